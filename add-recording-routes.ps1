@@ -71,6 +71,7 @@ Add-Route -RouteKey "GET /shows/{showId}/recordings" -FunctionName "shelcaster-g
 Add-Route -RouteKey "GET /recordings" -FunctionName "shelcaster-get-recordings" -Description "Get recordings for a user"
 Add-Route -RouteKey "POST /shows/{showId}/recordings" -FunctionName "shelcaster-save-recording" -Description "Start a new recording"
 Add-Route -RouteKey "POST /shows/{showId}/recordings/{recordingId}" -FunctionName "shelcaster-save-recording" -Description "Update or stop a recording"
+Add-Route -RouteKey "POST /sessions/{sessionId}/recording/clips" -FunctionName "shelcaster-create-clip-py" -Description "Cut a clip of a session recording"
 
 Write-Host "`n========================================" -ForegroundColor Green
 Write-Host "✅ All routes created successfully!" -ForegroundColor Green
@@ -81,4 +82,5 @@ Write-Host "  GET  https://td0dn99gi2.execute-api.us-east-1.amazonaws.com/shows/
 Write-Host "  GET  https://td0dn99gi2.execute-api.us-east-1.amazonaws.com/recordings?userId={userId}" -ForegroundColor Cyan
 Write-Host "  POST https://td0dn99gi2.execute-api.us-east-1.amazonaws.com/shows/{showId}/recordings" -ForegroundColor Cyan
 Write-Host "  POST https://td0dn99gi2.execute-api.us-east-1.amazonaws.com/shows/{showId}/recordings/{recordingId}" -ForegroundColor Cyan
+Write-Host "  POST https://td0dn99gi2.execute-api.us-east-1.amazonaws.com/sessions/{sessionId}/recording/clips" -ForegroundColor Cyan
 
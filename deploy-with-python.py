@@ -1,70 +1,501 @@
 #!/usr/bin/env python3
-import zipfile
+"""Package and deploy Lambda functions, skipping the ones that have not changed.
+
+Each function directory is hashed over its packaged files, so a deploy only
+uploads functions whose contents moved since the last successful deploy
+(recorded in .deploy-state.json) and whose code differs from what Lambda
+already runs. Zips are built in memory with fixed timestamps and ordering,
+so the same tree always produces the same bytes and CodeSha256. Dev-only
+node_modules (marked ``dev`` in package-lock.json) are left out.
+
+With ``--layers``, packages that at least ``--min-share`` functions install
+at the same version and integrity move into one Node.js layer, closed over
+their dependencies so nothing in /opt resolves back into a function. The
+layer is named by content hash and only published when that hash is new.
+Functions are then repackaged without those modules and attached to the
+layer. A function whose version of a package differs from the layer's keeps
+its own copy, which Node resolves first.
+
+The ``-py`` functions import shelcaster_common, so whenever one is deployed
+the layer built from lambda-layer/python is published (if its content is
+new) and attached, with or without ``--layers``. The layer version is part
+of each function's hash, so a change under lambda-layer/python redeploys
+the ``-py`` functions named in the run.
+
+    python deploy-with-python.py shelcaster-create-session
+    python deploy-with-python.py shelcaster-start-streaming-py shelcaster-stop-streaming-py
+    python deploy-with-python.py --all --jobs 16
+    python deploy-with-python.py --all --dry-run
+    python deploy-with-python.py my-dir:my-function-name
+    python deploy-with-python.py --all --layers --dry-run
+    python deploy-with-python.py --all --layers --min-share 3
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
 import os
-import subprocess
 import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(REPO_ROOT, '.deploy-state.json')
+HANDLER_FILES = ('index.mjs', 'index.js', 'lambda_function.py')
+# Zip entries get a fixed timestamp so identical trees give identical zips.
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# update-function-code takes at most this much inline; larger needs S3.
+MAX_INLINE_ZIP_BYTES = 50 * 1024 * 1024
+
+SKIP_DIRS = {'.git', '__pycache__', '.pytest_cache', '.bin'}
+# Only skipped at the top of a function directory; some packages need theirs.
+SKIP_TOP_DIRS = {'tests', 'test', 'coverage'}
+SKIP_SUFFIXES = ('.zip', '.pyc', '.log', '.md')
+SKIP_FILES = {'.DS_Store', 'Thumbs.db', '.package-lock.json'}
+# Sources are never run directly, so they always get 0o644: a checkout's
+# exec bits (and Windows, where every file passes os.X_OK) must not change
+# a function's hash or zip.
+SOURCE_SUFFIXES = ('.py', '.js', '.mjs', '.cjs', '.json', '.ts', '.map')
+
+NODE_LAYER_NAME = 'shelcaster-shared-node-deps'
+PYTHON_LAYER_NAME = 'shelcaster-common-py'
+PYTHON_LAYER_DIR = os.path.join(REPO_ROOT, 'lambda-layer', 'python')
+NODE_RUNTIMES = ['nodejs18.x', 'nodejs20.x', 'nodejs22.x']
+PYTHON_RUNTIMES = ['python3.11', 'python3.12', 'python3.13']
+# Layers are recorded in the state file under this key, next to functions.
+LAYER_STATE_KEY = '_layers'
+
+def find_functions():
+    """Every shelcaster-* directory that has a Lambda handler"""
+    functions = []
+    for name in sorted(os.listdir(REPO_ROOT)):
+        path = os.path.join(REPO_ROOT, name)
+        if name.startswith('shelcaster-') and os.path.isdir(path):
+            if any(os.path.exists(os.path.join(path, handler)) for handler in HANDLER_FILES):
+                functions.append(name)
+    return functions
+
+def dev_only_modules(source_dir):
+    """node_modules paths that package-lock.json marks as dev-only"""
+    lock_path = os.path.join(source_dir, 'package-lock.json')
+    if os.path.exists(lock_path):
+        with open(lock_path) as f:
+            packages = json.load(f).get('packages', {})
+        return {
+            path for path, meta in packages.items()
+            if path.startswith('node_modules/') and (meta.get('dev') or meta.get('devOptional'))
+        }
+
+    # No lockfile: drop only the direct devDependencies
+    package_path = os.path.join(source_dir, 'package.json')
+    if not os.path.exists(package_path):
+        return set()
+    with open(package_path) as f:
+        dev_dependencies = json.load(f).get('devDependencies', {})
+    return {f'node_modules/{name}' for name in dev_dependencies}
+
+def collect_files(source_dir, exclude_modules=()):
+    """Sorted ``(arcname, path)`` pairs that make up a function's package.
+
+    ``exclude_modules`` holds extra ``node_modules/<name>`` paths to leave
+    out on top of the dev-only ones.
+    """
+    excluded = dev_only_modules(source_dir) | set(exclude_modules)
+    files = []
+    for root, dirs, names in os.walk(source_dir):
+        rel_root = os.path.relpath(root, source_dir).replace(os.sep, '/')
+        rel_root = '' if rel_root == '.' else rel_root + '/'
+        dirs[:] = sorted(
+            d for d in dirs
+            if d not in SKIP_DIRS
+            and not (rel_root == '' and d in SKIP_TOP_DIRS)
+            and f'{rel_root}{d}' not in excluded
+        )
+        for name in names:
+            if name in SKIP_FILES or name.endswith(SKIP_SUFFIXES):
+                continue
+            files.append((f'{rel_root}{name}', os.path.join(root, name)))
+    files.sort()
+    return files
+
+def installed_packages(source_dir):
+    """Production entries of package-lock.json that are installed on disk"""
+    lock_path = os.path.join(source_dir, 'package-lock.json')
+    if not os.path.exists(lock_path) or not os.path.isdir(os.path.join(source_dir, 'node_modules')):
+        return {}
+    with open(lock_path) as f:
+        packages = json.load(f).get('packages', {})
+    return {
+        path: meta for path, meta in packages.items()
+        if path.startswith('node_modules/') and not (meta.get('dev') or meta.get('devOptional'))
+        and os.path.isdir(os.path.join(source_dir, path))
+    }
+
+def resolve_dependency(packages, from_path, name):
+    """Lockfile path Node would load ``name`` from when required in ``from_path``"""
+    path = from_path
+    while True:
+        candidate = f'{path}/node_modules/{name}' if path else f'node_modules/{name}'
+        if candidate in packages:
+            return candidate
+        if not path:
+            return None
+        cut = path.rfind('/node_modules/')
+        path = path[:cut] if cut >= 0 else ''
+
+def hoisted_requirements(packages, name):
+    """Top-level packages that ``node_modules/<name>`` (or anything nested in it) loads"""
+    root = f'node_modules/{name}'
+    required = {}
+    for path, meta in packages.items():
+        if path != root and not path.startswith(root + '/'):
+            continue
+        for dependency in {**meta.get('dependencies', {}), **meta.get('optionalDependencies', {})}:
+            resolved = resolve_dependency(packages, path, dependency)
+            if resolved is None:
+                if dependency not in meta.get('optionalDependencies', {}):
+                    required[dependency] = None
+            elif resolved.count('node_modules/') == 1 and resolved != root:
+                required[dependency] = package_key(packages[resolved])
+    return required
+
+def package_key(meta):
+    return meta.get('version'), meta.get('integrity')
+
+def plan_node_layer(function_dirs, min_share=2):
+    """Work out which top-level packages move into the shared layer.
+
+    Returns ``(chosen, providers, excludes)``: ``{name: (version, integrity)}``,
+    the function directory each package is copied from, and per function the
+    ``node_modules/<name>`` paths its package can now leave out.
+    """
+    locks = {source_dir: installed_packages(os.path.join(REPO_ROOT, source_dir)) for source_dir in function_dirs}
+    users = {}
+    for source_dir, packages in locks.items():
+        for path, meta in packages.items():
+            if path.count('node_modules/') == 1:
+                users.setdefault((path[len('node_modules/'):], package_key(meta)), []).append(source_dir)
+
+    # One version per name: the one most functions share
+    chosen = {}
+    for (name, key), dirs in sorted(users.items(), key=lambda entry: (entry[0][0], -len(entry[1]))):
+        if len(dirs) >= min_share and name not in chosen:
+            chosen[name] = key
+    providers = {name: users[(name, key)][0] for name, key in chosen.items()}
+
+    # Close over dependencies. A layer module can only see /opt, so each
+    # top-level package it loads must be in the layer at the version it was
+    # installed against; drop anything whose requirements conflict.
+    requirements = {}
+    rejected = set()
+    changed = True
+    while changed:
+        changed = False
+        for name in sorted(chosen):
+            if name not in chosen:
+                continue
+            if name not in requirements:
+                requirements[name] = hoisted_requirements(locks[providers[name]], name)
+            needs = requirements[name]
+            if any(key is None or dep in rejected or chosen.get(dep, key) != key for dep, key in needs.items()):
+                del chosen[name]
+                del providers[name]
+                rejected.add(name)
+                changed = True
+                continue
+            for dep, key in needs.items():
+                if dep not in chosen:
+                    chosen[dep] = key
+                    providers[dep] = users[(dep, key)][0]
+                    changed = True
+
+    excludes = {
+        source_dir: {
+            f'node_modules/{name}' for name, key in chosen.items()
+            if f'node_modules/{name}' in packages
+            and package_key(packages[f'node_modules/{name}']) == key
+        }
+        for source_dir, packages in locks.items()
+    }
+    return chosen, providers, excludes
+
+def node_layer_files(providers):
+    """Sorted ``(arcname, path)`` pairs for the shared Node.js layer"""
+    files = []
+    for name, source_dir in providers.items():
+        module_dir = os.path.join(REPO_ROOT, source_dir, 'node_modules', name)
+        for root, dirs, names in os.walk(module_dir):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            rel_root = os.path.relpath(root, module_dir).replace(os.sep, '/')
+            rel_root = '' if rel_root == '.' else rel_root + '/'
+            for file_name in names:
+                if file_name in SKIP_FILES or file_name.endswith(SKIP_SUFFIXES):
+                    continue
+                files.append((f'nodejs/node_modules/{name}/{rel_root}{file_name}', os.path.join(root, file_name)))
+    files.sort()
+    return files
+
+def python_layer_files():
+    """Sorted ``(arcname, path)`` pairs for the shelcaster_common layer"""
+    return [(f'python/{arcname}', path) for arcname, path in collect_files(PYTHON_LAYER_DIR)]
+
+def file_mode(path):
+    """Unix mode for a packaged file: 0o755 for executables, else 0o644"""
+    if path.endswith(SOURCE_SUFFIXES) or os.name == 'nt':
+        # Windows has no exec bit to read
+        return 0o644
+    return 0o755 if os.stat(path).st_mode & 0o111 else 0o644
+
+def content_hash(files):
+    """SHA-256 over every packaged file's name, mode and bytes"""
+    digest = hashlib.sha256()
+    for arcname, path in files:
+        digest.update(arcname.encode())
+        digest.update(b'\0x' if file_mode(path) == 0o755 else b'\0-')
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def build_zip(files):
+    """Deterministic in-memory zip of ``files``"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for arcname, path in files:
+            info = zipfile.ZipInfo(arcname, date_time=ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = file_mode(path) << 16
+            with open(path, 'rb') as f:
+                zipf.writestr(info, f.read())
+    return buffer.getvalue()
+
+def code_sha256(zip_bytes):
+    """Lambda's CodeSha256 for a package"""
+    return base64.b64encode(hashlib.sha256(zip_bytes).digest()).decode()
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
 
-def create_zip(source_dir, output_file):
-    """Create a zip file from a directory"""
-    print(f"Creating zip file from {source_dir}...")
-    
-    with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(source_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, source_dir)
-                print(f"  Adding: {arcname}")
-                zipf.write(file_path, arcname)
-    
-    print(f"Zip file created: {output_file}")
-    print(f"Size: {os.path.getsize(output_file) / (1024*1024):.2f} MB")
-
-def deploy_lambda(zip_file, function_name):
-    """Deploy the zip file to Lambda"""
-    print(f"\nDeploying to Lambda function: {function_name}...")
-    
-    cmd = [
-        'aws', 'lambda', 'update-function-code',
-        '--function-name', function_name,
-        '--zip-file', f'fileb://{zip_file}',
-        '--region', 'us-east-1',
-        '--profile', 'shelcaster-admin',
-        '--no-cli-pager'
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    
-    if result.returncode == 0:
-        print("✓ Deployment successful!")
-        return True
+def save_state(state):
+    with open(STATE_FILE, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def publish_layer(lambda_client, layer_name, files, runtimes, previous=None, s3=None, bucket=None, dry_run=False):
+    """Publish ``files`` as a layer version unless that content is already out.
+
+    The content hash goes in the description, so a version published from
+    another checkout is found and reused. Returns a state entry with the
+    hash and version ARN.
+    """
+    layer_hash = content_hash(files)
+    if previous and previous.get('hash') == layer_hash:
+        return {**previous, 'status': 'unchanged'}
+
+    for page in lambda_client.get_paginator('list_layer_versions').paginate(LayerName=layer_name):
+        for version in page.get('LayerVersions', []):
+            if version.get('Description') == layer_hash:
+                return {'hash': layer_hash, 'arn': version['LayerVersionArn'], 'status': 'up-to-date'}
+
+    zip_bytes = build_zip(files)
+    if dry_run:
+        # Stand-in ARN so the dry run still packages functions without the shared modules
+        arn = f'arn:aws:lambda:::layer:{layer_name}:unpublished-{layer_hash[:12]}'
+        return {'hash': layer_hash, 'arn': arn, 'size': len(zip_bytes), 'status': 'would-publish'}
+
+    if len(zip_bytes) <= MAX_INLINE_ZIP_BYTES:
+        content = {'ZipFile': zip_bytes}
+    elif s3 and bucket:
+        key = f'layers/{layer_name}/{layer_hash}.zip'
+        s3.put_object(Bucket=bucket, Key=key, Body=zip_bytes)
+        content = {'S3Bucket': bucket, 'S3Key': key}
     else:
-        print(f"✗ Deployment failed!")
-        print(f"Error: {result.stderr}")
+        raise ValueError(f'{layer_name} is {len(zip_bytes) / (1024*1024):.1f} MB; pass --layer-bucket to upload through S3')
+
+    response = lambda_client.publish_layer_version(
+        LayerName=layer_name,
+        Description=layer_hash,
+        Content=content,
+        CompatibleRuntimes=runtimes
+    )
+    return {'hash': layer_hash, 'arn': response['LayerVersionArn'], 'size': len(zip_bytes), 'status': 'published'}
+
+def layer_name_of(arn):
+    # arn:aws:lambda:<region>:<account>:layer:<name>:<version>
+    return arn.split(':')[6]
+
+def attach_layers(lambda_client, function_name, layer_arns, remote):
+    """Point a function at ``layer_arns``, replacing older versions of the same layers"""
+    names = {layer_name_of(arn) for arn in layer_arns}
+    current = [layer['Arn'] for layer in remote.get('Layers', [])]
+    wanted = [arn for arn in current if layer_name_of(arn) not in names] + list(layer_arns)
+    if wanted == current:
         return False
+    lambda_client.update_function_configuration(FunctionName=function_name, Layers=wanted)
+    # Code updates are rejected while the configuration update is in progress
+    lambda_client.get_waiter('function_updated_v2').wait(FunctionName=function_name)
+    return True
+
+def is_python_function(source_dir):
+    return os.path.exists(os.path.join(REPO_ROOT, source_dir, 'lambda_function.py'))
+
+def parse_target(target):
+    """``dir`` or ``dir:function-name``"""
+    source_dir, _, function_name = target.partition(':')
+    source_dir = source_dir.rstrip('/\\')
+    return source_dir, function_name or os.path.basename(source_dir)
+
+def deploy_function(lambda_client, source_dir, function_name, previous_hash, force=False, dry_run=False,
+                    exclude_modules=(), layer_arns=()):
+    """Package one function and upload it if it changed; returns a result dict.
+
+    With ``layer_arns`` the function is attached to those layers before its
+    slimmed code (without ``exclude_modules``) goes up, so it never runs
+    without the modules it needs.
+    """
+    started = time.perf_counter()
+    files = collect_files(os.path.join(REPO_ROOT, source_dir), exclude_modules=exclude_modules)
+    tree_hash = content_hash(files)
+    if layer_arns:
+        tree_hash = hashlib.sha256('\n'.join([tree_hash, *layer_arns]).encode()).hexdigest()
+    result = {'function': function_name, 'hash': tree_hash, 'files': len(files)}
+
+    if tree_hash == previous_hash and not force:
+        result['status'] = 'unchanged'
+        return result
+
+    zip_bytes = build_zip(files)
+    sha = code_sha256(zip_bytes)
+    result['size'] = len(zip_bytes)
+
+    remote = None
+    if not force or layer_arns:
+        remote = lambda_client.get_function_configuration(FunctionName=function_name)
+    if not force:
+        # The same tree zips to the same bytes, so this catches deploys made elsewhere
+        attached = {layer['Arn'] for layer in remote.get('Layers', [])}
+        if remote.get('CodeSha256') == sha and attached.issuperset(layer_arns):
+            result['status'] = 'up-to-date'
+            return result
+
+    if dry_run:
+        result['status'] = 'would-deploy'
+        return result
+
+    if len(zip_bytes) > MAX_INLINE_ZIP_BYTES:
+        raise ValueError(f'{function_name} package is {len(zip_bytes) / (1024*1024):.1f} MB; inline uploads max out at 50 MB')
+
+    if layer_arns:
+        attach_layers(lambda_client, function_name, layer_arns, remote)
+
+    lambda_client.update_function_code(FunctionName=function_name, ZipFile=zip_bytes)
+    result['status'] = 'deployed'
+    result['seconds'] = round(time.perf_counter() - started, 2)
+    return result
 
 def main():
-    source_dir = 'shelcaster-create-session'
-    zip_file = 'lambda-package.zip'
-    function_name = 'shelcaster-create-session'
-    
-    # Remove old zip if exists
-    if os.path.exists(zip_file):
-        os.remove(zip_file)
-        print(f"Removed old zip file: {zip_file}")
-    
-    # Create zip
-    create_zip(source_dir, zip_file)
-    
-    # Deploy
-    success = deploy_lambda(zip_file, function_name)
-    
-    # Cleanup
-    if os.path.exists(zip_file):
-        os.remove(zip_file)
-        print(f"\nCleaned up: {zip_file}")
-    
-    sys.exit(0 if success else 1)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('targets', nargs='*', help='function directories, optionally dir:function-name')
+    parser.add_argument('--all', action='store_true', help='every shelcaster-* function directory')
+    parser.add_argument('--jobs', type=int, default=8, help='concurrent packages (default 8)')
+    parser.add_argument('--force', action='store_true', help='deploy even if unchanged')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be deployed')
+    parser.add_argument('--layers', action='store_true', help='move shared dependencies into layers')
+    parser.add_argument('--min-share', type=int, default=2, help='functions that must share a package (default 2)')
+    parser.add_argument('--layer-bucket', help='S3 bucket for layers over the 50 MB inline limit')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--profile', default='shelcaster-admin')
+    args = parser.parse_args()
+
+    targets = [parse_target(target) for target in args.targets]
+    if args.all:
+        targets += [(name, name) for name in find_functions()]
+    if not targets:
+        parser.error('name at least one function directory or pass --all')
+
+    import boto3
+    from botocore.config import Config
+
+    session = boto3.Session(profile_name=args.profile, region_name=args.region)
+    lambda_client = session.client('lambda', config=Config(
+        max_pool_connections=args.jobs,
+        retries={'max_attempts': 5, 'mode': 'adaptive'}
+    ))
+
+    state = load_state()
+    layer_state = state.setdefault(LAYER_STATE_KEY, {})
+    excludes = {}
+    layers_for = {}
+    builds = []
+    if args.layers:
+        # Sharing is decided across the whole fleet, not just this run's targets
+        function_dirs = find_functions()
+        chosen, providers, excludes = plan_node_layer(function_dirs, min_share=args.min_share)
+        print(f'{len(chosen)} shared packages across {sum(1 for paths in excludes.values() if paths)} functions')
+        builds.append((NODE_LAYER_NAME, node_layer_files(providers), NODE_RUNTIMES))
+    python_dirs = [source_dir for source_dir, _ in targets if is_python_function(source_dir)]
+    if python_dirs:
+        # Python handlers import shelcaster_common, so they never go out without it
+        builds.append((PYTHON_LAYER_NAME, python_layer_files(), PYTHON_RUNTIMES))
+
+    layers = {}
+    for layer_name, files, runtimes in builds:
+        if not files:
+            continue
+        entry = publish_layer(
+            lambda_client, layer_name, files, runtimes,
+            previous=layer_state.get(layer_name), s3=session.client('s3'), bucket=args.layer_bucket,
+            dry_run=args.dry_run
+        )
+        size = f" {entry['size'] / (1024*1024):.2f} MB" if 'size' in entry else ''
+        print(f"{'·' if entry['status'] == 'would-publish' else '✓'} layer {layer_name}: {entry['status']}{size}")
+        layers[layer_name] = entry['arn']
+        layer_state[layer_name] = {'hash': entry['hash'], 'arn': entry['arn']}
+
+    for source_dir in python_dirs:
+        layers_for[source_dir] = [layers[PYTHON_LAYER_NAME]]
+    if args.layers:
+        for source_dir, _ in targets:
+            if source_dir in layers_for:
+                continue
+            if excludes.get(source_dir) and NODE_LAYER_NAME in layers:
+                layers_for[source_dir] = [layers[NODE_LAYER_NAME]]
+            else:
+                # Without a published layer, keep bundling everything
+                excludes[source_dir] = set()
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {
+            executor.submit(
+                deploy_function, lambda_client, source_dir, function_name,
+                state.get(function_name), force=args.force, dry_run=args.dry_run,
+                exclude_modules=excludes.get(source_dir, ()), layer_arns=layers_for.get(source_dir, ())
+            ): function_name
+            for source_dir, function_name in dict.fromkeys(targets)
+        }
+        for future in as_completed(futures):
+            function_name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f'✗ {function_name}: {str(e)}')
+                continue
+
+            size = f" {result['size'] / (1024*1024):.2f} MB" if 'size' in result else ''
+            print(f"{'✓' if result['status'] != 'would-deploy' else '·'} {function_name}: {result['status']}{size}")
+            if result['status'] in ('deployed', 'up-to-date'):
+                state[function_name] = result['hash']
+
+    if not args.dry_run:
+        save_state(state)
+
+    sys.exit(1 if failures else 0)
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,5 @@
+"""Shared helpers for the Shelcaster Python Lambdas.
+
+Deployed as the ``python/`` tree of a Lambda layer, so handlers can
+``from shelcaster_common.session import load_session``.
+"""
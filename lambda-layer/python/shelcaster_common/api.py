@@ -0,0 +1,46 @@
+"""API Gateway proxy request helpers shared by the HTTP handlers."""
+import hashlib
+import json
+
+
+def parse_body(event):
+    """The request body as a dict ({} when empty).
+
+    Raises ``ValueError`` for malformed JSON or a body that is not a JSON
+    object, so handlers answer 400 from the same block as their other
+    request checks.
+    """
+    raw = event.get('body')
+    if not raw:
+        return {}
+    try:
+        body = json.loads(raw)
+    except ValueError:
+        raise ValueError('Request body is not valid JSON')
+    if not isinstance(body, dict):
+        raise ValueError('Request body must be a JSON object')
+    return body
+
+
+def request_header(event, name):
+    """Header value regardless of how the API gateway cased the name"""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def entity_tag(body):
+    """Strong ETag: a digest of the exact bytes served"""
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match comparison (weak, as RFC 9110 requires for it)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in candidates)
@@ -0,0 +1,165 @@
+"""MediaLive and IVS state-change events as session state.
+
+EventBridge emits ``MediaLive Channel State Change`` and ``IVS Stream State
+Change`` events whenever a channel moves, so the session can carry the
+channel's actual state (``mediaLive.channelState``, ``ivs.streamState``)
+instead of every reader calling ``describe_channel``.
+
+Delivery is at least once and not in order. Each observation therefore
+carries a ``version``: the event time (UTC, millisecond ISO) followed by
+the state's rank in the channel lifecycle, which orders two transitions
+reported in the same second. Writers only apply an observation whose
+version is greater than the stored one, so duplicates and late arrivals
+are no-ops however often they are replayed.
+
+MediaLive reports lifecycle states that ``describe_channel`` does not use
+(``CREATED``, ``STOPPED``); they are stored in ``describe_channel`` terms
+so ``READY_STATES`` and the reaper's state lists apply unchanged.
+"""
+import json
+from datetime import datetime
+
+from shelcaster_common.schedule import parse_time
+
+MEDIALIVE_SOURCE = 'aws.medialive'
+MEDIALIVE_DETAIL_TYPE = 'MediaLive Channel State Change'
+IVS_SOURCE = 'aws.ivs'
+IVS_DETAIL_TYPE = 'IVS Stream State Change'
+
+# event state -> (describe_channel state, lifecycle rank)
+MEDIALIVE_STATES = {
+    'CREATING': ('CREATING', 0),
+    'CREATED': ('IDLE', 1),
+    'IDLE': ('IDLE', 1),
+    'UPDATING': ('UPDATING', 1),
+    'STARTING': ('STARTING', 2),
+    'RUNNING': ('RUNNING', 3),
+    'RECOVERING': ('RECOVERING', 3),
+    'STOPPING': ('STOPPING', 4),
+    'STOPPED': ('IDLE', 5),
+    'CREATE_FAILED': ('CREATE_FAILED', 6),
+    'DELETING': ('DELETING', 6),
+    'DELETED': ('DELETED', 7)
+}
+# event_name -> (stream state, lifecycle rank)
+IVS_STREAMS = {
+    'Stream Start': ('LIVE', 1),
+    'Stream End': ('OFFLINE', 2),
+    'Stream Failure': ('OFFLINE', 2)
+}
+# A channel in one of these is not carrying the show
+STOPPED_STATES = ('IDLE', 'DELETED', 'DELETING', 'CREATE_FAILED')
+
+MEDIALIVE = 'medialive'
+IVS = 'ivs'
+
+
+class ChannelEvent:
+    """One state change of one channel"""
+
+    __slots__ = ('event_id', 'kind', 'channel', 'state', 'at', 'version', 'detail')
+
+    def __init__(self, event_id, kind, channel, state, at, rank, detail=None):
+        self.event_id = event_id
+        self.kind = kind
+        # MediaLive channel id, or IVS channel ARN
+        self.channel = channel
+        self.state = state
+        self.at = at
+        self.version = f'{at}#{rank:02d}'
+        self.detail = detail or {}
+
+    @property
+    def target(self):
+        return (self.kind, self.channel)
+
+    def attribute(self):
+        """The map AttributeValue stored on the session"""
+        fields = {
+            'state': {'S': self.state},
+            'at': {'S': self.at},
+            'version': {'S': self.version},
+            'eventId': {'S': self.event_id}
+        }
+        for name, value in self.detail.items():
+            fields[name] = {'N': str(value)} if isinstance(value, int) else {'S': str(value)}
+        return {'M': fields}
+
+
+def event_time(value):
+    """Naive UTC ISO time with milliseconds (compare with ``parse_time``, not as strings)"""
+    return datetime.utcfromtimestamp(parse_time(value)).isoformat(timespec='milliseconds')
+
+
+def parse_event(event):
+    """``ChannelEvent`` for an EventBridge event, or None if it is not a channel state change"""
+    detail = event.get('detail') or {}
+    source = event.get('source')
+    if source == MEDIALIVE_SOURCE and event.get('detail-type') == MEDIALIVE_DETAIL_TYPE:
+        known = MEDIALIVE_STATES.get(detail.get('state'))
+        arn = detail.get('channel_arn') or next(iter(event.get('resources') or []), '')
+        if known is None or not arn:
+            return None
+        extra = {}
+        if isinstance(detail.get('pipelines_running_count'), int):
+            extra['pipelinesRunning'] = detail['pipelines_running_count']
+        return ChannelEvent(event['id'], MEDIALIVE, arn.rsplit(':', 1)[-1], known[0], event_time(event['time']), known[1], extra)
+    if source == IVS_SOURCE and event.get('detail-type') == IVS_DETAIL_TYPE:
+        known = IVS_STREAMS.get(detail.get('event_name'))
+        resources = event.get('resources') or []
+        if known is None or not resources:
+            return None
+        extra = {'event': detail['event_name']}
+        if detail.get('stream_id'):
+            extra['streamId'] = detail['stream_id']
+        return ChannelEvent(event['id'], IVS, resources[0], known[0], event_time(event['time']), known[1], extra)
+    return None
+
+
+def unpack_events(event):
+    """``[(message id or None, EventBridge event)]`` from a direct invocation or an SQS batch.
+
+    SQS records whose body is not a JSON object are logged and left out:
+    redelivering them cannot help, and failing the batch would hold back
+    every other record in it.
+    """
+    if 'Records' in event:
+        events = []
+        for record in event['Records']:
+            try:
+                body = json.loads(record['body'])
+            except (TypeError, ValueError) as e:
+                print(f"Skipping unreadable record {record.get('messageId')}: {str(e)}")
+                continue
+            if not isinstance(body, dict):
+                print(f"Skipping record {record.get('messageId')}: body is not an event")
+                continue
+            events.append((record['messageId'], body))
+        return events
+    if 'detail-type' in event:
+        return [(None, event)]
+    return [(None, entry) for entry in event.get('events', [])]
+
+
+def coalesce(events):
+    """Newest event per channel, plus the ids of those dropped as duplicates or superseded.
+
+    Returns ``(latest, dropped)`` with ``latest`` as ``{target: ChannelEvent}``
+    and ``dropped`` as ``{event_id: 'duplicate' | 'superseded'}``.
+    """
+    latest = {}
+    seen = set()
+    dropped = {}
+    for event in events:
+        if event.event_id in seen:
+            dropped[event.event_id] = 'duplicate'
+            continue
+        seen.add(event.event_id)
+        current = latest.get(event.target)
+        if current is None or event.version > current.version:
+            if current is not None:
+                dropped[current.event_id] = 'superseded'
+            latest[event.target] = event
+        else:
+            dropped[event.event_id] = 'superseded'
+    return latest, dropped
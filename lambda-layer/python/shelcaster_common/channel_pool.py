@@ -0,0 +1,302 @@
+"""Warm pool of pre-provisioned MediaLive input/channel pairs.
+
+Pool entries live in the app table under ``pk=medialive-pool#<profile>``,
+``sk=channel#<channelId>``. Start-streaming claims an idle entry with a
+conditional write, rebinds the channel's destinations to the session and
+asks the pool function to top the pool back up asynchronously.
+
+The prewarm scheduler can also reserve an idle entry for a show ahead of
+air time; a session of that show then claims its reservation before any
+idle entry, and unclaimed reservations go back to idle once the show is
+well past its air time.
+"""
+import json
+import os
+import uuid
+from datetime import datetime
+
+from shelcaster_common.channels import (
+    create_input_and_channel,
+    rebind_destinations,
+    wait_for_channel_state,
+)
+from shelcaster_common.profiles import DEFAULT_PROFILE, get_profile
+from shelcaster_common.session import TABLE_NAME
+
+POOL_SIZE = int(os.environ.get('MEDIALIVE_POOL_SIZE', '2'))
+POOL_PROFILE = os.environ.get('MEDIALIVE_POOL_PROFILE', DEFAULT_PROFILE)
+POOL_FUNCTION_NAME = os.environ.get('MEDIALIVE_POOL_FUNCTION', 'shelcaster-medialive-pool-py')
+# Pool channels need *some* IVS destination until a session claims them.
+PLACEHOLDER_INGEST = os.environ.get('MEDIALIVE_POOL_PLACEHOLDER_INGEST', 'rtmps://pool.invalid:443/app/')
+
+STATUS_IDLE = 'idle'
+STATUS_RESERVED = 'reserved'
+STATUS_CLAIMED = 'claimed'
+
+
+def pool_key(channel_id, profile=POOL_PROFILE):
+    return {
+        'pk': {'S': f'medialive-pool#{profile}'},
+        'sk': {'S': f'channel#{channel_id}'}
+    }
+
+
+def list_entries(dynamodb, profile=POOL_PROFILE, status=STATUS_IDLE, table_name=TABLE_NAME):
+    """Pool entries for a profile in ``status``, oldest first"""
+    entries = []
+    kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': 'pk = :pk',
+        'FilterExpression': '#status = :status',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {
+            ':pk': {'S': f'medialive-pool#{profile}'},
+            ':status': {'S': status}
+        }
+    }
+    while True:
+        response = dynamodb.query(**kwargs)
+        for item in response.get('Items', []):
+            entries.append({
+                'channelId': item['channelId']['S'],
+                'inputId': item['inputId']['S'],
+                'rtmpUrl': item['rtmpUrl']['S'],
+                'specHash': item.get('specHash', {}).get('S'),
+                'createdAt': item.get('createdAt', {}).get('S', ''),
+                'reservedFor': item.get('reservedFor', {}).get('S'),
+                'airTime': float(item['airTime']['N']) if 'airTime' in item else None
+            })
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    entries.sort(key=lambda entry: entry['createdAt'])
+    return entries
+
+
+def list_idle(dynamodb, profile=POOL_PROFILE, table_name=TABLE_NAME):
+    """Idle pool entries for a profile, oldest first"""
+    return list_entries(dynamodb, profile, STATUS_IDLE, table_name)
+
+
+def provision_pooled_channel(medialive, dynamodb, profile=POOL_PROFILE, table_name=TABLE_NAME):
+    """Create one input/channel pair and register it as idle"""
+    token = f'pool-{uuid.uuid4().hex[:12]}'
+    ml_channel = create_input_and_channel(
+        medialive,
+        name_suffix=token,
+        stream_name=f'host/{token}',
+        ivs_ingest=PLACEHOLDER_INGEST,
+        recording_id=token,
+        profile_name=profile
+    )
+
+    item = pool_key(ml_channel['channelId'], profile)
+    item.update({
+        'entityType': {'S': 'medialivePoolChannel'},
+        'status': {'S': STATUS_IDLE},
+        'channelId': {'S': ml_channel['channelId']},
+        'inputId': {'S': ml_channel['inputId']},
+        'rtmpUrl': {'S': ml_channel['rtmpUrl']},
+        'specHash': {'S': ml_channel['specHash']},
+        'createdAt': {'S': datetime.utcnow().isoformat()}
+    })
+    dynamodb.put_item(
+        TableName=table_name,
+        Item=item,
+        ConditionExpression='attribute_not_exists(pk)'
+    )
+    return ml_channel
+
+
+def refill_pool(medialive, dynamodb, size=POOL_SIZE, profile=POOL_PROFILE, table_name=TABLE_NAME):
+    """Provision pairs until ``size`` idle entries exist; returns the new ones"""
+    missing = size - len(list_idle(dynamodb, profile, table_name))
+    created = []
+    for _ in range(max(missing, 0)):
+        created.append(provision_pooled_channel(medialive, dynamodb, profile, table_name))
+    return created
+
+
+def reserve_pooled_channel(dynamodb, show_id, air_time, profile=POOL_PROFILE, table_name=TABLE_NAME):
+    """Set an idle entry aside for a show; its existing reservation if it has one.
+
+    Returns the entry, or None if the pool is empty.
+    """
+    for entry in list_entries(dynamodb, profile, STATUS_RESERVED, table_name):
+        if entry['reservedFor'] == show_id:
+            return entry
+    for entry in list_idle(dynamodb, profile, table_name):
+        try:
+            dynamodb.update_item(
+                TableName=table_name,
+                Key=pool_key(entry['channelId'], profile),
+                UpdateExpression='SET #status = :reserved, reservedFor = :show, airTime = :air',
+                ConditionExpression='#status = :idle',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':reserved': {'S': STATUS_RESERVED},
+                    ':idle': {'S': STATUS_IDLE},
+                    ':show': {'S': show_id},
+                    ':air': {'N': str(int(air_time))}
+                }
+            )
+            return {**entry, 'reservedFor': show_id, 'airTime': float(int(air_time))}
+        except dynamodb.exceptions.ConditionalCheckFailedException:
+            continue
+    return None
+
+
+def release_expired_reservations(dynamodb, before, profile=POOL_PROFILE, table_name=TABLE_NAME):
+    """Return reservations for shows that aired before ``before`` (epoch seconds) to idle"""
+    released = []
+    for entry in list_entries(dynamodb, profile, STATUS_RESERVED, table_name):
+        if entry['airTime'] is not None and entry['airTime'] >= before:
+            continue
+        try:
+            dynamodb.update_item(
+                TableName=table_name,
+                Key=pool_key(entry['channelId'], profile),
+                UpdateExpression='SET #status = :idle REMOVE reservedFor, airTime',
+                ConditionExpression='#status = :reserved AND reservedFor = :show',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':idle': {'S': STATUS_IDLE},
+                    ':reserved': {'S': STATUS_RESERVED},
+                    ':show': {'S': entry['reservedFor']}
+                }
+            )
+            released.append(entry)
+        except dynamodb.exceptions.ConditionalCheckFailedException:
+            continue
+    return released
+
+
+def claim_pooled_channel(dynamodb, session_id, profile=POOL_PROFILE, table_name=TABLE_NAME, reserved_for=None):
+    """Atomically claim an entry for a session, or None if the pool is empty.
+
+    With ``reserved_for`` (a show id) that show's reservation is taken
+    before any idle entry.
+    """
+    candidates = []
+    if reserved_for:
+        candidates = [
+            (entry, STATUS_RESERVED) for entry in list_entries(dynamodb, profile, STATUS_RESERVED, table_name)
+            if entry['reservedFor'] == reserved_for
+        ]
+    candidates += [(entry, STATUS_IDLE) for entry in list_idle(dynamodb, profile, table_name)]
+    for entry, status in candidates:
+        values = {
+            ':claimed': {'S': STATUS_CLAIMED},
+            ':status': {'S': status},
+            ':sid': {'S': session_id},
+            ':now': {'S': datetime.utcnow().isoformat()}
+        }
+        condition = '#status = :status'
+        if status == STATUS_RESERVED:
+            condition += ' AND reservedFor = :show'
+            values[':show'] = {'S': reserved_for}
+        try:
+            dynamodb.update_item(
+                TableName=table_name,
+                Key=pool_key(entry['channelId'], profile),
+                UpdateExpression='SET #status = :claimed, claimedBy = :sid, claimedAt = :now',
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues=values
+            )
+            return entry
+        except dynamodb.exceptions.ConditionalCheckFailedException:
+            # Another invocation won this entry; try the next one.
+            continue
+    return None
+
+
+def release_pooled_channel(dynamodb, channel_id, profile=POOL_PROFILE, table_name=TABLE_NAME, claimed_by=None,
+                           reserved_for=None):
+    """Return a claimed entry to the pool (e.g. when rebinding failed).
+
+    With ``claimed_by`` (a session id) the entry is only released while
+    that session holds it; returns False if it no longer does. An entry
+    claimed from ``reserved_for``'s reservation (a show id) goes back to
+    that reservation rather than to idle.
+    """
+    kwargs = {
+        'TableName': table_name,
+        'Key': pool_key(channel_id, profile),
+        'UpdateExpression': 'SET #status = :idle REMOVE claimedBy, claimedAt, reservedFor, airTime',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {':idle': {'S': STATUS_IDLE}}
+    }
+    conditions = []
+    if reserved_for:
+        # Claiming left reservedFor and airTime in place
+        kwargs['UpdateExpression'] = 'SET #status = :reserved REMOVE claimedBy, claimedAt'
+        kwargs['ExpressionAttributeValues'] = {':reserved': {'S': STATUS_RESERVED}, ':show': {'S': reserved_for}}
+        conditions.append('reservedFor = :show')
+    if claimed_by:
+        conditions.append('claimedBy = :sid')
+        kwargs['ExpressionAttributeValues'][':sid'] = {'S': claimed_by}
+    if conditions:
+        kwargs['ConditionExpression'] = ' AND '.join(conditions)
+    try:
+        dynamodb.update_item(**kwargs)
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+
+def remove_pooled_channel(dynamodb, channel_id, profile=POOL_PROFILE, table_name=TABLE_NAME):
+    """Drop a claimed entry once the session owns the channel"""
+    dynamodb.delete_item(
+        TableName=table_name,
+        Key=pool_key(channel_id, profile)
+    )
+
+
+def take_pooled_channel(medialive, dynamodb, session_id, ivs_ingest, profile=POOL_PROFILE, table_name=TABLE_NAME,
+                        reserved_for=None, deadline=None):
+    """Claim a pair (the show's reservation first) and rebind it to the session; None if the pool is empty.
+
+    Entries built from an older revision of the profile are patched to the
+    current spec during the rebind rather than discarded. Both channel waits
+    end at ``deadline``; the claim is released if either runs out. Once the
+    pair is returned the caller owns the claim until its session write
+    deletes the entry, and releases it (to ``reservedFor``'s reservation,
+    if it came from one) if that write fails.
+    """
+    entry = claim_pooled_channel(dynamodb, session_id, profile, table_name, reserved_for=reserved_for)
+    if entry is None:
+        return None
+
+    try:
+        wait_for_channel_state(medialive, entry['channelId'], ('IDLE',), deadline=deadline)
+        rebind_destinations(
+            medialive, entry['channelId'], ivs_ingest, session_id,
+            stored_hash=entry['specHash'], profile_name=profile
+        )
+        # update_channel briefly moves the channel to UPDATING.
+        wait_for_channel_state(medialive, entry['channelId'], ('IDLE',), interval=0.5, deadline=deadline)
+    except Exception:
+        release_pooled_channel(
+            dynamodb, entry['channelId'], profile, table_name,
+            claimed_by=session_id, reserved_for=entry['reservedFor']
+        )
+        raise
+
+    return {
+        'channelId': entry['channelId'],
+        'inputId': entry['inputId'],
+        'rtmpUrl': entry['rtmpUrl'],
+        'profile': profile,
+        'specHash': get_profile(profile).spec_hash,
+        'reservedFor': entry['reservedFor']
+    }
+
+
+def request_refill(lambda_client, profile=POOL_PROFILE, function_name=POOL_FUNCTION_NAME):
+    """Fire-and-forget invoke of the pool function to replace a claimed pair"""
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'action': 'refill', 'profile': profile}).encode('utf-8')
+    )
@@ -0,0 +1,175 @@
+"""MediaLive channel provisioning shared by the streaming handlers.
+
+Mutating MediaLive calls go through the ``medialive`` resilience guard.
+Creates carry an explicit ``RequestId``, so a retry after a server error
+returns the resource the first attempt made instead of a second one.
+"""
+import time
+import uuid
+
+from shelcaster_common import readiness
+from shelcaster_common.profiles import DEFAULT_PROFILE, SPEC_HASH_TAG, get_profile
+from shelcaster_common.resilience import guard
+
+MEDIALIVE_ROLE_ARN = 'arn:aws:iam::124355640062:role/MediaLiveAccessRole'
+INPUT_SECURITY_GROUP_ID = '3617718'
+S3_BUCKET = 'shelcaster-media-manager'
+
+
+def ivs_ingest_url(ivs_ingest):
+    """RTMPS URL for an IVS ingest endpoint (bare host or full URL)"""
+    if ivs_ingest.startswith('rtmps://') or ivs_ingest.startswith('rtmp://'):
+        return ivs_ingest
+    return f'rtmps://{ivs_ingest}:443/app/'
+
+
+def build_destinations(ivs_ingest, session_id):
+    """IVS + S3 recording destinations for a session"""
+    return [
+        {
+            'Id': 'ivs-destination',
+            'Settings': [{'Url': ivs_ingest_url(ivs_ingest), 'StreamName': 'live'}]
+        },
+        {
+            'Id': 's3-destination',
+            'Settings': [{'Url': f's3ssl://{S3_BUCKET}/recordings/{session_id}/index'}]
+        }
+    ]
+
+
+def create_input_and_channel(medialive, name_suffix, stream_name, ivs_ingest, recording_id, profile_name=DEFAULT_PROFILE):
+    """Create an RTMP input and a channel attached to it from a named profile"""
+    profile = get_profile(profile_name)
+    medialive_guard = guard('medialive')
+
+    input_request = {
+        'Name': f'shelcaster-input-{name_suffix}',
+        'Type': 'RTMP_PUSH',
+        'InputSecurityGroups': [INPUT_SECURITY_GROUP_ID],
+        'Destinations': [{'StreamName': stream_name}],
+        'RequestId': str(uuid.uuid4())
+    }
+    input_response = medialive_guard.call(lambda: medialive.create_input(**input_request))
+
+    input_id = input_response['Input']['Id']
+    rtmp_url = input_response['Input']['Destinations'][0]['Url']
+
+    channel_request = {
+        'Name': f'shelcaster-channel-{name_suffix}',
+        'RoleArn': MEDIALIVE_ROLE_ARN,
+        'ChannelClass': profile.channel_class,
+        'InputSpecification': profile.input_specification,
+        'InputAttachments': [{
+            'InputId': input_id,
+            'InputAttachmentName': 'host-input',
+            'InputSettings': {
+                'SourceEndBehavior': 'CONTINUE'
+            }
+        }],
+        'Destinations': build_destinations(ivs_ingest, recording_id),
+        'EncoderSettings': profile.encoder_settings,
+        'Tags': profile.tags(),
+        'RequestId': str(uuid.uuid4())
+    }
+    channel_response = medialive_guard.call(lambda: medialive.create_channel(**channel_request))
+
+    return {
+        'channelId': channel_response['Channel']['Id'],
+        'inputId': input_id,
+        'rtmpUrl': rtmp_url,
+        'profile': profile.name,
+        'specHash': profile.spec_hash
+    }
+
+
+def media_live_attribute(ml_channel, source=None, latency_mode=None):
+    """``mediaLive`` map AttributeValue for a session item"""
+    value = {
+        'channelId': {'S': ml_channel['channelId']},
+        'inputId': {'S': ml_channel['inputId']},
+        'rtmpUrl': {'S': ml_channel['rtmpUrl']}
+    }
+    if ml_channel.get('specHash'):
+        value['profile'] = {'S': ml_channel['profile']}
+        value['specHash'] = {'S': ml_channel['specHash']}
+    if source:
+        value['input'] = source_attribute(source)
+    if latency_mode:
+        value['latencyMode'] = {'S': latency_mode}
+    return {'M': value}
+
+
+def source_attribute(source):
+    """``mediaLive.input`` map AttributeValue for a declared source"""
+    return {'M': {field: {'N': str(number)} for field, number in source.items()}}
+
+
+def wait_for_channel_state(medialive, channel_id, states, timeout=30, interval=1, deadline=None):
+    """Poll describe_channel until the channel is in one of ``states``.
+
+    ``deadline`` (monotonic, e.g. ``deadline_from_context``) takes the place
+    of ``timeout`` when given, so a wait inside an API request ends before
+    the gateway gives up on it.
+    """
+    started = time.monotonic()
+    state, reached = readiness.wait_for_channel_state(
+        medialive, channel_id, states,
+        deadline=deadline if deadline is not None else started + timeout,
+        initial=interval / 2
+    )
+    if not reached:
+        raise TimeoutError(f'Channel {channel_id} still {state} after {time.monotonic() - started:.0f}s')
+    return state
+
+
+def rebind_destinations(medialive, channel_id, ivs_ingest, session_id, stored_hash=None, profile_name=DEFAULT_PROFILE):
+    """Point an idle channel's destinations at a session.
+
+    If ``stored_hash`` does not match the profile, the encoder spec is
+    patched in the same ``update_channel`` call. Returns True if patched.
+    """
+    profile = get_profile(profile_name)
+    kwargs = {
+        'ChannelId': channel_id,
+        'Destinations': build_destinations(ivs_ingest, session_id)
+    }
+    patched = stored_hash != profile.spec_hash
+    if patched:
+        kwargs['InputSpecification'] = profile.input_specification
+        kwargs['EncoderSettings'] = profile.encoder_settings
+
+    response = guard('medialive').call(lambda: medialive.update_channel(**kwargs))
+    if patched:
+        guard('medialive').call(lambda: medialive.create_tags(ResourceArn=response['Channel']['Arn'], Tags=profile.tags()))
+    return patched
+
+
+def ensure_channel_spec(medialive, channel_id, stored_hash, profile_name=DEFAULT_PROFILE, deadline=None):
+    """Reuse a channel whose spec hash matches, or patch it if it is idle.
+
+    Returns the spec hash the channel now has. Running channels cannot be
+    updated, so a mismatched running channel is left alone until next time.
+    ``deadline`` bounds the wait for the patched channel to settle.
+    """
+    profile = get_profile(profile_name)
+    if stored_hash == profile.spec_hash:
+        return stored_hash
+
+    channel = guard('medialive').call(lambda: medialive.describe_channel(ChannelId=channel_id), deadline=deadline)
+    current_hash = channel.get('Tags', {}).get(SPEC_HASH_TAG)
+    if current_hash == profile.spec_hash:
+        return current_hash
+
+    if channel['State'] != 'IDLE':
+        print(f"MediaLive channel {channel_id} is {channel['State']}, not patching encoder spec")
+        return current_hash
+
+    guard('medialive').call(lambda: medialive.update_channel(
+        ChannelId=channel_id,
+        InputSpecification=profile.input_specification,
+        EncoderSettings=profile.encoder_settings
+    ))
+    guard('medialive').call(lambda: medialive.create_tags(ResourceArn=channel['Arn'], Tags=profile.tags()))
+    wait_for_channel_state(medialive, channel_id, ('IDLE',), interval=0.5, deadline=deadline)
+    print(f'MediaLive channel {channel_id} patched to profile {profile.name}')
+    return profile.spec_hash
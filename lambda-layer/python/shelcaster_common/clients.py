@@ -0,0 +1,107 @@
+"""Lazily created, explicitly tuned AWS clients.
+
+Handlers declare ``medialive = lazy_client('medialive')`` at module level
+as before, but nothing is imported or built until the first call, so an
+invocation only pays for the clients it actually uses. All clients come
+from one shared botocore session and one tuned ``Config``.
+
+Calls to the services in ``GUARDED_SERVICES`` all go through
+``resilience.guard``, which does its own retrying, so their clients make a
+single attempt; otherwise each guarded attempt would hide up to
+``MAX_ATTEMPTS`` botocore attempts, and non-idempotent creates would be
+retried on server errors behind the guard's back.
+"""
+import os
+import threading
+
+REGION = os.environ.get('SHELCASTER_REGION', 'us-east-1')
+
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '10'))
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '3'))
+GUARDED_SERVICES = ('medialive', 'ivs')
+# One connection per fan-out worker plus headroom for the main thread.
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', str(int(os.environ.get('FANOUT_MAX_WORKERS', '8')) + 2)))
+
+# DynamoDB calls are small and fast; fail over to a retry sooner.
+SERVICE_READ_TIMEOUTS = {
+    'dynamodb': 3.0
+}
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_session():
+    """The shared boto3 session (created on first use)"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3.session
+                from shelcaster_common.tracing import instrument_session
+                session = boto3.session.Session(region_name=REGION)
+                instrument_session(session)
+                _session = session
+    return _session
+
+
+def client_config(service):
+    from botocore.config import Config
+    return Config(
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=SERVICE_READ_TIMEOUTS.get(service, READ_TIMEOUT),
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        retries={'mode': 'standard', 'max_attempts': 1 if service in GUARDED_SERVICES else MAX_ATTEMPTS}
+    )
+
+
+def get_client(service):
+    """Cached client for ``service``; safe to call from fan-out threads"""
+    client = _clients.get(service)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = session.client(service, config=client_config(service))
+                _clients[service] = client
+    return client
+
+
+def set_client(service, client):
+    """Install a prebuilt client (benchmarks and local runs)"""
+    with _lock:
+        _clients[service] = client
+
+
+def reset_clients():
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
+
+
+class LazyClient:
+    """Module-level stand-in that builds the real client on first attribute access"""
+
+    __slots__ = ('service',)
+
+    def __init__(self, service):
+        self.service = service
+
+    @property
+    def client(self):
+        return get_client(self.service)
+
+    def __getattr__(self, name):
+        return getattr(get_client(self.service), name)
+
+    def __repr__(self):
+        return f'LazyClient({self.service!r})'
+
+
+def lazy_client(service):
+    return LazyClient(service)
@@ -0,0 +1,130 @@
+"""Clips of a session recording as VOD playlists over its existing segments.
+
+A clip is a time range of the HLS output. Its segments come from each
+rendition's segment index (a bisect, however long the show), and the clip
+is written as a master plus one media playlist per rendition under
+``recordings/<sessionId>/clips/<clipId>/`` whose entries point back at the
+original segment objects by relative URI. Nothing is copied, so a clip
+costs a few small PUTs.
+
+By default the clip snaps out to whole segments. A frame-accurate clip
+re-encodes just the two edge segments, cut to the requested times, with
+the ffmpeg binary the finalize function uses; the cut segments sit behind
+discontinuity tags. Without ffmpeg the start is trimmed by the player
+instead (``#EXT-X-START`` with ``PRECISE=YES``) and the end stays on the
+segment boundary.
+"""
+import math
+import os
+import posixpath
+import subprocess
+from datetime import datetime, timezone
+
+from shelcaster_common.finalize import CONTAINERS, recording_prefix
+
+CLIP_DIR = 'clips'
+MEDIA_DOMAIN = os.environ.get('MEDIA_DOMAIN', 'https://d2kyyx47f0bavc.cloudfront.net')
+PLAYLIST_CONTENT_TYPE = 'application/vnd.apple.mpegurl'
+MAX_CLIP_SECONDS = float(os.environ.get('CLIP_MAX_SECONDS', str(4 * 60 * 60)))
+# Cuts closer than this to a segment boundary are left on the boundary
+EDGE_TOLERANCE = 0.05
+# A jump in program time bigger than this between segments is a gap
+GAP_TOLERANCE = 0.5
+
+
+def clip_prefix(session_id, clip_id):
+    return f'{recording_prefix(session_id)}{CLIP_DIR}/{clip_id}/'
+
+
+def media_url(key):
+    return f'{MEDIA_DOMAIN}/{key}'
+
+
+def format_time(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def clip_entries(index, started_at, stopped_at):
+    """Index entries overlapping ``[started_at, stopped_at)``, gaps marked as discontinuities"""
+    span = index.span(started_at, stopped_at)
+    if span is None:
+        return []
+    entries = []
+    for i in range(span[0], span[1] + 1):
+        entry = index.entry(i)
+        entry['discontinuity'] = bool(entries) and entry['start'] > entries[-1]['start'] + entries[-1]['duration'] + GAP_TOLERANCE
+        entries.append(entry)
+    return entries
+
+
+def trim_segment(s3, bucket, entry, cut_from, cut_to, key, ffmpeg):
+    """Re-encode ``entry`` keeping ``[cut_from, cut_to)`` seconds into it; returns the new entry"""
+    source = s3.get_object(Bucket=bucket, Key=entry['key'])['Body'].read()
+    result = subprocess.run(
+        [
+            ffmpeg, '-hide_banner', '-loglevel', 'error',
+            '-f', 'mpegts', '-i', 'pipe:0',
+            '-ss', f'{cut_from:.3f}', '-t', f'{cut_to - cut_from:.3f}',
+            '-map', '0:v:0?', '-map', '0:a:0?',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac',
+            '-f', 'mpegts', 'pipe:1'
+        ],
+        input=source, capture_output=True
+    )
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', 'replace').strip().splitlines()[-5:]
+        raise RuntimeError(f"ffmpeg exited {result.returncode}: {' | '.join(message)}")
+    s3.put_object(Bucket=bucket, Key=key, Body=result.stdout, ContentType=CONTAINERS['ts'])
+    return {
+        'key': key,
+        'sequence': entry['sequence'],
+        'start': entry['start'] + cut_from,
+        'duration': cut_to - cut_from,
+        'size': len(result.stdout),
+        'discontinuity': True,
+        'trimmed': True
+    }
+
+
+def edge_cuts(entries, started_at, stopped_at):
+    """``{position: (cut_from, cut_to)}`` for the edge entries that need cutting"""
+    cuts = {}
+    for position in {0, len(entries) - 1}:
+        entry = entries[position]
+        cut_from = max(started_at - entry['start'], 0) if position == 0 else 0
+        cut_to = min(stopped_at - entry['start'], entry['duration']) if position == len(entries) - 1 else entry['duration']
+        if cut_from > EDGE_TOLERANCE or cut_to < entry['duration'] - EDGE_TOLERANCE:
+            cuts[position] = (cut_from, cut_to)
+    return cuts
+
+
+def media_playlist(entries, playlist_key, start_offset=None):
+    """VOD media playlist text for ``entries``, written at ``playlist_key``"""
+    directory = posixpath.dirname(playlist_key)
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        f"#EXT-X-TARGETDURATION:{math.ceil(max(entry['duration'] for entry in entries))}",
+        '#EXT-X-MEDIA-SEQUENCE:0'
+    ]
+    if start_offset:
+        lines.append(f'#EXT-X-START:TIME-OFFSET={start_offset:.3f},PRECISE=YES')
+    for i, entry in enumerate(entries):
+        discontinuity = i > 0 and (entry['discontinuity'] or entries[i - 1].get('trimmed'))
+        if discontinuity:
+            lines.append('#EXT-X-DISCONTINUITY')
+        if i == 0 or discontinuity:
+            lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{format_time(entry['start'])}")
+        lines.append(f"#EXTINF:{entry['duration']:.3f},")
+        lines.append(posixpath.relpath(entry['key'], directory))
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def master_playlist(variants):
+    """Master playlist text for ``[(stream-inf attributes, uri)]``"""
+    lines = ['#EXTM3U']
+    for attributes, uri in variants:
+        lines += [f'#EXT-X-STREAM-INF:{attributes}', uri]
+    return '\n'.join(lines) + '\n'
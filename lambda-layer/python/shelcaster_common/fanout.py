@@ -0,0 +1,70 @@
+"""Run independent control-plane calls concurrently.
+
+boto3 clients are thread-safe, so the handlers' module-level clients are
+shared across a small, container-wide thread pool. Each call's outcome is
+collected separately; one failing call never hides another's result.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', '8'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Container-wide executor, created on first use and reused while warm"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='fanout')
+    return _executor
+
+
+class CallResult:
+    __slots__ = ('name', 'value', 'error', 'elapsed')
+
+    def __init__(self, name, value=None, error=None, elapsed=0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _timed(name, call):
+    started = time.perf_counter()
+    try:
+        return CallResult(name, value=call(), elapsed=time.perf_counter() - started)
+    except Exception as error:
+        return CallResult(name, error=error, elapsed=time.perf_counter() - started)
+
+
+def run_concurrently(calls, timeout=None):
+    """Run ``{name: zero-arg callable}`` in parallel; returns ``{name: CallResult}``.
+
+    A single call runs inline, since a thread hop would only add latency.
+    """
+    if len(calls) <= 1:
+        return {name: _timed(name, call) for name, call in calls.items()}
+
+    executor = get_executor()
+    futures = {name: executor.submit(_timed, name, call) for name, call in calls.items()}
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    results = {}
+    for name, future in futures.items():
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            results[name] = future.result(timeout=remaining)
+        except Exception as error:
+            # Only reachable on timeout; _timed captures the call's own errors.
+            results[name] = CallResult(name, error=error)
+    return results
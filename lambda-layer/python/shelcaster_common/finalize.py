@@ -0,0 +1,309 @@
+"""Finalize a session recording into one downloadable file.
+
+MediaLive writes the HLS output as TS segments under
+``recordings/<sessionId>/`` for as long as the channel runs; a recording
+is the span between its start and stop markers. Finalization picks the
+top rendition, selects the segments whose program time falls inside the
+recording from the rendition's segment index (so upload lag does not move
+the edges), and streams them in playlist order with ranged, concurrent
+GETs into a multipart upload. Memory is bounded by the read-ahead window plus
+the part buffers, whatever the length of the show.
+
+With an ffmpeg binary (``FFMPEG_PATH``, ``/opt/bin/ffmpeg`` from a layer, or
+on PATH) the stream is remuxed to fragmented MP4 on the way through.
+Without one the segments are joined into a single MPEG-TS file, which
+plays as-is.
+"""
+import collections
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from shelcaster_common.hls import parse_playlist, resolve_uri
+
+S3_BUCKET = 'shelcaster-media-manager'
+RECORDING_PREFIX = 'recordings'
+MASTER_PLAYLIST = 'index.m3u8'
+FINAL_DIR = 'final'
+FINALIZE_FUNCTION_NAME = os.environ.get('FINALIZE_FUNCTION', 'shelcaster-finalize-recording-py')
+
+# S3 parts must be at least 5 MiB, except the last.
+PART_BYTES = int(os.environ.get('FINALIZE_PART_BYTES', str(8 * 1024 * 1024)))
+RANGE_BYTES = int(os.environ.get('FINALIZE_RANGE_BYTES', str(4 * 1024 * 1024)))
+# Ranged GETs in flight ahead of the writer, and parts uploading at once.
+READ_AHEAD = int(os.environ.get('FINALIZE_READ_AHEAD', '6'))
+UPLOAD_AHEAD = int(os.environ.get('FINALIZE_UPLOAD_AHEAD', '2'))
+PIPE_CHUNK_BYTES = 1024 * 1024
+
+CONTAINERS = {
+    'mp4': 'video/mp4',
+    'ts': 'video/mp2t'
+}
+
+_SEQUENCE = re.compile(r'_(\d+)\.ts$')
+_SEQUENCE_SUFFIX = re.compile(r'\d+\.ts')
+
+
+def recording_prefix(session_id):
+    return f'{RECORDING_PREFIX}/{session_id}/'
+
+
+def output_key(session_id, action_name, container):
+    return f'{recording_prefix(session_id)}{FINAL_DIR}/{action_name}.{container}'
+
+
+def find_ffmpeg():
+    """Path of an ffmpeg binary, or None"""
+    for candidate in (os.environ.get('FFMPEG_PATH'), '/opt/bin/ffmpeg'):
+        if candidate and os.access(candidate, os.X_OK):
+            return candidate
+    return shutil.which('ffmpeg')
+
+
+def list_objects(s3, bucket, prefix, start_after=None):
+    """Every object under ``prefix`` (after ``start_after``), as ``{key: object summary}``"""
+    objects = {}
+    extra = {'StartAfter': start_after} if start_after else {}
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix, **extra):
+        for obj in page.get('Contents', []):
+            objects[obj['Key']] = obj
+    return objects
+
+
+def segment_sequence(key):
+    match = _SEQUENCE.search(key)
+    return int(match.group(1)) if match else None
+
+
+def master_rendition(s3, bucket, master_key):
+    """Key of the master playlist's highest-bandwidth variant, or None if it is a media playlist"""
+    master = parse_playlist(s3.get_object(Bucket=bucket, Key=master_key)['Body'].read().decode('utf-8'))
+    if not master.is_master:
+        return None
+    best = max(master.variants, key=lambda variant: variant['bandwidth'])
+    return resolve_uri(master_key, best['uri'])
+
+
+def top_rendition(s3, bucket, prefix, objects):
+    """Key of the highest-bandwidth media playlist under ``prefix``"""
+    master_key = f'{prefix}{MASTER_PLAYLIST}'
+    if master_key in objects:
+        playlist_key = master_rendition(s3, bucket, master_key)
+        if playlist_key:
+            return playlist_key
+
+    # No master (or it is a media playlist): take the playlist with most segments
+    playlists = [key for key in objects if key.endswith('.m3u8') and key != master_key and f'/{FINAL_DIR}/' not in key]
+    if not playlists:
+        return master_key if master_key in objects else None
+    return max(playlists, key=lambda key: len(rendition_segments(objects, key)))
+
+
+def rendition_segments(objects, playlist_key):
+    """A rendition's segment objects in sequence (playlist) order.
+
+    The live playlist only lists its last few segments, so the full run
+    comes from the listing: MediaLive names them ``<playlist>_<seq>.ts``.
+    """
+    stem = playlist_key[:-len('.m3u8')] + '_'
+    segments = [
+        (segment_sequence(key), obj) for key, obj in objects.items()
+        if key.startswith(stem) and _SEQUENCE_SUFFIX.fullmatch(key[len(stem):])
+    ]
+    segments.sort(key=lambda entry: entry[0])
+    return [obj for _, obj in segments]
+
+
+def byte_ranges(segments, range_bytes=RANGE_BYTES):
+    for obj in segments:
+        for start in range(0, obj['Size'], range_bytes):
+            yield obj['Key'], start, min(start + range_bytes, obj['Size']) - 1
+
+
+def read_segments(s3, bucket, segments, range_bytes=RANGE_BYTES, read_ahead=READ_AHEAD):
+    """Yield the segments' bytes in order, fetched as concurrent ranged GETs.
+
+    At most ``read_ahead`` ranges are in flight or waiting to be consumed.
+    """
+    def fetch(key, start, end):
+        response = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}')
+        return response['Body'].read()
+
+    ranges = byte_ranges(segments, range_bytes)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=read_ahead, thread_name_prefix='finalize-read') as executor:
+        try:
+            for key, start, end in ranges:
+                pending.append(executor.submit(fetch, key, start, end))
+                if len(pending) >= read_ahead:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class MultipartUpload:
+    """Buffered multipart upload with a bounded number of parts in flight.
+
+    Use as a context manager: the upload completes on a clean exit and is
+    aborted on an exception, so no orphaned parts are left behind.
+    """
+
+    def __init__(self, s3, bucket, key, content_type, part_bytes=PART_BYTES, upload_ahead=UPLOAD_AHEAD):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_bytes = part_bytes
+        self.upload_ahead = upload_ahead
+        self.size = 0
+        self.upload_id = None
+        self._buffer = bytearray()
+        self._parts = []
+        self._pending = collections.deque()
+        self._executor = None
+
+    def __enter__(self):
+        response = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key, ContentType=self.content_type)
+        self.upload_id = response['UploadId']
+        self._executor = ThreadPoolExecutor(max_workers=self.upload_ahead, thread_name_prefix='finalize-upload')
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self.complete()
+            else:
+                self.abort()
+        finally:
+            self._executor.shutdown(wait=True)
+        return False
+
+    def _upload(self, number, body):
+        response = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=number, Body=body
+        )
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    def _send(self, body):
+        # Wait for the oldest part before queueing more than upload_ahead
+        if len(self._pending) >= self.upload_ahead:
+            self._parts.append(self._pending.popleft().result())
+        number = len(self._parts) + len(self._pending) + 1
+        self._pending.append(self._executor.submit(self._upload, number, body))
+
+    def write(self, data):
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.part_bytes:
+            self._send(bytes(self._buffer[:self.part_bytes]))
+            del self._buffer[:self.part_bytes]
+
+    def complete(self):
+        if self._buffer or not (self._parts or self._pending):
+            self._send(bytes(self._buffer))
+            self._buffer = bytearray()
+        while self._pending:
+            self._parts.append(self._pending.popleft().result())
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={'Parts': self._parts}
+        )
+
+    def abort(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+def remux_to_mp4(chunks, sink, ffmpeg):
+    """Pipe MPEG-TS ``chunks`` through ffmpeg into ``sink`` as fragmented MP4.
+
+    Stream copy only; fragmented output needs no seek back to write the
+    moov atom, so ffmpeg never holds the whole file either.
+    """
+    process = subprocess.Popen(
+        [
+            ffmpeg, '-hide_banner', '-loglevel', 'error',
+            '-f', 'mpegts', '-i', 'pipe:0',
+            '-map', '0:v:0?', '-map', '0:a:0?', '-c', 'copy', '-bsf:a', 'aac_adtstoasc',
+            '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof', 'pipe:1'
+        ],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    feed_error = []
+    stderr = []
+
+    def feed():
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except Exception as error:
+            feed_error.append(error)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name='finalize-feed', daemon=True)
+    drainer = threading.Thread(target=lambda: stderr.append(process.stderr.read()), name='finalize-stderr', daemon=True)
+    feeder.start()
+    drainer.start()
+    try:
+        while True:
+            data = process.stdout.read(PIPE_CHUNK_BYTES)
+            if not data:
+                break
+            sink.write(data)
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.wait()
+    feeder.join()
+    drainer.join()
+
+    if feed_error:
+        raise feed_error[0]
+    if process.returncode != 0:
+        message = b''.join(stderr).decode('utf-8', 'replace').strip().splitlines()[-5:]
+        raise RuntimeError(f"ffmpeg exited {process.returncode}: {' | '.join(message)}")
+
+
+def finalize_recording(s3, bucket, session_id, action_name, segments, ffmpeg=None):
+    """Stream ``segments`` into one object; returns a summary dict"""
+    container = 'mp4' if ffmpeg else 'ts'
+    key = output_key(session_id, action_name, container)
+    with MultipartUpload(s3, bucket, key, CONTAINERS[container]) as upload:
+        chunks = read_segments(s3, bucket, segments)
+        if ffmpeg:
+            remux_to_mp4(chunks, upload, ffmpeg)
+        else:
+            for chunk in chunks:
+                upload.write(chunk)
+    return {
+        'key': key,
+        'container': container,
+        'bytes': upload.size,
+        'segments': len(segments),
+        'firstSegment': segments[0]['Key'],
+        'lastSegment': segments[-1]['Key']
+    }
+
+
+def request_finalize(lambda_client, session_id, action_name, function_name=FINALIZE_FUNCTION_NAME):
+    """Fire-and-forget invoke of the finalize function for a stopped recording"""
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'sessionId': session_id, 'actionName': action_name}).encode('utf-8')
+    )
@@ -0,0 +1,129 @@
+"""HLS playlist parsing for the recording and latency tools.
+
+Understands the tags MediaLive's HLS output group writes: master playlists
+(``#EXT-X-STREAM-INF``) and media playlists with ``#EXTINF`` durations,
+``#EXT-X-PROGRAM-DATE-TIME`` stamps, discontinuities and ``#EXT-X-ENDLIST``.
+Unknown tags are ignored. Program date times are carried forward across
+segments that do not repeat the tag, as the HLS spec describes.
+"""
+import posixpath
+from datetime import datetime, timezone
+
+
+class Segment:
+    __slots__ = ('uri', 'duration', 'sequence', 'program_date_time', 'discontinuity')
+
+    def __init__(self, uri, duration, sequence, program_date_time=None, discontinuity=False):
+        self.uri = uri
+        self.duration = duration
+        self.sequence = sequence
+        # Epoch seconds of the segment's first frame, if the playlist says
+        self.program_date_time = program_date_time
+        self.discontinuity = discontinuity
+
+
+class Playlist:
+    __slots__ = ('target_duration', 'media_sequence', 'segments', 'variants', 'ended')
+
+    def __init__(self):
+        self.target_duration = None
+        self.media_sequence = 0
+        self.segments = []
+        # Master playlists only: [{'uri', 'bandwidth', 'resolution', 'attributes'}]
+        self.variants = []
+        self.ended = False
+
+    @property
+    def is_master(self):
+        return bool(self.variants)
+
+    @property
+    def duration(self):
+        return sum(segment.duration for segment in self.segments)
+
+
+def parse_program_date_time(value):
+    """Epoch seconds from an ``#EXT-X-PROGRAM-DATE-TIME`` value"""
+    stamp = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return stamp.timestamp()
+
+
+def parse_attributes(value):
+    """``KEY=value,KEY="quoted, value"`` attribute lists"""
+    attributes = {}
+    key = ''
+    current = ''
+    quoted = False
+    reading_key = True
+    for char in value + ',':
+        if char == '"':
+            quoted = not quoted
+        elif char == '=' and reading_key and not quoted:
+            key, current, reading_key = current, '', False
+        elif char == ',' and not quoted:
+            if key:
+                attributes[key.strip()] = current.strip()
+            key, current, reading_key = '', '', True
+        else:
+            current += char
+    return attributes
+
+
+def parse_playlist(text):
+    """Parse master or media playlist text into a ``Playlist``"""
+    playlist = Playlist()
+    duration = None
+    program_date_time = None
+    discontinuity = False
+    stream_info = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith('#'):
+            tag, _, value = line.partition(':')
+            if tag == '#EXTINF':
+                duration = float(value.split(',', 1)[0])
+            elif tag == '#EXT-X-TARGETDURATION':
+                playlist.target_duration = int(value)
+            elif tag == '#EXT-X-MEDIA-SEQUENCE':
+                playlist.media_sequence = int(value)
+            elif tag == '#EXT-X-PROGRAM-DATE-TIME':
+                program_date_time = parse_program_date_time(value)
+            elif tag == '#EXT-X-DISCONTINUITY':
+                discontinuity = True
+            elif tag == '#EXT-X-ENDLIST':
+                playlist.ended = True
+            elif tag == '#EXT-X-STREAM-INF':
+                stream_info = (value, parse_attributes(value))
+            continue
+
+        if stream_info is not None:
+            raw, attributes = stream_info
+            playlist.variants.append({
+                'uri': line,
+                'bandwidth': int(attributes.get('BANDWIDTH', 0)),
+                'resolution': attributes.get('RESOLUTION'),
+                'attributes': raw
+            })
+            stream_info = None
+        elif duration is not None:
+            sequence = playlist.media_sequence + len(playlist.segments)
+            playlist.segments.append(Segment(line, duration, sequence, program_date_time, discontinuity))
+            if program_date_time is not None:
+                program_date_time += duration
+            duration = None
+            discontinuity = False
+
+    return playlist
+
+
+def resolve_uri(playlist_key, uri):
+    """Key of a segment or variant relative to the playlist that names it"""
+    if '://' in uri or uri.startswith('/'):
+        return uri
+    return posixpath.normpath(posixpath.join(posixpath.dirname(playlist_key), uri))
@@ -0,0 +1,107 @@
+"""Single-flight leases on an item, built on conditional writes.
+
+The first invocation to ``acquire`` a lease does the work; concurrent ones
+``single_flight`` into waiting on the item with backoff until the holder
+publishes its result (or the lease expires and they may take over). A
+lease is a map attribute ``{owner, expiresAt}`` on the item it guards, so
+the result and the lease release land in the same write.
+"""
+import os
+import time
+
+from shelcaster_common.readiness import backoff_intervals
+from shelcaster_common.session import TABLE_NAME
+
+LEASE_SECONDS = int(os.environ.get('PROVISION_LEASE_SECONDS', '90'))
+DEFAULT_LEASE = 'provisionLease'
+
+
+def acquire_lease(dynamodb, key, owner, name=DEFAULT_LEASE, ttl=LEASE_SECONDS, unless_exists=None,
+                  must_exist=True, table_name=TABLE_NAME):
+    """Take the lease if it is free or expired; False if someone else holds it.
+
+    ``unless_exists`` is an attribute path; if it is already set the work
+    has been done and the lease is refused. With ``must_exist=False`` the
+    lease may create the item it guards.
+    """
+    now = int(time.time())
+    condition = '(attribute_not_exists(#lease) OR #lease.expiresAt < :now)'
+    if must_exist:
+        condition = f'attribute_exists(pk) AND {condition}'
+    if unless_exists:
+        condition = f'attribute_not_exists({unless_exists}) AND {condition}'
+    try:
+        dynamodb.update_item(
+            TableName=table_name,
+            Key=key,
+            UpdateExpression='SET #lease = :lease',
+            ConditionExpression=condition,
+            ExpressionAttributeNames={'#lease': name},
+            ExpressionAttributeValues={
+                ':now': {'N': str(now)},
+                ':lease': {'M': {
+                    'owner': {'S': owner},
+                    'expiresAt': {'N': str(now + ttl)}
+                }}
+            }
+        )
+        return True
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def release_lease(dynamodb, key, owner, name=DEFAULT_LEASE, table_name=TABLE_NAME):
+    """Drop the lease if we still hold it (e.g. after the work failed)"""
+    try:
+        dynamodb.update_item(
+            TableName=table_name,
+            Key=key,
+            UpdateExpression='REMOVE #lease',
+            ConditionExpression='#lease.#owner = :owner',
+            ExpressionAttributeNames={'#lease': name, '#owner': 'owner'},
+            ExpressionAttributeValues={':owner': {'S': owner}}
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def stage_release(writes, key, owner, name=DEFAULT_LEASE):
+    """Release the lease inside a WriteBatch, guarded on ownership"""
+    writes.remove(key, name)
+    writes.condition(
+        key, '#lease.#leaseOwner = :leaseOwner',
+        values={':leaseOwner': {'S': owner}},
+        names={'#lease': name, '#leaseOwner': 'owner'}
+    )
+
+
+def single_flight(dynamodb, key, owner, is_done, deadline, name=DEFAULT_LEASE, unless_exists=None,
+                  must_exist=True, table_name=TABLE_NAME):
+    """Acquire the lease or wait for its holder to finish.
+
+    Returns ``(None, True)`` when this caller holds the lease and must do
+    the work, or ``(item, False)`` with the item once ``is_done(item)``.
+    """
+    intervals = backoff_intervals()
+    while True:
+        if acquire_lease(dynamodb, key, owner, name=name, unless_exists=unless_exists,
+                         must_exist=must_exist, table_name=table_name):
+            return None, True
+
+        for interval in intervals:
+            item = dynamodb.get_item(TableName=table_name, Key=key, ConsistentRead=True).get('Item')
+            if item is None:
+                raise LookupError('Item disappeared while waiting on lease')
+            if is_done(item):
+                return item, False
+
+            # The same whole-second clock acquire_lease's condition compares with
+            lease = item.get(name, {}).get('M')
+            expired = not lease or int(lease['expiresAt']['N']) < int(time.time())
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError('Lease expired without a result' if expired else f"Lease held by {lease['owner']['S']}")
+            time.sleep(min(interval, remaining))
+            if expired:
+                break  # holder gave up or died; try to take over
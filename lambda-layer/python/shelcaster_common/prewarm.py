@@ -0,0 +1,229 @@
+"""Starting MediaLive channels ahead of a show's scheduled air time.
+
+A channel takes a minute or two to get from IDLE to RUNNING, and that
+clock used to start when the host pressed go live. The prewarm scheduler
+starts it ``lead`` seconds before the show's air time instead, so the
+pipeline is already running when the host arrives.
+
+The lead comes from measured start-up times. When the channel's RUNNING
+state-change event reaches the channel-state sync, the seconds since the
+prewarm was requested are counted into a histogram item
+per region and encoder profile (``pk=medialive-startup#<region>``,
+``sk=profile#<profile>``) with ``ADD`` on one bucket counter, so recording
+a sample is a single write that never conflicts. The lead is a high
+percentile of that histogram plus a margin; until a profile has enough
+samples it is a fixed default.
+
+Upcoming shows come from ``airDay-index``, a sparse GSI keyed on the UTC
+day of the air time (``airDay``) with the normalized air time
+(``airTime``) as range key; create-show and update-show maintain both.
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from shelcaster_common.clients import REGION
+from shelcaster_common.profiles import DEFAULT_PROFILE, resolve_profile
+from shelcaster_common.schedule import parse_time
+from shelcaster_common.session import TABLE_NAME, session_path
+
+SCHEDULE_INDEX = os.environ.get('SCHEDULE_INDEX', 'airDay-index')
+SCHEDULED_STATUS = 'scheduled'
+
+BUCKET_SECONDS = 5
+# Slower starts are counted in the last bucket
+MAX_STARTUP_SECONDS = 900
+STARTUP_PERCENTILE = float(os.environ.get('PREWARM_PERCENTILE', '0.9'))
+MIN_SAMPLES = int(os.environ.get('PREWARM_MIN_SAMPLES', '5'))
+DEFAULT_LEAD_SECONDS = float(os.environ.get('PREWARM_DEFAULT_LEAD_SECONDS', '180'))
+LEAD_MARGIN_SECONDS = float(os.environ.get('PREWARM_LEAD_MARGIN_SECONDS', '30'))
+MAX_LEAD_SECONDS = float(os.environ.get('PREWARM_MAX_LEAD_SECONDS', '900'))
+# How long past air time a prewarmed channel is kept running for a late host
+HOLD_SECONDS = float(os.environ.get('PREWARM_HOLD_SECONDS', '900'))
+
+
+def startup_key(profile, region=REGION):
+    return {
+        'pk': {'S': f'medialive-startup#{region}'},
+        'sk': {'S': f'profile#{profile}'}
+    }
+
+
+def bucket_name(seconds):
+    """Histogram attribute for a sample, e.g. ``b0085`` for 85-89s"""
+    lower = min(int(max(seconds, 0) // BUCKET_SECONDS) * BUCKET_SECONDS, MAX_STARTUP_SECONDS)
+    return f'b{lower:04d}'
+
+
+def record_startup(dynamodb, profile, seconds, region=REGION, table_name=TABLE_NAME):
+    """Count one start-to-RUNNING duration for ``profile``"""
+    dynamodb.update_item(
+        TableName=table_name,
+        Key=startup_key(profile, region),
+        UpdateExpression='ADD samples :one, totalSeconds :seconds, #bucket :one SET entityType = :type, updatedAt = :now',
+        ExpressionAttributeNames={'#bucket': bucket_name(seconds)},
+        ExpressionAttributeValues={
+            ':one': {'N': '1'},
+            ':seconds': {'N': f'{seconds:.3f}'},
+            ':type': {'S': 'medialiveStartup'},
+            ':now': {'S': datetime.utcnow().isoformat()}
+        }
+    )
+
+
+class StartupStats:
+    """Start-up time histogram of one profile in one region"""
+
+    __slots__ = ('profile', 'samples', 'buckets')
+
+    def __init__(self, profile, buckets=None):
+        self.profile = profile
+        # bucket lower bound (seconds) -> count
+        self.buckets = dict(buckets or {})
+        self.samples = sum(self.buckets.values())
+
+    @classmethod
+    def from_item(cls, profile, item):
+        return cls(profile, {
+            int(name[1:]): int(value['N'])
+            for name, value in (item or {}).items()
+            if name[:1] == 'b' and name[1:].isdigit() and 'N' in value
+        })
+
+    def percentile(self, fraction):
+        """Upper edge of the bucket holding the ``fraction`` quantile, or None without samples"""
+        if not self.samples:
+            return None
+        seen = 0
+        for lower in sorted(self.buckets):
+            seen += self.buckets[lower]
+            if seen >= fraction * self.samples:
+                return lower + BUCKET_SECONDS
+        return max(self.buckets) + BUCKET_SECONDS
+
+    def lead_time(self):
+        """Seconds before air time to start a channel of this profile"""
+        if self.samples < MIN_SAMPLES:
+            return DEFAULT_LEAD_SECONDS
+        return min(self.percentile(STARTUP_PERCENTILE) + LEAD_MARGIN_SECONDS, MAX_LEAD_SECONDS)
+
+
+def load_startup_stats(dynamodb, profiles, region=REGION, table_name=TABLE_NAME, max_attempts=6):
+    """``{profile: StartupStats}`` for ``profiles`` (empty stats for unmeasured ones)"""
+    profiles = list(dict.fromkeys(profiles))
+    items = {}
+    request = {table_name: {'Keys': [startup_key(profile, region) for profile in profiles]}} if profiles else None
+    attempt = 0
+    while request:
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(table_name, []):
+            items[item['sk']['S'].split('#', 1)[1]] = item
+        request = response.get('UnprocessedKeys') or None
+        attempt += 1
+        if request and attempt >= max_attempts:
+            raise RuntimeError('DynamoDB kept returning unprocessed keys')
+        if request:
+            time.sleep(min(0.05 * 2 ** attempt, 1))
+    return {profile: StartupStats.from_item(profile, items.get(profile)) for profile in profiles}
+
+
+def format_time(epoch):
+    """``airTime`` form of an epoch time, matching JavaScript's ``toISOString``"""
+    stamp = datetime.fromtimestamp(epoch, tz=timezone.utc)
+    return stamp.strftime('%Y-%m-%dT%H:%M:%S.') + f'{stamp.microsecond // 1000:03d}Z'
+
+
+def air_day(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def upcoming_shows(dynamodb, start, stop, table_name=TABLE_NAME):
+    """Scheduled shows airing between ``start`` and ``stop`` (epoch seconds), soonest first.
+
+    Each is ``{'showId', 'airTime', 'sessionId'}``; ``sessionId`` is the
+    show's current live session, if one has been created.
+    """
+    shows = []
+    day = datetime.fromtimestamp(start, tz=timezone.utc).date()
+    while day <= datetime.fromtimestamp(stop, tz=timezone.utc).date():
+        kwargs = {
+            'TableName': table_name,
+            'IndexName': SCHEDULE_INDEX,
+            'KeyConditionExpression': 'airDay = :day AND airTime BETWEEN :from AND :to',
+            'FilterExpression': '#status = :scheduled',
+            'ExpressionAttributeNames': {'#status': 'status'},
+            'ExpressionAttributeValues': {
+                ':day': {'S': day.isoformat()},
+                ':from': {'S': format_time(start)},
+                ':to': {'S': format_time(stop)},
+                ':scheduled': {'S': SCHEDULED_STATUS}
+            }
+        }
+        while True:
+            response = dynamodb.query(**kwargs)
+            for item in response.get('Items', []):
+                shows.append({
+                    'showId': item['pk']['S'].split('#', 1)[1],
+                    'airTime': parse_time(item['airTime']['S']),
+                    'sessionId': item.get('currentSessionId', {}).get('S')
+                })
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        day += timedelta(days=1)
+    shows.sort(key=lambda show: show['airTime'])
+    return shows
+
+
+def prewarm_attribute(show_id, air_time, lead, requested_at):
+    """``mediaLive.prewarm`` map AttributeValue for a session"""
+    return {'M': {
+        'showId': {'S': show_id},
+        'airTime': {'S': format_time(air_time)},
+        'leadSeconds': {'N': str(int(lead))},
+        'requestedAt': {'S': requested_at}
+    }}
+
+
+def prewarm_expired(prewarm, now=None):
+    """Whether a prewarm (decoded ``mediaLive.prewarm``) is past its hold"""
+    now = time.time() if now is None else now
+    return parse_time(prewarm['airTime']) + HOLD_SECONDS < now
+
+
+def session_profile(session):
+    """The encoder profile start-streaming will resolve for the session"""
+    try:
+        return resolve_profile(
+            source=session.media_live_input,
+            latency_mode=session.media_live_latency_mode,
+            current=session.media_live_profile
+        )
+    except ValueError:
+        return DEFAULT_PROFILE
+
+
+def mark_running(dynamodb, session_id, running_at, table_name=TABLE_NAME):
+    """Stamp ``mediaLive.prewarm.runningAt`` once; False if it was already stamped"""
+    key, path = session_path(session_id, 'mediaLive.prewarm.runningAt')
+    names = {f'#n{n}': name for n, name in enumerate(path.split('.'))}
+    reference = '.'.join(names)
+    prewarm = '.'.join(list(names)[:-1])
+    try:
+        dynamodb.update_item(
+            TableName=table_name,
+            Key=key,
+            UpdateExpression=f'SET {reference} = :at',
+            ConditionExpression=f'attribute_exists({prewarm}) AND attribute_not_exists({reference})',
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={':at': {'S': running_at}}
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+
+def prewarm_held(session, now=None):
+    """Whether the session's channel is running ahead of an air time that has not lapsed"""
+    prewarm = session.get('mediaLive', 'prewarm')
+    return bool(prewarm) and not session.is_live and not prewarm_expired(prewarm, now)
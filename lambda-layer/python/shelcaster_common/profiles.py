@@ -0,0 +1,409 @@
+"""Named MediaLive encoder profiles.
+
+Each profile is built once per container, validated, and fingerprinted with
+a content hash. The hash is stored with every channel (session item, pool
+entry and channel tags) so an existing channel can be reused as-is when it
+matches, or patched with ``update_channel`` when it does not.
+
+Besides the single-rendition default, ``abr-*`` profiles encode a rendition
+ladder: one HLS output per rung (MediaLive writes the master manifest) and
+the top rung on RTMP. ``select_profile`` picks the tallest ladder whose top
+rung the declared source can feed, so nothing is encoded above the source.
+Every profile also has a ``-ll`` low-latency variant with short segments,
+a short live manifest window and program date times for latency probing.
+"""
+import copy
+import hashlib
+import json
+import os
+
+DEFAULT_PROFILE = os.environ.get('MEDIALIVE_PROFILE', 'hd-1080p')
+CHANNEL_CLASS = 'SINGLE_PIPELINE'
+
+SPEC_HASH_TAG = 'shelcaster:spec-hash'
+PROFILE_TAG = 'shelcaster:profile'
+
+# Destination ids every profile's output groups may reference.
+DESTINATION_IDS = ('ivs-destination', 's3-destination')
+
+# Rungs from the top down: (name, width, height, bitrate, H.264 level).
+RENDITIONS = (
+    ('1080p', 1920, 1080, 5000000, 'H264_LEVEL_4_1'),
+    ('720p', 1280, 720, 3000000, 'H264_LEVEL_3_1'),
+    ('480p', 854, 480, 1200000, 'H264_LEVEL_3_1'),
+    ('360p', 640, 360, 700000, 'H264_LEVEL_3')
+)
+LADDER_PREFIX = 'abr-'
+
+LATENCY_MODES = ('standard', 'low')
+LOW_LATENCY_SUFFIX = '-ll'
+# Two-second segments (and GOPs) with a 6-segment live window, ~12s of
+# manifest instead of MediaLive's default 10 x 6s.
+LOW_LATENCY_SEGMENT_SECONDS = 2
+LOW_LATENCY_HLS_SETTINGS = {
+    'SegmentLength': LOW_LATENCY_SEGMENT_SECONDS,
+    'IndexNSegments': 6,
+    'ManifestDurationFormat': 'FLOATING_POINT',
+    'ClientCache': 'DISABLED',
+    # Wall-clock capture time on every segment; the latency probe reads it
+    'ProgramDateTime': 'INCLUDE',
+    'ProgramDateTimeClock': 'SYSTEM_CLOCK',
+    'ProgramDateTimePeriod': LOW_LATENCY_SEGMENT_SECONDS,
+    # Retry fast and keep a small cache so a stalled PUT does not back up segments
+    'HlsCdnSettings': {'HlsBasicPutSettings': {
+        'ConnectionRetryInterval': 1,
+        'NumRetries': 3,
+        'FilecacheDuration': 20,
+        'RestartDelay': 5
+    }}
+}
+
+_BUILDERS = {}
+_PROFILES = {}
+
+
+class EncoderProfile:
+    """A validated, hashed channel spec. Treat the dicts as read-only."""
+
+    __slots__ = ('name', 'input_specification', 'encoder_settings', 'channel_class', 'spec_hash')
+
+    def __init__(self, name, input_specification, encoder_settings, channel_class=CHANNEL_CLASS):
+        self.name = name
+        self.input_specification = input_specification
+        self.encoder_settings = encoder_settings
+        self.channel_class = channel_class
+        self.spec_hash = spec_hash(input_specification, encoder_settings, channel_class)
+
+    def tags(self):
+        return {PROFILE_TAG: self.name, SPEC_HASH_TAG: self.spec_hash}
+
+
+def spec_hash(input_specification, encoder_settings, channel_class=CHANNEL_CLASS):
+    """Deterministic SHA-256 of a channel spec (key order independent)"""
+    canonical = json.dumps(
+        {
+            'ChannelClass': channel_class,
+            'InputSpecification': input_specification,
+            'EncoderSettings': encoder_settings
+        },
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def validate_encoder_settings(encoder_settings):
+    """Check that outputs only reference descriptions and destinations that exist"""
+    video_names = [v['Name'] for v in encoder_settings.get('VideoDescriptions', [])]
+    audio_names = [a['Name'] for a in encoder_settings.get('AudioDescriptions', [])]
+
+    for names, kind in ((video_names, 'video'), (audio_names, 'audio')):
+        if len(names) != len(set(names)):
+            raise ValueError(f'Duplicate {kind} description names: {names}')
+
+    output_names = set()
+    for group in encoder_settings.get('OutputGroups', []):
+        group_settings = group['OutputGroupSettings']
+        for settings in group_settings.values():
+            destination = settings.get('Destination', {}).get('DestinationRefId')
+            if destination and destination not in DESTINATION_IDS:
+                raise ValueError(f"Output group {group['Name']} references unknown destination {destination}")
+
+        if not group.get('Outputs'):
+            raise ValueError(f"Output group {group['Name']} has no outputs")
+
+        for output in group['Outputs']:
+            name = output['OutputName']
+            if name in output_names:
+                raise ValueError(f'Duplicate output name: {name}')
+            output_names.add(name)
+
+            video = output.get('VideoDescriptionName')
+            if video and video not in video_names:
+                raise ValueError(f'Output {name} references unknown video description {video}')
+            for audio in output.get('AudioDescriptionNames', []):
+                if audio not in audio_names:
+                    raise ValueError(f'Output {name} references unknown audio description {audio}')
+
+            for settings in output['OutputSettings'].values():
+                destination = settings.get('Destination', {}).get('DestinationRefId')
+                if destination and destination not in DESTINATION_IDS:
+                    raise ValueError(f'Output {name} references unknown destination {destination}')
+
+
+def register_profile(name):
+    """Decorator registering a builder returning (input_specification, encoder_settings)"""
+    def decorator(builder):
+        _BUILDERS[name] = builder
+        _PROFILES.pop(name, None)
+        return builder
+    return decorator
+
+
+def get_profile(name=DEFAULT_PROFILE):
+    """Built, validated profile; cached for the life of the container"""
+    profile = _PROFILES.get(name)
+    if profile is not None:
+        return profile
+
+    if name not in _BUILDERS:
+        raise KeyError(f'Unknown encoder profile: {name}')
+
+    input_specification, encoder_settings = _BUILDERS[name]()
+    validate_encoder_settings(encoder_settings)
+    profile = EncoderProfile(name, input_specification, encoder_settings)
+    _PROFILES[name] = profile
+    return profile
+
+
+def profile_names():
+    return sorted(_BUILDERS)
+
+
+def parse_source(value):
+    """Declared source ``{'width', 'height', 'bitrate'}`` with integer fields.
+
+    Raises ValueError for anything else; None stays None.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        raise ValueError('input must be an object with width, height and bitrate')
+    source = {}
+    for field in ('width', 'height', 'bitrate'):
+        if value.get(field) is None:
+            continue
+        try:
+            number = int(value[field])
+        except (TypeError, ValueError):
+            raise ValueError(f'input.{field} must be a number')
+        if number <= 0:
+            raise ValueError(f'input.{field} must be positive')
+        source[field] = number
+    return source
+
+
+def is_low_latency(name):
+    return bool(name) and name.endswith(LOW_LATENCY_SUFFIX)
+
+
+def base_profile(name):
+    """Profile name without its low-latency suffix"""
+    return name[:-len(LOW_LATENCY_SUFFIX)] if is_low_latency(name) else name
+
+
+def resolve_profile(requested=None, source=None, latency_mode=None, current=None):
+    """Profile for a channel: ``requested`` if given, else a ladder for
+    ``source`` in the given latency mode.
+
+    ``current`` (the channel's existing profile) fills in whatever is not
+    declared. Raises ValueError for unknown profiles or latency modes.
+    """
+    if latency_mode is not None and latency_mode not in LATENCY_MODES:
+        raise ValueError(f'latencyMode must be one of {", ".join(LATENCY_MODES)}')
+
+    name = requested
+    if not name:
+        name = select_profile(source, default=base_profile(current or DEFAULT_PROFILE))
+        low = latency_mode == 'low' if latency_mode else is_low_latency(current or DEFAULT_PROFILE)
+        if low:
+            name += LOW_LATENCY_SUFFIX
+    if name not in _BUILDERS:
+        raise ValueError(f'Unknown profile: {name}')
+    return name
+
+
+def select_profile(source=None, default=DEFAULT_PROFILE):
+    """Profile for a declared source ``{'width', 'height', 'bitrate'}``.
+
+    Picks the tallest ladder whose top rung is no larger (and, when the
+    bitrate is declared, no richer) than the source, falling back to the
+    smallest ladder. Without a declared height the default is kept.
+    """
+    height = (source or {}).get('height')
+    if not height:
+        return default
+    bitrate = source.get('bitrate')
+    for name, _, rung_height, rung_bitrate, _ in RENDITIONS:
+        if rung_height <= int(height) and (not bitrate or rung_bitrate <= int(bitrate)):
+            return f'{LADDER_PREFIX}{name}'
+    return f'{LADDER_PREFIX}{RENDITIONS[-1][0]}'
+
+
+def audio_description(name):
+    return {
+        'Name': name,
+        'AudioSelectorName': 'default',
+        'CodecSettings': {
+            'AacSettings': {
+                'Bitrate': 128000,
+                'CodingMode': 'CODING_MODE_2_0',
+                'SampleRate': 48000
+            }
+        }
+    }
+
+
+def video_description(name, width, height, bitrate, level):
+    return {
+        'Name': name,
+        'CodecSettings': {
+            'H264Settings': {
+                'Profile': 'HIGH',
+                'Level': level,
+                'Bitrate': bitrate,
+                'RateControlMode': 'CBR',
+                'FramerateNumerator': 30,
+                'FramerateDenominator': 1
+            }
+        },
+        'Width': width,
+        'Height': height
+    }
+
+
+def rtmp_group(video_name, audio_name):
+    """IVS output group carrying one rendition"""
+    return {
+        'Name': 'RTMP',
+        'OutputGroupSettings': {
+            'RtmpGroupSettings': {
+                'AuthenticationScheme': 'COMMON',
+                'CacheFullBehavior': 'DISCONNECT_IMMEDIATELY',
+                'CacheLength': 30,
+                'CaptionData': 'ALL',
+                'RestartDelay': 15
+            }
+        },
+        'Outputs': [{
+            'OutputName': 'ivs-output',
+            'VideoDescriptionName': video_name,
+            'AudioDescriptionNames': [audio_name],
+            'OutputSettings': {
+                'RtmpOutputSettings': {
+                    'Destination': {'DestinationRefId': 'ivs-destination'},
+                    'ConnectionRetryInterval': 2,
+                    'NumRetries': 10
+                }
+            }
+        }]
+    }
+
+
+def hls_output(output_name, video_name, audio_name, name_modifier):
+    return {
+        'OutputName': output_name,
+        'VideoDescriptionName': video_name,
+        'AudioDescriptionNames': [audio_name],
+        'OutputSettings': {
+            'HlsOutputSettings': {
+                'HlsSettings': {
+                    'StandardHlsSettings': {
+                        'M3u8Settings': {
+                            'AudioFramesPerPes': 4,
+                            'PcrControl': 'PCR_EVERY_PES_PACKET'
+                        },
+                        'AudioRenditionSets': 'program_audio'
+                    }
+                },
+                'NameModifier': name_modifier
+            }
+        }
+    }
+
+
+def hls_group(outputs, segment_length=6):
+    """S3 recording/playback output group"""
+    return {
+        'Name': 'HLS',
+        'OutputGroupSettings': {
+            'HlsGroupSettings': {
+                'Destination': {'DestinationRefId': 's3-destination'},
+                'HlsCdnSettings': {'HlsBasicPutSettings': {'ConnectionRetryInterval': 1, 'NumRetries': 10}},
+                'SegmentLength': segment_length,
+                'ManifestDurationFormat': 'INTEGER',
+                # Recording start/stop markers are ID3 segment tags
+                'HlsId3SegmentTagging': 'ENABLED'
+            }
+        },
+        'Outputs': outputs
+    }
+
+
+def low_latency(builder):
+    """Builder for the low-latency variant of ``builder``'s profile"""
+    def low_latency_builder():
+        input_specification, encoder_settings = builder()
+        encoder_settings = copy.deepcopy(encoder_settings)
+        for video in encoder_settings['VideoDescriptions']:
+            # Segments can only cut on a GOP boundary
+            video['CodecSettings']['H264Settings'].update({
+                'GopSize': LOW_LATENCY_SEGMENT_SECONDS,
+                'GopSizeUnits': 'SECONDS',
+                'GopClosedCadence': 1
+            })
+        for group in encoder_settings['OutputGroups']:
+            hls = group['OutputGroupSettings'].get('HlsGroupSettings')
+            if hls:
+                hls.update(copy.deepcopy(LOW_LATENCY_HLS_SETTINGS))
+        return input_specification, encoder_settings
+
+    low_latency_builder.__doc__ = f'Low-latency variant: {builder.__doc__}'
+    return low_latency_builder
+
+
+def ladder_profile(renditions):
+    """Builder for a ladder over ``renditions`` (top rung first)"""
+    top_height = renditions[0][2]
+
+    def builder():
+        input_specification = {
+            'Codec': 'AVC',
+            'Resolution': 'HD' if top_height >= 720 else 'SD',
+            'MaximumBitrate': 'MAX_20_MBPS' if top_height > 720 else 'MAX_10_MBPS'
+        }
+        video = []
+        audio = []
+        outputs = []
+        for name, width, height, bitrate, level in renditions:
+            video.append(video_description(f'video_{name}', width, height, bitrate, level))
+            audio.append(audio_description(f'audio_aac_{name}'))
+            outputs.append(hls_output(f's3-output-{name}', f'video_{name}', f'audio_aac_{name}', f'_{name}'))
+
+        top = renditions[0][0]
+        encoder_settings = {
+            'AudioDescriptions': audio,
+            'VideoDescriptions': video,
+            'OutputGroups': [rtmp_group(f'video_{top}', f'audio_aac_{top}'), hls_group(outputs)],
+            'TimecodeConfig': {'Source': 'EMBEDDED'}
+        }
+        return input_specification, encoder_settings
+
+    return builder
+
+
+@register_profile('hd-1080p')
+def _hd_1080p():
+    """Single 1080p rendition sent to both the RTMP and HLS output groups"""
+    input_specification = {
+        'Codec': 'AVC',
+        'Resolution': 'HD',
+        'MaximumBitrate': 'MAX_10_MBPS'
+    }
+    encoder_settings = {
+        'AudioDescriptions': [audio_description('audio_aac')],
+        'VideoDescriptions': [video_description('video_1080p', 1920, 1080, 5000000, 'H264_LEVEL_4_1')],
+        'OutputGroups': [
+            rtmp_group('video_1080p', 'audio_aac'),
+            hls_group([hls_output('s3-output', 'video_1080p', 'audio_aac', '_recording')])
+        ],
+        'TimecodeConfig': {'Source': 'EMBEDDED'}
+    }
+    return input_specification, encoder_settings
+
+
+for _position in range(len(RENDITIONS)):
+    register_profile(f'{LADDER_PREFIX}{RENDITIONS[_position][0]}')(ladder_profile(RENDITIONS[_position:]))
+
+for _name in list(_BUILDERS):
+    register_profile(f'{_name}{LOW_LATENCY_SUFFIX}')(low_latency(_BUILDERS[_name]))
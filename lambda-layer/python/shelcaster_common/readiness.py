@@ -0,0 +1,86 @@
+"""Wait for MediaLive channel state changes without sleeping blindly.
+
+Polls ``describe_channel`` with jittered, growing intervals until a target
+state or a deadline. Deadlines are derived from the Lambda context so a
+handler always returns before it is killed; when the deadline passes the
+caller falls back to handing the client a status token to poll.
+"""
+import base64
+import json
+import os
+import random
+import time
+
+INITIAL_INTERVAL = float(os.environ.get('READINESS_INITIAL_INTERVAL', '0.5'))
+MAX_INTERVAL = float(os.environ.get('READINESS_MAX_INTERVAL', '5'))
+# Time kept back from the Lambda deadline to write state and respond.
+DEADLINE_MARGIN = float(os.environ.get('READINESS_DEADLINE_MARGIN', '2'))
+
+READY_STATES = ('RUNNING',)
+# States a channel cannot reach RUNNING from without another start_channel.
+START_FAILED_STATES = ('CREATE_FAILED', 'DELETED', 'DELETING', 'STOPPING')
+
+
+def deadline_from_context(context, cap=None):
+    """Monotonic deadline leaving DEADLINE_MARGIN of the invocation's remaining time"""
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        budget = context.get_remaining_time_in_millis() / 1000.0 - DEADLINE_MARGIN
+    else:
+        budget = cap if cap is not None else 30.0
+    if cap is not None:
+        budget = min(budget, cap)
+    return time.monotonic() + max(budget, 0.0)
+
+
+def backoff_intervals(initial=INITIAL_INTERVAL, maximum=MAX_INTERVAL):
+    """Decorrelated-jitter intervals: each sleep is drawn from [initial, 3 * previous]"""
+    interval = initial
+    while True:
+        interval = min(maximum, random.uniform(initial, interval * 3))
+        yield interval
+
+
+def wait_for_channel_state(medialive, channel_id, states, deadline, fail_states=(), initial=INITIAL_INTERVAL, maximum=MAX_INTERVAL):
+    """Poll until the channel reaches ``states``; returns (state, reached).
+
+    The loop adapts to transitions: whenever the observed state changes the
+    interval resets to ``initial``, since the next change tends to follow soon.
+    """
+    # resilience imports this module
+    from shelcaster_common.resilience import guard
+
+    previous = None
+    intervals = backoff_intervals(initial, maximum)
+    while True:
+        state = guard('medialive').call(
+            lambda: medialive.describe_channel(ChannelId=channel_id), deadline=deadline
+        )['State']
+        if state in states:
+            return state, True
+        if state in fail_states:
+            return state, False
+        if state != previous:
+            intervals = backoff_intervals(initial, maximum)
+            previous = state
+
+        sleep_for = next(intervals)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return state, False
+        time.sleep(min(sleep_for, remaining))
+
+
+def encode_status_token(session_id, channel_id):
+    """Opaque token a client passes back to the status endpoint"""
+    payload = json.dumps({'s': session_id, 'c': channel_id, 't': int(time.time())}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_status_token(token):
+    """Inverse of ``encode_status_token``; raises ValueError if malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return {'sessionId': payload['s'], 'channelId': payload['c'], 'issuedAt': payload['t']}
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError(f'Invalid status token: {error}')
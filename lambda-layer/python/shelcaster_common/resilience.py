@@ -0,0 +1,321 @@
+"""Error-aware retries, call budgets and circuit breakers for control-plane APIs.
+
+MediaLive and IVS throttle per account, so when many shows start at the
+top of the hour their ``create_channel``/``start_channel`` calls collide.
+Clients of the guarded services (``clients.GUARDED_SERVICES``) make a
+single botocore attempt, so every call to them goes through a guard and
+this is the only retry layer; it absorbs blips and handles the burst:
+
+* ``classify`` sorts errors by botocore error code, never by message text.
+* Every service gets one ``ServiceGuard`` per container, made of:
+  - a token bucket that paces calls and halves its rate on each throttle,
+    creeping back on success (AIMD);
+  - a circuit breaker that opens after consecutive throttled or failed
+    attempts, so later calls fail fast with a retry-after rather than
+    queueing on a degraded API;
+  - retries with decorrelated jitter, which spreads the retries of
+    concurrent containers apart instead of letting them collide again.
+* Calls that are not idempotent are only retried on throttling, which
+  guarantees the request was never applied.
+"""
+import os
+import threading
+import time
+
+from shelcaster_common import tracing
+from shelcaster_common.readiness import backoff_intervals
+
+THROTTLE_CODES = (
+    'TooManyRequestsException',
+    'ThrottlingException',
+    'Throttling',
+    'ThrottledException',
+    'RequestThrottled',
+    'SlowDown',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+)
+TRANSIENT_CODES = (
+    'InternalServerErrorException',
+    'InternalServerException',
+    'InternalServerError',
+    'InternalFailure',
+    'ServiceUnavailable',
+    'ServiceUnavailableException',
+    'BadGatewayException',
+    'GatewayTimeoutException',
+    'RequestTimeout',
+    'RequestTimeoutException',
+    'PriorRequestNotComplete',
+)
+CONFLICT_CODES = ('ConflictException', 'ConditionalCheckFailedException', 'PreconditionFailed')
+NOT_FOUND_CODES = ('NotFoundException', 'ResourceNotFoundException', 'NoSuchKey')
+# botocore connection failures carry no error code
+TRANSIENT_EXCEPTIONS = ('EndpointConnectionError', 'ConnectTimeoutError', 'ReadTimeoutError', 'ConnectionClosedError')
+
+THROTTLE = 'throttle'
+TRANSIENT = 'transient'
+CONFLICT = 'conflict'
+NOT_FOUND = 'not_found'
+CLIENT = 'client'
+RETRYABLE = (THROTTLE, TRANSIENT)
+
+MAX_ATTEMPTS = int(os.environ.get('GUARD_MAX_ATTEMPTS', '5'))
+BACKOFF_INITIAL = 0.2
+BACKOFF_MAX = 5.0
+BREAKER_FAILURES = int(os.environ.get('BREAKER_FAILURES', '8'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '15'))
+# service -> (calls per second, burst); override with CALL_BUDGET_<SERVICE>="rate/burst"
+SERVICE_BUDGETS = {
+    'medialive': (10.0, 20),
+    'ivs': (10.0, 20)
+}
+DEFAULT_BUDGET = (20.0, 40)
+
+
+def error_code(error):
+    """botocore error code for an exception, or None.
+
+    Duck-typed on ``.response`` so importing this module does not pull in
+    botocore before a client is actually needed.
+    """
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+def classify(error):
+    """``throttle``, ``transient``, ``conflict``, ``not_found``, ``client`` or None (not an AWS error)"""
+    if isinstance(error, ServiceDegraded):
+        return THROTTLE
+    code = error_code(error)
+    if code in THROTTLE_CODES:
+        return THROTTLE
+    if code in TRANSIENT_CODES or type(error).__name__ in TRANSIENT_EXCEPTIONS:
+        return TRANSIENT
+    if code in CONFLICT_CODES:
+        return CONFLICT
+    if code in NOT_FOUND_CODES:
+        return NOT_FOUND
+    if code is None:
+        return None
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 400
+    return TRANSIENT if status >= 500 else CLIENT
+
+
+def is_throttle_error(error):
+    return classify(error) == THROTTLE
+
+
+def is_conflict(error):
+    return classify(error) == CONFLICT
+
+
+def is_retryable(error):
+    """Whether the caller may try again later (throttled, degraded or a server fault)"""
+    return classify(error) in RETRYABLE
+
+
+class ServiceDegraded(Exception):
+    """A guard refused the call before it reached AWS"""
+
+    def __init__(self, service, reason, retry_after):
+        super().__init__(f'{service} {reason}; retry in {retry_after:.1f}s')
+        self.service = service
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ServiceDegraded):
+    pass
+
+
+class BudgetExhausted(ServiceDegraded):
+    pass
+
+
+class TokenBucket:
+    """Call budget whose rate adapts to throttling (AIMD)"""
+
+    def __init__(self, rate, burst, min_rate=0.2):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline=None):
+        """Block until a token is free; returns the wait, or None if that would pass ``deadline``"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return None
+            time.sleep(wait)
+            waited += wait
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class CircuitBreaker:
+    """closed -> open after ``failures`` consecutive failures -> half-open probe after ``reset_after``"""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = 'closed'
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """None if a call may go ahead, else seconds until it might"""
+        with self._lock:
+            if self.state == 'closed':
+                return None
+            remaining = self.opened_at + self.reset_after - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half-open'
+            if self.state == 'half-open' and not self._probing:
+                self._probing = True
+                return None
+            return max(remaining, 0.1)
+
+    def on_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive = 0
+            self._probing = False
+
+    def abandon(self):
+        """The allowed call never reached the service; let another probe through"""
+        with self._lock:
+            self._probing = False
+
+    def on_failure(self):
+        """Count a failure; True if this one opened the circuit"""
+        with self._lock:
+            self.consecutive += 1
+            self._probing = False
+            if self.state == 'half-open' or (self.state == 'closed' and self.consecutive >= self.failures):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class ServiceGuard:
+    """Budget, breaker and retries for every call to one service"""
+
+    def __init__(self, service, rate, burst, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET_SECONDS):
+        self.service = service
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failures, reset_after)
+
+    def call(self, fn, deadline=None, idempotent=True, max_attempts=MAX_ATTEMPTS):
+        """Run ``fn`` under the guard; raises its last error or ``ServiceDegraded``.
+
+        ``deadline`` is a ``time.monotonic()`` value; no wait or retry is
+        started that would end after it. Guarded clients make a single
+        botocore attempt, so attempts and retries are counted here: each call
+        is a ``GuardedCall`` span for the service, and the AWS operations of
+        a retry count as retries in their own spans.
+        """
+        retry_on = RETRYABLE if idempotent else (THROTTLE,)
+        intervals = backoff_intervals(initial=BACKOFF_INITIAL, maximum=BACKOFF_MAX)
+        started = time.perf_counter()
+        attempt = 0
+        failure = None
+        try:
+            while True:
+                retry_after = self.breaker.allow()
+                if retry_after is not None:
+                    raise CircuitOpenError(self.service, 'circuit open', retry_after)
+                if self.bucket.acquire(deadline) is None:
+                    self.breaker.abandon()
+                    raise BudgetExhausted(self.service, 'call budget exhausted', 1 / self.bucket.rate)
+                attempt += 1
+                try:
+                    with tracing.guarded_attempt(attempt):
+                        result = fn()
+                except Exception as error:
+                    kind = classify(error)
+                    if kind is None:
+                        # Our own code failed; the service was never asked
+                        self.breaker.abandon()
+                        raise
+                    if kind == THROTTLE:
+                        self.bucket.on_throttle()
+                    if kind in RETRYABLE:
+                        if self.breaker.on_failure():
+                            print(f'{self.service} circuit opened after {self.breaker.consecutive} failures ({error_code(error)})')
+                    else:
+                        # The service answered; only our request was wrong
+                        self.breaker.on_success()
+                    if kind not in retry_on or attempt >= max_attempts:
+                        raise
+                    interval = next(intervals)
+                    if deadline is not None and time.monotonic() + interval > deadline:
+                        raise
+                    time.sleep(interval)
+                    continue
+                self.bucket.on_success()
+                self.breaker.on_success()
+                return result
+        except Exception as error:
+            failure = error_code(error) or type(error).__name__
+            raise
+        finally:
+            tracing.recorder.record(
+                self.service, 'GuardedCall', (time.perf_counter() - started) * 1000,
+                retries=max(attempt - 1, 0), attempts=attempt, error_code=failure
+            )
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def service_budget(service):
+    value = os.environ.get(f'CALL_BUDGET_{service.upper()}')
+    if value:
+        rate, _, burst = value.partition('/')
+        return float(rate), int(burst or max(1, int(float(rate) * 2)))
+    return SERVICE_BUDGETS.get(service, DEFAULT_BUDGET)
+
+
+def guard(service):
+    """Container-wide guard for ``service``, so a warm container remembers recent throttling"""
+    current = _guards.get(service)
+    if current is None:
+        with _guards_lock:
+            current = _guards.get(service)
+            if current is None:
+                current = ServiceGuard(service, *service_budget(service))
+                _guards[service] = current
+    return current
+
+
+def reset_guards():
+    with _guards_lock:
+        _guards.clear()
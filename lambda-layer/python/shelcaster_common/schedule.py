@@ -0,0 +1,193 @@
+"""Recording markers on MediaLive channel schedules.
+
+The HLS group writes to S3 for as long as a channel runs; a recording is
+the span between a start and a stop marker, each an ID3 segment tag
+schedule action. ``ScheduleBatch`` stages creates and deletes for any
+number of channels and sends one ``batch_update_schedule`` per channel
+(the API is per channel), fanning channels out concurrently. Markers can
+be immediate or fixed to a UTC time aligned to an HLS segment boundary,
+so a planned recording starts on the first segment of a show. Boundaries
+come from the program date times of the channel's own playlist when it has
+written one; before that they are only epoch multiples of the segment
+length, approximately aligned.
+
+``reconcile_recording`` compares a channel's schedule with the session's
+``recording`` map and stages deletes for markers the session no longer
+references.
+"""
+import time
+from datetime import datetime, timezone
+
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.profiles import DEFAULT_PROFILE, get_profile
+from shelcaster_common.resilience import guard
+
+ACTION_PREFIX = 'recording'
+# MediaLive rejects fixed-mode actions that start too close to now.
+MIN_LEAD_SECONDS = 15
+# The API takes at most this many actions per request.
+MAX_ACTIONS_PER_CALL = 200
+
+
+def action_name(session_id, kind, at=None):
+    """Unique marker name, e.g. ``recording-start-<sid>-<epoch ms>``"""
+    stamp = int((at or time.time()) * 1000)
+    return f'{ACTION_PREFIX}-{kind}-{session_id}-{stamp}'
+
+
+def is_session_action(name, session_id):
+    return name.startswith(f'{ACTION_PREFIX}-') and f'-{session_id}-' in name
+
+
+def hls_segment_length(profile_name=DEFAULT_PROFILE):
+    """Segment length of the profile's HLS (recording) output group"""
+    for group in get_profile(profile_name).encoder_settings['OutputGroups']:
+        hls = group['OutputGroupSettings'].get('HlsGroupSettings')
+        if hls:
+            return hls.get('SegmentLength', 10)
+    raise ValueError(f'Profile {profile_name} has no HLS output group')
+
+
+def aligned_start(at, segment_seconds, now=None, anchor=None):
+    """Round ``at`` (epoch seconds) up to a segment boundary.
+
+    ``anchor`` is a known boundary on the channel's segment timeline (see
+    ``segment_index.timeline_anchor``); boundaries are extrapolated from it
+    every ``segment_seconds``. Without one the result is only a multiple of
+    the segment length since the epoch, which the channel's segments need
+    not share, so the marker lands within a segment of the requested time
+    rather than on its first frame.
+
+    Raises ValueError if the result is inside MediaLive's lead time.
+    """
+    now = time.time() if now is None else now
+    origin = anchor or 0
+    offset = round((at - origin) * 1000)
+    aligned = origin + -(-offset // (segment_seconds * 1000)) * segment_seconds
+    if aligned < now + MIN_LEAD_SECONDS:
+        raise ValueError(f'Fixed start must be at least {MIN_LEAD_SECONDS}s in the future')
+    return aligned
+
+
+def fixed_time(epoch):
+    """MediaLive's ``yyyy-mm-ddThh:mm:ss.nnnZ`` form of an epoch time"""
+    stamp = datetime.fromtimestamp(epoch, tz=timezone.utc)
+    return stamp.strftime('%Y-%m-%dT%H:%M:%S.') + f'{stamp.microsecond // 1000:03d}Z'
+
+
+def parse_time(value):
+    """Epoch seconds from an ISO-8601 string (``Z`` allowed) or a number"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    stamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return stamp.timestamp()
+
+
+def marker_action(name, session_id, kind, start_at=None):
+    """ID3-tagging schedule action; immediate unless ``start_at`` is given"""
+    if start_at is None:
+        start = {'ImmediateModeScheduleActionStartSettings': {}}
+    else:
+        start = {'FixedModeScheduleActionStartSettings': {'Time': fixed_time(start_at)}}
+    return {
+        'ActionName': name,
+        'ScheduleActionStartSettings': start,
+        'ScheduleActionSettings': {
+            'HlsId3SegmentTaggingSettings': {
+                'Tag': f'shelcaster:recording={kind};session={session_id}'
+            }
+        }
+    }
+
+
+class ScheduleBatch:
+    """Staged schedule changes, flushed as one call per channel"""
+
+    def __init__(self, medialive):
+        self.medialive = medialive
+        self._creates = {}
+        self._deletes = {}
+
+    def create(self, channel_id, action):
+        self._creates.setdefault(channel_id, []).append(action)
+        return action['ActionName']
+
+    def delete(self, channel_id, name):
+        names = self._deletes.setdefault(channel_id, [])
+        if name not in names:
+            names.append(name)
+        return self
+
+    def marker(self, channel_id, session_id, kind, start_at=None):
+        """Stage a ``start``/``stop`` marker and return its action name"""
+        name = action_name(session_id, kind, at=start_at)
+        return self.create(channel_id, marker_action(name, session_id, kind, start_at))
+
+    def __bool__(self):
+        return bool(self._creates or self._deletes)
+
+    def _request(self, channel_id):
+        request = {'ChannelId': channel_id}
+        creates = self._creates.get(channel_id)
+        deletes = self._deletes.get(channel_id)
+        if creates:
+            request['Creates'] = {'ScheduleActions': creates}
+        if deletes:
+            request['Deletes'] = {'ActionNames': deletes}
+        if len(creates or ()) + len(deletes or ()) > MAX_ACTIONS_PER_CALL:
+            raise ValueError(f'Too many schedule actions for channel {channel_id}')
+        return request
+
+    def flush(self):
+        """Send every staged change; returns ``{channel_id: CallResult}``"""
+        channel_ids = list(dict.fromkeys(list(self._creates) + list(self._deletes)))
+        calls = {}
+        for channel_id in channel_ids:
+            request = self._request(channel_id)
+            # Named actions are not safe to resend after a server error, so only throttles retry
+            calls[channel_id] = lambda request=request: guard('medialive').call(
+                lambda: self.medialive.batch_update_schedule(**request), idempotent=False
+            )
+        self._creates = {}
+        self._deletes = {}
+        return run_concurrently(calls) if calls else {}
+
+
+def describe_schedule(medialive, channel_id):
+    """All schedule actions on a channel, across pages"""
+    def list_actions():
+        actions = []
+        for page in medialive.get_paginator('describe_schedule').paginate(ChannelId=channel_id):
+            actions.extend(page.get('ScheduleActions', []))
+        return actions
+    # A retry lists again from the first page
+    return guard('medialive').call(list_actions)
+
+
+def reconcile_recording(session, actions, batch=None):
+    """Compare a channel's schedule with the session's recording map.
+
+    Returns ``{'missing': [...], 'orphaned': [...]}``: markers the session
+    references but the channel lacks, and this session's markers nobody
+    references. Orphans are staged for deletion when ``batch`` is given.
+    """
+    scheduled = {action['ActionName'] for action in actions}
+    referenced = {name for name in (session.recording_action_name, session.recording_stop_action_name) if name}
+
+    # A stopped recording's markers have done their job
+    if not session.is_recording:
+        referenced.discard(session.recording_action_name)
+        referenced.discard(session.recording_stop_action_name)
+
+    missing = sorted(name for name in referenced if name not in scheduled)
+    orphaned = sorted(
+        name for name in scheduled
+        if is_session_action(name, session.session_id) and name not in referenced
+    )
+
+    if batch is not None:
+        for name in orphaned:
+            batch.delete(session.media_live_channel_id, name)
+    return {'missing': missing, 'orphaned': orphaned}
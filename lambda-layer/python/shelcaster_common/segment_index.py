@@ -0,0 +1,300 @@
+"""Compact index over a recording's HLS segments, kept next to the recording.
+
+MediaLive rewrites each media playlist every segment, and the playlist only
+lists the last few. The index is the whole run: per segment its sequence,
+program time, duration and byte size, held in parallel ``array`` columns
+so a three-hour show is a few tens of kilobytes and a seek is a
+``bisect`` over the start times instead of a playlist download and parse.
+
+It is append-only. ``update_index`` tails the playlist, lists only the
+segment objects after the last indexed one (``StartAfter``) and appends
+the new ones. The write is conditional on the ETag it read, so concurrent
+updaters retry instead of overwriting a longer index with a shorter one.
+
+Program time is the segment's ``#EXT-X-PROGRAM-DATE-TIME``. Segments that
+have already slid out of the playlist window (the indexer fell behind)
+get the target duration and start where the previous one ended. The
+first segment of an undated playlist starts at its LastModified minus
+its duration.
+"""
+import base64
+import json
+import re
+import sys
+from array import array
+from bisect import bisect_right
+
+from shelcaster_common.finalize import MASTER_PLAYLIST, list_objects, master_rendition, rendition_segments, segment_sequence
+from shelcaster_common.hls import parse_playlist, resolve_uri
+
+FORMAT_VERSION = 1
+INDEX_SUFFIX = '.index.json'
+INDEX_CONTENT_TYPE = 'application/json'
+# Conditional-write retries before giving up to the next trigger
+WRITE_ATTEMPTS = 4
+CONFLICT_CODES = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+_NUMBERED = re.compile(r'^(.*?)(\d+)(\.\w+)$')
+# Column name -> array typecode
+COLUMNS = (
+    ('sequence', 'q'),
+    ('start', 'd'),
+    ('duration', 'f'),
+    ('size', 'q')
+)
+
+
+def index_key(playlist_key):
+    """``recordings/<id>/index_recording.m3u8`` -> ``recordings/<id>/index_recording.index.json``"""
+    return playlist_key[:-len('.m3u8')] + INDEX_SUFFIX
+
+
+def segment_format(uri):
+    """``index_recording_00042.ts`` -> ``index_recording_{:05d}.ts``"""
+    match = _NUMBERED.match(uri)
+    if not match:
+        raise ValueError(f'Segment name has no sequence number: {uri}')
+    prefix, digits, suffix = match.groups()
+    return f"{prefix.replace('{', '{{').replace('}', '}}')}{{:0{len(digits)}d}}{suffix}"
+
+
+def _pack(column):
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return base64.b64encode(column.tobytes()).decode('ascii')
+
+
+def _unpack(typecode, data):
+    column = array(typecode)
+    column.frombytes(base64.b64decode(data))
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+class SegmentIndex:
+    """One rendition's segments, in sequence order, as parallel arrays"""
+
+    __slots__ = ('playlist_key', 'segment_format', 'target_duration', 'ended', 'etag', 'columns')
+
+    def __init__(self, playlist_key, segment_format=None, target_duration=None):
+        self.playlist_key = playlist_key
+        self.segment_format = segment_format
+        self.target_duration = target_duration
+        self.ended = False
+        # ETag of the stored copy this was read from; None if never stored
+        self.etag = None
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+
+    def __len__(self):
+        return len(self.columns['sequence'])
+
+    @property
+    def last_sequence(self):
+        return self.columns['sequence'][-1] if len(self) else None
+
+    @property
+    def start(self):
+        return self.columns['start'][0] if len(self) else None
+
+    @property
+    def end(self):
+        if not len(self):
+            return None
+        return self.columns['start'][-1] + self.columns['duration'][-1]
+
+    @property
+    def bytes(self):
+        return sum(self.columns['size'])
+
+    def key(self, i):
+        """S3 key of the ``i``-th indexed segment"""
+        return resolve_uri(self.playlist_key, self.segment_format.format(self.columns['sequence'][i]))
+
+    def entry(self, i):
+        return {
+            'key': self.key(i),
+            'sequence': self.columns['sequence'][i],
+            'start': self.columns['start'][i],
+            'duration': self.columns['duration'][i],
+            'size': self.columns['size'][i]
+        }
+
+    def append(self, sequence, start, duration, size):
+        if len(self) and sequence <= self.last_sequence:
+            raise ValueError(f'Segment {sequence} is not after {self.last_sequence}')
+        # Start times must stay sorted for bisect, whatever the clock did
+        if len(self) and start < self.columns['start'][-1]:
+            start = self.columns['start'][-1]
+        self.columns['sequence'].append(sequence)
+        self.columns['start'].append(start)
+        self.columns['duration'].append(duration)
+        self.columns['size'].append(size)
+
+    def locate(self, when):
+        """Index of the segment playing at ``when`` (epoch seconds).
+
+        A time before the first segment or in a gap between segments (a
+        discontinuity) snaps forward to the next segment; past the end is
+        None.
+        """
+        if not len(self):
+            return None
+        i = bisect_right(self.columns['start'], when) - 1
+        if i >= 0 and when < self.columns['start'][i] + self.columns['duration'][i]:
+            return i
+        return i + 1 if i + 1 < len(self) else None
+
+    def span(self, started_at, stopped_at):
+        """``(first, last)`` indexes of the segments overlapping ``[started_at, stopped_at)``, or None"""
+        first = self.locate(started_at)
+        if first is None or self.columns['start'][first] >= stopped_at:
+            return None
+        last = bisect_right(self.columns['start'], stopped_at) - 1
+        if self.columns['start'][last] >= stopped_at:
+            last -= 1
+        return first, max(first, last)
+
+    def to_json(self):
+        document = {
+            'version': FORMAT_VERSION,
+            'playlist': self.playlist_key,
+            'segmentFormat': self.segment_format,
+            'targetDuration': self.target_duration,
+            'ended': self.ended,
+            'count': len(self)
+        }
+        document.update({name: _pack(self.columns[name]) for name, _ in COLUMNS})
+        return json.dumps(document, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text, etag=None):
+        document = json.loads(text)
+        if document.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported segment index version {document.get('version')}")
+        index = cls(document['playlist'], document.get('segmentFormat'), document.get('targetDuration'))
+        index.ended = document.get('ended', False)
+        index.etag = etag
+        index.columns = {name: _unpack(typecode, document[name]) for name, typecode in COLUMNS}
+        if any(len(column) != document['count'] for column in index.columns.values()):
+            raise ValueError('Segment index columns disagree on length')
+        return index
+
+
+def span_objects(index, started_at, stopped_at):
+    """The segments overlapping ``[started_at, stopped_at)`` as ``{'Key', 'Size'}`` object summaries"""
+    span = index.span(started_at, stopped_at)
+    if span is None:
+        return []
+    return [{'Key': index.key(i), 'Size': index.columns['size'][i]} for i in range(span[0], span[1] + 1)]
+
+
+def load_index(s3, bucket, playlist_key):
+    """The stored index for a media playlist, or None if there is none yet"""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=index_key(playlist_key))
+    except s3.exceptions.NoSuchKey:
+        return None
+    return SegmentIndex.from_json(response['Body'].read().decode('utf-8'), etag=response['ETag'])
+
+
+def save_index(s3, bucket, index):
+    """Write ``index`` if the stored copy is still the one it was read from.
+
+    Returns False when another writer got there first.
+    """
+    condition = {'IfMatch': index.etag} if index.etag else {'IfNoneMatch': '*'}
+    try:
+        response = s3.put_object(
+            Bucket=bucket, Key=index_key(index.playlist_key),
+            Body=index.to_json().encode('utf-8'), ContentType=INDEX_CONTENT_TYPE,
+            **condition
+        )
+    except s3.exceptions.ClientError as error:
+        if error.response['Error']['Code'] in CONFLICT_CODES:
+            return False
+        raise
+    index.etag = response['ETag']
+    return True
+
+
+def extend_index(index, playlist, objects):
+    """Append the segments in ``objects`` that come after the index, up to the playlist's last.
+
+    ``objects`` is a listing (``{key: object summary}``) of the rendition's
+    segments. Returns the number appended.
+    """
+    if not playlist.segments:
+        return 0
+    if index.segment_format is None:
+        index.segment_format = segment_format(playlist.segments[0].uri)
+    index.target_duration = playlist.target_duration or index.target_duration
+    index.ended = playlist.ended
+
+    listed = {segment.sequence: segment for segment in playlist.segments}
+    newest = playlist.segments[-1].sequence
+    target = index.target_duration or playlist.segments[-1].duration
+    added = 0
+    for obj in rendition_segments(objects, index.playlist_key):
+        sequence = segment_sequence(obj['Key'])
+        if (index.last_sequence is not None and sequence <= index.last_sequence) or sequence > newest:
+            continue
+        segment = listed.get(sequence)
+        duration = segment.duration if segment else target
+        if segment and segment.program_date_time is not None:
+            start = segment.program_date_time
+        elif len(index):
+            start = index.end
+        else:
+            start = obj['LastModified'].timestamp() - duration
+        index.append(sequence, start, duration, obj['Size'])
+        added += 1
+    return added
+
+
+def update_index(s3, bucket, playlist_key, rebuild=False):
+    """Bring the stored index for a media playlist up to date.
+
+    Returns ``(index, added)``; ``index`` is None for a master playlist.
+    """
+    playlist = parse_playlist(s3.get_object(Bucket=bucket, Key=playlist_key)['Body'].read().decode('utf-8'))
+    if playlist.is_master:
+        return None, 0
+
+    stem = playlist_key[:-len('.m3u8')] + '_'
+    for _ in range(WRITE_ATTEMPTS):
+        stored = load_index(s3, bucket, playlist_key)
+        index = stored if stored is not None and not rebuild else SegmentIndex(playlist_key)
+        if stored is not None:
+            index.etag = stored.etag
+        start_after = index.key(len(index) - 1) if len(index) else None
+        objects = list_objects(s3, bucket, stem, start_after=start_after)
+        ended = index.ended
+        added = extend_index(index, playlist, objects)
+        if stored is index and not added and index.ended == ended:
+            return index, 0
+        if save_index(s3, bucket, index):
+            return index, added
+        # Someone else wrote it since we read it; start over from theirs
+        rebuild = False
+    raise RuntimeError(f'Segment index for {playlist_key} kept changing under {WRITE_ATTEMPTS} attempts')
+
+
+def timeline_anchor(s3, bucket, prefix):
+    """A segment boundary (epoch seconds) on the timeline of the recording under ``prefix``.
+
+    The end of the newest dated segment in the top rendition's live
+    playlist, from its program date time; later boundaries follow every
+    segment length. None until the channel has written dated output.
+    """
+    master_key = f'{prefix}{MASTER_PLAYLIST}'
+    try:
+        playlist_key = master_rendition(s3, bucket, master_key) or master_key
+        text = s3.get_object(Bucket=bucket, Key=playlist_key)['Body'].read().decode('utf-8')
+    except s3.exceptions.NoSuchKey:
+        return None
+    dated = [segment for segment in parse_playlist(text).segments if segment.program_date_time is not None]
+    if not dated:
+        return None
+    return dated[-1].program_date_time + dated[-1].duration
@@ -0,0 +1,436 @@
+"""Typed, lazily decoded view of the ``session#<id>/info`` item.
+
+Handlers used to ``get_item`` the session on every call and walk the raw
+``{'M': {...}}`` / ``{'S': ...}`` AttributeValue dicts by hand. ``Session``
+keeps the raw item and decodes only the paths that are actually read, and
+``SessionCache`` keeps recently read sessions for the life of the container.
+
+The split layout keeps the streaming, recording, MediaLive and IVS maps
+in sibling items (``info#streaming`` ...) under the same pk, so handlers
+read only the concerns they name in ``parts`` and write their own sub-item
+instead of contending on one growing hot item. ``SessionWrites`` routes
+attribute paths to the right item for either layout. Deployments cannot
+select it yet: the JS functions (end-session among them) read those maps
+from the info item, so ``SESSION_LAYOUT=split`` refuses to load.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TABLE_NAME = os.environ.get('TABLE_NAME', 'shelcaster-app')
+INFO_SK = 'info'
+BATCH_GET_SIZE = 100
+# Top-level copy of mediaLive.channelId, the key of a sparse GSI that only
+# holds sessions with a channel (GSI keys cannot be nested map paths).
+CHANNEL_ID_ATTRIBUTE = 'mediaLiveChannelId'
+CHANNEL_INDEX = os.environ.get('CHANNEL_INDEX', 'mediaLiveChannelId-index')
+# Same for the IVS channel MediaLive outputs to (ivs.ingestChannelArn)
+IVS_CHANNEL_ATTRIBUTE = 'ivsChannelArn'
+IVS_CHANNEL_INDEX = os.environ.get('IVS_CHANNEL_INDEX', 'ivsChannelArn-index')
+
+# 'item': everything on session#<id>/info. 'split': concerns in sibling items,
+# only reachable through the layout= arguments until the JS readers move.
+SESSION_LAYOUT = os.environ.get('SESSION_LAYOUT', 'item')
+if SESSION_LAYOUT != 'item':
+    # end-session would miss mediaLive.channelId on the info item and leak the channel
+    raise ValueError(f'SESSION_LAYOUT={SESSION_LAYOUT} is not supported: the JS functions read the info item only')
+CONCERNS = ('streaming', 'recording', 'mediaLive', 'ivs')
+# Always read alongside a projected set of concerns.
+CORE_ATTRIBUTES = ('pk', 'sk', 'entityType', 'status', 'showId', 'hostUserId', 'updatedAt', CHANNEL_ID_ATTRIBUTE)
+
+CACHE_TTL_SECONDS = float(os.environ.get('SESSION_CACHE_TTL', '5'))
+CACHE_MAX_ENTRIES = int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', '256'))
+
+
+def session_key(session_id, sk=INFO_SK):
+    """DynamoDB key for a session item"""
+    return {
+        'pk': {'S': f'session#{session_id}'},
+        'sk': {'S': sk}
+    }
+
+
+def concern_sk(concern):
+    return f'{INFO_SK}#{concern}'
+
+
+def session_path(session_id, path, layout=SESSION_LAYOUT):
+    """``(key, path)`` where an attribute path is stored under ``layout``.
+
+    In the split layout ``mediaLive.channelId`` is ``channelId`` on the
+    ``info#mediaLive`` item; a bare concern name maps to path None.
+    """
+    head, _, rest = path.partition('.')
+    if layout == 'split' and head in CONCERNS:
+        return session_key(session_id, concern_sk(head)), rest or None
+    return session_key(session_id), path
+
+
+def decode_value(value):
+    """Convert a DynamoDB AttributeValue into a plain Python value"""
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        number = value['N']
+        return int(number) if number.lstrip('-').isdigit() else float(number)
+    if 'BOOL' in value:
+        return value['BOOL']
+    if 'NULL' in value:
+        return None
+    if 'M' in value:
+        return {k: decode_value(v) for k, v in value['M'].items()}
+    if 'L' in value:
+        return [decode_value(v) for v in value['L']]
+    if 'SS' in value:
+        return set(value['SS'])
+    if 'NS' in value:
+        return {decode_value({'N': n}) for n in value['NS']}
+    if 'B' in value:
+        return value['B']
+    return None
+
+
+class Session:
+    """Read-only view over a raw session item.
+
+    Nothing is decoded up front; ``get('mediaLive', 'channelId')`` walks only
+    that path and memoizes the result.
+    """
+
+    __slots__ = ('session_id', 'item', 'parts', 'version', 'fetched_at', '_decoded')
+
+    def __init__(self, session_id, item, fetched_at=None, parts=None):
+        self.session_id = session_id
+        self.item = item
+        # Concerns this view was read with; None means the whole session.
+        self.parts = None if parts is None else frozenset(parts)
+        # updatedAt is an ISO-8601 string, so later writes compare greater.
+        self.version = item.get('updatedAt', {}).get('S', '')
+        self.fetched_at = time.monotonic() if fetched_at is None else fetched_at
+        self._decoded = {}
+
+    @classmethod
+    def from_items(cls, session_id, items, parts=None):
+        """Assemble a session from its info item and/or split concern items"""
+        merged = {}
+        versions = []
+        for item in items:
+            sk = item['sk']['S']
+            versions.append(item.get('updatedAt', {}).get('S', ''))
+            if sk == INFO_SK:
+                merged.update(item)
+            else:
+                concern = sk.split('#', 1)[1]
+                merged[concern] = {'M': {
+                    name: value for name, value in item.items()
+                    if name not in ('pk', 'sk', 'updatedAt')
+                }}
+        if versions:
+            merged['updatedAt'] = {'S': max(versions)}
+        return cls(session_id, merged, parts=parts)
+
+    def covers(self, parts):
+        """Whether this view holds every concern in ``parts`` (None = all)"""
+        if self.parts is None:
+            return True
+        return parts is not None and self.parts.issuperset(parts)
+
+    def get(self, *path):
+        """Decoded value at a nested attribute path, or None if absent"""
+        try:
+            return self._decoded[path]
+        except KeyError:
+            pass
+
+        node = self.item.get(path[0])
+        for name in path[1:]:
+            if not node or 'M' not in node:
+                node = None
+                break
+            node = node['M'].get(name)
+
+        value = decode_value(node) if node is not None else None
+        self._decoded[path] = value
+        return value
+
+    @property
+    def media_live_channel_id(self):
+        return self.get('mediaLive', 'channelId')
+
+    @property
+    def media_live_input_id(self):
+        return self.get('mediaLive', 'inputId')
+
+    @property
+    def media_live_rtmp_url(self):
+        return self.get('mediaLive', 'rtmpUrl')
+
+    @property
+    def media_live_spec_hash(self):
+        return self.get('mediaLive', 'specHash')
+
+    @property
+    def media_live_profile(self):
+        return self.get('mediaLive', 'profile')
+
+    @property
+    def media_live_input(self):
+        """Declared source resolution and bitrate, if any"""
+        return self.get('mediaLive', 'input')
+
+    @property
+    def media_live_latency_mode(self):
+        return self.get('mediaLive', 'latencyMode')
+
+    @property
+    def media_live_channel_state(self):
+        """Last channel state seen in a state-change event (``{state, at, version}``), if any"""
+        return self.get('mediaLive', 'channelState')
+
+    @property
+    def ivs_ingest_endpoint(self):
+        return self.get('ivs', 'programIngestEndpoint')
+
+    @property
+    def ivs_program_channel_arn(self):
+        return self.get('ivs', 'programChannelArn')
+
+    @property
+    def ivs_playback_url(self):
+        return self.get('ivs', 'programPlaybackUrl')
+
+    @property
+    def ivs_stream_state(self):
+        """Last IVS stream state seen in a state-change event, if any"""
+        return self.get('ivs', 'streamState')
+
+    @property
+    def recording_action_name(self):
+        return self.get('recording', 'actionName')
+
+    @property
+    def recording_stop_action_name(self):
+        return self.get('recording', 'stopActionName')
+
+    @property
+    def is_live(self):
+        return bool(self.get('streaming', 'isLive'))
+
+    @property
+    def is_recording(self):
+        return bool(self.get('recording', 'isRecording'))
+
+
+class SessionCache:
+    """Per-container LRU of sessions with a short TTL.
+
+    ``put`` never replaces a cached session with an older version, so a slow
+    read that lands after a newer one cannot roll the cache back. Handlers
+    call ``invalidate`` after writing a session.
+
+    That only orders this container's copy; another container may have
+    written within the TTL. It is for read-only paths (status polling).
+    Handlers that decide a write from the session load it with
+    ``use_cache=False, consistent_read=True``.
+    """
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, parts=None):
+        with self._lock:
+            session = self._entries.get(session_id)
+            if session is None:
+                return None
+            if time.monotonic() - session.fetched_at > self.ttl:
+                del self._entries[session_id]
+                return None
+            if not session.covers(parts):
+                return None
+            self._entries.move_to_end(session_id)
+            return session
+
+    def put(self, session):
+        with self._lock:
+            cached = self._entries.get(session.session_id)
+            if cached is not None and cached.version > session.version:
+                return cached
+            if cached is not None and cached.version == session.version and cached.covers(session.parts):
+                return cached
+            self._entries[session.session_id] = session
+            self._entries.move_to_end(session.session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return session
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+SESSION_CACHE = SessionCache()
+
+
+def projection(parts):
+    """ProjectionExpression and names for the core attributes plus ``parts``"""
+    attributes = CORE_ATTRIBUTES + tuple(parts)
+    names = {f'#a{n}': name for n, name in enumerate(attributes)}
+    return ', '.join(names), names
+
+
+def load_session(dynamodb, session_id, table_name=TABLE_NAME, cache=SESSION_CACHE, use_cache=True,
+                 parts=None, consistent_read=False, layout=SESSION_LAYOUT):
+    """Read-through fetch of a session; returns None if missing.
+
+    ``parts`` names the concerns the caller needs (None reads them all).
+    """
+    if use_cache and cache is not None:
+        cached = cache.get(session_id, parts)
+        if cached is not None:
+            return cached
+
+    if layout == 'split' and parts is not None:
+        # Exact keys for the named concerns (key attributes cannot be filtered)
+        session = load_sessions(
+            dynamodb, [session_id], table_name=table_name, parts=parts,
+            consistent_read=consistent_read, layout=layout
+        ).get(session_id)
+        if session is None:
+            return None
+    elif layout == 'split':
+        kwargs = {
+            'TableName': table_name,
+            'KeyConditionExpression': 'pk = :pk AND begins_with(sk, :info)',
+            'ExpressionAttributeValues': {
+                ':pk': {'S': f'session#{session_id}'},
+                ':info': {'S': INFO_SK}
+            },
+            'ConsistentRead': consistent_read
+        }
+        items = []
+        while True:
+            response = dynamodb.query(**kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        if not any(item['sk']['S'] == INFO_SK for item in items):
+            return None
+        session = Session.from_items(session_id, items)
+    else:
+        kwargs = {
+            'TableName': table_name,
+            'Key': session_key(session_id),
+            'ConsistentRead': consistent_read
+        }
+        if parts is not None:
+            kwargs['ProjectionExpression'], kwargs['ExpressionAttributeNames'] = projection(parts)
+        response = dynamodb.get_item(**kwargs)
+        if 'Item' not in response:
+            return None
+        session = Session(session_id, response['Item'], parts=parts)
+
+    if cache is not None:
+        session = cache.put(session)
+    return session
+
+
+def load_sessions(dynamodb, session_ids, table_name=TABLE_NAME, max_attempts=6, parts=None,
+                  consistent_read=False, layout=SESSION_LAYOUT):
+    """batch_get_item many sessions, retrying unprocessed keys; ``{id: Session}``"""
+    keys = []
+    for session_id in session_ids:
+        keys.append(session_key(session_id))
+        if layout == 'split':
+            keys.extend(session_key(session_id, concern_sk(concern)) for concern in (parts or CONCERNS))
+
+    items = {}
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        request = {table_name: {'Keys': keys[start:start + BATCH_GET_SIZE], 'ConsistentRead': consistent_read}}
+        if parts is not None and layout != 'split':
+            request[table_name]['ProjectionExpression'], request[table_name]['ExpressionAttributeNames'] = projection(parts)
+        attempt = 0
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table_name, []):
+                session_id = item['pk']['S'].split('#', 1)[1]
+                items.setdefault(session_id, []).append(item)
+            request = response.get('UnprocessedKeys') or None
+            attempt += 1
+            if request and attempt >= max_attempts:
+                raise RuntimeError('DynamoDB kept returning unprocessed keys')
+            if request:
+                time.sleep(min(0.05 * 2 ** attempt, 1))
+
+    return {
+        session_id: Session.from_items(session_id, session_items, parts=parts)
+        for session_id, session_items in items.items()
+        if any(item['sk']['S'] == INFO_SK for item in session_items)
+    }
+
+
+class SessionWrites:
+    """Stage session attribute writes on a ``WriteBatch`` for the layout.
+
+    Paths are written as if everything lived on the info item
+    (``streaming.isLive``); in the split layout they are routed to the
+    concern's item, where a whole-map set becomes one set per field.
+    """
+
+    def __init__(self, writes, session_id, layout=SESSION_LAYOUT):
+        self.writes = writes
+        self.session_id = session_id
+        self.layout = layout
+        self._touched = {}
+
+    def key(self, path=None):
+        """Key of the item holding ``path`` (the info item by default)"""
+        if path is None:
+            return session_key(self.session_id)
+        return session_path(self.session_id, path, self.layout)[0]
+
+    def _route(self, path):
+        key, item_path = session_path(self.session_id, path, self.layout)
+        self._touched[key['sk']['S']] = key
+        return key, item_path
+
+    def set(self, path, value):
+        key, item_path = self._route(path)
+        if item_path is None:
+            for name, field in value['M'].items():
+                self.writes.set(key, name, field)
+        else:
+            self.writes.set(key, item_path, value)
+        return self
+
+    def remove(self, path):
+        key, item_path = self._route(path)
+        if item_path is None:
+            self.writes.delete(key)
+            self._touched.pop(key['sk']['S'], None)
+        else:
+            self.writes.remove(key, item_path)
+        return self
+
+    def touch(self, now):
+        """Set updatedAt on every item written (the info item if none were).
+
+        A session's version is the newest updatedAt across its items, so
+        concern writes leave the info item alone.
+        """
+        for key in list(self._touched.values()) or [self.key()]:
+            self.writes.set(key, 'updatedAt', now)
+        return self
+
+
+def invalidate_session(session_id, cache=SESSION_CACHE):
+    """Drop a session from the container cache after writing it"""
+    cache.invalidate(session_id)
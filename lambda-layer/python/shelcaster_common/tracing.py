@@ -0,0 +1,201 @@
+"""Per-call latency spans, emitted as CloudWatch Embedded Metric Format.
+
+``instrument_session`` hooks botocore's ``before-parameter-build`` and
+``after-call`` events on the shared session, so every AWS call (DynamoDB included) is
+timed with its retry count and error code without touching call sites.
+Guarded services (``resilience``) retry outside botocore, so their guard
+reports each call's attempts and marks the operations of a retry.
+``traced_handler`` wraps a ``lambda_handler``: it samples event logging,
+times the invocation and prints one EMF line per service/operation at the
+end. ``span`` times arbitrary blocks such as provisioning.
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Shelcaster/Lambda')
+EVENT_LOG_SAMPLE_RATE = float(os.environ.get('EVENT_LOG_SAMPLE_RATE', '0.01'))
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true') == 'true'
+DEBUG = os.environ.get('LOG_LEVEL', '').lower() == 'debug'
+
+_START_KEY = 'shelcaster_started_at'
+# EMF accepts at most 100 values per metric per line.
+MAX_VALUES = 100
+
+
+class _Recorder:
+    """Spans for the current invocation; fan-out threads record here too"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def record(self, service, operation, latency_ms, retries=0, error_code=None, attempts=None):
+        """Add one span; ``attempts`` defaults to one plus the retries"""
+        with self._lock:
+            span = self._spans.get((service, operation))
+            if span is None:
+                span = self._spans[(service, operation)] = {
+                    'latencies': [], 'attempts': 0, 'retries': 0, 'errors': 0, 'error_codes': set()
+                }
+            span['latencies'].append(round(latency_ms, 3))
+            span['attempts'] += retries + 1 if attempts is None else attempts
+            span['retries'] += retries
+            if error_code:
+                span['errors'] += 1
+                span['error_codes'].add(error_code)
+
+    def drain(self):
+        with self._lock:
+            spans, self._spans = self._spans, {}
+        return spans
+
+
+recorder = _Recorder()
+# Whether this invocation was picked for the event log
+_sampled = False
+# Attempt number of the guarded call running on this thread (resilience)
+_attempts = threading.local()
+
+
+@contextmanager
+def guarded_attempt(attempt):
+    """Count the AWS calls made inside as attempt ``attempt`` (1-based) of a guarded call"""
+    previous = getattr(_attempts, 'current', 1)
+    _attempts.current = attempt
+    try:
+        yield
+    finally:
+        _attempts.current = previous
+
+
+def _guard_retries():
+    """1 if the call on this thread is a guard's retry, else 0"""
+    return 1 if getattr(_attempts, 'current', 1) > 1 else 0
+
+
+def _before_parameter_build(model, context, **kwargs):
+    context[_START_KEY] = time.perf_counter()
+
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    started = context.pop(_START_KEY, None)
+    if started is None:
+        return
+    metadata = parsed.get('ResponseMetadata', {}) if isinstance(parsed, dict) else {}
+    error_code = None
+    if http_response is not None and getattr(http_response, 'status_code', 200) >= 300:
+        error_code = parsed.get('Error', {}).get('Code', str(http_response.status_code))
+    recorder.record(
+        model.service_model.service_name,
+        model.name,
+        (time.perf_counter() - started) * 1000,
+        retries=metadata.get('RetryAttempts', 0) + _guard_retries(),
+        error_code=error_code
+    )
+
+
+def _after_call_error(model, context, exception, **kwargs):
+    started = context.pop(_START_KEY, None)
+    if started is None:
+        return
+    recorder.record(
+        model.service_model.service_name,
+        model.name,
+        (time.perf_counter() - started) * 1000,
+        retries=_guard_retries(),
+        error_code=type(exception).__name__
+    )
+
+
+def instrument_session(session):
+    """Attach the timing hooks to a boto3 session (before clients are built)"""
+    # Not before-call: a handler that short-circuits it (Stubber, local
+    # fakes) would run first and the span would never start.
+    session.events.register('before-parameter-build', _before_parameter_build)
+    session.events.register('after-call', _after_call)
+    session.events.register('after-call-error', _after_call_error)
+
+
+@contextmanager
+def span(name, service='handler'):
+    """Time a block of our own code as a span"""
+    started = time.perf_counter()
+    error_code = None
+    try:
+        yield
+    except Exception as error:
+        error_code = type(error).__name__
+        raise
+    finally:
+        recorder.record(service, name, (time.perf_counter() - started) * 1000, error_code=error_code)
+
+
+def log_event(event):
+    """Log the incoming event for a sample of invocations only"""
+    global _sampled
+    _sampled = DEBUG or random.random() < EVENT_LOG_SAMPLE_RATE
+    log_sampled('Event', event)
+
+
+def log_sampled(label, value):
+    """Dump ``value`` only in the invocations whose event is logged"""
+    if _sampled:
+        print(f'{label}:', json.dumps(value, default=str))
+
+
+def emit_metrics(function_name, spans):
+    """Print one EMF line per service/operation"""
+    timestamp = int(time.time() * 1000)
+    for (service, operation), data in sorted(spans.items()):
+        line = {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Function', 'Service', 'Operation'], ['Service', 'Operation']],
+                    'Metrics': [
+                        {'Name': 'Latency', 'Unit': 'Milliseconds'},
+                        {'Name': 'Attempts', 'Unit': 'Count'},
+                        {'Name': 'Retries', 'Unit': 'Count'},
+                        {'Name': 'Errors', 'Unit': 'Count'}
+                    ]
+                }]
+            },
+            'Function': function_name,
+            'Service': service,
+            'Operation': operation,
+            'Latency': data['latencies'][:MAX_VALUES],
+            'Attempts': data['attempts'],
+            'Retries': data['retries'],
+            'Errors': data['errors']
+        }
+        if data['error_codes']:
+            line['ErrorCodes'] = sorted(data['error_codes'])
+        print(json.dumps(line, separators=(',', ':')))
+
+
+def traced_handler(handler):
+    """Decorator for ``lambda_handler``: sampled event log + EMF spans"""
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        function_name = getattr(context, 'function_name', None) or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+        recorder.drain()
+        log_event(event)
+        started = time.perf_counter()
+        status = None
+        try:
+            response = handler(event, context)
+            if isinstance(response, dict):
+                status = response.get('statusCode')
+            return response
+        finally:
+            error_code = str(status) if status and status >= 500 else None
+            recorder.record('handler', 'Invocation', (time.perf_counter() - started) * 1000, error_code=error_code)
+            if METRICS_ENABLED:
+                emit_metrics(function_name, recorder.drain())
+    return wrapper
@@ -0,0 +1,144 @@
+"""Stage attribute changes during a request and flush them in one write.
+
+A handler stages ``SET``/``REMOVE`` actions (and optional conditions) per
+item as it goes, then calls ``flush()`` once. One item becomes a single
+conditional ``UpdateItem``; several items become one ``TransactWriteItems``
+so no other invocation ever observes a half-applied request.
+"""
+from collections import OrderedDict
+
+from shelcaster_common.session import TABLE_NAME
+
+MAX_TRANSACT_ITEMS = 100
+
+
+class _StagedItem:
+    __slots__ = ('key', 'sets', 'removes', 'conditions', 'delete')
+
+    def __init__(self, key):
+        self.key = key
+        self.sets = OrderedDict()
+        self.removes = []
+        self.conditions = []
+        self.delete = False
+
+
+class WriteBatch:
+    """Accumulates writes keyed by item; nothing is sent until ``flush``"""
+
+    def __init__(self, dynamodb, table_name=TABLE_NAME):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self._items = OrderedDict()
+
+    def _item(self, key):
+        ident = (key['pk']['S'], key['sk']['S'])
+        staged = self._items.get(ident)
+        if staged is None:
+            staged = self._items[ident] = _StagedItem(key)
+        return staged
+
+    def set(self, key, path, value):
+        """Stage ``SET path = value``; ``value`` is an AttributeValue, later sets win"""
+        self._item(key).sets[path] = value
+        return self
+
+    def remove(self, key, path):
+        self._item(key).removes.append(path)
+        return self
+
+    def delete(self, key):
+        self._item(key).delete = True
+        return self
+
+    def condition(self, key, expression, values=None, names=None):
+        """Add a condition expression for an item.
+
+        Placeholders must not collide with the generated ``#n<n>``/``:v<n>``
+        names used for staged paths and values.
+        """
+        self._item(key).conditions.append((expression, values or {}, names or {}))
+        return self
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def _expression(self, staged):
+        names = {}
+        values = {}
+
+        def name_ref(path):
+            parts = []
+            for part in path.split('.'):
+                placeholder = f'#n{len(names)}'
+                for existing, name in names.items():
+                    if name == part:
+                        placeholder = existing
+                        break
+                else:
+                    names[placeholder] = part
+                parts.append(placeholder)
+            return '.'.join(parts)
+
+        clauses = []
+        if staged.sets:
+            assignments = []
+            for index, (path, value) in enumerate(staged.sets.items()):
+                placeholder = f':v{index}'
+                values[placeholder] = value
+                assignments.append(f'{name_ref(path)} = {placeholder}')
+            clauses.append('SET ' + ', '.join(assignments))
+        if staged.removes:
+            clauses.append('REMOVE ' + ', '.join(name_ref(path) for path in staged.removes))
+
+        request = {'TableName': self.table_name, 'Key': staged.key}
+        if clauses:
+            request['UpdateExpression'] = ' '.join(clauses)
+        if staged.conditions:
+            request['ConditionExpression'] = ' AND '.join(f'({expr})' for expr, _, _ in staged.conditions)
+            for _, condition_values, condition_names in staged.conditions:
+                values.update(condition_values)
+                names.update(condition_names)
+        if names:
+            request['ExpressionAttributeNames'] = names
+        if values:
+            request['ExpressionAttributeValues'] = values
+        return request
+
+    def flush(self):
+        """Send everything staged as one request; returns the number of items written"""
+        staged_items = list(self._items.values())
+        self._items.clear()
+        if not staged_items:
+            return 0
+
+        if len(staged_items) == 1:
+            staged = staged_items[0]
+            request = self._expression(staged)
+            if 'UpdateExpression' not in request and not staged.delete:
+                return 0  # a condition with nothing to guard
+            if staged.delete:
+                request.pop('UpdateExpression', None)
+                self.dynamodb.delete_item(**request)
+            else:
+                self.dynamodb.update_item(**request)
+            return 1
+
+        if len(staged_items) > MAX_TRANSACT_ITEMS:
+            raise ValueError(f'Cannot write {len(staged_items)} items in one transaction')
+
+        transact_items = []
+        for staged in staged_items:
+            request = self._expression(staged)
+            if staged.delete:
+                request.pop('UpdateExpression', None)
+                transact_items.append({'Delete': request})
+            elif 'UpdateExpression' not in request:
+                transact_items.append({'ConditionCheck': request})
+            else:
+                transact_items.append({'Update': request})
+        self.dynamodb.transact_write_items(TransactItems=transact_items)
+        return len(staged_items)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Import-time and first-invocation benchmark for the Python Lambdas.
+
+Every run starts a fresh interpreter per function, so module imports and
+client construction are measured exactly as a cold container pays them.
+AWS calls are answered in-process with empty responses, so no credentials
+or network are needed and only our own code is on the clock.
+
+    python scripts/bench_cold_start.py --runs 10
+    python scripts/bench_cold_start.py --save bench/cold-start.json
+    python scripts/bench_cold_start.py --baseline bench/cold-start.json --threshold 0.2
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER_DIR = os.path.join(REPO_ROOT, 'lambda-layer', 'python')
+
+DEFAULT_EVENT = {'pathParameters': {'sessionId': 'bench-cold-start'}}
+# Events that take each function down its cheapest realistic path.
+FUNCTION_EVENTS = {
+    'shelcaster-channel-reaper-py': {'dryRun': True},
+    'shelcaster-bulk-stop-streaming-py': {'body': json.dumps({'sessionIds': ['bench-cold-start']})},
+    'shelcaster-medialive-pool-py': {'size': 0},
+    'shelcaster-reconcile-recording-py': {'body': json.dumps({'sessionIds': ['bench-cold-start']})},
+    'shelcaster-finalize-recording-py': {'sessionId': 'bench-cold-start', 'actionName': 'recording-start-bench-cold-start-0'},
+    'shelcaster-index-recording-py': {'sessionId': 'bench-cold-start'},
+    'shelcaster-prewarm-channels-py': {'dryRun': True},
+    'shelcaster-sync-channel-state-py': {
+        'id': 'bench-cold-start',
+        'detail-type': 'MediaLive Channel State Change',
+        'source': 'aws.medialive',
+        'time': '2026-01-01T00:00:00Z',
+        'detail': {'channel_arn': 'arn:aws:medialive:us-east-1:000000000000:channel:bench', 'state': 'RUNNING'}
+    }
+}
+
+METRICS = ('import_ms', 'session_ms', 'first_invoke_ms', 'warm_invoke_ms')
+
+
+class FakeContext:
+    function_name = 'bench'
+    aws_request_id = 'bench'
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+def child(function_dir):
+    """Runs inside the fresh interpreter; prints one JSON result line"""
+    sys.path[:0] = [LAYER_DIR, os.path.join(REPO_ROOT, function_dir)]
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    event = FUNCTION_EVENTS.get(function_dir, DEFAULT_EVENT)
+    modules_before = len(sys.modules)
+
+    started = time.perf_counter()
+    import lambda_function
+    imported = time.perf_counter()
+    boto3_at_import = 'boto3' in sys.modules
+
+    from botocore.awsrequest import AWSResponse
+    from shelcaster_common import clients
+
+    def canned_response(**kwargs):
+        return AWSResponse(None, 200, {}, None), {}
+
+    clients.get_session().events.register('before-call', canned_response)
+    session_ready = time.perf_counter()
+
+    devnull = open(os.devnull, 'w')
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        first_started = time.perf_counter()
+        first = lambda_function.lambda_handler(event, FakeContext())
+        first_done = time.perf_counter()
+        lambda_function.lambda_handler(event, FakeContext())
+        warm_done = time.perf_counter()
+    finally:
+        sys.stdout = stdout
+
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'session_ms': (session_ready - imported) * 1000,
+        'first_invoke_ms': (first_done - first_started) * 1000,
+        'warm_invoke_ms': (warm_done - first_done) * 1000,
+        'modules_at_import': len(sys.modules) - modules_before,
+        'boto3_at_import': boto3_at_import,
+        'status': (first or {}).get('statusCode')
+    }))
+
+
+def discover():
+    return sorted(
+        os.path.basename(os.path.dirname(path))
+        for path in glob.glob(os.path.join(REPO_ROOT, '*-py', 'lambda_function.py'))
+    )
+
+
+def run_function(function_dir, runs):
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', function_dir],
+            capture_output=True, text=True, cwd=REPO_ROOT
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f'{function_dir} failed:\n{result.stderr}')
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    summary = {metric: statistics.median(s[metric] for s in samples) for metric in METRICS}
+    summary['modules_at_import'] = samples[-1]['modules_at_import']
+    summary['boto3_at_import'] = samples[-1]['boto3_at_import']
+    summary['status'] = samples[-1]['status']
+    return summary
+
+
+def compare(results, baseline, threshold):
+    """Names of (function, metric) pairs slower than baseline by more than threshold"""
+    regressions = []
+    for function_dir, summary in results.items():
+        previous = baseline.get(function_dir)
+        if not previous:
+            continue
+        for metric in METRICS:
+            before = previous.get(metric)
+            if before and summary[metric] > before * (1 + threshold):
+                regressions.append((function_dir, metric, before, summary[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('functions', nargs='*', help='function directories (default: all *-py)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--save', help='write results JSON here')
+    parser.add_argument('--baseline', help='compare against a saved results JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown vs baseline (0.2 = 20%%)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    results = {}
+    print(f"{'function':40} {'import':>9} {'session':>9} {'1st call':>9} {'warm':>9}  boto3@import")
+    for function_dir in args.functions or discover():
+        summary = run_function(function_dir, args.runs)
+        results[function_dir] = summary
+        print(f"{function_dir:40} {summary['import_ms']:8.1f}ms {summary['session_ms']:8.1f}ms "
+              f"{summary['first_invoke_ms']:8.1f}ms {summary['warm_invoke_ms']:8.1f}ms  {summary['boto3_at_import']}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for function_dir, metric, before, after in regressions:
+            print(f'REGRESSION {function_dir} {metric}: {before:.1f}ms -> {after:.1f}ms')
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""Offline latency/throughput benchmark for the Python Lambda handlers.
+
+Drives each handler's ``lambda_handler`` against realistic session
+fixtures with AWS answered by ``fakeaws.FakeAws``, which injects
+per-operation latency, throttling and errors. Reports p50/p95/p99
+latency, throughput, AWS calls per invocation and allocations, so
+concurrency, caching and batching changes can be compared on a plain box.
+
+    python scripts/bench_handlers.py
+    python scripts/bench_handlers.py --iterations 200 --concurrency 8
+    python scripts/bench_handlers.py --latency medialive.StartChannel=400 --throttle-rate 0.05
+    python scripts/bench_handlers.py start-streaming/warm --throttle-rate 0.3 --call-budget 10/20
+    python scripts/bench_handlers.py --save bench/handlers.json
+    python scripts/bench_handlers.py --baseline bench/handlers.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda-layer', 'python'))
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+os.environ.setdefault('EVENT_LOG_SAMPLE_RATE', '0')
+os.environ.setdefault('READINESS_INITIAL_INTERVAL', '0.01')
+
+from fakeaws import FakeAws  # noqa: E402
+from shelcaster_common import clients, resilience  # noqa: E402
+from shelcaster_common.finalize import S3_BUCKET, recording_prefix  # noqa: E402
+from shelcaster_common.prewarm import air_day, format_time, prewarm_attribute  # noqa: E402
+from shelcaster_common.profiles import get_profile  # noqa: E402
+from shelcaster_common.readiness import encode_status_token  # noqa: E402
+from shelcaster_common.session import SESSION_CACHE  # noqa: E402
+
+# Rough us-east-1 control-plane latencies; override with --latency.
+DEFAULT_LATENCY_MS = {
+    'dynamodb.*': (6, 3),
+    'medialive.*': (120, 40),
+    'medialive.CreateChannel': (900, 200),
+    'medialive.CreateInput': (250, 50),
+    'ivs.*': (90, 30),
+    'lambda.*': (25, 10)
+}
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+class FakeContext:
+    function_name = 'bench'
+    aws_request_id = 'bench'
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+def session_item(session_id, channel=True, recording=False, ivs=True, stopped=False):
+    """A session#<id>/info item shaped like the ones create-session writes"""
+    item = {
+        'pk': {'S': f'session#{session_id}'},
+        'sk': {'S': 'info'},
+        'entityType': {'S': 'liveSession'},
+        'sessionId': {'S': session_id},
+        'hostUserId': {'S': 'bench-host'},
+        'showId': {'S': 'bench-show'},
+        'status': {'S': 'ACTIVE'},
+        'streaming': {'M': {'isLive': {'BOOL': False}}},
+        'recording': {'M': {'isRecording': {'BOOL': recording}}},
+        'programState': {'M': {
+            'activeVideoSource': {'S': 'host'},
+            'audioLevels': {'M': {'host': {'N': '1.0'}}},
+            'overlayImageS3Key': {'NULL': True}
+        }},
+        'participants': {'M': {'callers': {'L': [
+            {'M': {'participantId': {'S': f'caller-{n}'}, 'name': {'S': f'Caller {n}'}}} for n in range(8)
+        ]}}},
+        'updatedAt': {'S': '2026-01-01T00:00:00'}
+    }
+    if ivs:
+        item['ivs'] = {'M': {
+            'programIngestEndpoint': {'S': 'bench.global-contribute.live-video.net'},
+            'programChannelArn': {'S': 'arn:aws:ivs:us-east-1:000000000000:channel/bench'},
+            'programPlaybackUrl': {'S': 'https://bench.playback.live-video.net/api/video/v1/bench.m3u8'}
+        }}
+    if channel:
+        item['mediaLive'] = {'M': {
+            'channelId': {'S': f'ch-{session_id}'},
+            'inputId': {'S': f'in-{session_id}'},
+            'rtmpUrl': {'S': f'rtmp://198.51.100.10:1935/host/{session_id}'},
+            'profile': {'S': get_profile().name},
+            'specHash': {'S': get_profile().spec_hash}
+        }}
+        item['mediaLiveChannelId'] = {'S': f'ch-{session_id}'}
+    if recording:
+        item['recording']['M']['actionName'] = {'S': f'recording-start-{session_id}-0'}
+        item['recording']['M']['startedAt'] = {'S': '2024-01-01T00:00:00'}
+    if stopped:
+        item['recording']['M']['actionName'] = {'S': f'recording-start-{session_id}-0'}
+        item['recording']['M']['startedAt'] = {'S': RECORDING_START}
+        item['recording']['M']['stoppedAt'] = {'S': RECORDING_STOP}
+    return item
+
+
+RECORDING_START = '2024-01-01T00:00:00'
+RECORDING_STOP = '2024-01-01T00:01:00'
+SEGMENT_BYTES = 96 * 1024
+
+
+def seed_recording(fake, session_id):
+    """HLS output of a one-minute recording (plus segments either side) on the fake S3"""
+    prefix = recording_prefix(session_id)
+    started = datetime.fromisoformat(RECORDING_START).replace(tzinfo=timezone.utc).timestamp()
+    segment_seconds = 6
+    fake.put_object(S3_BUCKET, f'{prefix}index.m3u8', (
+        '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=5128000,RESOLUTION=1920x1080\nindex_recording.m3u8\n'
+    ).encode())
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:6', '#EXT-X-MEDIA-SEQUENCE:9']
+    for sequence in range(1, 15):
+        name = f'index_recording_{sequence:05d}.ts'
+        body = bytes([sequence]) * SEGMENT_BYTES
+        fake.put_object(S3_BUCKET, f'{prefix}{name}', body, modified=started + (sequence - 2) * segment_seconds)
+        if sequence >= 9:
+            lines += ['#EXTINF:6,', name]
+    fake.put_object(S3_BUCKET, f'{prefix}index_recording.m3u8', ('\n'.join(lines) + '\n').encode())
+
+
+def seed_schedule(fake, session_id):
+    """Shows airing soon: one due a start, one prewarmed and starting, one with no session yet"""
+    now = time.time()
+    shows = (
+        (session_id, now + 60, None),
+        (f'{session_id}-0', now + 30, now - 90),
+        (None, now + 600, None)
+    )
+    for n, (show_session, air_time, requested_at) in enumerate(shows):
+        show_id = f'{session_id}-show-{n}'
+        air = format_time(air_time)
+        item = {
+            'pk': {'S': f'show#{show_id}'},
+            'sk': {'S': 'info'},
+            'entityType': {'S': 'show'},
+            'status': {'S': 'scheduled'},
+            'airTime': {'S': air},
+            'airDay': {'S': air_day(air_time)}
+        }
+        if show_session:
+            item['currentSessionId'] = {'S': show_session}
+            session = session_item(show_session)
+            session['showId'] = {'S': show_id}
+            if requested_at:
+                session['mediaLive']['M']['prewarm'] = prewarm_attribute(
+                    show_id, air_time, 120, datetime.utcfromtimestamp(requested_at).isoformat()
+                )
+            fake.put_item(session)
+        fake.put_item(item)
+
+
+def channel_state_batch(session_id):
+    """SQS batch of the session channel's start-up events, the last one redelivered"""
+    channel_arn = f'arn:aws:medialive:us-east-1:000000000000:channel:ch-{session_id}'
+    events = [
+        {
+            'version': '0',
+            'id': f'{session_id}-{state.lower()}',
+            'detail-type': 'MediaLive Channel State Change',
+            'source': 'aws.medialive',
+            'time': at,
+            'resources': [channel_arn],
+            'detail': {'channel_arn': channel_arn, 'state': state, 'pipelines_running_count': pipelines}
+        }
+        for state, at, pipelines in (('STARTING', '2026-01-01T00:00:05Z', 0), ('RUNNING', '2026-01-01T00:01:30Z', 1))
+    ]
+    events.append(events[-1])
+    return {'Records': [
+        {'messageId': f'{session_id}-{n}', 'body': json.dumps(event)} for n, event in enumerate(events)
+    ]}
+
+
+def path_event(session_id, **query):
+    event = {'pathParameters': {'sessionId': session_id}}
+    if query:
+        event['queryStringParameters'] = query
+    return event
+
+
+def status_token_event(session_id):
+    """Poll of the status token start-streaming hands out for the session's channel"""
+    return path_event(session_id, token=encode_status_token(session_id, f'ch-{session_id}'))
+
+
+# name -> (function dir, fixture kwargs, event builder)
+SCENARIOS = {
+    'start-streaming/warm': ('shelcaster-start-streaming-py', {}, path_event),
+    'start-streaming/cold': ('shelcaster-start-streaming-py', {'channel': False}, path_event),
+    'start-streaming/wait': ('shelcaster-start-streaming-py', {}, lambda sid: path_event(sid, mode='wait')),
+    'start-streaming/cold-abr': (
+        'shelcaster-start-streaming-py', {'channel': False},
+        lambda sid: {**path_event(sid), 'body': json.dumps({'input': {'width': 1280, 'height': 720, 'bitrate': 4000000}})}
+    ),
+    'stop-streaming': ('shelcaster-stop-streaming-py', {}, path_event),
+    'start-recording': ('shelcaster-start-recording-py', {}, path_event),
+    'stop-recording': ('shelcaster-stop-recording-py', {'recording': True}, path_event),
+    'create-medialive/reuse': ('shelcaster-create-medialive-py', {}, path_event),
+    'create-medialive/new': ('shelcaster-create-medialive-py', {'channel': False}, path_event),
+    'bulk-stop/25': (
+        'shelcaster-bulk-stop-streaming-py', {},
+        lambda sid: {'body': json.dumps({'sessionIds': [f'{sid}-{n}' for n in range(25)]})}
+    ),
+    'channel-reaper': ('shelcaster-channel-reaper-py', {}, lambda sid: {'dryRun': True}),
+    'reconcile-recording/25': (
+        'shelcaster-reconcile-recording-py', {'recording': True},
+        lambda sid: {'body': json.dumps({'sessionIds': [f'{sid}-{n}' for n in range(25)]})}
+    ),
+    'finalize-recording': (
+        'shelcaster-finalize-recording-py', {'stopped': True},
+        lambda sid: {'sessionId': sid, 'actionName': f'recording-start-{sid}-0'}
+    ),
+    'index-recording': (
+        'shelcaster-index-recording-py', {'recording': True},
+        lambda sid: {'Records': [{'s3': {
+            'bucket': {'name': S3_BUCKET},
+            'object': {'key': f'{recording_prefix(sid)}index_recording.m3u8'}
+        }}]}
+    ),
+    'create-clip': (
+        'shelcaster-create-clip-py', {'stopped': True},
+        lambda sid: {'pathParameters': {'sessionId': sid}, 'body': json.dumps({'start': 10, 'end': 40})}
+    ),
+    'start-streaming/prewarm': (
+        'shelcaster-start-streaming-py', {},
+        lambda sid: {**path_event(sid, mode='prewarm'), 'body': json.dumps({'prewarm': {
+            'showId': 'bench-show', 'airTime': format_time(time.time() + 120), 'leadSeconds': 120
+        }})}
+    ),
+    'prewarm-channels': ('shelcaster-prewarm-channels-py', {}, lambda sid: {}),
+    'sync-channel-state': ('shelcaster-sync-channel-state-py', {}, channel_state_batch),
+    'streaming-status/token': ('shelcaster-streaming-status-py', {}, status_token_event),
+    'streaming-status/session': ('shelcaster-streaming-status-py', {}, path_event)
+}
+
+# name -> per-session setup beyond the DynamoDB fixture
+SCENARIO_SETUP = {
+    'finalize-recording': seed_recording,
+    'index-recording': seed_recording,
+    'create-clip': seed_recording,
+    'prewarm-channels': seed_schedule
+}
+
+_modules = {}
+
+
+def load_handler(function_dir):
+    """Import a function's lambda_function.py under a unique module name"""
+    if function_dir not in _modules:
+        path = os.path.join(REPO_ROOT, function_dir, 'lambda_function.py')
+        spec = importlib.util.spec_from_file_location(f"bench_{function_dir.replace('-', '_')}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[function_dir] = module
+    return _modules[function_dir].lambda_handler
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(name, fake, iterations, concurrency, use_cache):
+    function_dir, fixture, make_event = SCENARIOS[name]
+    handler = load_handler(function_dir)
+
+    session_ids = [f'bench-{name.replace("/", "-")}-{n}' for n in range(max(concurrency, 1) * 4)]
+    for session_id in session_ids:
+        for n in [None] + list(range(25)):
+            fake.put_item(session_item(session_id if n is None else f'{session_id}-{n}', **fixture))
+        if name in SCENARIO_SETUP:
+            SCENARIO_SETUP[name](fake, session_id)
+
+    resilience.reset_guards()
+
+    def invoke(index):
+        if not use_cache:
+            SESSION_CACHE.clear()
+        event = make_event(session_ids[index % len(session_ids)])
+        started = time.perf_counter()
+        response = handler(event, FakeContext())
+        return (time.perf_counter() - started) * 1000, response.get('statusCode') if isinstance(response, dict) else None
+
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        # Warm-up builds clients and caches, like a warm container.
+        invoke(0)
+        fake.calls.clear()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(invoke, range(iterations)))
+        elapsed = time.perf_counter() - started
+        aws_calls = sum(fake.calls.values())
+        calls_by_op = dict(fake.calls)
+
+        tracemalloc.start()
+        snapshot = tracemalloc.take_snapshot()
+        sample = min(iterations, 10)
+        for index in range(sample):
+            invoke(index)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated = sum(
+            stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, 'filename') if stat.count_diff > 0
+        )
+        tracemalloc.stop()
+
+    latencies = sorted(latency for latency, _ in outcomes)
+    statuses = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': statistics.fmean(latencies),
+        'throughput_rps': iterations / elapsed if elapsed else 0.0,
+        'aws_calls_per_invocation': aws_calls / iterations,
+        'aws_calls': calls_by_op,
+        'net_alloc_blocks_per_invocation': allocated / sample,
+        'peak_kib': peak / 1024,
+        'statuses': statuses
+    }
+
+
+def parse_latency(values):
+    overrides = {}
+    for value in values:
+        operation, _, millis = value.partition('=')
+        latency, _, jitter = millis.partition('/')
+        overrides[operation] = (float(latency), float(jitter or 0))
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', help=f"default: all of {', '.join(SCENARIOS)}")
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', action='append', default=[], metavar='SERVICE.Op=MS[/JITTER]')
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--no-latency', action='store_true', help='measure handler overhead only')
+    parser.add_argument('--no-cache', action='store_true', help='clear the session cache before each call')
+    parser.add_argument('--call-budget', metavar='RATE/BURST',
+                        help='resilience guard budget per service (default: unlimited, as one process stands in for many containers)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save')
+    parser.add_argument('--baseline')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.call_budget:
+        rate, _, burst = args.call_budget.partition('/')
+        budget = (float(rate), int(burst or max(1, int(float(rate) * 2))))
+    else:
+        budget = (1e9, 10 ** 9)
+    resilience.SERVICE_BUDGETS.clear()
+    resilience.DEFAULT_BUDGET = budget
+
+    s3_root = tempfile.mkdtemp(prefix='bench-s3-')
+    fake = FakeAws(seed=args.seed, s3_root=s3_root)
+    latency = {} if args.no_latency else dict(DEFAULT_LATENCY_MS)
+    latency.update(parse_latency(args.latency))
+    for operation in set(latency) | {'*'}:
+        latency_ms, jitter_ms = latency.get(operation, (0, 0))
+        fake.configure(
+            operation, latency_ms=latency_ms, jitter_ms=jitter_ms,
+            throttle_rate=args.throttle_rate, error_rate=args.error_rate
+        )
+    clients.reset_clients()
+    fake.install(clients.get_session())
+
+    results = {}
+    print(f"{'scenario':26} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>8} {'calls':>6} {'allocs':>8}  statuses")
+    for name in args.scenarios or SCENARIOS:
+        result = run_scenario(name, fake, args.iterations, args.concurrency, not args.no_cache)
+        results[name] = result
+        print(f"{name:26} {result['p50_ms']:7.1f}ms {result['p95_ms']:7.1f}ms {result['p99_ms']:7.1f}ms "
+              f"{result['throughput_rps']:8.1f} {result['aws_calls_per_invocation']:6.1f} "
+              f"{result['net_alloc_blocks_per_invocation']:8.0f}  {result['statuses']}")
+
+    shutil.rmtree(s3_root, ignore_errors=True)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, result in results.items():
+            for metric in METRICS:
+                before = baseline.get(name, {}).get(metric)
+                if before and result[metric] > before * (1 + args.threshold):
+                    regressions.append(f'{name} {metric}: {before:.1f}ms -> {result[metric]:.1f}ms')
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,790 @@
+"""In-process AWS stand-in for benchmarking and running the Python Lambdas locally.
+
+``FakeAws.install(session)`` registers a ``before-call`` handler on a boto3
+session, so every client built from it is answered here instead of over
+the network. Each operation can be given latency, jitter, throttling and
+error rates. DynamoDB items live in ``items``: writes are applied,
+condition and update expressions are evaluated (paths, comparisons,
+``BETWEEN``, the attribute/``begins_with`` functions, ``SET``/``REMOVE``/
+``ADD``), and a failed condition answers ``ConditionalCheckFailedException``
+or ``TransactionCanceledException`` with its ``CancellationReasons``
+(``record_writes=True`` also keeps the requests in ``writes`` for inspection).
+
+S3 is backed by a directory (``FakeAws(s3_root=...)``): objects live at
+``<root>/<bucket>/<key>`` with the file mtime as LastModified, ranged GETs,
+multipart uploads and conditional puts work, so recording tools run
+against real bytes.
+"""
+import copy
+import functools
+import hashlib
+import io
+import itertools
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+
+class OperationProfile:
+    __slots__ = ('latency_ms', 'jitter_ms', 'throttle_rate', 'error_rate', 'error_code')
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, throttle_rate=0.0, error_rate=0.0, error_code='InternalServerErrorException'):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.error_code = error_code
+
+
+THROTTLE_CODES = {
+    'dynamodb': 'ProvisionedThroughputExceededException',
+    'medialive': 'TooManyRequestsException',
+    'ivs': 'ThrottlingException',
+    'lambda': 'TooManyRequestsException',
+    's3': 'SlowDown'
+}
+
+DYNAMODB_WRITES = ('PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems')
+
+
+class ConditionFailed(Exception):
+    pass
+
+
+class InvalidExpression(Exception):
+    pass
+
+
+_TOKEN = re.compile(r'\s*(<>|<=|>=|[=<>(),.+\-\[\]]|[#:]?[A-Za-z_][A-Za-z0-9_]*|\d+)')
+_CLAUSES = ('SET', 'REMOVE', 'ADD', 'DELETE')
+
+
+@functools.lru_cache(maxsize=256)
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise InvalidExpression(f'Invalid expression near {expression[position:]!r}')
+        tokens.append(match.group(1))
+        position = match.end()
+    return tuple(tokens)
+
+
+def _number(value):
+    return Decimal(value['N'])
+
+
+def _compare(left, operator, right):
+    if left is None or right is None:
+        return operator == '<>' and left != right
+    if operator == '=':
+        return left == right
+    if operator == '<>':
+        return left != right
+    (left_type, left_value), = left.items()
+    (right_type, right_value), = right.items()
+    if left_type != right_type or left_type not in ('S', 'N', 'B'):
+        return False
+    if left_type == 'N':
+        left_value, right_value = Decimal(left_value), Decimal(right_value)
+    return {
+        '<': left_value < right_value,
+        '<=': left_value <= right_value,
+        '>': left_value > right_value,
+        '>=': left_value >= right_value
+    }[operator]
+
+
+class _Expression:
+    """Recursive-descent reader for one condition, key condition or update expression"""
+
+    def __init__(self, expression, names, values):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def keyword(self, *words):
+        token = self.peek()
+        return token is not None and token.upper() in words
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected):
+            raise InvalidExpression(f'Expected {expected or "a token"}, found {token!r}')
+        self.position += 1
+        return token
+
+    def done(self):
+        if self.peek() is not None:
+            raise InvalidExpression(f'Unexpected {self.peek()!r}')
+
+    # -- operands
+
+    def path(self):
+        parts = [self.name()]
+        while self.peek() in ('.', '['):
+            if self.take() == '.':
+                parts.append(self.name())
+            else:
+                parts.append(int(self.take()))
+                self.take(']')
+        return parts
+
+    def name(self):
+        token = self.take()
+        if token.startswith('#'):
+            if token not in self.names:
+                raise InvalidExpression(f'Unknown attribute name {token}')
+            return self.names[token]
+        if token.startswith(':') or not (token[0].isalpha() or token[0] == '_'):
+            raise InvalidExpression(f'Expected an attribute name, found {token!r}')
+        return token
+
+    def value(self):
+        token = self.take()
+        if token not in self.values:
+            raise InvalidExpression(f'Unknown attribute value {token}')
+        return self.values[token]
+
+    def operand(self, item):
+        if (self.peek() or '').startswith(':'):
+            return self.value()
+        if self.keyword('SIZE') and self.peek(1) == '(':
+            self.take()
+            self.take('(')
+            found = _resolve(item, self.path())
+            self.take(')')
+            if found is None:
+                return None
+            (_, inner), = found.items()
+            return {'N': str(len(inner))}
+        return _resolve(item, self.path())
+
+    # -- conditions
+
+    def condition(self, item):
+        result = self.conjunction(item)
+        while self.keyword('OR'):
+            self.take()
+            result = self.conjunction(item) or result
+        return result
+
+    def conjunction(self, item):
+        result = self.negation(item)
+        while self.keyword('AND'):
+            self.take()
+            result = self.negation(item) and result
+        return result
+
+    def negation(self, item):
+        if self.keyword('NOT'):
+            self.take()
+            return not self.negation(item)
+        return self.predicate(item)
+
+    def predicate(self, item):
+        if self.peek() == '(':
+            self.take()
+            result = self.condition(item)
+            self.take(')')
+            return result
+        function = (self.peek() or '').lower()
+        if self.peek(1) == '(' and function in ('attribute_exists', 'attribute_not_exists', 'begins_with', 'contains'):
+            self.take()
+            self.take('(')
+            found = _resolve(item, self.path())
+            if function in ('begins_with', 'contains'):
+                self.take(',')
+                operand = self.operand(item)
+            self.take(')')
+            if function == 'attribute_exists':
+                return found is not None
+            if function == 'attribute_not_exists':
+                return found is None
+            if found is None or operand is None:
+                return False
+            (kind, inner), = found.items()
+            (_, wanted), = operand.items()
+            if function == 'begins_with':
+                return kind == 'S' and inner.startswith(wanted)
+            return wanted in inner
+        left = self.operand(item)
+        if self.keyword('BETWEEN'):
+            self.take()
+            low = self.operand(item)
+            self.take('AND')
+            high = self.operand(item)
+            return _compare(left, '>=', low) and _compare(left, '<=', high)
+        if self.keyword('IN'):
+            self.take()
+            self.take('(')
+            candidates = [self.operand(item)]
+            while self.peek() == ',':
+                self.take()
+                candidates.append(self.operand(item))
+            self.take(')')
+            return left is not None and left in candidates
+        operator = self.take()
+        if operator not in ('=', '<>', '<', '<=', '>', '>='):
+            raise InvalidExpression(f'Expected a comparator, found {operator!r}')
+        return _compare(left, operator, self.operand(item))
+
+    # -- updates
+
+    def update(self, item):
+        while self.peek() is not None:
+            clause = self.take().upper()
+            if clause not in _CLAUSES:
+                raise InvalidExpression(f'Unknown update clause {clause}')
+            while True:
+                if clause == 'SET':
+                    path = self.path()
+                    self.take('=')
+                    _assign(item, path, self.set_value(item))
+                elif clause == 'REMOVE':
+                    _remove(item, self.path())
+                else:
+                    path = self.path()
+                    _add(item, path, self.value(), clause == 'DELETE')
+                if self.peek() != ',':
+                    break
+                self.take()
+        return item
+
+    def set_value(self, item):
+        value = self.set_operand(item)
+        if self.peek() in ('+', '-'):
+            operator = self.take()
+            other = self.set_operand(item)
+            if value is None or other is None or 'N' not in value or 'N' not in other:
+                raise InvalidExpression('Arithmetic needs two numbers')
+            total = _number(value) + _number(other) if operator == '+' else _number(value) - _number(other)
+            value = {'N': str(total)}
+        if value is None:
+            raise InvalidExpression('The provided expression refers to an attribute that does not exist in the item')
+        return value
+
+    def set_operand(self, item):
+        function = (self.peek() or '').lower()
+        if self.peek(1) == '(' and function in ('if_not_exists', 'list_append'):
+            self.take()
+            self.take('(')
+            if function == 'if_not_exists':
+                found = _resolve(item, self.path())
+                self.take(',')
+                fallback = self.set_operand(item)
+                self.take(')')
+                return found if found is not None else fallback
+            first = self.set_operand(item)
+            self.take(',')
+            second = self.set_operand(item)
+            self.take(')')
+            return {'L': first['L'] + second['L']}
+        return self.operand(item)
+
+
+def _resolve(item, path):
+    """The AttributeValue at ``path`` (names and list indexes), or None"""
+    value = {'M': item}
+    for part in path:
+        if isinstance(part, int):
+            value = value.get('L', [])[part] if part < len(value.get('L', [])) else None
+        else:
+            value = value.get('M', {}).get(part)
+        if value is None:
+            return None
+    return value
+
+
+def _parent(item, path):
+    container = _resolve(item, path[:-1]) if len(path) > 1 else {'M': item}
+    if container is None or not ('M' in container or 'L' in container):
+        raise InvalidExpression('The document path provided in the update expression is invalid for update')
+    return container
+
+
+def _assign(item, path, value):
+    container = _parent(item, path)
+    if 'L' in container:
+        items = container['L']
+        if path[-1] >= len(items):
+            items.append(copy.deepcopy(value))
+        else:
+            items[path[-1]] = copy.deepcopy(value)
+    else:
+        container['M'][path[-1]] = copy.deepcopy(value)
+
+
+def _remove(item, path):
+    container = _resolve(item, path[:-1]) if len(path) > 1 else {'M': item}
+    if container is None:
+        return
+    if 'L' in container:
+        if path[-1] < len(container['L']):
+            del container['L'][path[-1]]
+    else:
+        container.get('M', {}).pop(path[-1], None)
+
+
+def _add(item, path, value, delete=False):
+    current = _resolve(item, path)
+    (kind, operand), = value.items()
+    if kind == 'N' and not delete:
+        total = (_number(current) if current is not None else 0) + Decimal(operand)
+        _assign(item, path, {'N': str(total)})
+    elif kind in ('SS', 'NS', 'BS'):
+        members = list(current[kind]) if current is not None else []
+        if delete:
+            members = [member for member in members if member not in operand]
+        else:
+            members += [member for member in operand if member not in members]
+        if members:
+            _assign(item, path, {kind: members})
+        else:
+            _remove(item, path)
+    else:
+        raise InvalidExpression(f'{"DELETE" if delete else "ADD"} does not support {kind}')
+
+
+def _item_key(item):
+    return item['pk']['S'], item['sk']['S']
+
+
+def evaluate_condition(expression, item, names=None, values=None):
+    """Whether ``item`` (None when absent) satisfies a condition expression"""
+    if not expression:
+        return True
+    reader = _Expression(expression, names, values)
+    result = reader.condition(item or {})
+    reader.done()
+    return result
+
+
+def apply_update(expression, item, names=None, values=None):
+    """A copy of ``item`` with an update expression applied"""
+    updated = copy.deepcopy(item)
+    reader = _Expression(expression, names, values)
+    reader.update(updated)
+    reader.done()
+    return updated
+
+
+class FakeAws:
+    def __init__(self, seed=0, s3_root=None, record_writes=False):
+        self.s3_root = s3_root
+        self.record_writes = record_writes
+        self.writes = []
+        self.items = {}
+        self._partitions = {}
+        self.channel_states = {}
+        self.schedules = {}
+        self.calls = Counter()
+        self._profiles = {}
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1000)
+        self._lock = threading.Lock()
+
+    # -- configuration -------------------------------------------------
+
+    def configure(self, operation, **settings):
+        """Set the profile for ``service.Operation``, ``service.*`` or ``*``"""
+        self._profiles[operation] = OperationProfile(**settings)
+        return self
+
+    def profile_for(self, service, operation):
+        for key in (f'{service}.{operation}', f'{service}.*', '*'):
+            if key in self._profiles:
+                return self._profiles[key]
+        return None
+
+    def put_item(self, item):
+        key = _item_key(item)
+        self.items[key] = item
+        self._partitions.setdefault(key[0], set()).add(key)
+
+    def install(self, session):
+        session.events.register('before-parameter-build', self._capture_params)
+        session.events.register('before-call', self._handle)
+        return self
+
+    # -- dispatch ------------------------------------------------------
+
+    def _capture_params(self, params, context, **kwargs):
+        # before-call only sees the serialized request; keep the API params.
+        context['fakeaws_params'] = dict(params)
+
+    def _handle(self, model, context, **kwargs):
+        params = context.get('fakeaws_params', {})
+        service = model.service_model.service_name
+        operation = model.name
+        with self._lock:
+            self.calls[f'{service}.{operation}'] += 1
+            if self.record_writes and service == 'dynamodb' and operation in DYNAMODB_WRITES:
+                self.writes.append((operation, params))
+            profile = self.profile_for(service, operation)
+            roll = self._rng.random()
+            jitter = self._rng.uniform(-1, 1)
+
+        if profile is not None:
+            delay = max(profile.latency_ms + jitter * profile.jitter_ms, 0) / 1000.0
+            if delay:
+                time.sleep(delay)
+            if roll < profile.throttle_rate:
+                return self._error(service, THROTTLE_CODES.get(service, 'ThrottlingException'), 429)
+            if roll < profile.throttle_rate + profile.error_rate:
+                return self._error(service, profile.error_code, 500)
+
+        handler = getattr(self, f'_{service}_{operation}'.replace('-', '_'), None)
+        try:
+            parsed = handler(params) if handler else {}
+        except InvalidExpression as error:
+            return self._error(service, 'ValidationException', 400, str(error))
+        if isinstance(parsed, tuple):
+            return parsed
+        parsed.setdefault('ResponseMetadata', {'HTTPStatusCode': 200, 'RetryAttempts': 0})
+        return AWSResponse(None, 200, {}, None), parsed
+
+    def _error(self, service, code, status, message=None, **extra):
+        parsed = {
+            'Error': {'Code': code, 'Message': message or f'Injected {code}'},
+            'ResponseMetadata': {'HTTPStatusCode': status, 'RetryAttempts': 0},
+            **extra
+        }
+        return AWSResponse(None, status, {}, None), parsed
+
+    def _new_id(self):
+        with self._lock:
+            return str(next(self._ids))
+
+    # -- dynamodb ------------------------------------------------------
+
+    def _dynamodb_GetItem(self, params):
+        item = self.items.get(_item_key(params['Key']))
+        return {'Item': item} if item else {}
+
+    def _dynamodb_BatchGetItem(self, params):
+        responses = {}
+        for table, request in params['RequestItems'].items():
+            responses[table] = [
+                self.items[_item_key(key)] for key in request['Keys'] if _item_key(key) in self.items
+            ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def _dynamodb_Query(self, params):
+        # Tables and indexes alike: the hash clause picks the partition, then
+        # the whole key condition and the filter are evaluated on it
+        names = params.get('ExpressionAttributeNames') or {}
+        values = params.get('ExpressionAttributeValues')
+        clause = params['KeyConditionExpression'].split(' AND ')[0]
+        name, _, placeholder = (part.strip() for part in clause.partition('='))
+        partition = values[placeholder]
+        name = names.get(name, name)
+        if name == 'pk' and 'IndexName' not in params:
+            keys = self._partitions.get(partition.get('S'), ())
+            matches = sorted((key, self.items[key]) for key in keys)
+        else:
+            matches = sorted((key, item) for key, item in self.items.items() if item.get(name) == partition)
+        items = [
+            item for _, item in matches
+            if evaluate_condition(params['KeyConditionExpression'], item, names, values)
+            and evaluate_condition(params.get('FilterExpression'), item, names, values)
+        ]
+        return {'Items': items, 'Count': len(items)}
+
+    def _dynamodb_Scan(self, params):
+        # Sparse indexes are named '<key attribute>-index'; only items carrying it
+        items = [item for _, item in sorted(self.items.items())]
+        index = params.get('IndexName')
+        if index:
+            attribute = index.rsplit('-index', 1)[0]
+            items = [item for item in items if attribute in item]
+        if params.get('FilterExpression'):
+            names = params.get('ExpressionAttributeNames')
+            values = params.get('ExpressionAttributeValues')
+            items = [item for item in items if evaluate_condition(params['FilterExpression'], item, names, values)]
+        return {'Items': items, 'Count': len(items)}
+
+    def _dynamodb_write(self, operation, request):
+        """The item ``request`` leaves behind (None to delete); raises ConditionFailed"""
+        key = request['Item'] if operation == 'Put' else request['Key']
+        current = self.items.get(_item_key(key))
+        names = request.get('ExpressionAttributeNames')
+        values = request.get('ExpressionAttributeValues')
+        if not evaluate_condition(request.get('ConditionExpression'), current, names, values):
+            raise ConditionFailed()
+        if operation == 'Put':
+            return copy.deepcopy(request['Item'])
+        if operation == 'Update':
+            return apply_update(request['UpdateExpression'], current or copy.deepcopy(request['Key']), names, values)
+        if operation == 'Delete':
+            return None
+        return current
+
+    def _dynamodb_commit(self, key, item):
+        if item is None:
+            self.items.pop(key, None)
+            self._partitions.get(key[0], set()).discard(key)
+        else:
+            self.put_item(item)
+
+    def _dynamodb_single(self, operation, params):
+        key = _item_key(params['Item'] if operation == 'Put' else params['Key'])
+        with self._lock:
+            previous = self.items.get(key)
+            try:
+                item = self._dynamodb_write(operation, params)
+            except ConditionFailed:
+                return self._error(
+                    'dynamodb', 'ConditionalCheckFailedException', 400, 'The conditional request failed'
+                )
+            self._dynamodb_commit(key, item)
+        returned = {'ALL_OLD': previous, 'ALL_NEW': item}.get(params.get('ReturnValues'))
+        return {'Attributes': returned} if returned else {}
+
+    def _dynamodb_PutItem(self, params):
+        return self._dynamodb_single('Put', params)
+
+    def _dynamodb_UpdateItem(self, params):
+        return self._dynamodb_single('Update', params)
+
+    def _dynamodb_DeleteItem(self, params):
+        return self._dynamodb_single('Delete', params)
+
+    def _dynamodb_TransactWriteItems(self, params):
+        with self._lock:
+            results = []
+            reasons = []
+            for entry in params['TransactItems']:
+                (operation, request), = entry.items()
+                try:
+                    item = self._dynamodb_write(operation, request)
+                except ConditionFailed:
+                    reasons.append({'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+                    continue
+                reasons.append({'Code': 'None'})
+                if operation != 'ConditionCheck':
+                    results.append((_item_key(request['Item'] if operation == 'Put' else request['Key']), item))
+            if any(reason['Code'] != 'None' for reason in reasons):
+                codes = ', '.join(reason['Code'] for reason in reasons)
+                return self._error(
+                    'dynamodb', 'TransactionCanceledException', 400,
+                    f'Transaction cancelled, please refer cancellation reasons for specific reasons [{codes}]',
+                    CancellationReasons=reasons
+                )
+            for key, item in results:
+                self._dynamodb_commit(key, item)
+        return {}
+
+    def _dynamodb_BatchWriteItem(self, params):
+        with self._lock:
+            for requests in params['RequestItems'].values():
+                for request in requests:
+                    if 'PutRequest' in request:
+                        item = request['PutRequest']['Item']
+                        self._dynamodb_commit(_item_key(item), copy.deepcopy(item))
+                    else:
+                        self._dynamodb_commit(_item_key(request['DeleteRequest']['Key']), None)
+        return {'UnprocessedItems': {}}
+
+    # -- medialive -----------------------------------------------------
+
+    def _medialive_CreateInput(self, params):
+        input_id = self._new_id()
+        stream = params['Destinations'][0]['StreamName']
+        return {'Input': {'Id': input_id, 'Destinations': [{'Url': f'rtmp://198.51.100.10:1935/{stream}'}]}}
+
+    def _medialive_CreateChannel(self, params):
+        channel_id = self._new_id()
+        self.channel_states[channel_id] = 'IDLE'
+        return {'Channel': {
+            'Id': channel_id,
+            'Arn': f'arn:aws:medialive:us-east-1:000000000000:channel:{channel_id}',
+            'State': 'CREATING',
+            'Tags': params.get('Tags', {})
+        }}
+
+    def _medialive_DescribeChannel(self, params):
+        channel_id = params['ChannelId']
+        return {
+            'Id': channel_id,
+            'Arn': f'arn:aws:medialive:us-east-1:000000000000:channel:{channel_id}',
+            'State': self.channel_states.get(channel_id, 'RUNNING'),
+            'Tags': {}
+        }
+
+    def _medialive_StartChannel(self, params):
+        return {'Id': params['ChannelId'], 'State': 'STARTING'}
+
+    def _medialive_StopChannel(self, params):
+        return {'Id': params['ChannelId'], 'State': 'STOPPING'}
+
+    def _medialive_UpdateChannel(self, params):
+        channel_id = params['ChannelId']
+        return {'Channel': {'Id': channel_id, 'Arn': f'arn:aws:medialive:us-east-1:000000000000:channel:{channel_id}'}}
+
+    def _medialive_ListChannels(self, params):
+        return {'Channels': [
+            {'Id': channel_id, 'State': state}
+            for channel_id, state in sorted(self.channel_states.items())
+        ]}
+
+    def _medialive_BatchUpdateSchedule(self, params):
+        with self._lock:
+            actions = self.schedules.setdefault(params['ChannelId'], {})
+            deleted = [actions.pop(name) for name in params.get('Deletes', {}).get('ActionNames', []) if name in actions]
+            created = params.get('Creates', {}).get('ScheduleActions', [])
+            for action in created:
+                actions[action['ActionName']] = action
+        return {'Creates': {'ScheduleActions': created}, 'Deletes': {'ScheduleActions': deleted}}
+
+    def _medialive_DescribeSchedule(self, params):
+        actions = list(self.schedules.get(params['ChannelId'], {}).values())
+        start = int(params.get('NextToken') or 0)
+        end = start + params.get('MaxResults', 100)
+        response = {'ScheduleActions': actions[start:end]}
+        if end < len(actions):
+            response['NextToken'] = str(end)
+        return response
+
+    # -- ivs -----------------------------------------------------------
+
+    def _ivs_CreateChannel(self, params):
+        channel_id = self._new_id()
+        return {'channel': {
+            'arn': f'arn:aws:ivs:us-east-1:000000000000:channel/{channel_id}',
+            'ingestEndpoint': f'{channel_id}.global-contribute.live-video.net'
+        }}
+
+    def _ivs_StopStream(self, params):
+        return {}
+
+    # -- s3 ------------------------------------------------------------
+
+    def _s3_path(self, bucket, key=''):
+        return os.path.join(self.s3_root, bucket, *key.split('/'))
+
+    def _s3_object(self, path, key):
+        stat = os.stat(path)
+        return {
+            'Key': key,
+            'Size': stat.st_size,
+            'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            'ETag': f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        }
+
+    def put_object(self, bucket, key, body, modified=None):
+        """Seed an object; ``modified`` (epoch seconds) sets its LastModified"""
+        path = self._s3_path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        if modified is not None:
+            os.utime(path, (modified, modified))
+
+    def _s3_ListObjectsV2(self, params):
+        bucket_dir = self._s3_path(params['Bucket'])
+        prefix = params.get('Prefix', '')
+        keys = []
+        for directory, dirs, names in os.walk(bucket_dir):
+            dirs[:] = [d for d in dirs if d != '.uploads']
+            for name in names:
+                key = os.path.relpath(os.path.join(directory, name), bucket_dir).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        keys.sort()
+        if params.get('StartAfter'):
+            keys = [key for key in keys if key > params['StartAfter']]
+        start = int(params.get('ContinuationToken') or 0)
+        end = start + params.get('MaxKeys', 1000)
+        contents = [self._s3_object(self._s3_path(params['Bucket'], key), key) for key in keys[start:end]]
+        response = {'Contents': contents, 'KeyCount': len(contents), 'IsTruncated': end < len(keys)}
+        if end < len(keys):
+            response['NextContinuationToken'] = str(end)
+        return response
+
+    def _s3_GetObject(self, params):
+        path = self._s3_path(params['Bucket'], params['Key'])
+        if not os.path.isfile(path):
+            return self._error('s3', 'NoSuchKey', 404)
+        with open(path, 'rb') as f:
+            data = f.read()
+        size = len(data)
+        response = {}
+        if params.get('Range'):
+            first, _, last = params['Range'][len('bytes='):].partition('-')
+            first = int(first)
+            last = min(int(last) if last else size - 1, size - 1)
+            data = data[first:last + 1]
+            response['ContentRange'] = f'bytes {first}-{last}/{size}'
+        response.update(self._s3_object(path, params['Key']))
+        response['ContentLength'] = len(data)
+        response['Body'] = StreamingBody(io.BytesIO(data), len(data))
+        return response
+
+    def _s3_HeadObject(self, params):
+        path = self._s3_path(params['Bucket'], params['Key'])
+        if not os.path.isfile(path):
+            return self._error('s3', 'NoSuchKey', 404)
+        obj = self._s3_object(path, params['Key'])
+        return {'ContentLength': obj['Size'], 'LastModified': obj['LastModified'], 'ETag': obj['ETag']}
+
+    def _s3_PutObject(self, params):
+        body = params.get('Body', b'')
+        path = self._s3_path(params['Bucket'], params['Key'])
+        with self._lock:
+            # Conditional writes: If-Match an ETag, or If-None-Match * to create only
+            current = self._s3_object(path, params['Key'])['ETag'] if os.path.isfile(path) else None
+            if ('IfMatch' in params and params['IfMatch'] != current) or \
+                    (params.get('IfNoneMatch') == '*' and current is not None):
+                return self._error('s3', 'PreconditionFailed', 412)
+            self.put_object(params['Bucket'], params['Key'], body if isinstance(body, bytes) else body.read())
+            return {'ETag': self._s3_object(path, params['Key'])['ETag']}
+
+    def _s3_CreateMultipartUpload(self, params):
+        upload_id = self._new_id()
+        os.makedirs(self._s3_path(params['Bucket'], f'.uploads/{upload_id}'))
+        return {'Bucket': params['Bucket'], 'Key': params['Key'], 'UploadId': upload_id}
+
+    def _s3_UploadPart(self, params):
+        body = params['Body'] if isinstance(params['Body'], bytes) else params['Body'].read()
+        path = self._s3_path(params['Bucket'], f".uploads/{params['UploadId']}/{params['PartNumber']}")
+        with open(path, 'wb') as f:
+            f.write(body)
+        return {'ETag': f'"{hashlib.md5(body).hexdigest()}"'}
+
+    def _s3_CompleteMultipartUpload(self, params):
+        upload_dir = self._s3_path(params['Bucket'], f".uploads/{params['UploadId']}")
+        path = self._s3_path(params['Bucket'], params['Key'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            for part in params['MultipartUpload']['Parts']:
+                with open(os.path.join(upload_dir, str(part['PartNumber'])), 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        shutil.rmtree(upload_dir)
+        return {'Bucket': params['Bucket'], 'Key': params['Key'], 'ETag': f'"{params["UploadId"]}"'}
+
+    def _s3_AbortMultipartUpload(self, params):
+        shutil.rmtree(self._s3_path(params['Bucket'], f".uploads/{params['UploadId']}"), ignore_errors=True)
+        return {}
+
+    # -- lambda --------------------------------------------------------
+
+    def _lambda_Invoke(self, params):
+        return {'StatusCode': 202}
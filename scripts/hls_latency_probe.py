@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Offline end-to-end latency probe for the HLS output on S3.
+
+Reads the manifests MediaLive wrote under a recording prefix and compares
+each segment's ``#EXT-X-PROGRAM-DATE-TIME`` (MediaLive's clock at capture
+of its first frame) with when the segment landed: S3 LastModified, or the
+file mtime of a local copy (``aws s3 sync`` keeps LastModified as mtime).
+Profiles need ProgramDateTime on the HLS group; the ``-ll`` ones have it.
+
+Per media playlist it reports:
+
+    available   capture of a segment's first frame -> segment on S3
+    packaging   end of the segment -> segment on S3
+    player      packaging + hold-back x target duration + half a target
+                duration of playlist polling: what a player sitting
+                --hold-segments behind the live edge shows
+    glass       player + --source-offset (contribution encoder -> MediaLive,
+                which the manifests cannot see)
+
+Pass several sources to compare settings side by side.
+
+    python scripts/hls_latency_probe.py s3://shelcaster-media-manager/recordings/<sessionId>/
+    python scripts/hls_latency_probe.py ./recordings/standard ./recordings/low-latency
+    python scripts/hls_latency_probe.py s3://.../recordings/<sessionId>/ --hold-segments 2 --source-offset 1.5
+    python scripts/hls_latency_probe.py ./recordings/low-latency --json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda-layer', 'python'))
+
+from shelcaster_common.hls import parse_playlist, resolve_uri  # noqa: E402
+
+METRICS = ('available', 'packaging', 'player', 'glass')
+
+
+class LocalStore:
+    """A directory of downloaded playlists and segments"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def listing(self):
+        """{key: published epoch seconds}"""
+        published = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                published[key] = os.path.getmtime(path)
+        return published
+
+    def read(self, key):
+        with open(os.path.join(self.root, key)) as f:
+            return f.read()
+
+
+class S3Store:
+    """Playlists and segments under an ``s3://bucket/prefix``"""
+
+    def __init__(self, url, profile=None):
+        import boto3
+
+        bucket, _, prefix = url[len('s3://'):].partition('/')
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = boto3.Session(profile_name=profile).client('s3')
+
+    def listing(self):
+        published = {}
+        for page in self.s3.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                published[obj['Key'][len(self.prefix):].lstrip('/')] = obj['LastModified'].timestamp()
+        return published
+
+    def read(self, key):
+        full_key = f"{self.prefix.rstrip('/')}/{key}" if self.prefix else key
+        return self.s3.get_object(Bucket=self.bucket, Key=full_key)['Body'].read().decode('utf-8')
+
+
+def open_store(source, profile=None):
+    return S3Store(source, profile) if source.startswith('s3://') else LocalStore(source)
+
+
+def summarize(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'p50': round(statistics.median(ordered), 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max': round(ordered[-1], 3)
+    }
+
+
+def probe_playlist(key, playlist, published, hold_segments, source_offset):
+    """Latency figures for one media playlist"""
+    target = playlist.target_duration or max((s.duration for s in playlist.segments), default=0)
+    available = []
+    packaging = []
+    undated = 0
+    for segment in playlist.segments:
+        landed = published.get(resolve_uri(key, segment.uri))
+        if landed is None:
+            continue
+        if segment.program_date_time is None:
+            undated += 1
+            continue
+        available.append(landed - segment.program_date_time)
+        packaging.append(landed - segment.program_date_time - segment.duration)
+
+    result = {
+        'playlist': key,
+        'segments': len(playlist.segments),
+        'measured': len(available),
+        'targetDuration': target,
+        'windowSeconds': round(playlist.duration, 3),
+        'available': summarize(available),
+        'packaging': summarize(packaging)
+    }
+    if packaging:
+        hold_back = hold_segments * target + target / 2
+        result['player'] = summarize([p + hold_back for p in packaging])
+        result['glass'] = summarize([p + hold_back + source_offset for p in packaging])
+    if undated:
+        result['warning'] = f'{undated} segments have no EXT-X-PROGRAM-DATE-TIME; enable ProgramDateTime on the HLS group'
+    return result
+
+
+def probe(source, hold_segments=3, source_offset=0.0, profile=None):
+    """Latency report for every media playlist under ``source``"""
+    store = open_store(source, profile)
+    published = store.listing()
+    results = []
+    for key in sorted(k for k in published if k.endswith('.m3u8')):
+        playlist = parse_playlist(store.read(key))
+        if not playlist.is_master:
+            results.append(probe_playlist(key, playlist, published, hold_segments, source_offset))
+    return results
+
+
+def print_table(reports):
+    print(f"{'source / playlist':<58} {'segs':>5} {'target':>6} " + ' '.join(f'{m + " p50/p95":>16}' for m in METRICS))
+    for source, results in reports.items():
+        print(source)
+        for result in results:
+            cells = []
+            for metric in METRICS:
+                stats = result.get(metric)
+                cells.append(f"{stats['p50']:.2f}/{stats['p95']:.2f}s" if stats else '-')
+            print(f"  {result['playlist']:<56} {result['measured']:>5} {result['targetDuration']:>5}s " + ' '.join(f'{cell:>16}' for cell in cells))
+            if 'warning' in result:
+                print(f"    ! {result['warning']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sources', nargs='+', help='local directories or s3://bucket/prefix')
+    parser.add_argument('--hold-segments', type=int, default=3, help='segments a player keeps behind the live edge (default 3)')
+    parser.add_argument('--source-offset', type=float, default=0.0, help='seconds from camera to MediaLive input')
+    parser.add_argument('--profile', help='AWS profile for s3:// sources')
+    parser.add_argument('--json', action='store_true', help='print the raw report')
+    args = parser.parse_args()
+
+    reports = {
+        source: probe(source, args.hold_segments, args.source_offset, args.profile)
+        for source in args.sources
+    }
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_table(reports)
+
+    if not any(result['measured'] for results in reports.values() for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Replay recorded MediaLive/IVS state-change events through the sync consumer.
+
+Runs shelcaster-sync-channel-state-py locally against a file of
+EventBridge events (default tests/fixtures/channel-state-events.json),
+with AWS answered in-process by ``fakeaws.FakeAws``. The file's sessions
+are seeded first, then its events are delivered in file order as SQS
+batches and each batch's summary is printed.
+
+FakeAws applies DynamoDB writes and evaluates their conditions, so each
+batch sees what the earlier ones stored and a replay shows what the
+consumer decided (deduplicated, superseded, unowned, written);
+``--show-writes`` prints the conditional requests it sent, which is where
+the version and ownership checks live.
+
+    python scripts/replay_channel_events.py
+    python scripts/replay_channel_events.py --batch-size 1 --show-writes
+    python scripts/replay_channel_events.py recorded-events.json --direct
+
+A file is either ``{"sessions": {...}, "events": [...]}`` or a plain list
+of events. A session entry names the channels it owns:
+``{"mediaLiveChannelId", "ivsChannelArn", "isLive", "startedAt"}``.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+
+from bench_handlers import REPO_ROOT, FakeContext, load_handler, session_item
+from fakeaws import FakeAws
+from shelcaster_common import clients, resilience
+from shelcaster_common.session import CHANNEL_ID_ATTRIBUTE, IVS_CHANNEL_ATTRIBUTE
+
+DEFAULT_FIXTURE = os.path.join(REPO_ROOT, 'tests', 'fixtures', 'channel-state-events.json')
+FUNCTION_DIR = 'shelcaster-sync-channel-state-py'
+
+
+def load_fixture(path):
+    with open(path) as f:
+        fixture = json.load(f)
+    if isinstance(fixture, list):
+        return {}, fixture
+    return fixture.get('sessions', {}), fixture.get('events', [])
+
+
+def seed_session(fake, session_id, spec):
+    item = session_item(session_id, channel='mediaLiveChannelId' in spec)
+    if 'mediaLiveChannelId' in spec:
+        item['mediaLive']['M']['channelId'] = {'S': spec['mediaLiveChannelId']}
+        item[CHANNEL_ID_ATTRIBUTE] = {'S': spec['mediaLiveChannelId']}
+    if 'ivsChannelArn' in spec:
+        item['ivs']['M']['ingestChannelArn'] = {'S': spec['ivsChannelArn']}
+        item[IVS_CHANNEL_ATTRIBUTE] = {'S': spec['ivsChannelArn']}
+    item['streaming']['M']['isLive'] = {'BOOL': bool(spec.get('isLive'))}
+    if spec.get('startedAt'):
+        item['streaming']['M']['startedAt'] = {'S': spec['startedAt']}
+    fake.put_item(item)
+
+
+def batches(events, size, direct):
+    """Invocation events: one per EventBridge event, or SQS batches of ``size``"""
+    if direct:
+        return list(events)
+    records = [
+        {'messageId': f'msg-{n}', 'eventSource': 'aws:sqs', 'body': json.dumps(event)}
+        for n, event in enumerate(events)
+    ]
+    return [{'Records': records[start:start + size]} for start in range(0, len(records), size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fixtures', nargs='*', default=[DEFAULT_FIXTURE])
+    parser.add_argument('--batch-size', type=int, default=10, help='events per SQS batch')
+    parser.add_argument('--direct', action='store_true', help='invoke once per event, as an EventBridge target')
+    parser.add_argument('--show-writes', action='store_true', help='print the DynamoDB write requests')
+    parser.add_argument('--logs', action='store_true', help="print the consumer's own log lines")
+    args = parser.parse_args()
+
+    resilience.SERVICE_BUDGETS.clear()
+    resilience.DEFAULT_BUDGET = (1e9, 10 ** 9)
+    fake = FakeAws(record_writes=True)
+    clients.reset_clients()
+    fake.install(clients.get_session())
+    handler = load_handler(FUNCTION_DIR)
+
+    for path in args.fixtures:
+        sessions, events = load_fixture(path)
+        for session_id, spec in sessions.items():
+            seed_session(fake, session_id, spec)
+        print(f'# {os.path.relpath(path)}: {len(events)} events, {len(sessions)} sessions')
+
+        for n, event in enumerate(batches(events, args.batch_size, args.direct)):
+            del fake.writes[:]
+            sink = io.StringIO()
+            with contextlib.redirect_stdout(sink):
+                try:
+                    result = handler(event, FakeContext())
+                except Exception as error:
+                    result = {'error': str(error)}
+            print(f'## invocation {n}')
+            if args.logs:
+                sys.stdout.write(sink.getvalue())
+            print(json.dumps(result, indent=2))
+            if args.show_writes:
+                for operation, params in fake.writes:
+                    print(f'{operation} {json.dumps(params, indent=2)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import json
+import os
+import time
+from datetime import datetime
+
+from shelcaster_common.api import parse_body
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.readiness import deadline_from_context
+from shelcaster_common.resilience import error_code, guard, is_conflict
+from shelcaster_common.session import SESSION_LAYOUT, Session, SessionWrites, invalidate_session, load_sessions
+from shelcaster_common.tracing import traced_handler
+from shelcaster_common.writes import WriteBatch
+
+ivs = lazy_client('ivs')
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+
+TABLE_NAME = 'shelcaster-app'
+MAX_SESSIONS = int(os.environ.get('BULK_STOP_MAX_SESSIONS', '200'))
+TRANSACT_SIZE = 25
+SESSION_PARTS = ('mediaLive', 'ivs')
+FILTER_FIELDS = ('showId', 'hostUserId', 'status', 'isLive')
+
+def filter_error(session_filter):
+    """Why a filter is unusable, or None; an empty filter would match every session"""
+    if not isinstance(session_filter, dict) or not session_filter:
+        return 'filter must be an object with at least one of ' + ', '.join(FILTER_FIELDS)
+    unknown = sorted(set(session_filter) - set(FILTER_FIELDS))
+    if unknown:
+        return f"Unknown filter fields: {', '.join(unknown)}"
+    return None
+
+def find_sessions(session_filter):
+    """Sessions matching a filter, via the entityType index like stop-broadcast"""
+    conditions = []
+    names = {}
+    values = {':et': {'S': 'liveSession'}}
+    for field in ('showId', 'hostUserId', 'status'):
+        if field in session_filter:
+            names[f'#{field}'] = field
+            values[f':{field}'] = {'S': str(session_filter[field])}
+            conditions.append(f'#{field} = :{field}')
+    # In the split layout streaming state is not on the indexed info item
+    filter_live = 'isLive' in session_filter and SESSION_LAYOUT == 'split'
+    if 'isLive' in session_filter and not filter_live:
+        names['#streaming'] = 'streaming'
+        values[':isLive'] = {'BOOL': bool(session_filter['isLive'])}
+        conditions.append('#streaming.isLive = :isLive')
+    
+    kwargs = {
+        'TableName': TABLE_NAME,
+        'IndexName': 'entityType-index',
+        'KeyConditionExpression': 'entityType = :et',
+        'ExpressionAttributeValues': values
+    }
+    if conditions:
+        kwargs['FilterExpression'] = ' AND '.join(conditions)
+        kwargs['ExpressionAttributeNames'] = names
+    
+    sessions = {}
+    while len(sessions) < MAX_SESSIONS:
+        response = dynamodb.query(**kwargs)
+        for item in response.get('Items', []):
+            session_id = item['pk']['S'].split('#', 1)[1]
+            sessions[session_id] = Session(session_id, item)
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    if SESSION_LAYOUT == 'split':
+        parts = SESSION_PARTS + ('streaming',) if filter_live else SESSION_PARTS
+        sessions = load_sessions(dynamodb, list(sessions)[:MAX_SESSIONS], table_name=TABLE_NAME, parts=parts)
+        if filter_live:
+            is_live = bool(session_filter['isLive'])
+            sessions = {session_id: session for session_id, session in sessions.items() if session.is_live == is_live}
+    return dict(list(sessions.items())[:MAX_SESSIONS])
+
+def stop_medialive(channel_id, deadline):
+    try:
+        guard('medialive').call(lambda: medialive.stop_channel(ChannelId=channel_id), deadline=deadline)
+        return 'stopped'
+    except Exception as e:
+        if is_conflict(e):
+            return 'already_stopped'
+        raise
+
+def stop_ivs(channel_arn, deadline):
+    """End the channel's broadcast (IVS channels have no stop of their own)"""
+    try:
+        guard('ivs').call(lambda: ivs.stop_stream(channelArn=channel_arn), deadline=deadline)
+        return 'stopped'
+    except Exception as e:
+        if error_code(e) == 'ChannelNotBroadcasting':
+            return 'already_stopped'
+        raise
+
+def stage_stopped(writes, session_id, now):
+    session_writes = SessionWrites(writes, session_id)
+    writes.condition(session_writes.key(), 'attribute_exists(pk)')
+    session_writes.set('streaming.isLive', {'BOOL': False})
+    session_writes.touch(now)
+
+def write_stopped(session_ids):
+    """Mark sessions not live, up to TRANSACT_SIZE per TransactWriteItems"""
+    now = {'S': datetime.utcnow().isoformat()}
+    failed = {}
+    for start in range(0, len(session_ids), TRANSACT_SIZE):
+        chunk = session_ids[start:start + TRANSACT_SIZE]
+        writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+        for session_id in chunk:
+            stage_stopped(writes, session_id, now)
+        try:
+            writes.flush()
+        except Exception as e:
+            # One bad item cancels the whole transaction; retry the chunk item by item
+            print(f'Batch status write failed, retrying individually: {str(e)}')
+            for session_id in chunk:
+                writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+                stage_stopped(writes, session_id, now)
+                try:
+                    writes.flush()
+                except Exception as item_error:
+                    failed[session_id] = str(item_error)
+        for session_id in chunk:
+            invalidate_session(session_id)
+    return failed
+
+@traced_handler
+def lambda_handler(event, context):
+    """Stop streaming for many sessions at once.
+
+    Body: {"sessionIds": [...]} or {"filter": {"showId", "hostUserId", "status", "isLive"}}
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': '*'
+    }
+    
+    try:
+        try:
+            body = parse_body(event)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)})
+            }
+        session_ids = body.get('sessionIds')
+        session_filter = body.get('filter')
+        
+        if not session_ids and not session_filter:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'Provide sessionIds or filter'})
+            }
+        
+        invalid = None if session_ids else filter_error(session_filter)
+        if invalid:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': invalid})
+            }
+        
+        if session_ids:
+            session_ids = list(dict.fromkeys(session_ids))
+            if len(session_ids) > MAX_SESSIONS:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': f'At most {MAX_SESSIONS} sessions per request'})
+                }
+            sessions = load_sessions(dynamodb, session_ids, table_name=TABLE_NAME, parts=SESSION_PARTS)
+        else:
+            sessions = find_sessions(session_filter)
+            session_ids = list(sessions)
+        
+        # Leave time to write statuses back even if some stops hang
+        deadline = deadline_from_context(context) - 2
+        results = {}
+        calls = {}
+        for session_id in session_ids:
+            session = sessions.get(session_id)
+            if session is None:
+                results[session_id] = {'status': 'not_found'}
+                continue
+            results[session_id] = {'status': 'stopped'}
+            channel_id = session.media_live_channel_id
+            if channel_id:
+                calls[(session_id, 'mediaLive')] = lambda channel_id=channel_id: stop_medialive(channel_id, deadline)
+            channel_arn = session.ivs_program_channel_arn
+            if channel_arn:
+                calls[(session_id, 'ivs')] = lambda channel_arn=channel_arn: stop_ivs(channel_arn, deadline)
+        
+        outcomes = run_concurrently(calls, timeout=max(deadline - time.monotonic(), 1))
+        for (session_id, service), outcome in outcomes.items():
+            if outcome.ok:
+                results[session_id][service] = outcome.value
+            else:
+                print(f'{service} stop warning for {session_id}: {str(outcome.error)}')
+                results[session_id][service] = {'error': str(outcome.error), 'code': error_code(outcome.error)}
+                # A channel that may still be running must not be marked not live
+                results[session_id]['status'] = 'error'
+        
+        found = [session_id for session_id in session_ids if session_id in sessions]
+        stopped = [session_id for session_id in found if results[session_id]['status'] == 'stopped']
+        for session_id, message in write_stopped(stopped).items():
+            results[session_id]['status'] = 'error'
+            results[session_id]['error'] = message
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'message': 'Streaming stopped',
+                'count': sum(1 for result in results.values() if result['status'] == 'stopped'),
+                'results': results
+            })
+        }
+        
+    except Exception as error:
+        print(f'Error stopping streaming in bulk: {str(error)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(error)})
+        }
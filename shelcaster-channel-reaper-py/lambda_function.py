@@ -0,0 +1,180 @@
+import json
+import os
+import time
+from datetime import datetime
+
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.prewarm import prewarm_held
+from shelcaster_common.readiness import deadline_from_context
+from shelcaster_common.resilience import guard, is_conflict
+from shelcaster_common.session import CHANNEL_ID_ATTRIBUTE, CHANNEL_INDEX, SESSION_LAYOUT, invalidate_session, load_sessions
+from shelcaster_common.tracing import traced_handler
+
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+
+TABLE_NAME = 'shelcaster-app'
+# 'stop' stops drifted channels; 'flag' only reports them.
+REAPER_ACTION = os.environ.get('REAPER_ACTION', 'stop')
+# Leave sessions alone for a while after any write so an in-flight
+# start/stop is not mistaken for drift.
+GRACE_SECONDS = int(os.environ.get('REAPER_GRACE_SECONDS', '600'))
+ACTIVE_STATES = ('STARTING', 'RUNNING', 'RECOVERING')
+
+def indexed_sessions():
+    """Every session with a MediaLive channel, from the sparse channel index"""
+    kwargs = {
+        'TableName': TABLE_NAME,
+        'IndexName': CHANNEL_INDEX,
+        'ProjectionExpression': 'pk, #channelId, streaming, #status, updatedAt',
+        'ExpressionAttributeNames': {'#channelId': CHANNEL_ID_ATTRIBUTE, '#status': 'status'}
+    }
+    while True:
+        response = dynamodb.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def with_streaming(items):
+    """Attach streaming state, which the split layout keeps off the indexed item"""
+    if SESSION_LAYOUT != 'split':
+        return items
+    by_id = {item['pk']['S'].split('#', 1)[1]: item for item in items}
+    for session_id, session in load_sessions(dynamodb, list(by_id), table_name=TABLE_NAME, parts=('streaming',)).items():
+        if 'streaming' in session.item:
+            by_id[session_id]['streaming'] = session.item['streaming']
+    return items
+
+def prewarm_holds(session_ids):
+    """Sessions whose channel is running ahead of their show's air time"""
+    if not session_ids:
+        return set()
+    sessions = load_sessions(dynamodb, session_ids, table_name=TABLE_NAME, parts=('mediaLive', 'streaming'))
+    now = time.time()
+    return {session_id for session_id, session in sessions.items() if prewarm_held(session, now)}
+
+def channel_states():
+    """{channel_id: state} for every MediaLive channel in the account"""
+    def list_states():
+        states = {}
+        for page in medialive.get_paginator('list_channels').paginate():
+            for channel in page.get('Channels', []):
+                states[channel['Id']] = channel['State']
+        return states
+    return guard('medialive').call(list_states)
+
+def seconds_since(timestamp):
+    if not timestamp:
+        return float('inf')
+    return (datetime.utcnow() - datetime.fromisoformat(timestamp.rstrip('Z'))).total_seconds()
+
+def classify(item, states):
+    """Drift verdict for one indexed session, or None if it is consistent"""
+    channel_id = item[CHANNEL_ID_ATTRIBUTE]['S']
+    state = states.get(channel_id)
+    is_live = item.get('streaming', {}).get('M', {}).get('isLive', {}).get('BOOL', False)
+
+    if seconds_since(item.get('updatedAt', {}).get('S')) < GRACE_SECONDS:
+        return None
+    if state is None:
+        return 'channel_gone'
+    if state in ACTIVE_STATES and not is_live:
+        return 'running_not_live'
+    if state == 'IDLE' and is_live:
+        return 'live_but_idle'
+    return None
+
+def stop_channel(channel_id, deadline):
+    try:
+        guard('medialive').call(lambda: medialive.stop_channel(ChannelId=channel_id), deadline=deadline)
+        return 'stopped'
+    except Exception as e:
+        if is_conflict(e):
+            return 'already_stopped'
+        raise
+
+def drop_index_entry(session_id, channel_id):
+    """Take a session whose channel no longer exists out of the sparse index"""
+    try:
+        dynamodb.update_item(
+            TableName=TABLE_NAME,
+            Key={
+                'pk': {'S': f'session#{session_id}'},
+                'sk': {'S': 'info'}
+            },
+            UpdateExpression='REMOVE #channelId',
+            ConditionExpression='#channelId = :channelId',
+            ExpressionAttributeNames={'#channelId': CHANNEL_ID_ATTRIBUTE},
+            ExpressionAttributeValues={':channelId': {'S': channel_id}}
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        pass
+    invalidate_session(session_id)
+    return 'unindexed'
+
+@traced_handler
+def lambda_handler(event, context):
+    """Find MediaLive channels whose state disagrees with their session.
+
+    Runs on a schedule. Event: {"dryRun": false} to override REAPER_ACTION.
+    """
+    dry_run = bool(event.get('dryRun')) or REAPER_ACTION != 'stop'
+    
+    try:
+        states = channel_states()
+        drift = {}
+        owned = set()
+        for item in with_streaming(list(indexed_sessions())):
+            session_id = item['pk']['S'].split('#', 1)[1]
+            channel_id = item[CHANNEL_ID_ATTRIBUTE]['S']
+            owned.add(channel_id)
+            verdict = classify(item, states)
+            if verdict:
+                drift[session_id] = {'channelId': channel_id, 'reason': verdict, 'state': states.get(channel_id)}
+        
+        # A channel started ahead of air time is waiting for its host, not drifting
+        for session_id in prewarm_holds([
+            session_id for session_id, entry in drift.items() if entry['reason'] == 'running_not_live'
+        ]):
+            del drift[session_id]
+        
+        # Running channels no session points at (pooled channels sit IDLE)
+        unowned = sorted(
+            channel_id for channel_id, state in states.items()
+            if state in ACTIVE_STATES and channel_id not in owned
+        )
+        
+        deadline = deadline_from_context(context) - 2
+        calls = {}
+        if not dry_run:
+            for session_id, entry in drift.items():
+                if entry['reason'] == 'channel_gone':
+                    calls[session_id] = lambda session_id=session_id, channel_id=entry['channelId']: drop_index_entry(session_id, channel_id)
+                elif entry['reason'] == 'running_not_live':
+                    calls[session_id] = lambda channel_id=entry['channelId']: stop_channel(channel_id, deadline)
+        
+        # Bounded by the shared fan-out pool and paced by the MediaLive guard
+        for session_id, outcome in run_concurrently(calls, timeout=max(deadline - time.monotonic(), 1)).items():
+            if outcome.ok:
+                drift[session_id]['action'] = outcome.value
+            else:
+                drift[session_id]['action'] = 'error'
+                drift[session_id]['error'] = str(outcome.error)
+        
+        for session_id, entry in drift.items():
+            print(json.dumps({'reaper': 'drift', 'sessionId': session_id, **entry}))
+        for channel_id in unowned:
+            print(json.dumps({'reaper': 'unowned', 'channelId': channel_id, 'state': states[channel_id]}))
+        
+        return {
+            'dryRun': dry_run,
+            'channels': len(states),
+            'drift': drift,
+            'unowned': unowned
+        }
+    
+    except Exception as error:
+        print(f'Error reaping MediaLive channels: {str(error)}')
+        raise
@@ -0,0 +1,199 @@
+import json
+import posixpath
+import uuid
+
+from shelcaster_common.api import parse_body
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.clips import (
+    EDGE_TOLERANCE,
+    MAX_CLIP_SECONDS,
+    PLAYLIST_CONTENT_TYPE,
+    clip_entries,
+    clip_prefix,
+    edge_cuts,
+    format_time,
+    master_playlist,
+    media_playlist,
+    media_url,
+    trim_segment,
+)
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.finalize import MASTER_PLAYLIST, S3_BUCKET, find_ffmpeg, recording_prefix
+from shelcaster_common.hls import parse_playlist, resolve_uri
+from shelcaster_common.schedule import parse_time
+from shelcaster_common.segment_index import load_index, update_index
+from shelcaster_common.session import load_session
+from shelcaster_common.tracing import span, traced_handler
+
+s3 = lazy_client('s3')
+dynamodb = lazy_client('dynamodb')
+
+TABLE_NAME = 'shelcaster-app'
+SESSION_PARTS = ('recording',)
+
+def clip_time(value, origin):
+    """Epoch seconds from an ISO timestamp, or seconds into the recording"""
+    if isinstance(value, bool) or value is None:
+        raise ValueError('start and end are required')
+    if isinstance(value, (int, float)):
+        if origin is None:
+            raise ValueError('Session has no recording start; pass ISO timestamps')
+        return origin + value
+    return parse_time(value)
+
+def clip_rendition(playlist_key, prefix, started_at, stopped_at, frame_accurate, ffmpeg):
+    """Write one rendition's clip playlist; None if it has nothing in the range"""
+    index = load_index(s3, S3_BUCKET, playlist_key)
+    if index is None or (not index.ended and index.end is not None and index.end < stopped_at):
+        # Not indexed yet, or the range runs past what the indexer has seen
+        index, _ = update_index(s3, S3_BUCKET, playlist_key)
+    entries = clip_entries(index, started_at, stopped_at)
+    if not entries:
+        return None
+
+    name = posixpath.basename(playlist_key)[:-len('.m3u8')]
+    start_offset = None
+    if frame_accurate and ffmpeg:
+        for position, (cut_from, cut_to) in edge_cuts(entries, started_at, stopped_at).items():
+            edge = 'head' if position == 0 else 'tail'
+            entries[position] = trim_segment(
+                s3, S3_BUCKET, entries[position], cut_from, cut_to, f'{prefix}{name}_{edge}.ts', ffmpeg
+            )
+    elif frame_accurate and started_at - entries[0]['start'] > EDGE_TOLERANCE:
+        start_offset = started_at - entries[0]['start']
+
+    key = f'{prefix}{name}.m3u8'
+    s3.put_object(
+        Bucket=S3_BUCKET, Key=key, ContentType=PLAYLIST_CONTENT_TYPE,
+        Body=media_playlist(entries, key, start_offset).encode('utf-8')
+    )
+    return {
+        'segments': len(entries),
+        'start': entries[0]['start'] + (start_offset or 0),
+        'end': entries[-1]['start'] + entries[-1]['duration'],
+        'trimmed': any(entry.get('trimmed') for entry in entries) or start_offset is not None
+    }
+
+@traced_handler
+def lambda_handler(event, context):
+    """Cut a clip of a session recording as a VOD playlist over its segments.
+
+    Body: {"start", "end", "frameAccurate": false}. Times are ISO timestamps
+    or seconds from the start of the recording.
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': '*'
+    }
+    
+    try:
+        session_id = event.get('pathParameters', {}).get('sessionId')
+        
+        if not session_id:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'Missing sessionId'})
+            }
+        
+        session = load_session(
+            dynamodb, session_id, table_name=TABLE_NAME, parts=SESSION_PARTS,
+            use_cache=False, consistent_read=True
+        )
+        
+        if session is None:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': 'Session not found'})
+            }
+        
+        try:
+            body = parse_body(event)
+            recording_start = session.get('recording', 'startedAt')
+            origin = parse_time(recording_start) if recording_start else None
+            started_at = clip_time(body.get('start'), origin)
+            stopped_at = clip_time(body.get('end'), origin)
+            if stopped_at <= started_at:
+                raise ValueError('end must be after start')
+            if stopped_at - started_at > MAX_CLIP_SECONDS:
+                raise ValueError(f'Clips are limited to {int(MAX_CLIP_SECONDS)} seconds')
+        except ValueError as error:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': str(error)})
+            }
+        frame_accurate = bool(body.get('frameAccurate'))
+        
+        master_key = f'{recording_prefix(session_id)}{MASTER_PLAYLIST}'
+        try:
+            master = parse_playlist(s3.get_object(Bucket=S3_BUCKET, Key=master_key)['Body'].read().decode('utf-8'))
+        except s3.exceptions.NoSuchKey:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': 'Recording not found'})
+            }
+        variants = master.variants or [{'uri': MASTER_PLAYLIST, 'attributes': None}]
+        
+        clip_id = uuid.uuid4().hex[:12]
+        prefix = clip_prefix(session_id, clip_id)
+        ffmpeg = find_ffmpeg() if frame_accurate else None
+        calls = {
+            variant['uri']: (lambda key=resolve_uri(master_key, variant['uri']): clip_rendition(
+                key, prefix, started_at, stopped_at, frame_accurate, ffmpeg
+            ))
+            for variant in variants
+        }
+        with span('ClipRenditions'):
+            outcomes = run_concurrently(calls)
+        
+        failed = [outcome for outcome in outcomes.values() if not outcome.ok]
+        if failed:
+            raise failed[0].error
+        
+        clipped = [(variant, outcomes[variant['uri']].value) for variant in variants if outcomes[variant['uri']].value]
+        if not clipped:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': 'No recorded segments in that range'})
+            }
+        
+        playlist_key = f'{prefix}{MASTER_PLAYLIST}'
+        if master.is_master:
+            s3.put_object(
+                Bucket=S3_BUCKET, Key=playlist_key, ContentType=PLAYLIST_CONTENT_TYPE,
+                Body=master_playlist([
+                    (variant['attributes'], posixpath.basename(variant['uri'])) for variant, _ in clipped
+                ]).encode('utf-8')
+            )
+        
+        top = max(clipped, key=lambda clip: clip[0].get('bandwidth', 0))[1]
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'clipId': clip_id,
+                'sessionId': session_id,
+                'playlist': playlist_key,
+                'url': media_url(playlist_key),
+                'start': format_time(top['start']),
+                'end': format_time(top['end']),
+                'duration': round(top['end'] - top['start'], 3),
+                'segments': top['segments'],
+                'renditions': len(clipped),
+                'frameAccurate': frame_accurate,
+                'trimmed': top['trimmed']
+            })
+        }
+    
+    except Exception as error:
+        print(f'Error creating clip: {str(error)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(error)})
+        }
@@ -1,18 +1,34 @@
-import boto3
 import json
+import os
+import uuid
 from datetime import datetime
 
-medialive = boto3.client('medialive', region_name='us-east-1')
-dynamodb = boto3.client('dynamodb', region_name='us-east-1')
+from shelcaster_common.api import parse_body
+from shelcaster_common.channels import create_input_and_channel, ensure_channel_spec, media_live_attribute, source_attribute
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.lease import release_lease, single_flight, stage_release
+from shelcaster_common.profiles import get_profile, parse_source, resolve_profile
+from shelcaster_common.readiness import deadline_from_context
+from shelcaster_common.session import (
+    CHANNEL_ID_ATTRIBUTE,
+    Session,
+    SessionWrites,
+    invalidate_session,
+    load_session,
+    session_path,
+)
+from shelcaster_common.tracing import traced_handler
+from shelcaster_common.writes import WriteBatch
+
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
 
 TABLE_NAME = 'shelcaster-app'
-MEDIALIVE_ROLE_ARN = 'arn:aws:iam::124355640062:role/MediaLiveAccessRole'
-INPUT_SECURITY_GROUP_ID = '3617718'
-S3_BUCKET = 'shelcaster-media-manager'
+MAX_WAIT_SECONDS = float(os.environ.get('MEDIALIVE_WAIT_MAX_SECONDS', '25'))
+SESSION_PARTS = ('mediaLive', 'ivs')
 
+@traced_handler
 def lambda_handler(event, context):
-    print('Event:', json.dumps(event))
-    
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
@@ -29,30 +45,21 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing sessionId'})
             }
         
-        # Get session from DynamoDB
-        response = dynamodb.get_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            }
+        # Get session (read through: the decision below must not rest on another container's past)
+        session = load_session(
+            dynamodb, session_id, table_name=TABLE_NAME, parts=SESSION_PARTS,
+            use_cache=False, consistent_read=True
         )
         
-        if 'Item' not in response:
+        if session is None:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Session not found'})
             }
         
-        session = response['Item']
-        
         # Get IVS ingest endpoint
-        ivs_ingest = None
-        if 'ivs' in session and 'M' in session['ivs']:
-            ivs_data = session['ivs']['M']
-            if 'programIngestEndpoint' in ivs_data and 'S' in ivs_data['programIngestEndpoint']:
-                ivs_ingest = ivs_data['programIngestEndpoint']['S']
+        ivs_ingest = session.ivs_ingest_endpoint
         
         if not ivs_ingest:
             return {
@@ -61,139 +68,108 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'IVS ingest endpoint not found'})
             }
         
-        # Create RTMP input for host
-        input_response = medialive.create_input(
-            Name=f'shelcaster-input-{session_id}',
-            Type='RTMP_PUSH',
-            InputSecurityGroups=[INPUT_SECURITY_GROUP_ID],
-            Destinations=[
-                {'StreamName': f'host/{session_id}'}
-            ]
-        )
+        # Encoder profile: an explicit one, else a ladder fitted to the declared
+        # source in the requested latency mode, else what the channel already runs
+        try:
+            body = parse_body(event)
+            source = parse_source(body.get('input'))
+            profile_name = resolve_profile(
+                requested=body.get('profile'),
+                source=source or session.media_live_input,
+                latency_mode=body.get('latencyMode') or session.media_live_latency_mode,
+                current=session.media_live_profile
+            )
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)})
+            }
         
-        input_id = input_response['Input']['Id']
-        rtmp_url = input_response['Input']['Destinations'][0]['Url']
+        # API Gateway gives up at 29s; every wait below shares this budget
+        deadline = deadline_from_context(context, cap=MAX_WAIT_SECONDS)
         
-        # Create MediaLive channel
-        channel_response = medialive.create_channel(
-            Name=f'shelcaster-channel-{session_id}',
-            RoleArn=MEDIALIVE_ROLE_ARN,
-            InputAttachments=[{
-                'InputId': input_id,
-                'InputAttachmentName': 'host-input'
-            }],
-            Destinations=[
-                {
-                    'Id': 'ivs-destination',
-                    'Settings': [{
-                        'Url': ivs_ingest,
-                        'StreamName': 'program'
-                    }]
-                },
-                {
-                    'Id': 's3-destination',
-                    'Settings': [{
-                        'Url': f's3://{S3_BUCKET}/recordings/{session_id}/recording.m3u8'
-                    }]
-                }
-            ],
-            EncoderSettings={
-                'VideoDescriptions': [{
-                    'Name': 'video_1080p',
-                    'CodecSettings': {
-                        'H264Settings': {
-                            'Profile': 'HIGH',
-                            'Level': 'H264_LEVEL_4_1',
-                            'Bitrate': 5000000,
-                            'RateControlMode': 'CBR'
-                        }
-                    },
-                    'Width': 1920,
-                    'Height': 1080
-                }],
-                'AudioDescriptions': [{
-                    'Name': 'audio_aac',
-                    'CodecSettings': {
-                        'AacSettings': {
-                            'Bitrate': 128000,
-                            'CodingMode': 'CODING_MODE_2_0',
-                            'SampleRate': 48000
-                        }
-                    }
-                }],
-                'OutputGroups': [
-                    {
-                        'Name': 'IVS Output',
-                        'OutputGroupSettings': {
-                            'RtmpOutputSettings': {}
-                        },
-                        'Outputs': [{
-                            'OutputName': 'ivs-output',
-                            'VideoDescriptionName': 'video_1080p',
-                            'AudioDescriptionNames': ['audio_aac'],
-                            'OutputSettings': {
-                                'RtmpOutputSettings': {
-                                    'Destination': {'DestinationRefId': 'ivs-destination'}
-                                }
-                            }
-                        }]
-                    },
-                    {
-                        'Name': 'S3 Recording',
-                        'OutputGroupSettings': {
-                            'HlsOutputSettings': {
-                                'HlsSettings': {
-                                    'StandardHlsSettings': {
-                                        'M3u8Settings': {}
-                                    }
-                                }
-                            }
-                        },
-                        'Outputs': [{
-                            'OutputName': 's3-output',
-                            'VideoDescriptionName': 'video_1080p',
-                            'AudioDescriptionNames': ['audio_aac'],
-                            'OutputSettings': {
-                                'HlsOutputSettings': {
-                                    'HlsSettings': {
-                                        'StandardHlsSettings': {
-                                            'M3u8Settings': {}
-                                        }
-                                    },
-                                    'NameModifier': '_recording'
-                                }
-                            }
-                        }]
-                    }
-                ],
-                'TimecodeConfig': {
-                    'Source': 'EMBEDDED'
-                }
-            },
-            ChannelClass='SINGLE_PIPELINE'
-        )
+        writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+        session_writes = SessionWrites(writes, session_id)
         
-        channel_id = channel_response['Channel']['Id']
+        # Reuse the session's channel if it already has one
+        channel_id = session.media_live_channel_id
+        provisioned = False
+        if not channel_id:
+            # Concurrent calls wait for whichever one holds the provisioning lease
+            owner = getattr(context, 'aws_request_id', None) or str(uuid.uuid4())
+            lease_key, channel_path = session_path(session_id, 'mediaLive.channelId')
+            _, provisioned = single_flight(
+                dynamodb, lease_key, owner,
+                is_done=lambda item: Session.from_items(session_id, [item]).media_live_channel_id,
+                deadline=deadline,
+                unless_exists=channel_path,
+                must_exist=lease_key == session_writes.key(),
+                table_name=TABLE_NAME
+            )
+            if not provisioned:
+                session = load_session(
+                    dynamodb, session_id, table_name=TABLE_NAME, parts=SESSION_PARTS,
+                    use_cache=False, consistent_read=True
+                )
+                channel_id = session.media_live_channel_id
         
-        # Update DynamoDB with MediaLive info
-        dynamodb.update_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            },
-            UpdateExpression='SET mediaLive = :ml, updatedAt = :now',
-            ExpressionAttributeValues={
-                ':ml': {
-                    'M': {
-                        'channelId': {'S': channel_id},
-                        'inputId': {'S': input_id},
-                        'rtmpUrl': {'S': rtmp_url}
-                    }
-                },
-                ':now': {'S': datetime.utcnow().isoformat()}
+        if not provisioned:
+            spec_hash = ensure_channel_spec(
+                medialive, channel_id, session.media_live_spec_hash, profile_name, deadline=deadline
+            )
+            if spec_hash and spec_hash != session.media_live_spec_hash:
+                session_writes.set('mediaLive.specHash', {'S': spec_hash})
+                if spec_hash == get_profile(profile_name).spec_hash:
+                    session_writes.set('mediaLive.profile', {'S': profile_name})
+            if source:
+                session_writes.set('mediaLive.input', source_attribute(source))
+            if body.get('latencyMode'):
+                session_writes.set('mediaLive.latencyMode', {'S': body['latencyMode']})
+            if writes:
+                session_writes.touch({'S': datetime.utcnow().isoformat()})
+                writes.flush()
+                invalidate_session(session_id)
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({
+                    'message': 'MediaLive channel reused',
+                    'channelId': channel_id,
+                    'inputId': session.media_live_input_id,
+                    'rtmpUrl': session.media_live_rtmp_url,
+                    'specHash': spec_hash
+                })
             }
-        )
+        
+        # Create RTMP input and channel from the shared encoder profile
+        try:
+            ml_channel = create_input_and_channel(
+                medialive,
+                name_suffix=session_id,
+                stream_name=f'host/{session_id}',
+                ivs_ingest=ivs_ingest,
+                recording_id=session_id,
+                profile_name=profile_name
+            )
+        except Exception:
+            release_lease(dynamodb, lease_key, owner, table_name=TABLE_NAME)
+            raise
+        
+        channel_id = ml_channel['channelId']
+        input_id = ml_channel['inputId']
+        rtmp_url = ml_channel['rtmpUrl']
+        
+        # Update DynamoDB with MediaLive info and hand back the lease
+        session_writes.set('mediaLive', media_live_attribute(
+            ml_channel, source or session.media_live_input,
+            body.get('latencyMode') or session.media_live_latency_mode
+        ))
+        session_writes.set(CHANNEL_ID_ATTRIBUTE, {'S': channel_id})
+        session_writes.touch({'S': datetime.utcnow().isoformat()})
+        stage_release(writes, lease_key, owner)
+        writes.flush()
+        invalidate_session(session_id)
         
         return {
             'statusCode': 200,
@@ -202,7 +178,8 @@ def lambda_handler(event, context):
                 'message': 'MediaLive channel created',
                 'channelId': channel_id,
                 'inputId': input_id,
-                'rtmpUrl': rtmp_url
+                'rtmpUrl': rtmp_url,
+                'profile': ml_channel['profile']
             })
         }
         
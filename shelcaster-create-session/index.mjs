@@ -8,6 +8,9 @@ const dynamoDBClient = new DynamoDBClient({ region: "us-east-1" });
 const ivsRealTimeClient = new IVSRealTimeClient({ region: "us-east-1" });
 const ecsClient = new ECSClient({ region: "us-east-1" });
 
+// "low" picks the short-segment HLS variant of the session's encoder profile
+const LATENCY_MODES = ['standard', 'low'];
+
 // Lazy load IVS client to avoid import issues
 let ivsClient = null;
 let IVSClient = null;
@@ -42,7 +45,7 @@ export const handler = async (event) => {
 
   try {
     const body = JSON.parse(event.body);
-    const { showId, episodeId } = body;
+    const { showId, episodeId, latencyMode, input } = body;
 
     // Get authenticated user ID from Cognito authorizer
     // API Gateway JWT authorizer puts claims in event.requestContext.authorizer.jwt.claims
@@ -67,6 +70,22 @@ export const handler = async (event) => {
       };
     }
 
+    if (latencyMode && !LATENCY_MODES.includes(latencyMode)) {
+      return {
+        statusCode: 400,
+        headers,
+        body: JSON.stringify({ message: `latencyMode must be one of ${LATENCY_MODES.join(', ')}` }),
+      };
+    }
+
+    if (input && (typeof input !== 'object' || !['width', 'height', 'bitrate'].every((field) => input[field] === undefined || Number(input[field]) > 0))) {
+      return {
+        statusCode: 400,
+        headers,
+        body: JSON.stringify({ message: 'input must be an object with positive width, height and bitrate' }),
+      };
+    }
+
     // Verify show exists
     const getShowParams = {
       TableName: "shelcaster-app",
@@ -341,6 +360,18 @@ export const handler = async (event) => {
       updatedAt: now,
     };
 
+    // Encoder preferences read when the MediaLive channel is provisioned
+    if (latencyMode || input) {
+      liveSession.mediaLive = {
+        ...(latencyMode && { latencyMode }),
+        ...(input && {
+          input: Object.fromEntries(
+            ['width', 'height', 'bitrate'].filter((field) => input[field] !== undefined).map((field) => [field, Number(input[field])])
+          ),
+        }),
+      };
+    }
+
     const params = {
       TableName: "shelcaster-app",
       Item: marshall(liveSession),
@@ -348,6 +379,23 @@ export const handler = async (event) => {
 
     await dynamoDBClient.send(new PutItemCommand(params));
 
+    // Point the show at its live session so the channel prewarm scheduler can find it
+    try {
+      await dynamoDBClient.send(new UpdateItemCommand({
+        TableName: "shelcaster-app",
+        Key: marshall({
+          pk: `show#${showId}`,
+          sk: 'info',
+        }),
+        UpdateExpression: 'SET currentSessionId = :sessionId',
+        ExpressionAttributeValues: marshall({
+          ':sessionId': sessionId
+        })
+      }));
+    } catch (showError) {
+      console.error('WARNING: Failed to link session to show (channel will not be prewarmed):', showError.message);
+    }
+
     return {
       statusCode: 201,
       headers,
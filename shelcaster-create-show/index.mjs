@@ -41,6 +41,10 @@ export const handler = async (event) => {
     const groupId = randomUUID();
     const now = new Date().toISOString();
 
+    // Keys of the sparse airDay-index the channel prewarm scheduler reads (UTC)
+    const airDate = new Date(resolvedScheduledDate);
+    const airTime = Number.isNaN(airDate.getTime()) ? null : airDate.toISOString();
+
     // 1. Create the Show record
     const show = {
       pk: `show#${showId}`,
@@ -55,6 +59,7 @@ export const handler = async (event) => {
       scheduledDate: resolvedScheduledDate,
       scheduledStartTime: resolvedScheduledDate, // backward compat
       scheduledEndTime: scheduledEndTime || null,
+      ...(airTime && { airTime, airDay: airTime.slice(0, 10) }),
       tracklistId: tracklistId || null,
       groupId, // Media Manager group created at show creation (§1.2)
       status, // scheduled, live, completed, cancelled
@@ -295,7 +295,11 @@ export const handler = async (event) => {
         pk: `session#${sessionId}`,
         sk: 'info',
       }),
-      UpdateExpression: 'SET #status = :status, updatedAt = :now',
+      // Once the channel is gone, drop the session from the sparse live-channel index;
+      // an ended session no longer takes its IVS channel's stream events either
+      UpdateExpression: cleanupResults.mediaLiveChannel.success
+        ? 'SET #status = :status, updatedAt = :now REMOVE mediaLiveChannelId, ivsChannelArn'
+        : 'SET #status = :status, updatedAt = :now REMOVE ivsChannelArn',
       ExpressionAttributeNames: {
         '#status': 'status'
       },
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+from datetime import datetime
+
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.finalize import (
+    MASTER_PLAYLIST,
+    S3_BUCKET,
+    find_ffmpeg,
+    finalize_recording,
+    list_objects,
+    master_rendition,
+    recording_prefix,
+    top_rendition,
+)
+from shelcaster_common.profiles import DEFAULT_PROFILE
+from shelcaster_common.readiness import backoff_intervals, deadline_from_context
+from shelcaster_common.schedule import hls_segment_length, parse_time
+from shelcaster_common.segment_index import span_objects, update_index
+from shelcaster_common.session import SessionWrites, invalidate_session, load_session
+from shelcaster_common.tracing import span, traced_handler
+from shelcaster_common.writes import WriteBatch
+
+s3 = lazy_client('s3')
+dynamodb = lazy_client('dynamodb')
+
+TABLE_NAME = 'shelcaster-app'
+SESSION_PARTS = ('mediaLive', 'recording')
+# How long to wait for the segment holding the stop marker to land.
+SETTLE_SECONDS = float(os.environ.get('FINALIZE_SETTLE_SECONDS', '60'))
+
+def recording_rendition(prefix):
+    """Key of the recording's top media playlist, or None if nothing was written"""
+    master_key = f'{prefix}{MASTER_PLAYLIST}'
+    try:
+        return master_rendition(s3, S3_BUCKET, master_key) or master_key
+    except s3.exceptions.NoSuchKey:
+        # No master playlist: pick from what is there
+        return top_rendition(s3, S3_BUCKET, prefix, list_objects(s3, S3_BUCKET, prefix))
+
+def wait_for_index(playlist_key, stopped_at, segment_seconds, deadline):
+    """Index the rendition until it covers the stop marker's segment or time runs out"""
+    intervals = backoff_intervals(initial=1.0, maximum=segment_seconds)
+    while True:
+        try:
+            index, _ = update_index(s3, S3_BUCKET, playlist_key)
+        except s3.exceptions.NoSuchKey:
+            # The rendition has not written its playlist yet
+            index = None
+        if index is not None and (index.ended or (index.end is not None and index.end >= stopped_at)):
+            return index, True
+        interval = next(intervals)
+        if time.monotonic() + interval > deadline:
+            return index, False
+        time.sleep(interval)
+
+@traced_handler
+def lambda_handler(event, context):
+    """Join a stopped recording's segments into one file under recordings/<id>/final/.
+
+    Invoked asynchronously by stop-recording with {"sessionId", "actionName"}.
+    Pass "force": true to rebuild a finalized recording.
+    """
+    session_id = event.get('sessionId')
+    
+    try:
+        session = load_session(
+            dynamodb, session_id, table_name=TABLE_NAME, parts=SESSION_PARTS,
+            use_cache=False, consistent_read=True
+        )
+        if session is None:
+            return {'sessionId': session_id, 'status': 'not_found'}
+        
+        action_name = event.get('actionName') or session.recording_action_name
+        started_at = session.get('recording', 'startedAt')
+        stopped_at = session.get('recording', 'stoppedAt')
+        if action_name != session.recording_action_name:
+            return {'sessionId': session_id, 'status': 'superseded'}
+        if session.is_recording or not started_at or not stopped_at:
+            return {'sessionId': session_id, 'status': 'not_stopped'}
+        if session.get('recording', 'final', 'actionName') == action_name and not event.get('force'):
+            return {'sessionId': session_id, 'status': 'already_finalized', 'key': session.get('recording', 'final', 'key')}
+        
+        started_at = parse_time(started_at)
+        stopped_at = parse_time(stopped_at)
+        segment_seconds = hls_segment_length(session.media_live_profile or DEFAULT_PROFILE)
+        prefix = recording_prefix(session_id)
+        
+        playlist_key = recording_rendition(prefix)
+        if playlist_key is None:
+            return {'sessionId': session_id, 'status': 'no_segments', 'playlist': None}
+        
+        # Selected by program time from the segment index, not by when segments landed
+        with span('WaitForSegments'):
+            deadline = deadline_from_context(context, cap=SETTLE_SECONDS)
+            index, complete = wait_for_index(playlist_key, stopped_at, segment_seconds, deadline)
+        if not complete:
+            print(f'Final segment for {session_id} not indexed after {SETTLE_SECONDS}s, finalizing what landed')
+        
+        segments = span_objects(index, started_at, stopped_at) if index is not None else []
+        if not segments:
+            return {'sessionId': session_id, 'status': 'no_segments', 'playlist': playlist_key}
+        
+        with span('Finalize'):
+            result = finalize_recording(s3, S3_BUCKET, session_id, action_name, segments, ffmpeg=find_ffmpeg())
+        print(json.dumps({'finalized': session_id, 'playlist': playlist_key, **result}))
+        
+        now = datetime.utcnow().isoformat()
+        writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+        session_writes = SessionWrites(writes, session_id)
+        session_writes.set('recording.final', {'M': {
+            'actionName': {'S': action_name},
+            'key': {'S': result['key']},
+            'container': {'S': result['container']},
+            'bytes': {'N': str(result['bytes'])},
+            'segments': {'N': str(result['segments'])},
+            'complete': {'BOOL': complete},
+            'finalizedAt': {'S': now}
+        }})
+        session_writes.touch({'S': now})
+        writes.flush()
+        invalidate_session(session_id)
+        
+        return {'sessionId': session_id, 'status': 'finalized', 'complete': complete, **result}
+    
+    except Exception as error:
+        print(f'Error finalizing recording: {str(error)}')
+        raise
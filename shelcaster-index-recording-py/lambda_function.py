@@ -0,0 +1,72 @@
+from urllib.parse import unquote_plus
+
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.finalize import RECORDING_PREFIX, S3_BUCKET, list_objects, recording_prefix
+from shelcaster_common.segment_index import update_index
+from shelcaster_common.tracing import traced_handler
+
+s3 = lazy_client('s3')
+
+def playlist_keys(event):
+    """(bucket, key) of each media playlist write in an S3 or EventBridge event"""
+    keys = []
+    for record in event.get('Records', []):
+        keys.append((record['s3']['bucket']['name'], unquote_plus(record['s3']['object']['key'])))
+    if event.get('detail-type') == 'Object Created':
+        keys.append((event['detail']['bucket']['name'], event['detail']['object']['key']))
+    return [
+        (bucket, key) for bucket, key in dict.fromkeys(keys)
+        if key.startswith(f'{RECORDING_PREFIX}/') and key.endswith('.m3u8')
+    ]
+
+def session_playlists(session_id):
+    """Every playlist of a session's recording output"""
+    prefix = recording_prefix(session_id)
+    return [
+        (S3_BUCKET, key) for key in list_objects(s3, S3_BUCKET, prefix)
+        if key.endswith('.m3u8') and '/' not in key[len(prefix):]
+    ]
+
+@traced_handler
+def lambda_handler(event, context):
+    """Keep the segment index of each recording playlist up to date.
+
+    Triggered by S3 object-created events (bucket notifications or the
+    EventBridge "Object Created" rule) for recordings/**/*.m3u8; each write
+    of a media playlist appends its new segments. Invoke with
+    {"sessionId", "rebuild": true} to re-index a session from scratch.
+    """
+    rebuild = bool(event.get('rebuild'))
+    
+    try:
+        if event.get('sessionId'):
+            targets = session_playlists(event['sessionId'])
+        else:
+            targets = playlist_keys(event)
+        
+        calls = {
+            key: (lambda bucket=bucket, key=key: update_index(s3, bucket, key, rebuild=rebuild))
+            for bucket, key in targets
+        }
+        results = {}
+        failed = []
+        for key, outcome in run_concurrently(calls).items():
+            if not outcome.ok:
+                print(f'Segment index error for {key}: {str(outcome.error)}')
+                failed.append(key)
+                continue
+            index, added = outcome.value
+            if index is None:
+                continue
+            results[key] = {'segments': len(index), 'added': added, 'ended': index.ended}
+        
+        if failed:
+            # Let the async retry pick these up; the indexed ones are no-ops next time
+            raise RuntimeError(f"Segment index failed for {', '.join(failed)}")
+        
+        return {'indexed': results}
+    
+    except Exception as error:
+        print(f'Error indexing recording: {str(error)}')
+        raise
@@ -0,0 +1,32 @@
+from shelcaster_common.channel_pool import POOL_PROFILE, POOL_SIZE, refill_pool
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.tracing import traced_handler
+
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+
+TABLE_NAME = 'shelcaster-app'
+
+@traced_handler
+def lambda_handler(event, context):
+    """Top up the MediaLive warm pool.
+
+    Invoked asynchronously by start-streaming after it claims a pair, and on
+    a schedule so the pool recovers from failed refills.
+    """
+    profile = event.get('profile', POOL_PROFILE)
+    size = int(event.get('size', POOL_SIZE))
+    
+    try:
+        created = refill_pool(medialive, dynamodb, size=size, profile=profile, table_name=TABLE_NAME)
+        for ml_channel in created:
+            print(f"Pooled MediaLive channel created: {ml_channel['channelId']}")
+        
+        return {
+            'profile': profile,
+            'created': [ml_channel['channelId'] for ml_channel in created]
+        }
+        
+    except Exception as error:
+        print(f'Error refilling MediaLive pool: {str(error)}')
+        raise
@@ -0,0 +1,212 @@
+import json
+import os
+import time
+from datetime import datetime
+
+from shelcaster_common.channel_pool import (
+    POOL_PROFILE,
+    STATUS_RESERVED,
+    list_entries,
+    release_expired_reservations,
+    request_refill,
+    reserve_pooled_channel,
+)
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.prewarm import (
+    HOLD_SECONDS,
+    MAX_LEAD_SECONDS,
+    format_time,
+    load_startup_stats,
+    prewarm_expired,
+    session_profile,
+    upcoming_shows,
+)
+from shelcaster_common.profiles import profile_names
+from shelcaster_common.readiness import deadline_from_context
+from shelcaster_common.resilience import guard, is_conflict
+from shelcaster_common.session import SessionWrites, invalidate_session, load_sessions, session_path
+from shelcaster_common.tracing import traced_handler
+from shelcaster_common.writes import WriteBatch
+
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+lambda_client = lazy_client('lambda')
+
+TABLE_NAME = 'shelcaster-app'
+START_FUNCTION_NAME = os.environ.get('START_STREAMING_FUNCTION', 'shelcaster-start-streaming-py')
+# How often the schedule runs this; a start is due one run early rather than one run late
+INTERVAL_SECONDS = float(os.environ.get('PREWARM_INTERVAL_SECONDS', '60'))
+# Channels are set aside this much earlier than they are started
+CREATE_AHEAD_SECONDS = float(os.environ.get('PREWARM_CREATE_AHEAD_SECONDS', '600'))
+# A run only makes calls, it never waits on a channel
+CALL_SECONDS = float(os.environ.get('PREWARM_CALL_SECONDS', '20'))
+SESSION_PARTS = ('mediaLive', 'streaming')
+
+def plan(show, session, lead, reserved, now):
+    """What to do for one show this run, or None"""
+    until = show['airTime'] - now
+    if session is None or (not session.media_live_channel_id and until > lead + INTERVAL_SECONDS):
+        # Too early to start: set a channel aside so the start skips creating one
+        if show['showId'] not in reserved and 0 < until <= lead + INTERVAL_SECONDS + CREATE_AHEAD_SECONDS:
+            return 'reserve'
+        return None
+    if session.is_live:
+        return None
+    prewarm = session.get('mediaLive', 'prewarm')
+    if prewarm:
+        if prewarm_expired(prewarm, now):
+            return 'expire'
+        # RUNNING is recorded by the channel-state sync, not polled for here
+        return None
+    if -HOLD_SECONDS < until <= lead + INTERVAL_SECONDS:
+        return 'start'
+    return None
+
+def reserve(show, profile):
+    """Set an idle pool channel aside for the show.
+
+    A dry pool is left to the refill requested after the run; the show is
+    reserved for on a later run, well inside CREATE_AHEAD_SECONDS.
+    """
+    entry = reserve_pooled_channel(dynamodb, show['showId'], show['airTime'], profile=profile, table_name=TABLE_NAME)
+    if entry is None:
+        return {'action': 'reserve', 'result': 'pool_empty'}
+    return {'action': 'reserve', 'result': 'reserved', 'channelId': entry['channelId']}
+
+def start(show, session, lead):
+    """Start the session's channel through start-streaming, which provisions and records it"""
+    lambda_client.invoke(
+        FunctionName=START_FUNCTION_NAME,
+        InvocationType='Event',
+        Payload=json.dumps({
+            'pathParameters': {'sessionId': session.session_id},
+            'queryStringParameters': {'mode': 'prewarm'},
+            'body': json.dumps({'prewarm': {
+                'showId': show['showId'],
+                'airTime': format_time(show['airTime']),
+                'leadSeconds': int(lead)
+            }})
+        }).encode('utf-8')
+    )
+    return {'action': 'start', 'result': 'requested', 'leadSeconds': int(lead)}
+
+def expire(session, deadline):
+    """Stop a prewarmed channel whose host never went live"""
+    writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+    session_writes = SessionWrites(writes, session.session_id)
+    session_writes.remove('mediaLive.prewarm')
+    session_writes.touch({'S': datetime.utcnow().isoformat()})
+    # Unless the host went live since the session was read
+    live_key, live_path = session_path(session.session_id, 'streaming.isLive')
+    names = {f'#live{n}': name for n, name in enumerate(live_path.split('.'))}
+    writes.condition(live_key, f"NOT {'.'.join(names)} = :isLive", values={':isLive': {'BOOL': True}}, names=names)
+    try:
+        writes.flush()
+    except (dynamodb.exceptions.ConditionalCheckFailedException, dynamodb.exceptions.TransactionCanceledException):
+        return {'action': 'expire', 'result': 'went_live'}
+    finally:
+        invalidate_session(session.session_id)
+
+    try:
+        guard('medialive').call(
+            lambda: medialive.stop_channel(ChannelId=session.media_live_channel_id), deadline=deadline
+        )
+    except Exception as e:
+        if not is_conflict(e):
+            raise
+    return {'action': 'expire', 'result': 'stopped', 'channelId': session.media_live_channel_id}
+
+@traced_handler
+def lambda_handler(event, context):
+    """Start MediaLive channels ahead of their shows' scheduled air time.
+    
+    Runs on a schedule (every PREWARM_INTERVAL_SECONDS). For each
+    scheduled show airing soon:
+    - a channel is reserved from the warm pool ahead of time, so the start
+      does not have to create one; the pool function is asked to top the
+      pool up, and a show it was dry for is reserved for on a later run;
+    - its session's channel is started through start-streaming
+      (mode=prewarm) the profile's measured lead time before air, without
+      putting the session live;
+    - the channel-state sync records when it reaches RUNNING (from the
+      MediaLive state-change event), which is what the lead is computed
+      from, so a run never waits on a channel;
+    - a prewarmed channel whose host is not live HOLD_SECONDS after air
+      time is stopped, and stale reservations go back to the pool.
+    Event: {"dryRun": true} to report the plan without acting.
+    """
+    dry_run = bool(event.get('dryRun'))
+    
+    try:
+        now = time.time()
+        deadline = deadline_from_context(context, cap=CALL_SECONDS)
+        shows = upcoming_shows(
+            dynamodb, now - HOLD_SECONDS - INTERVAL_SECONDS,
+            now + MAX_LEAD_SECONDS + INTERVAL_SECONDS + CREATE_AHEAD_SECONDS, table_name=TABLE_NAME
+        )
+        sessions = load_sessions(
+            dynamodb, [show['sessionId'] for show in shows if show['sessionId']],
+            table_name=TABLE_NAME, parts=SESSION_PARTS
+        )
+        
+        profiles = {}
+        for show in shows:
+            session = sessions.get(show['sessionId'])
+            if session is not None and session.get('showId') != show['showId']:
+                # The show moved on to a newer session than the one indexed
+                sessions.pop(show['sessionId'])
+                session = None
+            profiles[show['showId']] = session_profile(session) if session is not None else POOL_PROFILE
+        stats = load_startup_stats(dynamodb, set(profiles.values()), table_name=TABLE_NAME)
+        reserved = {
+            entry['reservedFor']
+            for profile in set(profiles.values())
+            for entry in list_entries(dynamodb, profile, STATUS_RESERVED, table_name=TABLE_NAME)
+        }
+        
+        plans = {}
+        for show in shows:
+            session = sessions.get(show['sessionId'])
+            lead = stats[profiles[show['showId']]].lead_time()
+            action = plan(show, session, lead, reserved, now)
+            if action:
+                plans[show['showId']] = (action, show, session, lead)
+        
+        results = {}
+        if dry_run:
+            results = {show_id: {'action': action, 'result': 'planned'} for show_id, (action, _, _, _) in plans.items()}
+        else:
+            calls = {}
+            for show_id, (action, show, session, lead) in plans.items():
+                if action == 'reserve':
+                    calls[show_id] = lambda show=show, profile=profiles[show_id]: reserve(show, profile)
+                elif action == 'start':
+                    calls[show_id] = lambda show=show, session=session, lead=lead: start(show, session, lead)
+                elif action == 'expire':
+                    calls[show_id] = lambda session=session: expire(session, deadline)
+            for show_id, outcome in run_concurrently(calls).items():
+                results[show_id] = outcome.value if outcome.ok else {
+                    'action': plans[show_id][0], 'result': 'error', 'error': str(outcome.error)
+                }
+            # One asynchronous top-up per profile reserved from, taken or dry
+            for profile in sorted({profiles[show_id] for show_id, (action, _, _, _) in plans.items() if action == 'reserve'}):
+                request_refill(lambda_client, profile=profile)
+            
+            for profile in profile_names():
+                for entry in release_expired_reservations(dynamodb, now - HOLD_SECONDS, profile=profile, table_name=TABLE_NAME):
+                    results.setdefault(entry['reservedFor'], {'action': 'release', 'result': 'released', 'channelId': entry['channelId']})
+        
+        for show_id, result in results.items():
+            print(json.dumps({'prewarm': 'show', 'showId': show_id, **result}))
+        
+        return {
+            'dryRun': dry_run,
+            'shows': len(shows),
+            'leads': {profile: stats[profile].lead_time() for profile in stats},
+            'actions': results
+        }
+    
+    except Exception as error:
+        print(f'Error prewarming channels: {str(error)}')
+        raise
@@ -0,0 +1,98 @@
+import json
+import os
+
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.schedule import ScheduleBatch, describe_schedule, reconcile_recording
+from shelcaster_common.session import load_sessions
+from shelcaster_common.tracing import traced_handler
+
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+
+TABLE_NAME = 'shelcaster-app'
+MAX_SESSIONS = int(os.environ.get('RECONCILE_MAX_SESSIONS', '100'))
+
+@traced_handler
+def lambda_handler(event, context):
+    """Reconcile recording markers on channel schedules with session state.
+
+    Body: {"sessionIds": [...], "dryRun": false}. Orphaned markers are
+    deleted in one batch_update_schedule per channel.
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': '*'
+    }
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+        session_ids = list(dict.fromkeys(body.get('sessionIds') or []))
+        dry_run = bool(body.get('dryRun'))
+
+        if not session_ids:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'Missing sessionIds'})
+            }
+
+        if len(session_ids) > MAX_SESSIONS:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': f'At most {MAX_SESSIONS} sessions per request'})
+            }
+
+        sessions = load_sessions(dynamodb, session_ids, table_name=TABLE_NAME, parts=('mediaLive', 'recording'))
+        results = {}
+        calls = {}
+        for session_id in session_ids:
+            session = sessions.get(session_id)
+            if session is None:
+                results[session_id] = {'status': 'not_found'}
+            elif not session.media_live_channel_id:
+                results[session_id] = {'status': 'no_channel'}
+            else:
+                channel_id = session.media_live_channel_id
+                calls[session_id] = lambda channel_id=channel_id: describe_schedule(medialive, channel_id)
+
+        # Read every channel's schedule concurrently
+        schedule = ScheduleBatch(medialive)
+        owners = {}
+        for session_id, outcome in run_concurrently(calls).items():
+            if not outcome.ok:
+                results[session_id] = {'status': 'error', 'error': str(outcome.error)}
+                continue
+            session = sessions[session_id]
+            report = reconcile_recording(session, outcome.value, batch=None if dry_run else schedule)
+            report['status'] = 'drift' if report['missing'] or report['orphaned'] else 'ok'
+            results[session_id] = report
+            owners.setdefault(session.media_live_channel_id, []).append(session_id)
+
+        # Then delete orphans with one schedule update per channel
+        for channel_id, outcome in schedule.flush().items():
+            if not outcome.ok:
+                print(f'Schedule cleanup failed for {channel_id}: {str(outcome.error)}')
+                for session_id in owners[channel_id]:
+                    results[session_id]['status'] = 'error'
+                    results[session_id]['error'] = str(outcome.error)
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'message': 'Recording schedules reconciled',
+                'dryRun': dry_run,
+                'results': results
+            })
+        }
+
+    except Exception as error:
+        print(f'Error reconciling recordings: {str(error)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(error)})
+        }
@@ -1,15 +1,25 @@
-import boto3
 import json
 from datetime import datetime
 
-medialive = boto3.client('medialive', region_name='us-east-1')
-dynamodb = boto3.client('dynamodb', region_name='us-east-1')
+from shelcaster_common.api import parse_body
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.finalize import S3_BUCKET, recording_prefix
+from shelcaster_common.profiles import DEFAULT_PROFILE
+from shelcaster_common.schedule import ScheduleBatch, aligned_start, hls_segment_length, parse_time
+from shelcaster_common.segment_index import timeline_anchor
+from shelcaster_common.session import SessionWrites, invalidate_session, load_session
+from shelcaster_common.tracing import traced_handler
+from shelcaster_common.writes import WriteBatch
+
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+s3 = lazy_client('s3')
 
 TABLE_NAME = 'shelcaster-app'
+SESSION_PARTS = ('mediaLive', 'recording')
 
+@traced_handler
 def lambda_handler(event, context):
-    print('Event:', json.dumps(event))
-    
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
@@ -26,30 +36,21 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing sessionId'})
             }
         
-        # Get session from DynamoDB
-        response = dynamodb.get_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            }
+        # Get session (read through: the decision below must not rest on another container's past)
+        session = load_session(
+            dynamodb, session_id, table_name=TABLE_NAME, parts=SESSION_PARTS,
+            use_cache=False, consistent_read=True
         )
         
-        if 'Item' not in response:
+        if session is None:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Session not found'})
             }
         
-        session = response['Item']
-        
         # Get MediaLive channel ID
-        channel_id = None
-        if 'mediaLive' in session and 'M' in session['mediaLive']:
-            ml_data = session['mediaLive']['M']
-            if 'channelId' in ml_data and 'S' in ml_data['channelId']:
-                channel_id = ml_data['channelId']['S']
+        channel_id = session.media_live_channel_id
         
         if not channel_id:
             return {
@@ -58,48 +59,77 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'MediaLive channel not found'})
             }
         
-        # Create schedule action to enable S3 output
-        action_name = f'start-recording-{session_id}'
-        medialive.batch_update_schedule(
-            ChannelId=channel_id,
-            Creates={
-                'ScheduleActions': [{
-                    'ActionName': action_name,
-                    'ScheduleActionStartSettings': {
-                        'ImmediateMode': {}
-                    },
-                    'ScheduleActionSettings': {
-                        'HlsOutputSettings': {
-                            'HlsGroupSettings': {
-                                'Destination': {
-                                    'DestinationRefId': 's3-destination'
-                                }
-                            }
-                        }
-                    }
-                }]
+        if session.is_recording:
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({
+                    'message': 'Recording already started',
+                    'actionName': session.recording_action_name
+                })
             }
-        )
         
-        # Update DynamoDB
-        dynamodb.update_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            },
-            UpdateExpression='SET recording.isRecording = :rec, recording.startedAt = :now, recording.actionName = :action, updatedAt = :now',
-            ExpressionAttributeValues={
-                ':rec': {'BOOL': True},
-                ':action': {'S': action_name},
-                ':now': {'S': datetime.utcnow().isoformat()}
+        # Optional planned window: {"startAt": ISO-8601, "stopAt": ISO-8601}
+        segment_seconds = hls_segment_length(session.media_live_profile or DEFAULT_PROFILE)
+        try:
+            body = parse_body(event)
+            start_at = stop_at = None
+            if body.get('startAt') or body.get('stopAt'):
+                # Boundaries follow the channel's own segments once it has written some
+                anchor = timeline_anchor(s3, S3_BUCKET, recording_prefix(session_id))
+                if body.get('startAt'):
+                    start_at = aligned_start(parse_time(body['startAt']), segment_seconds, anchor=anchor)
+                if body.get('stopAt'):
+                    stop_at = aligned_start(parse_time(body['stopAt']), segment_seconds, anchor=anchor)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)})
             }
-        )
+        if start_at is not None and stop_at is not None and stop_at <= start_at:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'stopAt must be after startAt'})
+            }
+        
+        # Start (and planned stop) markers go out in one schedule update
+        schedule = ScheduleBatch(medialive)
+        action_name = schedule.marker(channel_id, session_id, 'start', start_at=start_at)
+        stop_action_name = None
+        if stop_at is not None:
+            stop_action_name = schedule.marker(channel_id, session_id, 'stop', start_at=stop_at)
+        result = schedule.flush()[channel_id]
+        if not result.ok:
+            raise result.error
+        
+        # Update DynamoDB
+        now = datetime.utcnow().isoformat()
+        started_at = datetime.utcfromtimestamp(start_at).isoformat() if start_at else now
+        writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+        session_writes = SessionWrites(writes, session_id)
+        session_writes.set('recording.isRecording', {'BOOL': True})
+        session_writes.set('recording.startedAt', {'S': started_at})
+        session_writes.set('recording.actionName', {'S': action_name})
+        if stop_action_name:
+            session_writes.set('recording.stopActionName', {'S': stop_action_name})
+            session_writes.set('recording.stopAt', {'S': datetime.utcfromtimestamp(stop_at).isoformat()})
+        else:
+            session_writes.remove('recording.stopActionName')
+            session_writes.remove('recording.stopAt')
+        session_writes.touch({'S': now})
+        writes.flush()
+        invalidate_session(session_id)
         
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps({'message': 'Recording started'})
+            'body': json.dumps({
+                'message': 'Recording scheduled' if start_at else 'Recording started',
+                'actionName': action_name,
+                'startedAt': started_at
+            })
         }
         
     except Exception as error:
@@ -1,152 +1,148 @@
-import boto3
 import json
+import math
+import os
+import time
+import uuid
 from datetime import datetime
 
-ivs = boto3.client('ivs', region_name='us-east-1')
-medialive = boto3.client('medialive', region_name='us-east-1')
-dynamodb = boto3.client('dynamodb', region_name='us-east-1')
+from shelcaster_common.api import parse_body
+from shelcaster_common.channel_pool import POOL_PROFILE, pool_key, release_pooled_channel, request_refill, take_pooled_channel
+from shelcaster_common.channels import create_input_and_channel, ensure_channel_spec, media_live_attribute, source_attribute
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.lease import release_lease, single_flight, stage_release
+from shelcaster_common.prewarm import prewarm_attribute, record_startup
+from shelcaster_common.profiles import DEFAULT_PROFILE, get_profile, parse_source, resolve_profile
+from shelcaster_common.readiness import (
+    READY_STATES,
+    START_FAILED_STATES,
+    deadline_from_context,
+    encode_status_token,
+    wait_for_channel_state,
+)
+from shelcaster_common.resilience import guard, is_conflict, is_retryable
+from shelcaster_common.schedule import parse_time
+from shelcaster_common.session import (
+    CHANNEL_ID_ATTRIBUTE,
+    IVS_CHANNEL_ATTRIBUTE,
+    Session,
+    SessionWrites,
+    invalidate_session,
+    load_session,
+    session_path,
+)
+from shelcaster_common.tracing import log_sampled, span, traced_handler
+from shelcaster_common.writes import WriteBatch
+
+ivs = lazy_client('ivs')
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+lambda_client = lazy_client('lambda')
 
 TABLE_NAME = 'shelcaster-app'
-MEDIALIVE_ROLE_ARN = 'arn:aws:iam::124355640062:role/MediaLiveAccessRole'
-INPUT_SECURITY_GROUP_ID = '3617718'
-S3_BUCKET = 'shelcaster-media-manager'
+POOL_ENABLED = os.environ.get('MEDIALIVE_POOL_ENABLED', 'true') == 'true'
+# Upper bound for all MediaLive waits in one request (API Gateway gives up
+# at 29s), on top of the Lambda's own remaining time.
+MAX_WAIT_SECONDS = float(os.environ.get('START_WAIT_MAX_SECONDS', '25'))
+START_MODES = ('immediate', 'wait', 'async', 'prewarm')
+SESSION_PARTS = ('mediaLive', 'ivs')
+PREWARM_PARTS = SESSION_PARTS + ('streaming',)
 
-def create_medialive_channel(session_id, ivs_ingest):
+def create_medialive_channel(session_id, ivs_ingest, profile_name=DEFAULT_PROFILE):
     """Create MediaLive channel with RTMP input and dual outputs"""
-    # Create RTMP input
-    input_response = medialive.create_input(
-        Name=f'shelcaster-input-{session_id}',
-        Type='RTMP_PUSH',
-        InputSecurityGroups=[INPUT_SECURITY_GROUP_ID],
-        Destinations=[{'StreamName': f'host/{session_id}'}]
+    return create_input_and_channel(
+        medialive,
+        name_suffix=session_id,
+        stream_name=f'host/{session_id}',
+        ivs_ingest=ivs_ingest,
+        recording_id=session_id,
+        profile_name=profile_name
     )
+
+def provision_medialive_channel(session_id, ivs_ingest, profile_name=DEFAULT_PROFILE, show_id=None, deadline=None):
+    """Take the show's reserved channel or a warm pooled one of the profile, otherwise create one"""
+    if POOL_ENABLED:
+        ml_channel = take_pooled_channel(
+            medialive, dynamodb, session_id, ivs_ingest, profile=profile_name, table_name=TABLE_NAME,
+            reserved_for=show_id, deadline=deadline
+        )
+        if ml_channel:
+            print(f"Claimed pooled MediaLive channel: {ml_channel['channelId']}")
+            return ml_channel, True
+        print(f'MediaLive pool empty for {profile_name}, creating channel inline')
     
-    input_id = input_response['Input']['Id']
-    rtmp_url = input_response['Input']['Destinations'][0]['Url']
+    return create_medialive_channel(session_id, ivs_ingest, profile_name), False
+
+def provision_session_channels(session_id, session, session_writes, profile_name=DEFAULT_PROFILE, deadline=None):
+    """Create the IVS ingest channel if needed and provision MediaLive, staging IVS writes"""
+    # Get or create IVS STANDARD channel for ingest
+    ivs_ingest = session.ivs_ingest_endpoint
     
-    # Create MediaLive channel
-    channel_response = medialive.create_channel(
-        Name=f'shelcaster-channel-{session_id}',
-        RoleArn=MEDIALIVE_ROLE_ARN,
-        ChannelClass='SINGLE_PIPELINE',
-        InputSpecification={
-            'Codec': 'AVC',
-            'Resolution': 'HD',
-            'MaximumBitrate': 'MAX_10_MBPS'
-        },
-        InputAttachments=[{
-            'InputId': input_id,
-            'InputAttachmentName': 'host-input',
-            'InputSettings': {
-                'SourceEndBehavior': 'CONTINUE'
-            }
-        }],
-        Destinations=[
-            {
-                'Id': 'ivs-destination',
-                'Settings': [{'Url': f'rtmps://{ivs_ingest}:443/app/', 'StreamName': 'live'}]
-            },
-            {
-                'Id': 's3-destination',
-                'Settings': [{'Url': f's3ssl://{S3_BUCKET}/recordings/{session_id}/index'}]
-            }
-        ],
-        EncoderSettings={
-            'AudioDescriptions': [{
-                'Name': 'audio_aac',
-                'AudioSelectorName': 'default',
-                'CodecSettings': {
-                    'AacSettings': {
-                        'Bitrate': 128000,
-                        'CodingMode': 'CODING_MODE_2_0',
-                        'SampleRate': 48000
-                    }
-                }
-            }],
-            'VideoDescriptions': [{
-                'Name': 'video_1080p',
-                'CodecSettings': {
-                    'H264Settings': {
-                        'Profile': 'HIGH',
-                        'Level': 'H264_LEVEL_4_1',
-                        'Bitrate': 5000000,
-                        'RateControlMode': 'CBR',
-                        'FramerateNumerator': 30,
-                        'FramerateDenominator': 1
-                    }
-                },
-                'Width': 1920,
-                'Height': 1080
-            }],
-            'OutputGroups': [
-                {
-                    'Name': 'RTMP',
-                    'OutputGroupSettings': {
-                        'RtmpGroupSettings': {
-                            'AuthenticationScheme': 'COMMON',
-                            'CacheFullBehavior': 'DISCONNECT_IMMEDIATELY',
-                            'CacheLength': 30,
-                            'CaptionData': 'ALL',
-                            'RestartDelay': 15
-                        }
-                    },
-                    'Outputs': [{
-                        'OutputName': 'ivs-output',
-                        'VideoDescriptionName': 'video_1080p',
-                        'AudioDescriptionNames': ['audio_aac'],
-                        'OutputSettings': {
-                            'RtmpOutputSettings': {
-                                'Destination': {'DestinationRefId': 'ivs-destination'},
-                                'ConnectionRetryInterval': 2,
-                                'NumRetries': 10
-                            }
-                        }
-                    }]
-                },
-                {
-                    'Name': 'HLS',
-                    'OutputGroupSettings': {
-                        'HlsGroupSettings': {
-                            'Destination': {'DestinationRefId': 's3-destination'},
-                            'HlsCdnSettings': {'HlsBasicPutSettings': {'ConnectionRetryInterval': 1, 'NumRetries': 10}},
-                            'SegmentLength': 6,
-                            'ManifestDurationFormat': 'INTEGER'
-                        }
-                    },
-                    'Outputs': [{
-                        'OutputName': 's3-output',
-                        'VideoDescriptionName': 'video_1080p',
-                        'AudioDescriptionNames': ['audio_aac'],
-                        'OutputSettings': {
-                            'HlsOutputSettings': {
-                                'HlsSettings': {
-                                    'StandardHlsSettings': {
-                                        'M3u8Settings': {
-                                            'AudioFramesPerPes': 4,
-                                            'PcrControl': 'PCR_EVERY_PES_PACKET'
-                                        },
-                                        'AudioRenditionSets': 'program_audio'
-                                    }
-                                },
-                                'NameModifier': '_recording'
-                            }
-                        }
-                    }]
-                }
-            ],
-            'TimecodeConfig': {'Source': 'EMBEDDED'}
-        }
-    )
+    # If no ingest endpoint, create STANDARD IVS channel
+    if not ivs_ingest:
+        print('Creating STANDARD IVS channel for MediaLive ingest...')
+        # Not idempotent: only retried on throttling, which never creates it
+        ivs_channel = guard('ivs').call(lambda: ivs.create_channel(
+            name=f'shelcaster-ingest-{session_id}',
+            type='STANDARD',
+            latencyMode='LOW'
+        ), idempotent=False)
+        ivs_ingest = f"rtmps://{ivs_channel['channel']['ingestEndpoint']}:443/app/"
+        
+        session_writes.set('ivs.programIngestEndpoint', {'S': ivs_ingest})
+        session_writes.set('ivs.ingestChannelArn', {'S': ivs_channel['channel']['arn']})
+        # Indexed copy, so the channel's stream events find the session
+        session_writes.set(IVS_CHANNEL_ATTRIBUTE, {'S': ivs_channel['channel']['arn']})
+        print(f'STANDARD IVS channel created with ingest: {ivs_ingest}')
     
-    return {
-        'channelId': channel_response['Channel']['Id'],
-        'inputId': input_id,
-        'rtmpUrl': rtmp_url
-    }
+    # Claim a pooled MediaLive channel or create one
+    with span('ProvisionChannel'):
+        return provision_medialive_channel(session_id, ivs_ingest, profile_name, show_id=session.get('showId'), deadline=deadline)
+
+def flush_session(writes, session_id, pooled_channel=None, profile_name=DEFAULT_PROFILE, started=False):
+    """Write the staged session changes; a pooled channel they would have taken goes back to the pool"""
+    try:
+        writes.flush()
+    except Exception:
+        if pooled_channel:
+            return_pooled_channel(pooled_channel, session_id, profile_name, started)
+        raise
+    finally:
+        invalidate_session(session_id)
 
+def return_pooled_channel(pooled_channel, session_id, profile_name, started):
+    """Release a claim the session never recorded, so the entry does not stay claimed forever"""
+    channel_id = pooled_channel['channelId']
+    try:
+        if started:
+            # Nothing else knows about this channel; a pool entry must be idle
+            guard('medialive').call(lambda: medialive.stop_channel(ChannelId=channel_id))
+        release_pooled_channel(
+            dynamodb, channel_id, profile_name, table_name=TABLE_NAME, claimed_by=session_id,
+            reserved_for=pooled_channel.get('reservedFor')
+        )
+        print(f'Returned pooled MediaLive channel {channel_id} after the session write failed')
+    except Exception as e:
+        print(f'MediaLive pool release warning for {channel_id}: {str(e)}')
+
+def unmark_live(session_id, started_at):
+    """Undo this call's streaming.isLive, unless a later start has written since"""
+    writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+    session_writes = SessionWrites(writes, session_id)
+    session_writes.set('streaming.isLive', {'BOOL': False})
+    session_writes.touch({'S': datetime.utcnow().isoformat()})
+    key, path = session_path(session_id, 'streaming.startedAt')
+    names = {f'#started{n}': name for n, name in enumerate(path.split('.'))}
+    writes.condition(key, f"{'.'.join(names)} = :startedAt", values={':startedAt': started_at}, names=names)
+    try:
+        writes.flush()
+    except (dynamodb.exceptions.ConditionalCheckFailedException, dynamodb.exceptions.TransactionCanceledException):
+        pass
+    finally:
+        invalidate_session(session_id)
+
+@traced_handler
 def lambda_handler(event, context):
-    print('Event:', json.dumps(event))
-    
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
@@ -155,6 +151,12 @@ def lambda_handler(event, context):
     
     try:
         session_id = event.get('pathParameters', {}).get('sessionId')
+        # immediate (default): return after start_channel
+        # wait: poll until RUNNING, falling back to 202 at the deadline
+        # async: return 202 with a status token right away
+        # prewarm: start only the MediaLive channel ahead of air time (the
+        #   prewarm scheduler); the session stays not live until go-live
+        mode = (event.get('queryStringParameters') or {}).get('mode', 'immediate')
         
         if not session_id:
             return {
@@ -163,138 +165,240 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing sessionId'})
             }
         
-        # Get session from DynamoDB
-        response = dynamodb.get_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
+        if mode not in START_MODES:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': f'Invalid mode: {mode}'})
             }
+        
+        # Get session (read through: the decision below must not rest on another container's past)
+        session = load_session(
+            dynamodb, session_id, table_name=TABLE_NAME,
+            parts=PREWARM_PARTS if mode == 'prewarm' else SESSION_PARTS,
+            use_cache=False, consistent_read=True
         )
         
-        if 'Item' not in response:
+        if session is None:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Session not found'})
             }
+        log_sampled('Session', session.item)
         
-        session = response['Item']
-        print('Session:', json.dumps(session, default=str))
+        if mode == 'prewarm' and (session.is_live or session.get('mediaLive', 'prewarm')):
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({'message': 'Already live' if session.is_live else 'Already prewarmed'})
+            }
+        
+        # Encoder profile: an explicit one, else a ladder fitted to the declared
+        # source in the requested latency mode, else what the channel already runs
+        try:
+            body = parse_body(event)
+            prewarm = None
+            if mode == 'prewarm':
+                details = body.get('prewarm') or {}
+                if not isinstance(details, dict) or not details.get('showId') or details.get('airTime') is None:
+                    raise ValueError('prewarm needs showId and airTime')
+                prewarm = prewarm_attribute(
+                    details['showId'], parse_time(details['airTime']), details.get('leadSeconds', 0),
+                    requested_at=datetime.utcnow().isoformat()
+                )
+            source = parse_source(body.get('input'))
+            profile_name = resolve_profile(
+                requested=body.get('profile'),
+                source=source or session.media_live_input,
+                latency_mode=body.get('latencyMode') or session.media_live_latency_mode,
+                current=session.media_live_profile
+            )
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)})
+            }
+        
+        # One budget for every wait below, so the request ends before the gateway cuts it off
+        deadline = deadline_from_context(context, cap=MAX_WAIT_SECONDS)
+        
+        # Session changes are staged here and written once at the end
+        writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+        session_writes = SessionWrites(writes, session_id)
+        writes.condition(session_writes.key(), 'attribute_exists(pk)')
         
         # Check if MediaLive channel exists, create if not
-        channel_id = None
-        if 'mediaLive' in session and 'M' in session['mediaLive']:
-            ml_data = session['mediaLive']['M']
-            if 'channelId' in ml_data and 'S' in ml_data['channelId']:
-                channel_id = ml_data['channelId']['S']
+        channel_id = session.media_live_channel_id
+        provisioned = False
+        pooled_channel = None
         
         if not channel_id:
-            print('MediaLive channel not found, creating...')
-            # Get or create IVS STANDARD channel for ingest
-            ivs_ingest = None
-            if 'ivs' in session and 'M' in session['ivs']:
-                ivs_data = session['ivs']['M']
-                if 'programIngestEndpoint' in ivs_data and 'S' in ivs_data['programIngestEndpoint']:
-                    ivs_ingest = ivs_data['programIngestEndpoint']['S']
-            
-            # If no ingest endpoint, create STANDARD IVS channel
-            if not ivs_ingest:
-                print('Creating STANDARD IVS channel for MediaLive ingest...')
-                ivs_channel = ivs.create_channel(
-                    name=f'shelcaster-ingest-{session_id}',
-                    type='STANDARD',
-                    latencyMode='LOW'
+            # Only one concurrent start provisions; the rest wait for its channel
+            owner = getattr(context, 'aws_request_id', None) or str(uuid.uuid4())
+            lease_key, channel_path = session_path(session_id, 'mediaLive.channelId')
+            with span('ProvisionLease'):
+                _, provisioned = single_flight(
+                    dynamodb, lease_key, owner,
+                    is_done=lambda item: Session.from_items(session_id, [item]).media_live_channel_id,
+                    deadline=deadline,
+                    unless_exists=channel_path,
+                    must_exist=lease_key == session_writes.key(),
+                    table_name=TABLE_NAME
                 )
-                ivs_ingest = f"rtmps://{ivs_channel['channel']['ingestEndpoint']}:443/app/"
-                
-                # Update session with ingest endpoint
-                dynamodb.update_item(
-                    TableName=TABLE_NAME,
-                    Key={
-                        'pk': {'S': f'session#{session_id}'},
-                        'sk': {'S': 'info'}
-                    },
-                    UpdateExpression='SET ivs.programIngestEndpoint = :ingest, ivs.ingestChannelArn = :arn',
-                    ExpressionAttributeValues={
-                        ':ingest': {'S': ivs_ingest},
-                        ':arn': {'S': ivs_channel['channel']['arn']}
-                    }
+            if not provisioned:
+                session = load_session(
+                    dynamodb, session_id, table_name=TABLE_NAME, parts=SESSION_PARTS,
+                    use_cache=False, consistent_read=True
                 )
-                print(f'STANDARD IVS channel created with ingest: {ivs_ingest}')
-            
-            # Create MediaLive channel
-            ml_channel = create_medialive_channel(session_id, ivs_ingest)
+                channel_id = session.media_live_channel_id
+                print(f'MediaLive channel provisioned concurrently: {channel_id}')
+        
+        if provisioned:
+            print('MediaLive channel not found, creating...')
+            try:
+                ml_channel, from_pool = provision_session_channels(
+                    session_id, session, session_writes, profile_name, deadline=deadline
+                )
+            except Exception:
+                release_lease(dynamodb, lease_key, owner, table_name=TABLE_NAME)
+                raise
             channel_id = ml_channel['channelId']
-            
-            # Update DynamoDB with MediaLive info
-            dynamodb.update_item(
-                TableName=TABLE_NAME,
-                Key={
-                    'pk': {'S': f'session#{session_id}'},
-                    'sk': {'S': 'info'}
-                },
-                UpdateExpression='SET mediaLive = :ml',
-                ExpressionAttributeValues={
-                    ':ml': {
-                        'M': {
-                            'channelId': {'S': ml_channel['channelId']},
-                            'inputId': {'S': ml_channel['inputId']},
-                            'rtmpUrl': {'S': ml_channel['rtmpUrl']}
-                        }
-                    }
-                }
+            media_live = media_live_attribute(
+                ml_channel, source or session.media_live_input,
+                body.get('latencyMode') or session.media_live_latency_mode
             )
+            session_writes.set('mediaLive', media_live)
+            session_writes.set(CHANNEL_ID_ATTRIBUTE, {'S': channel_id})
+            stage_release(writes, lease_key, owner)
             print(f'MediaLive channel created: {channel_id}')
+            
+            if from_pool:
+                # Drop the pool entry in the same transaction as the session write
+                pooled_channel = ml_channel
+                writes.delete(pool_key(channel_id, profile_name))
+                writes.condition(pool_key(channel_id, profile_name), 'claimedBy = :sid', values={':sid': {'S': session_id}})
+        else:
+            # Reuse the existing channel, patching it if its encoder spec is stale
+            spec_hash = ensure_channel_spec(
+                medialive, channel_id, session.media_live_spec_hash, profile_name, deadline=deadline
+            )
+            if spec_hash and spec_hash != session.media_live_spec_hash:
+                session_writes.set('mediaLive.specHash', {'S': spec_hash})
+                if spec_hash == get_profile(profile_name).spec_hash:
+                    session_writes.set('mediaLive.profile', {'S': profile_name})
+            if source:
+                session_writes.set('mediaLive.input', source_attribute(source))
+            if body.get('latencyMode'):
+                session_writes.set('mediaLive.latencyMode', {'S': body['latencyMode']})
+            if CHANNEL_ID_ATTRIBUTE not in session.item:
+                # Backfill the live-channel index key for sessions created before it
+                session_writes.set(CHANNEL_ID_ATTRIBUTE, {'S': channel_id})
         
-        # Start MediaLive channel
-        try:
-            medialive.start_channel(ChannelId=channel_id)
+        # Start MediaLive, riding out throttling when many shows start at once.
+        # IVS has no start call: the channel goes live once MediaLive's output
+        # reaches its ingest.
+        started_at = time.monotonic()
+        ml_result = run_concurrently({'medialive': lambda: guard('medialive').call(
+            lambda: medialive.start_channel(ChannelId=channel_id), deadline=deadline
+        )})['medialive']
+        channel_state = None
+        if ml_result.ok:
+            channel_state = ml_result.value.get('State')
             print(f'MediaLive channel started: {channel_id}')
-        except Exception as e:
-            if 'ConflictException' not in str(e):
-                raise
+        elif is_conflict(ml_result.error):
             print('MediaLive channel already running')
+        else:
+            # Keep what was provisioned so a retry reuses it instead of leaking it
+            flush_session(writes, session_id, pooled_channel, profile_name)
+            if not is_retryable(ml_result.error):
+                raise ml_result.error
+            # Still throttled (or MediaLive degraded) after the retries: ask the client to come back
+            retry_after = math.ceil(getattr(ml_result.error, 'retry_after', 5))
+            print(f'MediaLive start deferred: {str(ml_result.error)}')
+            return {
+                'statusCode': 503,
+                'headers': {**headers, 'Retry-After': str(retry_after)},
+                'body': json.dumps({
+                    'error': 'MediaLive is busy, retry shortly',
+                    'channelId': channel_id,
+                    'retryAfter': retry_after
+                })
+            }
         
-        # Start IVS channel if exists
-        if 'ivs' in session and 'M' in session['ivs']:
-            ivs_data = session['ivs']['M']
-            if 'programChannelArn' in ivs_data and 'S' in ivs_data['programChannelArn']:
-                channel_arn = ivs_data['programChannelArn']['S']
-                try:
-                    ivs.start_channel(arn=channel_arn)
-                    print(f'IVS channel started: {channel_arn}')
-                except Exception as e:
-                    print(f'IVS start warning: {str(e)}')
+        if prewarm and provisioned:
+            # Later sets of a path win, and a nested set would overlap the new map
+            media_live['M']['prewarm'] = prewarm
+            session_writes.set('mediaLive', media_live)
+        elif prewarm:
+            session_writes.set('mediaLive.prewarm', prewarm)
         
-        # Update DynamoDB
-        dynamodb.update_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            },
-            UpdateExpression='SET streaming.isLive = :live, streaming.startedAt = :now, updatedAt = :now',
-            ExpressionAttributeValues={
-                ':live': {'BOOL': True},
-                ':now': {'S': datetime.utcnow().isoformat()}
-            }
-        )
+        # Update DynamoDB in a single write
+        now = {'S': datetime.utcnow().isoformat()}
+        prewarmed = not prewarm and session.get('mediaLive', 'prewarm')
+        if prewarmed:
+            # Hand the prewarmed channel over to the live session
+            print(f"Going live on channel prewarmed for {prewarmed['airTime']}")
+            session_writes.remove('mediaLive.prewarm')
+        if not prewarm:
+            session_writes.set('streaming.isLive', {'BOOL': True})
+            session_writes.set('streaming.startedAt', now)
+        session_writes.touch(now)
+        flush_session(writes, session_id, pooled_channel, profile_name, started=True)
+        
+        # Inline creates only top up the default pool; other profiles' pools refill as they are used
+        if POOL_ENABLED and provisioned and (from_pool or profile_name == POOL_PROFILE):
+            try:
+                request_refill(lambda_client, profile=profile_name)
+            except Exception as e:
+                print(f'MediaLive pool refill warning: {str(e)}')
         
         # Get playback URL
-        playback_url = None
-        if 'ivs' in session and 'M' in session['ivs']:
-            ivs_data = session['ivs']['M']
-            if 'programPlaybackUrl' in ivs_data and 'S' in ivs_data['programPlaybackUrl']:
-                playback_url = ivs_data['programPlaybackUrl']['S']
+        playback_url = session.ivs_playback_url
+        
+        status_code = 200
+        body = {
+            'message': 'Streaming started',
+            'playbackUrl': playback_url
+        }
+        if prewarmed:
+            body['prewarmed'] = True
+        
+        if mode == 'wait':
+            with span('WaitForRunning'):
+                channel_state, ready = wait_for_channel_state(
+                    medialive, channel_id, READY_STATES,
+                    deadline=deadline,
+                    fail_states=START_FAILED_STATES
+                )
+            if channel_state in START_FAILED_STATES:
+                # Do not leave the session live on a channel that never came up
+                unmark_live(session_id, now)
+                raise RuntimeError(f'MediaLive channel {channel_id} is {channel_state}')
+            if ready and ml_result.ok:
+                # This call started it, so the wait measured a full start-up
+                try:
+                    record_startup(dynamodb, profile_name, time.monotonic() - started_at, table_name=TABLE_NAME)
+                except Exception as e:
+                    print(f'Start-up sample warning: {str(e)}')
+            body['channelState'] = channel_state
+            body['ready'] = ready
+            if not ready:
+                status_code = 202
+        elif mode in ('async', 'prewarm'):
+            body['channelState'] = channel_state
+            body['ready'] = channel_state in READY_STATES
+            status_code = 202
+        
+        if status_code == 202:
+            body['message'] = 'Channel prewarming' if prewarm else 'Streaming starting'
+            body['statusToken'] = encode_status_token(session_id, channel_id)
         
         return {
-            'statusCode': 200,
+            'statusCode': status_code,
             'headers': headers,
-            'body': json.dumps({
-                'message': 'Streaming started',
-                'playbackUrl': playback_url
-            })
+            'body': json.dumps(body)
         }
         
     except Exception as error:
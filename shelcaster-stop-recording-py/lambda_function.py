@@ -1,15 +1,25 @@
-import boto3
 import json
+import os
+import time
 from datetime import datetime
 
-medialive = boto3.client('medialive', region_name='us-east-1')
-dynamodb = boto3.client('dynamodb', region_name='us-east-1')
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.finalize import request_finalize
+from shelcaster_common.schedule import ScheduleBatch, parse_time
+from shelcaster_common.session import SessionWrites, invalidate_session, load_session
+from shelcaster_common.tracing import traced_handler
+from shelcaster_common.writes import WriteBatch
+
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+lambda_client = lazy_client('lambda')
 
 TABLE_NAME = 'shelcaster-app'
+FINALIZE_ENABLED = os.environ.get('RECORDING_FINALIZE_ENABLED', 'true') == 'true'
+SESSION_PARTS = ('mediaLive', 'recording')
 
+@traced_handler
 def lambda_handler(event, context):
-    print('Event:', json.dumps(event))
-    
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
@@ -26,37 +36,22 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing sessionId'})
             }
         
-        # Get session from DynamoDB
-        response = dynamodb.get_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            }
+        # Get session (read through: the decision below must not rest on another container's past)
+        session = load_session(
+            dynamodb, session_id, table_name=TABLE_NAME, parts=SESSION_PARTS,
+            use_cache=False, consistent_read=True
         )
         
-        if 'Item' not in response:
+        if session is None:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Session not found'})
             }
         
-        session = response['Item']
-        
         # Get MediaLive channel ID and action name
-        channel_id = None
-        action_name = None
-        
-        if 'mediaLive' in session and 'M' in session['mediaLive']:
-            ml_data = session['mediaLive']['M']
-            if 'channelId' in ml_data and 'S' in ml_data['channelId']:
-                channel_id = ml_data['channelId']['S']
-        
-        if 'recording' in session and 'M' in session['recording']:
-            rec_data = session['recording']['M']
-            if 'actionName' in rec_data and 'S' in rec_data['actionName']:
-                action_name = rec_data['actionName']['S']
+        channel_id = session.media_live_channel_id
+        action_name = session.recording_action_name
         
         if not channel_id:
             return {
@@ -65,33 +60,59 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'MediaLive channel not found'})
             }
         
-        # Delete schedule action to stop recording
-        if action_name:
-            medialive.batch_update_schedule(
-                ChannelId=channel_id,
-                Deletes={
-                    'ActionNames': [action_name]
-                }
-            )
+        # Stage every schedule change for one batch_update_schedule call
+        schedule = ScheduleBatch(medialive)
+        now = datetime.utcnow()
+        started_at = session.get('recording', 'startedAt')
+        stop_action_name = session.recording_stop_action_name
+        stop_at = session.get('recording', 'stopAt')
+        planned_stop_pending = bool(stop_at) and parse_time(stop_at) > time.time()
+        planned_stop_done = bool(stop_at) and not planned_stop_pending
+        message = 'Recording stopped'
+        
+        if action_name and started_at and parse_time(started_at) > time.time():
+            # Planned recording that has not begun: cancel its markers
+            schedule.delete(channel_id, action_name)
+            if stop_action_name and planned_stop_pending:
+                schedule.delete(channel_id, stop_action_name)
+            stop_action_name = None
+            message = 'Recording cancelled'
+        elif session.is_recording and not planned_stop_done:
+            # Replace any planned stop with an immediate one
+            if stop_action_name and planned_stop_pending:
+                schedule.delete(channel_id, stop_action_name)
+            stop_action_name = schedule.marker(channel_id, session_id, 'stop')
+        
+        if schedule:
+            result = schedule.flush()[channel_id]
+            if not result.ok:
+                raise result.error
         
         # Update DynamoDB
-        dynamodb.update_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            },
-            UpdateExpression='SET recording.isRecording = :rec, updatedAt = :now',
-            ExpressionAttributeValues={
-                ':rec': {'BOOL': False},
-                ':now': {'S': datetime.utcnow().isoformat()}
-            }
-        )
+        writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+        session_writes = SessionWrites(writes, session_id)
+        session_writes.set('recording.isRecording', {'BOOL': False})
+        session_writes.set('recording.stoppedAt', {'S': stop_at if planned_stop_done else now.isoformat()})
+        if stop_action_name:
+            session_writes.set('recording.stopActionName', {'S': stop_action_name})
+        else:
+            session_writes.remove('recording.stopActionName')
+        session_writes.remove('recording.stopAt')
+        session_writes.touch({'S': now.isoformat()})
+        writes.flush()
+        invalidate_session(session_id)
+        
+        # Join the recording's segments into one file once the stop lands
+        if FINALIZE_ENABLED and action_name and started_at and message == 'Recording stopped':
+            try:
+                request_finalize(lambda_client, session_id, action_name)
+            except Exception as e:
+                print(f'Recording finalize warning: {str(e)}')
         
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps({'message': 'Recording stopped'})
+            'body': json.dumps({'message': message, 'stopActionName': stop_action_name})
         }
         
     except Exception as error:
@@ -1,16 +1,23 @@
-import boto3
 import json
 from datetime import datetime
 
-ivs = boto3.client('ivs', region_name='us-east-1')
-medialive = boto3.client('medialive', region_name='us-east-1')
-dynamodb = boto3.client('dynamodb', region_name='us-east-1')
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.readiness import deadline_from_context
+from shelcaster_common.resilience import error_code, guard, is_conflict
+from shelcaster_common.session import SessionWrites, invalidate_session, load_session
+from shelcaster_common.tracing import traced_handler
+from shelcaster_common.writes import WriteBatch
+
+ivs = lazy_client('ivs')
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
 
 TABLE_NAME = 'shelcaster-app'
+SESSION_PARTS = ('mediaLive', 'ivs')
 
+@traced_handler
 def lambda_handler(event, context):
-    print('Event:', json.dumps(event))
-    
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
@@ -27,67 +34,70 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing sessionId'})
             }
         
-        # Get session from DynamoDB
-        response = dynamodb.get_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            }
+        # Get session (read through: the decision below must not rest on another container's past)
+        session = load_session(
+            dynamodb, session_id, table_name=TABLE_NAME, parts=SESSION_PARTS,
+            use_cache=False, consistent_read=True
         )
         
-        if 'Item' not in response:
+        if session is None:
             return {
                 'statusCode': 404,
                 'headers': headers,
                 'body': json.dumps({'error': 'Session not found'})
             }
         
-        session = response['Item']
+        # Stop MediaLive and IVS channels concurrently, retrying throttles
+        # while leaving time for the status write
+        deadline = deadline_from_context(context) - 2
+        calls = {}
+        channel_id = session.media_live_channel_id
+        if channel_id:
+            calls['medialive'] = lambda: guard('medialive').call(
+                lambda: medialive.stop_channel(ChannelId=channel_id), deadline=deadline
+            )
+        channel_arn = session.ivs_program_channel_arn
+        if channel_arn:
+            # IVS channels have no stop of their own; end the broadcast
+            calls['ivs'] = lambda: guard('ivs').call(lambda: ivs.stop_stream(channelArn=channel_arn), deadline=deadline)
+        results = run_concurrently(calls)
+        warnings = {}
         
-        # Stop MediaLive channel if exists
-        if 'mediaLive' in session and 'M' in session['mediaLive']:
-            ml_data = session['mediaLive']['M']
-            if 'channelId' in ml_data and 'S' in ml_data['channelId']:
-                channel_id = ml_data['channelId']['S']
-                try:
-                    medialive.stop_channel(ChannelId=channel_id)
-                    print(f'MediaLive channel stopped: {channel_id}')
-                except Exception as e:
-                    if 'ConflictException' not in str(e):
-                        print(f'MediaLive stop warning: {str(e)}')
-                    else:
-                        print('MediaLive channel already stopped')
+        if 'medialive' in results:
+            ml_result = results['medialive']
+            if ml_result.ok:
+                print(f'MediaLive channel stopped: {channel_id}')
+            elif is_conflict(ml_result.error):
+                print('MediaLive channel already stopped')
+            else:
+                print(f'MediaLive stop warning: {str(ml_result.error)}')
+                warnings['medialive'] = str(ml_result.error)
         
-        # Stop IVS channel if exists
-        if 'ivs' in session and 'M' in session['ivs']:
-            ivs_data = session['ivs']['M']
-            if 'programChannelArn' in ivs_data and 'S' in ivs_data['programChannelArn']:
-                channel_arn = ivs_data['programChannelArn']['S']
-                try:
-                    ivs.stop_channel(arn=channel_arn)
-                    print(f'IVS channel stopped: {channel_arn}')
-                except Exception as e:
-                    print(f'IVS stop warning: {str(e)}')
+        if 'ivs' in results:
+            if results['ivs'].ok:
+                print(f'IVS stream stopped: {channel_arn}')
+            elif error_code(results['ivs'].error) == 'ChannelNotBroadcasting':
+                print('IVS channel already stopped')
+            else:
+                print(f"IVS stop warning: {str(results['ivs'].error)}")
+                warnings['ivs'] = str(results['ivs'].error)
         
         # Update DynamoDB
-        dynamodb.update_item(
-            TableName=TABLE_NAME,
-            Key={
-                'pk': {'S': f'session#{session_id}'},
-                'sk': {'S': 'info'}
-            },
-            UpdateExpression='SET streaming.isLive = :live, updatedAt = :now',
-            ExpressionAttributeValues={
-                ':live': {'BOOL': False},
-                ':now': {'S': datetime.utcnow().isoformat()}
-            }
-        )
+        writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+        session_writes = SessionWrites(writes, session_id)
+        session_writes.set('streaming.isLive', {'BOOL': False})
+        session_writes.touch({'S': datetime.utcnow().isoformat()})
+        writes.flush()
+        invalidate_session(session_id)
+        
+        body = {'message': 'Streaming stopped'}
+        if warnings:
+            body['warnings'] = warnings
         
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps({'message': 'Streaming stopped'})
+            'body': json.dumps(body)
         }
         
     except Exception as error:
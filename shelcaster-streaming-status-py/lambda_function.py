@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+from shelcaster_common.api import entity_tag, etag_matches, request_header
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.prewarm import prewarm_held
+from shelcaster_common.readiness import READY_STATES, decode_status_token
+from shelcaster_common.resilience import guard
+from shelcaster_common.schedule import parse_time
+from shelcaster_common.session import SessionCache, load_session
+from shelcaster_common.tracing import traced_handler
+
+medialive = lazy_client('medialive')
+dynamodb = lazy_client('dynamodb')
+
+TABLE_NAME = 'shelcaster-app'
+# Pollers of the same channel within this window share one describe_channel.
+CHANNEL_STATE_TTL = float(os.environ.get('CHANNEL_STATE_TTL', '2'))
+CHANNEL_STATE_MAX_ENTRIES = int(os.environ.get('CHANNEL_STATE_MAX_ENTRIES', '256'))
+# Pollers of the same session within this window share one read
+STATUS_CACHE_TTL = float(os.environ.get('STATUS_CACHE_TTL', '2'))
+STATUS_PARTS = ('streaming', 'recording', 'mediaLive', 'ivs')
+RETRY_AFTER_SECONDS = '2'
+
+# channel id -> (state, fetched at), oldest first
+_channel_states = OrderedDict()
+# Separate from the session cache so its TTL does not follow SESSION_CACHE_TTL
+_status_cache = SessionCache(ttl=STATUS_CACHE_TTL)
+
+def get_channel_state(channel_id):
+    """describe_channel state, cached briefly per container"""
+    cached = _channel_states.get(channel_id)
+    if cached and time.monotonic() - cached[1] < CHANNEL_STATE_TTL:
+        return cached[0]
+    
+    state = guard('medialive').call(lambda: medialive.describe_channel(ChannelId=channel_id))['State']
+    now = time.monotonic()
+    _channel_states[channel_id] = (state, now)
+    _channel_states.move_to_end(channel_id)
+    # Drop expired entries, and the oldest beyond the bound, so a warm
+    # container polled for many channels does not grow without limit
+    while _channel_states and (
+        len(_channel_states) > CHANNEL_STATE_MAX_ENTRIES
+        or now - next(iter(_channel_states.values()))[1] >= CHANNEL_STATE_TTL
+    ):
+        _channel_states.popitem(last=False)
+    return state
+
+def synced_state(session, issued_at):
+    """State from the session's last channel event, if it happened after the token was issued"""
+    observed = session.media_live_channel_state
+    if not observed or parse_time(observed['at']) < issued_at:
+        return None
+    return observed['state']
+
+def session_status(session):
+    """The compact status a control UI polls for"""
+    channel = session.media_live_channel_state or {}
+    stream = session.ivs_stream_state or {}
+    prewarm = session.get('mediaLive', 'prewarm')
+    return {
+        'sessionId': session.session_id,
+        'showId': session.get('showId'),
+        'status': session.get('status'),
+        'isLive': session.is_live,
+        'startedAt': session.get('streaming', 'startedAt'),
+        'isRecording': session.is_recording,
+        'channelState': channel.get('state'),
+        'channelStateAt': channel.get('at'),
+        'streamState': stream.get('state'),
+        'prewarmedFor': prewarm.get('airTime') if prewarm and prewarm_held(session) else None,
+        'playbackUrl': session.ivs_playback_url
+    }
+
+def respond(event, headers, payload):
+    """200 with a strong ETag, or an empty 304 if the client already holds that body"""
+    body = json.dumps(payload, separators=(',', ':'), sort_keys=True)
+    headers['ETag'] = entity_tag(body)
+    if etag_matches(request_header(event, 'If-None-Match'), headers['ETag']):
+        del headers['Content-Type']
+        return {
+            'statusCode': 304,
+            'headers': headers,
+            'body': ''
+        }
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': body
+    }
+
+@traced_handler
+def lambda_handler(event, context):
+    """Read-only streaming status for polling clients.
+
+    With ?token= it answers the status token returned by start-streaming
+    (mode=async/wait) with the channel's state; without one it returns the
+    session's compact status (live, recording, channel and stream state).
+    Sessions come from a per-container cache (STATUS_CACHE_TTL seconds) and
+    every 200 carries a strong ETag, so a request whose If-None-Match
+    matches gets an empty 304.
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        # Always revalidate: a 304 is cheap, a stale status is not
+        'Cache-Control': 'no-cache'
+    }
+    
+    try:
+        session_id = (event.get('pathParameters') or {}).get('sessionId')
+        token = (event.get('queryStringParameters') or {}).get('token')
+        
+        if not session_id:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'Missing sessionId'})
+            }
+        
+        status = None
+        if token:
+            try:
+                status = decode_status_token(token)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': str(e)})
+                }
+        
+        session = load_session(dynamodb, session_id, table_name=TABLE_NAME, cache=_status_cache, parts=STATUS_PARTS)
+        
+        if status is None:
+            if session is None:
+                return {
+                    'statusCode': 404,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Session not found'})
+                }
+            return respond(event, headers, session_status(session))
+        
+        # The token is not signed, so only honour it for the session's own channel
+        if session is None or status['sessionId'] != session_id or status['channelId'] != session.media_live_channel_id:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': 'Unknown status token'})
+            }
+        
+        # Kept current by the channel state events; describe only when no event has landed yet
+        channel_state = synced_state(session, status['issuedAt']) or get_channel_state(status['channelId'])
+        ready = channel_state in READY_STATES
+        if not ready:
+            headers['Retry-After'] = RETRY_AFTER_SECONDS
+        
+        return respond(event, headers, {
+            'sessionId': session_id,
+            'channelId': status['channelId'],
+            'channelState': channel_state,
+            'ready': ready
+        })
+    
+    except Exception as error:
+        print(f'Error reading streaming status: {str(error)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(error)})
+        }
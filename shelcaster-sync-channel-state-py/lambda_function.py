@@ -0,0 +1,255 @@
+import json
+
+from shelcaster_common.channel_events import IVS, MEDIALIVE, STOPPED_STATES, coalesce, parse_event, unpack_events
+from shelcaster_common.clients import lazy_client
+from shelcaster_common.fanout import run_concurrently
+from shelcaster_common.prewarm import mark_running, record_startup, session_profile
+from shelcaster_common.readiness import READY_STATES
+from shelcaster_common.schedule import parse_time
+from shelcaster_common.session import (
+    CHANNEL_ID_ATTRIBUTE,
+    CHANNEL_INDEX,
+    IVS_CHANNEL_ATTRIBUTE,
+    IVS_CHANNEL_INDEX,
+    SessionWrites,
+    invalidate_session,
+    load_session,
+    session_key,
+    session_path,
+)
+from shelcaster_common.tracing import traced_handler
+from shelcaster_common.writes import WriteBatch
+
+dynamodb = lazy_client('dynamodb')
+
+TABLE_NAME = 'shelcaster-app'
+# When the session last heard about its channels; kept apart from updatedAt,
+# which the channel reaper measures a session's idle time from
+STATE_AT_ATTRIBUTE = 'channelStateAt'
+# kind -> (sparse index, indexed attribute on the info item, where the state is kept)
+TARGETS = {
+    MEDIALIVE: (CHANNEL_INDEX, CHANNEL_ID_ATTRIBUTE, 'mediaLive.channelState'),
+    IVS: (IVS_CHANNEL_INDEX, IVS_CHANNEL_ATTRIBUTE, 'ivs.streamState')
+}
+
+def owning_sessions(channel_event):
+    """Ids of the sessions indexed on the event's channel"""
+    index, attribute, _ = TARGETS[channel_event.kind]
+    kwargs = {
+        'TableName': TABLE_NAME,
+        'IndexName': index,
+        'KeyConditionExpression': '#channel = :channel',
+        'ProjectionExpression': 'pk',
+        'ExpressionAttributeNames': {'#channel': attribute},
+        'ExpressionAttributeValues': {':channel': {'S': channel_event.channel}}
+    }
+    session_ids = []
+    while True:
+        response = dynamodb.query(**kwargs)
+        session_ids.extend(item['pk']['S'].split('#', 1)[1] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return session_ids
+
+def path_names(prefix, path):
+    return {f'#{prefix}{n}': name for n, name in enumerate(path.split('.'))}
+
+def still_owned(writes, session_id, channel_event):
+    """Guard a write on the session still holding the channel (the index lags behind)"""
+    _, attribute, _ = TARGETS[channel_event.kind]
+    writes.condition(
+        session_key(session_id), '#owner = :owner',
+        values={':owner': {'S': channel_event.channel}}, names={'#owner': attribute}
+    )
+
+def condition_failed(error):
+    """Whether a write was refused by its condition, as opposed to failing"""
+    if isinstance(error, dynamodb.exceptions.ConditionalCheckFailedException):
+        return True
+    if not isinstance(error, dynamodb.exceptions.TransactionCanceledException):
+        return False
+    # A transaction also cancels on conflicts, which are worth retrying
+    reasons = error.response.get('CancellationReasons') or []
+    return any(reason.get('Code') == 'ConditionalCheckFailed' for reason in reasons)
+
+def record_state(session_id, channel_event):
+    """Store the observed state unless the session already holds a newer one"""
+    _, _, path = TARGETS[channel_event.kind]
+    writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+    session_writes = SessionWrites(writes, session_id)
+    session_writes.set(path, channel_event.attribute())
+    session_writes.set(STATE_AT_ATTRIBUTE, {'S': channel_event.at})
+    key, item_path = session_path(session_id, path)
+    names = path_names('state', f'{item_path}.version')
+    version = '.'.join(names)
+    writes.condition(
+        key, f'attribute_not_exists({version}) OR {version} < :version',
+        values={':version': {'S': channel_event.version}}, names=names
+    )
+    still_owned(writes, session_id, channel_event)
+    try:
+        writes.flush()
+    except Exception as e:
+        if not condition_failed(e):
+            raise
+        return 'stale'
+    finally:
+        invalidate_session(session_id)
+    return 'applied'
+
+def clear_live(session_id, channel_event):
+    """streaming.isLive = false if the session went live before its channel stopped"""
+    session = load_session(
+        dynamodb, session_id, table_name=TABLE_NAME, parts=('streaming',),
+        use_cache=False, consistent_read=True
+    )
+    started_at = session.get('streaming', 'startedAt') if session is not None else None
+    # Compared as times: startedAt has microseconds, event times milliseconds
+    if not started_at or not session.is_live or parse_time(started_at) >= parse_time(channel_event.at):
+        return False
+    writes = WriteBatch(dynamodb, table_name=TABLE_NAME)
+    session_writes = SessionWrites(writes, session_id)
+    session_writes.set('streaming.isLive', {'BOOL': False})
+    session_writes.set(STATE_AT_ATTRIBUTE, {'S': channel_event.at})
+    live_key, live_path = session_path(session_id, 'streaming.isLive')
+    _, started_path = session_path(session_id, 'streaming.startedAt')
+    live = path_names('live', live_path)
+    started = path_names('started', started_path)
+    # Unless a start since the read replaced the session's startedAt
+    writes.condition(
+        live_key, f"{'.'.join(live)} = :isLive AND {'.'.join(started)} = :startedAt",
+        values={':isLive': {'BOOL': True}, ':startedAt': {'S': started_at}}, names={**live, **started}
+    )
+    still_owned(writes, session_id, channel_event)
+    try:
+        writes.flush()
+    except Exception as e:
+        if not condition_failed(e):
+            raise
+        return False
+    finally:
+        invalidate_session(session_id)
+    return True
+
+def prewarm_running(session_id, channel_event):
+    """Count a prewarmed channel's time to RUNNING toward its profile's lead, once"""
+    session = load_session(
+        dynamodb, session_id, table_name=TABLE_NAME, parts=('mediaLive',),
+        use_cache=False, consistent_read=True
+    )
+    prewarm = session.get('mediaLive', 'prewarm') if session is not None else None
+    if not prewarm or prewarm.get('runningAt'):
+        return None
+    seconds = parse_time(channel_event.at) - parse_time(prewarm['requestedAt'])
+    if seconds < 0:
+        # RUNNING from an earlier start, not this prewarm's
+        return None
+    if not mark_running(dynamodb, session_id, channel_event.at, table_name=TABLE_NAME):
+        return None
+    invalidate_session(session_id)
+    record_startup(dynamodb, session_profile(session), seconds, table_name=TABLE_NAME)
+    return seconds
+
+def sync(channel_event):
+    """Apply the newest event for one channel to every session indexed on it"""
+    result = {
+        'kind': channel_event.kind,
+        'channel': channel_event.channel,
+        'state': channel_event.state,
+        'version': channel_event.version,
+        'sessions': {}
+    }
+    for session_id in owning_sessions(channel_event):
+        outcome = record_state(session_id, channel_event)
+        if outcome == 'applied' and channel_event.kind == MEDIALIVE and channel_event.state in STOPPED_STATES:
+            if clear_live(session_id, channel_event):
+                outcome = 'applied_not_live'
+        elif outcome == 'applied' and channel_event.kind == MEDIALIVE and channel_event.state in READY_STATES:
+            if prewarm_running(session_id, channel_event) is not None:
+                outcome = 'applied_prewarm_running'
+        result['sessions'][session_id] = outcome
+    if not result['sessions']:
+        # Pooled channels and channels of ended sessions
+        result['result'] = 'unowned'
+    return result
+
+@traced_handler
+def lambda_handler(event, context):
+    """Keep sessions in step with MediaLive and IVS state-change events.
+
+    Target of the channel-state-events-rule.json EventBridge rule, directly
+    or through an SQS queue (with ReportBatchItemFailures). A batch is
+    deduplicated by event id and reduced to the newest event per channel,
+    which is written to each session indexed on that channel
+    (mediaLive.channelState, ivs.streamState) only if it is newer than
+    what the session holds, so replays and late deliveries change nothing.
+    The event time goes to channelStateAt; updatedAt is left alone so
+    channel chatter does not hold off the channel reaper.
+    A MediaLive channel that stopped after its session went live also
+    clears streaming.isLive, and one that reached RUNNING for a prewarm
+    records its start-up time for the prewarm scheduler's lead.
+    Unreadable records and malformed events are logged and skipped, not
+    retried.
+    """
+    try:
+        messages = unpack_events(event)
+        channel_events = []
+        message_ids = {}
+        ignored = 0
+        for message_id, raw in messages:
+            try:
+                channel_event = parse_event(raw)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                # Malformed (no id or time, say); it would fail the same way again
+                print(f'Skipping malformed event {message_id}: {type(e).__name__} {str(e)}')
+                channel_event = None
+            if channel_event is None:
+                ignored += 1
+                continue
+            channel_events.append(channel_event)
+            if message_id:
+                message_ids.setdefault(channel_event.event_id, []).append(message_id)
+        latest, dropped = coalesce(channel_events)
+        
+        outcomes = run_concurrently({
+            target: (lambda channel_event=channel_event: sync(channel_event))
+            for target, channel_event in latest.items()
+        })
+        
+        results = []
+        failed = []
+        for target, outcome in outcomes.items():
+            channel_event = latest[target]
+            if outcome.ok:
+                results.append(outcome.value)
+            else:
+                print(f'Error syncing {channel_event.kind} channel {channel_event.channel}: {str(outcome.error)}')
+                failed.append(channel_event)
+        
+        for result in results:
+            print(json.dumps({'sync': 'channel', **result}))
+        
+        summary = {
+            'events': len(messages),
+            'ignored': ignored,
+            'duplicates': sum(1 for reason in dropped.values() if reason == 'duplicate'),
+            'superseded': sum(1 for reason in dropped.values() if reason == 'superseded'),
+            'channels': results
+        }
+        if 'Records' in event:
+            # Only the failed channels' newest events go back to the queue
+            summary['batchItemFailures'] = [
+                {'itemIdentifier': message_id}
+                for channel_event in failed
+                for message_id in message_ids.get(channel_event.event_id, [])
+            ]
+        elif failed:
+            # Let the async retry redeliver; applied channels are no-ops next time
+            raise RuntimeError(f"Channel state sync failed for {', '.join(e.channel for e in failed)}")
+        
+        return summary
+    
+    except Exception as error:
+        print(f'Error syncing channel state: {str(error)}')
+        raise
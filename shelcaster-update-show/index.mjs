@@ -27,6 +27,7 @@ export const handler = async (event) => {
     const allowedFields = [
       'title', 
       'description', 
+      'scheduledDate',
       'scheduledStartTime', 
       'scheduledEndTime',
       'tracklistId',
@@ -38,6 +39,7 @@ export const handler = async (event) => {
     ];
 
     const updateExpressions = [];
+    const removeExpressions = [];
     const expressionAttributeNames = {};
     const expressionAttributeValues = {};
 
@@ -49,6 +51,23 @@ export const handler = async (event) => {
       }
     });
 
+    // A new schedule moves the airDay-index keys the channel prewarm
+    // scheduler reads; the schedule fields themselves are stored as sent
+    const scheduledDate = updates.scheduledDate || updates.scheduledStartTime;
+    if (scheduledDate) {
+      const airDate = new Date(scheduledDate);
+      expressionAttributeNames['#airTime'] = 'airTime';
+      expressionAttributeNames['#airDay'] = 'airDay';
+      if (Number.isNaN(airDate.getTime())) {
+        removeExpressions.push('#airTime', '#airDay');
+      } else {
+        const airTime = airDate.toISOString();
+        updateExpressions.push('#airTime = :airTime', '#airDay = :airDay');
+        expressionAttributeValues[':airTime'] = airTime;
+        expressionAttributeValues[':airDay'] = airTime.slice(0, 10);
+      }
+    }
+
     if (updateExpressions.length === 0) {
       return {
         statusCode: 400,
@@ -68,7 +87,7 @@ export const handler = async (event) => {
         pk: `show#${showId}`,
         sk: 'info',
       }),
-      UpdateExpression: `SET ${updateExpressions.join(', ')}`,
+      UpdateExpression: `SET ${updateExpressions.join(', ')}${removeExpressions.length ? ` REMOVE ${removeExpressions.join(', ')}` : ''}`,
       ExpressionAttributeNames: expressionAttributeNames,
       ExpressionAttributeValues: marshall(expressionAttributeValues),
       ReturnValues: 'ALL_NEW',
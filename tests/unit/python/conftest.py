@@ -0,0 +1,317 @@
+"""Shared fixtures for the shelcaster_common layer tests.
+
+The layer is imported from lambda-layer/python, the same directory the
+Lambda layer zip is built from. Nothing here talks to AWS: ``dynamodb``
+records the requests a test makes, ``s3`` is an in-memory bucket store,
+``file_s3`` keeps objects and multipart parts as files under a temporary
+directory, and ``stubbed_dynamodb`` is a real botocore client behind a
+``Stubber`` for code that needs the client's modelled exceptions. Handler tests load a
+function with ``load_handler`` and queue its AWS responses through ``aws``,
+or run it against ``fake_aws`` (scripts/fakeaws.py), which keeps the
+items a handler writes so a test can check the table afterwards.
+"""
+import hashlib
+import importlib.util
+import os
+import shutil
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda-layer', 'python'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'scripts'))
+
+
+class RecordingDynamoDB:
+    """Accepts every write and keeps ``(operation, params)`` in ``requests``"""
+
+    def __init__(self):
+        self.requests = []
+
+    def update_item(self, **params):
+        self.requests.append(('update_item', params))
+        return {}
+
+    def delete_item(self, **params):
+        self.requests.append(('delete_item', params))
+        return {}
+
+    def transact_write_items(self, **params):
+        self.requests.append(('transact_write_items', params))
+        return {}
+
+
+class MemoryS3:
+    """The S3 calls the recording modules make, over ``{(bucket, key): (body, etag, modified)}``"""
+
+    class exceptions:
+        class ClientError(Exception):
+            def __init__(self, code):
+                super().__init__(code)
+                self.response = {'Error': {'Code': code}}
+
+        class NoSuchKey(ClientError):
+            def __init__(self):
+                super().__init__('NoSuchKey')
+
+    def __init__(self):
+        self.objects = {}
+
+    def put(self, bucket, key, body, modified=None):
+        """Seed an object; ``modified`` is epoch seconds"""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        stamp = datetime.fromtimestamp(modified if modified is not None else 0, tz=timezone.utc)
+        self.objects[(bucket, key)] = (body, '"' + hashlib.md5(body).hexdigest() + '"', stamp)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey()
+        body, etag, _ = self.objects[(Bucket, Key)]
+        return {'Body': _Body(body), 'ETag': etag}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **_):
+        current = self.objects.get((Bucket, Key))
+        if (IfNoneMatch == '*' and current) or (IfMatch and (not current or current[1] != IfMatch)):
+            raise self.exceptions.ClientError('PreconditionFailed')
+        self.put(Bucket, Key, Body)
+        return {'ETag': self.objects[(Bucket, Key)][1]}
+
+    def get_paginator(self, operation):
+        assert operation == 'list_objects_v2'
+        return self
+
+    def paginate(self, Bucket, Prefix, StartAfter=''):
+        contents = [
+            {'Key': key, 'Size': len(body), 'LastModified': modified}
+            for (bucket, key), (body, _, modified) in sorted(self.objects.items())
+            if bucket == Bucket and key.startswith(Prefix) and key > StartAfter
+        ]
+        return [{'Contents': contents}]
+
+
+class FileS3(MemoryS3):
+    """``MemoryS3`` over files under ``root``, plus ranged GETs and multipart uploads.
+
+    Objects are stored at ``root/<bucket>/<key>`` and parts at
+    ``root/.uploads/<upload id>/<part number>``, so a test can see what an
+    upload left behind. Completing enforces S3's part rules with
+    ``min_part_bytes``; ``fail_parts`` holds part numbers whose upload raises.
+    """
+
+    def __init__(self, root, min_part_bytes=5 * 1024 * 1024):
+        self.root = str(root)
+        self.min_part_bytes = min_part_bytes
+        self.fail_parts = set()
+        self.parts = {}
+        self.completed = []
+        self.aborted = []
+        self._lock = threading.Lock()
+
+    def path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    @property
+    def objects(self):
+        objects = {}
+        for bucket in os.listdir(self.root):
+            if bucket == '.uploads':
+                continue
+            for directory, _, names in os.walk(os.path.join(self.root, bucket)):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    key = os.path.relpath(path, os.path.join(self.root, bucket)).replace(os.sep, '/')
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                    stamp = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+                    objects[(bucket, key)] = (body, '"' + hashlib.md5(body).hexdigest() + '"', stamp)
+        return objects
+
+    def put(self, bucket, key, body, modified=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        path = self.path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        stamp = modified if modified is not None else 0
+        os.utime(path, (stamp, stamp))
+
+    def read(self, bucket, key):
+        with open(self.path(bucket, key), 'rb') as f:
+            return f.read()
+
+    def get_object(self, Bucket, Key, Range=None):
+        path = self.path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise self.exceptions.NoSuchKey()
+        body = self.read(Bucket, Key)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if Range:
+            start, end = (int(n) for n in Range[len('bytes='):].split('-'))
+            body = body[start:end + 1]
+        return {'Body': _Body(body), 'ETag': etag, 'ContentLength': len(body)}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, '.uploads', upload_id))
+        self.parts[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber in self.fail_parts:
+            raise self.exceptions.ClientError('InternalError')
+        with open(os.path.join(self.root, '.uploads', UploadId, str(PartNumber)), 'wb') as f:
+            f.write(Body)
+        etag = '"' + hashlib.md5(Body).hexdigest() + '"'
+        with self._lock:
+            self.parts[UploadId][PartNumber] = (len(Body), etag)
+        return {'ETag': etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = MultipartUpload['Parts']
+        assert [part['PartNumber'] for part in parts] == list(range(1, len(parts) + 1))
+        uploaded = self.parts[UploadId]
+        for part in parts:
+            assert uploaded[part['PartNumber']][1] == part['ETag']
+        sizes = [uploaded[part['PartNumber']][0] for part in parts]
+        if any(size < self.min_part_bytes for size in sizes[:-1]):
+            raise self.exceptions.ClientError('EntityTooSmall')
+        upload_dir = os.path.join(self.root, '.uploads', UploadId)
+        body = b''
+        for part in parts:
+            with open(os.path.join(upload_dir, str(part['PartNumber'])), 'rb') as f:
+                body += f.read()
+        shutil.rmtree(upload_dir)
+        self.put(Bucket, Key, body)
+        self.completed.append((Key, sizes))
+        return {'ETag': '"' + hashlib.md5(body).hexdigest() + '-' + str(len(parts)) + '"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        shutil.rmtree(os.path.join(self.root, '.uploads', UploadId), ignore_errors=True)
+        self.aborted.append(Key)
+        return {}
+
+    def pending_uploads(self):
+        """Ids of uploads neither completed nor aborted"""
+        uploads = os.path.join(self.root, '.uploads')
+        return os.listdir(uploads) if os.path.isdir(uploads) else []
+
+
+class _Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class LambdaContext:
+    """The parts of the Lambda context the handlers read"""
+
+    function_name = 'test'
+    aws_request_id = 'test-request'
+
+    def __init__(self, remaining_ms=30000):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+_handlers = {}
+
+
+def load_handler(function_dir):
+    """Import a function's lambda_function.py under its own module name"""
+    if function_dir not in _handlers:
+        path = os.path.join(REPO_ROOT, function_dir, 'lambda_function.py')
+        spec = importlib.util.spec_from_file_location(function_dir.replace('-', '_'), path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _handlers[function_dir] = module
+    return _handlers[function_dir]
+
+
+@pytest.fixture
+def dynamodb():
+    return RecordingDynamoDB()
+
+
+@pytest.fixture
+def s3():
+    return MemoryS3()
+
+
+@pytest.fixture
+def file_s3(tmp_path):
+    return FileS3(tmp_path)
+
+
+@pytest.fixture(scope='session')
+def botocore_session():
+    # One session for the run, so service models are loaded once
+    import botocore.session
+
+    return botocore.session.get_session()
+
+
+@pytest.fixture
+def stubbed_dynamodb(botocore_session):
+    from botocore.stub import Stubber
+
+    client = botocore_session.create_client(
+        'dynamodb', region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test'
+    )
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def aws(botocore_session):
+    """``aws('ivs')`` installs a stubbed client as the handlers' shared ivs client and returns its Stubber"""
+    from botocore.stub import Stubber
+
+    from shelcaster_common import clients, resilience
+
+    stubbers = {}
+
+    def stub(service):
+        if service not in stubbers:
+            client = botocore_session.create_client(
+                service, region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test'
+            )
+            clients.set_client(service, client)
+            stubbers[service] = Stubber(client)
+            stubbers[service].activate()
+        return stubbers[service]
+
+    yield stub
+    clients.reset_clients()
+    resilience.reset_guards()
+    for stubber in stubbers.values():
+        stubber.deactivate()
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def fake_aws():
+    """A ``FakeAws`` answering the handlers' shared clients; seed it with ``put_item``"""
+    import boto3.session
+    from fakeaws import FakeAws
+
+    from shelcaster_common import clients, resilience
+
+    fake = FakeAws()
+    session = boto3.session.Session(aws_access_key_id='test', aws_secret_access_key='test', region_name='us-east-1')
+    fake.install(session)
+    for service in ('dynamodb', 'medialive', 'ivs', 'lambda'):
+        clients.set_client(service, session.client(service))
+    yield fake
+    clients.reset_clients()
+    resilience.reset_guards()
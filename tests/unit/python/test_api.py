@@ -0,0 +1,46 @@
+"""Request parsing and the ETag / If-None-Match helpers."""
+import pytest
+
+from shelcaster_common.api import entity_tag, etag_matches, parse_body, request_header
+
+BODY = '{"isLive":true}'
+ETAG = entity_tag(BODY)
+
+
+def test_entity_tag_is_a_strong_digest_of_the_body():
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert len(ETAG) == 34
+    assert entity_tag(BODY) == ETAG
+    assert entity_tag('{"isLive":false}') != ETAG
+
+
+@pytest.mark.parametrize('if_none_match, matches', [
+    (None, False),
+    ('', False),
+    (ETAG, True),
+    (f'W/{ETAG}', True),                        # weak comparison
+    (f'"other", {ETAG}', True),                 # list
+    (f'"other",W/{ETAG} ', True),
+    ('"other", W/"another"', False),
+    ('*', True),
+    (' * ', True),
+    (ETAG[:-1], False),                         # unquoted tail
+    (ETAG.strip('"'), False),                   # not a quoted tag
+])
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, ETAG) is matches
+
+
+def test_request_header_ignores_case():
+    event = {'headers': {'if-none-match': ETAG}}
+    assert request_header(event, 'If-None-Match') == ETAG
+    assert request_header({'headers': None}, 'If-None-Match') is None
+
+
+def test_parse_body():
+    assert parse_body({}) == {}
+    assert parse_body({'body': '{"a": 1}'}) == {'a': 1}
+    with pytest.raises(ValueError, match='not valid JSON'):
+        parse_body({'body': '{'})
+    with pytest.raises(ValueError, match='JSON object'):
+        parse_body({'body': '[1]'})
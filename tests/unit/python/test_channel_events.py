@@ -0,0 +1,156 @@
+"""Channel state-change events: parsing, versions, coalescing and the session write."""
+import json
+
+import pytest
+from botocore.stub import ANY
+
+from conftest import LambdaContext, load_handler
+from shelcaster_common.channel_events import IVS, MEDIALIVE, coalesce, parse_event, unpack_events
+from shelcaster_common.session import CHANNEL_ID_ATTRIBUTE, CHANNEL_INDEX, session_key
+
+CHANNEL_ARN = 'arn:aws:medialive:us-east-1:000000000000:channel:1234567'
+IVS_ARN = 'arn:aws:ivs:us-east-1:000000000000:channel/abc'
+
+
+def medialive_event(state, time='2026-01-01T00:00:00Z', event_id='e1', **detail):
+    return {
+        'id': event_id,
+        'source': 'aws.medialive',
+        'detail-type': 'MediaLive Channel State Change',
+        'time': time,
+        'resources': [CHANNEL_ARN],
+        'detail': {'state': state, **detail}
+    }
+
+
+def ivs_event(name, time='2026-01-01T00:00:00Z', event_id='i1'):
+    return {
+        'id': event_id,
+        'source': 'aws.ivs',
+        'detail-type': 'IVS Stream State Change',
+        'time': time,
+        'resources': [IVS_ARN],
+        'detail': {'event_name': name, 'stream_id': 'st-1'}
+    }
+
+
+def test_parse_medialive_event():
+    event = parse_event(medialive_event('RUNNING', pipelines_running_count=2))
+    assert (event.kind, event.channel, event.state) == (MEDIALIVE, '1234567', 'RUNNING')
+    assert event.at == '2026-01-01T00:00:00.000'
+    assert event.version == '2026-01-01T00:00:00.000#03'
+    assert event.attribute()['M']['pipelinesRunning'] == {'N': '2'}
+
+
+def test_medialive_lifecycle_states_map_to_describe_channel_terms():
+    assert parse_event(medialive_event('STOPPED')).state == 'IDLE'
+    assert parse_event(medialive_event('CREATED')).state == 'IDLE'
+
+
+def test_parse_ivs_event():
+    event = parse_event(ivs_event('Stream End'))
+    assert (event.kind, event.channel, event.state) == (IVS, IVS_ARN, 'OFFLINE')
+    assert event.attribute()['M']['event'] == {'S': 'Stream End'}
+    assert event.attribute()['M']['streamId'] == {'S': 'st-1'}
+
+
+@pytest.mark.parametrize('event', [
+    medialive_event('SOMETHING_NEW'),
+    ivs_event('Session Created'),
+    {**medialive_event('RUNNING'), 'resources': []},
+    {'source': 'aws.s3', 'detail-type': 'Object Created', 'detail': {}},
+])
+def test_other_events_are_ignored(event):
+    assert parse_event(event) is None
+
+
+def test_version_orders_by_time_then_lifecycle_rank():
+    stopping = parse_event(medialive_event('STOPPING'))
+    stopped = parse_event(medialive_event('STOPPED'))
+    # Reported in the same millisecond: the later lifecycle state wins
+    assert stopped.version > stopping.version
+    # Milliseconds, and offsets, compare in time order
+    earlier = parse_event(medialive_event('STOPPED', time='2026-01-01T00:00:00.900Z'))
+    later = parse_event(medialive_event('STARTING', time='2026-01-01T02:00:01.000+02:00'))
+    assert later.version > earlier.version
+
+
+def test_coalesce_keeps_the_newest_event_per_channel():
+    running = parse_event(medialive_event('RUNNING', time='2026-01-01T00:00:10Z', event_id='a'))
+    starting = parse_event(medialive_event('STARTING', time='2026-01-01T00:00:05Z', event_id='b'))
+    live = parse_event(ivs_event('Stream Start'))
+    latest, dropped = coalesce([running, starting, running, live])
+    assert latest == {(MEDIALIVE, '1234567'): running, (IVS, IVS_ARN): live}
+    assert dropped == {'b': 'superseded', 'a': 'duplicate'}
+
+
+def test_coalesce_replaces_an_older_event_that_arrived_first():
+    starting = parse_event(medialive_event('STARTING', time='2026-01-01T00:00:05Z', event_id='b'))
+    running = parse_event(medialive_event('RUNNING', time='2026-01-01T00:00:10Z', event_id='a'))
+    latest, dropped = coalesce([starting, running])
+    assert latest[(MEDIALIVE, '1234567')] is running
+    assert dropped == {'b': 'superseded'}
+
+
+def test_unpack_skips_unreadable_records():
+    batch = {'Records': [
+        {'messageId': 'm1', 'body': json.dumps(medialive_event('RUNNING'))},
+        {'messageId': 'm2', 'body': '{not json'},
+        {'messageId': 'm3', 'body': '"a string"'}
+    ]}
+    assert unpack_events(batch) == [('m1', medialive_event('RUNNING'))]
+    assert unpack_events(medialive_event('RUNNING')) == [(None, medialive_event('RUNNING'))]
+
+
+def expect_owner_lookup(stubber, *session_ids):
+    stubber.add_response('query', {'Items': [{'pk': {'S': f'session#{s}'}} for s in session_ids]}, {
+        'TableName': 'shelcaster-app',
+        'IndexName': CHANNEL_INDEX,
+        'KeyConditionExpression': '#channel = :channel',
+        'ProjectionExpression': 'pk',
+        'ExpressionAttributeNames': {'#channel': CHANNEL_ID_ATTRIBUTE},
+        'ExpressionAttributeValues': {':channel': {'S': '1234567'}}
+    })
+
+
+def expect_state_write(stubber, version, error=None):
+    params = {
+        'TableName': 'shelcaster-app',
+        'Key': session_key('s1'),
+        'UpdateExpression': 'SET #n0.#n1 = :v0, #n2 = :v1',
+        'ConditionExpression': (
+            '(attribute_not_exists(#state0.#state1.#state2) OR #state0.#state1.#state2 < :version)'
+            ' AND (#owner = :owner)'
+        ),
+        'ExpressionAttributeNames': ANY,
+        'ExpressionAttributeValues': {':v0': ANY, ':v1': ANY, ':version': {'S': version}, ':owner': {'S': '1234567'}}
+    }
+    if error:
+        stubber.add_client_error('update_item', service_error_code=error, expected_params=params)
+    else:
+        stubber.add_response('update_item', {}, params)
+
+
+def sync(batch):
+    return load_handler('shelcaster-sync-channel-state-py').lambda_handler(batch, LambdaContext())
+
+
+def test_stale_event_is_refused_by_the_version_condition(aws):
+    # STARTING arrives after the session already recorded a newer state
+    expect_owner_lookup(aws('dynamodb'), 's1')
+    expect_state_write(aws('dynamodb'), '2026-01-01T00:00:00.000#02', error='ConditionalCheckFailedException')
+    summary = sync(medialive_event('STARTING'))
+    assert summary['channels'][0]['sessions'] == {'s1': 'stale'}
+
+
+def test_bad_records_do_not_fail_the_batch(aws):
+    expect_owner_lookup(aws('dynamodb'), 's1')
+    expect_state_write(aws('dynamodb'), '2026-01-01T00:00:00.000#02')
+    summary = sync({'Records': [
+        {'messageId': 'm1', 'body': '{not json'},
+        {'messageId': 'm2', 'body': json.dumps({**medialive_event('STARTING'), 'time': 'yesterday'})},
+        {'messageId': 'm3', 'body': json.dumps(medialive_event('STARTING'))}
+    ]})
+    assert summary['batchItemFailures'] == []
+    assert (summary['events'], summary['ignored']) == (2, 1)
+    assert summary['channels'][0]['sessions'] == {'s1': 'applied'}
@@ -0,0 +1,169 @@
+"""Pool entry claims, reservations and releases."""
+import pytest
+from botocore.stub import ANY
+
+from shelcaster_common.channel_pool import (
+    STATUS_CLAIMED,
+    STATUS_IDLE,
+    STATUS_RESERVED,
+    claim_pooled_channel,
+    pool_key,
+    release_pooled_channel,
+    reserve_pooled_channel,
+    take_pooled_channel,
+)
+
+PROFILE = 'hd-1080p'
+
+
+def pool_item(channel_id, status=STATUS_IDLE, reserved_for=None, created_at='2026-01-01T00:00:00'):
+    item = pool_key(channel_id, PROFILE)
+    item.update({
+        'status': {'S': status},
+        'channelId': {'S': channel_id},
+        'inputId': {'S': f'in-{channel_id}'},
+        'rtmpUrl': {'S': f'rtmp://198.51.100.10:1935/pool/{channel_id}'},
+        'specHash': {'S': 'hash'},
+        'createdAt': {'S': created_at}
+    })
+    if reserved_for:
+        item['reservedFor'] = {'S': reserved_for}
+        item['airTime'] = {'N': '1767225600'}
+    return item
+
+
+def expect_list(stubber, status, *items):
+    stubber.add_response('query', {'Items': list(items)}, {
+        'TableName': 'test',
+        'KeyConditionExpression': 'pk = :pk',
+        'FilterExpression': '#status = :status',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {':pk': {'S': f'medialive-pool#{PROFILE}'}, ':status': {'S': status}}
+    })
+
+
+def expect_update(stubber, channel_id, update, condition, values=ANY, error=None):
+    params = {
+        'TableName': 'test',
+        'Key': pool_key(channel_id, PROFILE),
+        'UpdateExpression': update,
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': values
+    }
+    if error:
+        stubber.add_client_error('update_item', service_error_code=error, expected_params=params)
+    else:
+        stubber.add_response('update_item', {}, params)
+
+
+CLAIM = 'SET #status = :claimed, claimedBy = :sid, claimedAt = :now'
+
+
+def test_claim_takes_the_oldest_idle_entry(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_list(stubber, STATUS_IDLE, pool_item('ch-2', created_at='2026-01-02'), pool_item('ch-1', created_at='2026-01-01'))
+    expect_update(stubber, 'ch-1', CLAIM, '#status = :status')
+    entry = claim_pooled_channel(client, 's1', PROFILE, 'test')
+    assert entry['channelId'] == 'ch-1'
+    assert entry['reservedFor'] is None
+
+
+def test_claim_moves_on_when_another_start_wins(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_list(stubber, STATUS_IDLE, pool_item('ch-1', created_at='1'), pool_item('ch-2', created_at='2'))
+    expect_update(stubber, 'ch-1', CLAIM, '#status = :status', error='ConditionalCheckFailedException')
+    expect_update(stubber, 'ch-2', CLAIM, '#status = :status')
+    assert claim_pooled_channel(client, 's1', PROFILE, 'test')['channelId'] == 'ch-2'
+
+
+def test_claim_prefers_the_shows_reservation(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_list(stubber, STATUS_RESERVED, pool_item('ch-other', STATUS_RESERVED, 'show-2'), pool_item('ch-r', STATUS_RESERVED, 'show-1'))
+    expect_list(stubber, STATUS_IDLE, pool_item('ch-idle'))
+    expect_update(stubber, 'ch-r', CLAIM, '#status = :status AND reservedFor = :show', values={
+        ':claimed': {'S': STATUS_CLAIMED},
+        ':status': {'S': STATUS_RESERVED},
+        ':sid': {'S': 's1'},
+        ':now': ANY,
+        ':show': {'S': 'show-1'}
+    })
+    entry = claim_pooled_channel(client, 's1', PROFILE, 'test', reserved_for='show-1')
+    assert (entry['channelId'], entry['reservedFor']) == ('ch-r', 'show-1')
+
+
+def test_claim_on_an_empty_pool(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_list(stubber, STATUS_IDLE)
+    assert claim_pooled_channel(client, 's1', PROFILE, 'test') is None
+
+
+def test_release_returns_an_idle_claim_to_idle(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_update(
+        stubber, 'ch-1', 'SET #status = :idle REMOVE claimedBy, claimedAt, reservedFor, airTime', 'claimedBy = :sid',
+        values={':idle': {'S': STATUS_IDLE}, ':sid': {'S': 's1'}}
+    )
+    assert release_pooled_channel(client, 'ch-1', PROFILE, 'test', claimed_by='s1') is True
+
+
+def test_release_restores_a_reservation(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_update(
+        stubber, 'ch-r', 'SET #status = :reserved REMOVE claimedBy, claimedAt', 'reservedFor = :show AND claimedBy = :sid',
+        values={':reserved': {'S': STATUS_RESERVED}, ':show': {'S': 'show-1'}, ':sid': {'S': 's1'}}
+    )
+    assert release_pooled_channel(client, 'ch-r', PROFILE, 'test', claimed_by='s1', reserved_for='show-1') is True
+
+
+def test_release_of_a_claim_someone_else_holds(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+    assert release_pooled_channel(client, 'ch-1', PROFILE, 'test', claimed_by='s1') is False
+
+
+def test_reserve_returns_the_shows_existing_reservation(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_list(stubber, STATUS_RESERVED, pool_item('ch-r', STATUS_RESERVED, 'show-1'))
+    assert reserve_pooled_channel(client, 'show-1', 1767225600, PROFILE, 'test')['channelId'] == 'ch-r'
+
+
+def test_reserve_sets_an_idle_entry_aside(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_list(stubber, STATUS_RESERVED)
+    expect_list(stubber, STATUS_IDLE, pool_item('ch-1'))
+    expect_update(
+        stubber, 'ch-1', 'SET #status = :reserved, reservedFor = :show, airTime = :air', '#status = :idle',
+        values={
+            ':reserved': {'S': STATUS_RESERVED},
+            ':idle': {'S': STATUS_IDLE},
+            ':show': {'S': 'show-1'},
+            ':air': {'N': '1767225600'}
+        }
+    )
+    entry = reserve_pooled_channel(client, 'show-1', 1767225600.5, PROFILE, 'test')
+    assert (entry['channelId'], entry['reservedFor'], entry['airTime']) == ('ch-1', 'show-1', 1767225600.0)
+
+
+def test_reserve_on_an_empty_pool(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_list(stubber, STATUS_RESERVED)
+    expect_list(stubber, STATUS_IDLE)
+    assert reserve_pooled_channel(client, 'show-1', 1767225600, PROFILE, 'test') is None
+
+
+class BrokenMediaLive:
+    def describe_channel(self, ChannelId):
+        raise RuntimeError('describe failed')
+
+
+def test_failed_take_puts_a_reserved_entry_back_on_reserve(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_list(stubber, STATUS_RESERVED, pool_item('ch-r', STATUS_RESERVED, 'show-1'))
+    expect_list(stubber, STATUS_IDLE)
+    expect_update(stubber, 'ch-r', CLAIM, '#status = :status AND reservedFor = :show')
+    expect_update(
+        stubber, 'ch-r', 'SET #status = :reserved REMOVE claimedBy, claimedAt', 'reservedFor = :show AND claimedBy = :sid'
+    )
+    with pytest.raises(RuntimeError):
+        take_pooled_channel(BrokenMediaLive(), client, 's1', 'rtmps://ingest/app/', PROFILE, 'test', reserved_for='show-1')
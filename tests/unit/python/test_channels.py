@@ -0,0 +1,74 @@
+"""MediaLive channel creation, destinations and encoder spec patching."""
+from botocore.stub import ANY
+
+from shelcaster_common.channels import (
+    build_destinations,
+    create_input_and_channel,
+    ensure_channel_spec,
+    ivs_ingest_url,
+    media_live_attribute,
+    source_attribute,
+)
+from shelcaster_common.clients import get_client
+from shelcaster_common.profiles import SPEC_HASH_TAG, get_profile
+
+INGEST = 'rtmps://abc.global-contribute.live-video.net:443/app/'
+CHANNEL_ARN = 'arn:aws:medialive:us-east-1:000000000000:channel:ch-1'
+
+
+def test_ivs_ingest_url_accepts_a_bare_host():
+    assert ivs_ingest_url('abc.global-contribute.live-video.net') == INGEST
+    assert ivs_ingest_url(INGEST) == INGEST
+
+
+def test_destinations_point_at_ivs_and_the_recording_prefix():
+    ivs, s3 = build_destinations(INGEST, 's1')
+    assert ivs['Settings'] == [{'Url': INGEST, 'StreamName': 'live'}]
+    assert s3['Settings'][0]['Url'].endswith('/recordings/s1/index')
+
+
+def test_created_channel_carries_the_profile(fake_aws):
+    ml_channel = create_input_and_channel(
+        get_client('medialive'), 's1', 'host/s1', INGEST, 's1', profile_name='abr-720p'
+    )
+    profile = get_profile('abr-720p')
+    assert (ml_channel['profile'], ml_channel['specHash']) == ('abr-720p', profile.spec_hash)
+    assert ml_channel['rtmpUrl'].endswith('/host/s1')
+    assert fake_aws.channel_states[ml_channel['channelId']] == 'IDLE'
+    assert fake_aws.calls['medialive.CreateInput'] == fake_aws.calls['medialive.CreateChannel'] == 1
+
+
+def test_media_live_attribute():
+    ml_channel = {'channelId': 'ch-1', 'inputId': 'in-1', 'rtmpUrl': 'rtmp://x/host/s1',
+                  'profile': 'hd-1080p', 'specHash': 'abc'}
+    value = media_live_attribute(ml_channel, {'width': 1280, 'height': 720}, 'low')['M']
+    assert value['channelId'] == {'S': 'ch-1'}
+    assert value['specHash'] == {'S': 'abc'}
+    assert value['input'] == source_attribute({'width': 1280, 'height': 720})
+    assert value['latencyMode'] == {'S': 'low'}
+    assert 'profile' not in media_live_attribute({**ml_channel, 'specHash': None})['M']
+
+
+def test_matching_spec_makes_no_call(aws):
+    aws('medialive')
+    spec_hash = get_profile('hd-1080p').spec_hash
+    assert ensure_channel_spec(get_client('medialive'), 'ch-1', spec_hash, 'hd-1080p') == spec_hash
+
+
+def test_running_channel_is_left_on_its_spec(aws):
+    aws('medialive').add_response('describe_channel', {
+        'State': 'RUNNING', 'Arn': CHANNEL_ARN, 'Tags': {SPEC_HASH_TAG: 'old'}
+    })
+    assert ensure_channel_spec(get_client('medialive'), 'ch-1', 'old', 'hd-1080p') == 'old'
+
+
+def test_idle_channel_is_patched_and_retagged(aws):
+    profile = get_profile('hd-1080p')
+    medialive = aws('medialive')
+    medialive.add_response('describe_channel', {'State': 'IDLE', 'Arn': CHANNEL_ARN, 'Tags': {}})
+    medialive.add_response('update_channel', {}, {
+        'ChannelId': 'ch-1', 'InputSpecification': profile.input_specification, 'EncoderSettings': ANY
+    })
+    medialive.add_response('create_tags', {}, {'ResourceArn': CHANNEL_ARN, 'Tags': profile.tags()})
+    medialive.add_response('describe_channel', {'State': 'IDLE'})
+    assert ensure_channel_spec(get_client('medialive'), 'ch-1', 'old', 'hd-1080p') == profile.spec_hash
@@ -0,0 +1,51 @@
+"""Client configuration and the lazily built shared clients."""
+import pytest
+
+from shelcaster_common import clients
+from shelcaster_common.clients import MAX_ATTEMPTS, client_config, get_client, lazy_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    clients.reset_clients()
+    yield
+    clients.reset_clients()
+
+
+def test_guarded_services_make_a_single_attempt():
+    # resilience.guard retries these itself
+    assert client_config('medialive').retries == {'mode': 'standard', 'max_attempts': 1}
+    assert client_config('ivs').retries['max_attempts'] == 1
+    assert client_config('dynamodb').retries['max_attempts'] == MAX_ATTEMPTS
+
+
+def test_dynamodb_fails_over_sooner():
+    assert client_config('dynamodb').read_timeout == 3.0
+    assert client_config('s3').read_timeout == clients.READ_TIMEOUT
+
+
+def test_lazy_client_builds_nothing_until_used(monkeypatch):
+    built = []
+    monkeypatch.setattr(clients, 'get_client', lambda service: built.append(service) or object())
+    client = lazy_client('medialive')
+    assert built == []
+    assert repr(client) == "LazyClient('medialive')"
+    with pytest.raises(AttributeError):
+        client.describe_channel
+    assert built == ['medialive']
+
+
+def test_installed_clients_are_shared():
+    installed = object()
+    clients.set_client('medialive', installed)
+    assert get_client('medialive') is installed
+    assert lazy_client('medialive').client is installed
+
+
+def test_get_client_caches_per_service(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    client = get_client('dynamodb')
+    assert get_client('dynamodb') is client
+    assert client.meta.region_name == clients.REGION
+    assert client.meta.config.read_timeout == 3.0
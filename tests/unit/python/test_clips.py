@@ -0,0 +1,104 @@
+"""Clip segment selection, edge cuts and playlist text."""
+import pytest
+
+from shelcaster_common.clips import EDGE_TOLERANCE, clip_entries, clip_prefix, edge_cuts, master_playlist, media_playlist
+from shelcaster_common.hls import parse_playlist, resolve_uri
+from shelcaster_common.segment_index import SegmentIndex, segment_format
+
+T0 = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+PLAYLIST_KEY = f"{clip_prefix('s1', 'c1')}index_1080p.m3u8"
+
+
+def entry(n, start, duration=6.0, discontinuity=False):
+    return {
+        'key': f'recordings/s1/index_1080p_{n:05d}.ts',
+        'sequence': n,
+        'start': start,
+        'duration': duration,
+        'size': 100,
+        'discontinuity': discontinuity
+    }
+
+
+def entries(count=3):
+    return [entry(n + 1, T0 + n * 6) for n in range(count)]
+
+
+def test_clip_entries_mark_gaps_as_discontinuities():
+    index = SegmentIndex('recordings/s1/index_1080p.m3u8', segment_format('index_1080p_00001.ts'))
+    for sequence, start in ((1, T0), (2, T0 + 6), (3, T0 + 20)):
+        index.append(sequence, start, 6.0, 100)
+    selected = clip_entries(index, T0 + 1, T0 + 21)
+    assert [e['sequence'] for e in selected] == [1, 2, 3]
+    assert [e['discontinuity'] for e in selected] == [False, False, True]
+    assert clip_entries(index, T0 + 30, T0 + 40) == []
+
+
+def test_no_cuts_on_segment_boundaries():
+    assert edge_cuts(entries(), T0, T0 + 18) == {}
+    assert edge_cuts(entries(), T0 + EDGE_TOLERANCE / 2, T0 + 18 - EDGE_TOLERANCE / 2) == {}
+
+
+def test_head_and_tail_cuts():
+    assert edge_cuts(entries(), T0 + 2.5, T0 + 16) == {0: (2.5, 6.0), 2: (0, 4.0)}
+
+
+def test_head_cut_only():
+    assert edge_cuts(entries(), T0 + 1, T0 + 18) == {0: (1.0, 6.0)}
+
+
+def test_single_segment_is_cut_at_both_ends():
+    assert edge_cuts(entries(1), T0 + 1, T0 + 4) == {0: (1.0, 4.0)}
+
+
+def test_cuts_are_clamped_to_the_segment():
+    assert edge_cuts(entries(2), T0 - 5, T0 + 30) == {}
+
+
+def test_media_playlist_points_back_at_the_recording():
+    text = media_playlist(entries(), PLAYLIST_KEY)
+    playlist = parse_playlist(text)
+    assert playlist.ended
+    assert playlist.target_duration == 6
+    assert [resolve_uri(PLAYLIST_KEY, s.uri) for s in playlist.segments] == [e['key'] for e in entries()]
+    assert playlist.segments[0].uri == '../../index_1080p_00001.ts'
+    assert [s.program_date_time for s in playlist.segments] == [pytest.approx(e['start']) for e in entries()]
+    assert '#EXT-X-PLAYLIST-TYPE:VOD' in text
+    assert '#EXT-X-START' not in text
+
+
+def test_media_playlist_target_duration_rounds_up():
+    text = media_playlist([entry(1, T0, 6.006), entry(2, T0 + 6.006, 5.994)], PLAYLIST_KEY)
+    assert '#EXT-X-TARGETDURATION:7' in text
+    assert '#EXTINF:6.006,' in text
+
+
+def test_media_playlist_restates_time_after_a_discontinuity():
+    clip = entries(2) + [entry(3, T0 + 30, discontinuity=True)]
+    text = media_playlist(clip, PLAYLIST_KEY)
+    assert text.count('#EXT-X-DISCONTINUITY') == 1
+    assert text.count('#EXT-X-PROGRAM-DATE-TIME') == 2
+    segments = parse_playlist(text).segments
+    assert segments[2].discontinuity
+    assert segments[2].program_date_time == pytest.approx(T0 + 30)
+
+
+def test_media_playlist_breaks_after_a_trimmed_segment():
+    head = dict(entry(1, T0 + 2, 4.0), key=f'{clip_prefix("s1", "c1")}index_1080p_head.ts', trimmed=True)
+    text = media_playlist([head] + entries(3)[1:], PLAYLIST_KEY)
+    segments = parse_playlist(text).segments
+    assert segments[0].uri == 'index_1080p_head.ts'
+    assert [s.discontinuity for s in segments] == [False, True, False]
+
+
+def test_media_playlist_start_offset():
+    text = media_playlist(entries(), PLAYLIST_KEY, start_offset=2.5)
+    assert '#EXT-X-START:TIME-OFFSET=2.500,PRECISE=YES' in text
+
+
+def test_master_playlist():
+    text = master_playlist([('BANDWIDTH=5128000,RESOLUTION=1920x1080', 'index_1080p.m3u8')])
+    master = parse_playlist(text)
+    assert master.is_master
+    assert master.variants[0]['uri'] == 'index_1080p.m3u8'
+    assert master.variants[0]['bandwidth'] == 5128000
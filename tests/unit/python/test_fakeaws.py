@@ -0,0 +1,101 @@
+"""The bench's DynamoDB stand-in applies writes and evaluates conditions."""
+import pytest
+from botocore.exceptions import ClientError
+from fakeaws import apply_update, evaluate_condition
+
+from shelcaster_common.clients import get_client
+from shelcaster_common.writes import WriteBatch
+
+TABLE = 'shelcaster-app'
+KEY = {'pk': {'S': 'session#s1'}, 'sk': {'S': 'info'}}
+
+
+@pytest.fixture
+def dynamodb(fake_aws):
+    return get_client('dynamodb')
+
+
+def session_item(**attributes):
+    return {**KEY, 'status': {'S': 'live'}, 'mediaLive': {'M': {'channelId': {'S': 'ch-1'}}}, **attributes}
+
+
+def test_conditions():
+    item = session_item(version={'N': '3'})
+    names = {'#ml': 'mediaLive', '#ch': 'channelId'}
+    assert evaluate_condition('attribute_exists(#ml.#ch) AND version < :v', item, names, {':v': {'N': '10'}})
+    assert not evaluate_condition('attribute_not_exists(pk) OR #ml.#ch <> :ch', item, names, {':ch': {'S': 'ch-1'}})
+    assert evaluate_condition('NOT (version = :v)', item, values={':v': {'N': '4'}})
+    assert evaluate_condition('version BETWEEN :low AND :high', item, values={':low': {'N': '1'}, ':high': {'N': '3'}})
+    assert evaluate_condition('begins_with(sk, :prefix)', item, values={':prefix': {'S': 'in'}})
+    assert not evaluate_condition('missing < :v', item, values={':v': {'N': '1'}})
+    assert evaluate_condition('attribute_not_exists(pk)', None)
+
+
+def test_updates():
+    item = apply_update(
+        'SET #ml.#ch = :ch, views = if_not_exists(views, :zero) + :one REMOVE #status ADD samples :one',
+        session_item(), {'#ml': 'mediaLive', '#ch': 'channelId', '#status': 'status'},
+        {':ch': {'S': 'ch-2'}, ':zero': {'N': '0'}, ':one': {'N': '1'}}
+    )
+    assert item['mediaLive'] == {'M': {'channelId': {'S': 'ch-2'}}}
+    assert item['views'] == {'N': '1'}
+    assert item['samples'] == {'N': '1'}
+    assert 'status' not in item
+
+
+def test_update_item_creates_and_conditions_apply(fake_aws, dynamodb):
+    dynamodb.update_item(
+        TableName=TABLE, Key=KEY, UpdateExpression='SET #status = :live',
+        ConditionExpression='attribute_not_exists(pk)',
+        ExpressionAttributeNames={'#status': 'status'}, ExpressionAttributeValues={':live': {'S': 'live'}}
+    )
+    assert fake_aws.items[('session#s1', 'info')] == {**KEY, 'status': {'S': 'live'}}
+
+    with pytest.raises(ClientError) as raised:
+        dynamodb.put_item(TableName=TABLE, Item=KEY, ConditionExpression='attribute_not_exists(pk)')
+    assert raised.value.response['Error']['Code'] == 'ConditionalCheckFailedException'
+    assert fake_aws.items[('session#s1', 'info')]['status'] == {'S': 'live'}
+
+    dynamodb.delete_item(TableName=TABLE, Key=KEY)
+    assert fake_aws.items == {}
+
+
+def test_cancelled_transaction_writes_nothing(fake_aws, dynamodb):
+    fake_aws.put_item(session_item())
+    other = {'pk': {'S': 'session#s2'}, 'sk': {'S': 'info'}}
+    batch = WriteBatch(dynamodb)
+    batch.set(other, 'status', {'S': 'stopped'})
+    batch.set(KEY, 'status', {'S': 'stopped'})
+    batch.condition(KEY, '#s = :expected', {':expected': {'S': 'ended'}}, {'#s': 'status'})
+
+    with pytest.raises(ClientError) as raised:
+        batch.flush()
+    response = raised.value.response
+    assert response['Error']['Code'] == 'TransactionCanceledException'
+    assert [reason['Code'] for reason in response['CancellationReasons']] == ['None', 'ConditionalCheckFailed']
+    assert ('session#s2', 'info') not in fake_aws.items
+    assert fake_aws.items[('session#s1', 'info')]['status'] == {'S': 'live'}
+
+    batch.set(other, 'status', {'S': 'stopped'})
+    batch.set(KEY, 'status', {'S': 'stopped'})
+    batch.condition(KEY, '#s = :expected', {':expected': {'S': 'live'}}, {'#s': 'status'})
+    assert batch.flush() == 2
+    assert fake_aws.items[('session#s2', 'info')]['status'] == {'S': 'stopped'}
+    assert fake_aws.items[('session#s1', 'info')]['mediaLive'] == {'M': {'channelId': {'S': 'ch-1'}}}
+
+
+def test_query_applies_the_range_condition(fake_aws, dynamodb):
+    fake_aws.put_item(session_item())
+    fake_aws.put_item({'pk': {'S': 'session#s1'}, 'sk': {'S': 'recording'}})
+    response = dynamodb.query(
+        TableName=TABLE, KeyConditionExpression='pk = :pk AND begins_with(sk, :info)',
+        ExpressionAttributeValues={':pk': {'S': 'session#s1'}, ':info': {'S': 'info'}}
+    )
+    assert [item['sk']['S'] for item in response['Items']] == ['info']
+
+
+def test_invalid_expressions_are_validation_errors(dynamodb):
+    with pytest.raises(ClientError) as raised:
+        dynamodb.update_item(TableName=TABLE, Key=KEY, UpdateExpression='SET #missing = :v',
+                             ExpressionAttributeValues={':v': {'S': 'x'}})
+    assert raised.value.response['Error']['Code'] == 'ValidationException'
@@ -0,0 +1,43 @@
+"""Concurrent control-plane calls and their per-call outcomes."""
+import threading
+import time
+
+from shelcaster_common.fanout import run_concurrently
+
+
+def test_each_call_keeps_its_own_outcome():
+    def fail():
+        raise RuntimeError('boom')
+
+    results = run_concurrently({'a': lambda: 1, 'b': fail, 'c': lambda: 3})
+    assert {name: result.value for name, result in results.items() if result.ok} == {'a': 1, 'c': 3}
+    assert str(results['b'].error) == 'boom'
+    assert all(result.elapsed >= 0 for result in results.values())
+
+
+def test_a_single_call_runs_inline():
+    caller = threading.current_thread()
+    result = run_concurrently({'only': threading.current_thread})['only']
+    assert result.value is caller
+
+
+def test_calls_overlap():
+    barrier = threading.Barrier(2, timeout=2)
+    results = run_concurrently({'a': barrier.wait, 'b': barrier.wait})
+    # Sequential calls would break the barrier
+    assert all(result.ok for result in results.values())
+
+
+def test_timeout_reports_unfinished_calls():
+    release = threading.Event()
+
+    def slow():
+        release.wait(2)
+        return 'late'
+
+    started = time.monotonic()
+    results = run_concurrently({'fast': lambda: 'ok', 'slow': slow}, timeout=0.05)
+    release.set()
+    assert time.monotonic() - started < 1
+    assert results['fast'].value == 'ok'
+    assert not results['slow'].ok
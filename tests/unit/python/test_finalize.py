@@ -0,0 +1,131 @@
+"""Segment selection, ranged reads and the multipart upload of a finalized recording."""
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import FileS3
+from shelcaster_common.finalize import (
+    MultipartUpload,
+    byte_ranges,
+    finalize_recording,
+    list_objects,
+    output_key,
+    read_segments,
+    rendition_segments,
+    top_rendition,
+)
+from shelcaster_common.segment_index import span_objects, update_index
+
+BUCKET = 'test-bucket'
+PREFIX = 'recordings/s1/'
+T0 = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+PART = 64
+
+
+def stamp(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def segment_body(rendition, sequence):
+    return f'{rendition}-{sequence:05d};'.encode() * 10
+
+
+def seed_recording(s3, count=15):
+    """A two-rendition recording of ``count`` 6s segments from T0, dated in its playlists"""
+    s3.put(BUCKET, f'{PREFIX}index.m3u8', (
+        '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000000\nindex_360p.m3u8\n'
+        '#EXT-X-STREAM-INF:BANDWIDTH=5000000\nindex_1080p.m3u8\n'
+    ))
+    for rendition in ('1080p', '360p'):
+        lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:6', '#EXT-X-MEDIA-SEQUENCE:1', f'#EXT-X-PROGRAM-DATE-TIME:{stamp(T0)}']
+        for sequence in range(1, count + 1):
+            key = f'{PREFIX}index_{rendition}_{sequence:05d}.ts'
+            s3.put(BUCKET, key, segment_body(rendition, sequence), modified=T0 + sequence * 6 + 3)
+            lines += ['#EXTINF:6.000,', f'index_{rendition}_{sequence:05d}.ts']
+        s3.put(BUCKET, f'{PREFIX}index_{rendition}.m3u8', '\n'.join(lines + ['#EXT-X-ENDLIST']) + '\n')
+
+
+def test_top_rendition_is_the_highest_bandwidth_variant(file_s3):
+    seed_recording(file_s3, count=3)
+    objects = list_objects(file_s3, BUCKET, PREFIX)
+    playlist_key = top_rendition(file_s3, BUCKET, PREFIX, objects)
+    assert playlist_key == f'{PREFIX}index_1080p.m3u8'
+    assert [obj['Key'] for obj in rendition_segments(objects, playlist_key)] == [
+        f'{PREFIX}index_1080p_{n:05d}.ts' for n in (1, 2, 3)
+    ]
+
+
+def test_finalize_takes_the_segments_inside_the_recording_by_program_time(file_s3):
+    seed_recording(file_s3)
+    index, _ = update_index(file_s3, BUCKET, f'{PREFIX}index_1080p.m3u8')
+    # Markers at 12s and 72s: segments 3-12, whatever their upload times
+    segments = span_objects(index, T0 + 12, T0 + 72)
+    summary = finalize_recording(file_s3, BUCKET, 's1', 'rec-1', segments)
+
+    expected = b''.join(segment_body('1080p', n) for n in range(3, 13))
+    assert summary['key'] == output_key('s1', 'rec-1', 'ts')
+    assert (summary['segments'], summary['bytes']) == (10, len(expected))
+    assert summary['firstSegment'].endswith('_00003.ts')
+    assert summary['lastSegment'].endswith('_00012.ts')
+    assert file_s3.read(BUCKET, summary['key']) == expected
+
+
+def test_byte_ranges_split_segments_at_the_range_size():
+    segments = [{'Key': 'a', 'Size': 10}, {'Key': 'b', 'Size': 4}, {'Key': 'c', 'Size': 0}]
+    assert list(byte_ranges(segments, range_bytes=4)) == [
+        ('a', 0, 3), ('a', 4, 7), ('a', 8, 9), ('b', 0, 3)
+    ]
+
+
+def test_read_segments_keeps_playlist_order(file_s3):
+    seed_recording(file_s3, count=4)
+    segments = [{'Key': f'{PREFIX}index_1080p_{n:05d}.ts', 'Size': len(segment_body('1080p', n))} for n in (1, 2, 3, 4)]
+    data = b''.join(read_segments(file_s3, BUCKET, segments, range_bytes=7, read_ahead=3))
+    assert data == b''.join(segment_body('1080p', n) for n in (1, 2, 3, 4))
+
+
+@pytest.mark.parametrize('size, parts', [
+    (0, [0]),
+    (1, [1]),
+    (PART - 1, [PART - 1]),
+    (PART, [PART]),
+    (PART + 1, [PART, 1]),
+    (2 * PART, [PART, PART]),
+    (2 * PART + 1, [PART, PART, 1]),
+])
+def test_multipart_part_size_boundaries(tmp_path, size, parts):
+    s3 = FileS3(tmp_path, min_part_bytes=PART)
+    data = bytes(range(256)) * (size // 256 + 1)
+    with MultipartUpload(s3, BUCKET, 'out.ts', 'video/mp2t', part_bytes=PART, upload_ahead=2) as upload:
+        # Odd-sized writes, so parts are cut across write boundaries
+        for start in range(0, size, 7):
+            upload.write(data[start:min(start + 7, size)])
+    assert s3.completed == [('out.ts', parts)]
+    assert s3.read(BUCKET, 'out.ts') == data[:size]
+    assert upload.size == size
+
+
+def test_failed_part_aborts_the_upload(tmp_path):
+    s3 = FileS3(tmp_path, min_part_bytes=PART)
+    s3.fail_parts.add(2)
+    with pytest.raises(s3.exceptions.ClientError):
+        with MultipartUpload(s3, BUCKET, 'out.ts', 'video/mp2t', part_bytes=PART, upload_ahead=1) as upload:
+            for _ in range(4):
+                upload.write(b'x' * PART)
+    assert s3.aborted == ['out.ts']
+    assert s3.completed == []
+    assert s3.pending_uploads() == []
+    assert (BUCKET, 'out.ts') not in s3.objects
+
+
+def test_failed_read_aborts_the_finalize(file_s3):
+    seed_recording(file_s3, count=3)
+    segments = [
+        {'Key': f'{PREFIX}index_1080p_00001.ts', 'Size': len(segment_body('1080p', 1))},
+        {'Key': f'{PREFIX}index_1080p_00099.ts', 'Size': 100}
+    ]
+    with pytest.raises(file_s3.exceptions.NoSuchKey):
+        finalize_recording(file_s3, BUCKET, 's1', 'rec-1', segments)
+    assert file_s3.aborted == [output_key('s1', 'rec-1', 'ts')]
+    assert file_s3.pending_uploads() == []
+    assert (BUCKET, output_key('s1', 'rec-1', 'ts')) not in file_s3.objects
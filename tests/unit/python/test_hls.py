@@ -0,0 +1,90 @@
+"""Playlist parsing for the tags MediaLive's HLS output writes."""
+from shelcaster_common.hls import parse_attributes, parse_playlist, parse_program_date_time, resolve_uri
+
+MASTER = '''#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-STREAM-INF:BANDWIDTH=5128000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2"
+index_1080p.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=1128000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2"
+index_360p.m3u8
+'''
+
+MEDIA = '''#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:6
+#EXT-X-MEDIA-SEQUENCE:41
+#EXT-X-PROGRAM-DATE-TIME:2026-01-01T00:00:00.000Z
+#EXTINF:6.006,
+index_1080p_00041.ts
+#EXTINF:5.994,
+index_1080p_00042.ts
+#EXT-X-DISCONTINUITY
+#EXT-X-PROGRAM-DATE-TIME:2026-01-01T00:01:00.500Z
+#EXTINF:6.000,
+index_1080p_00043.ts
+#EXT-X-ENDLIST
+'''
+
+START = parse_program_date_time('2026-01-01T00:00:00Z')
+
+
+def test_master_playlist_variants():
+    playlist = parse_playlist(MASTER)
+    assert playlist.is_master
+    assert playlist.segments == []
+    assert [variant['uri'] for variant in playlist.variants] == ['index_1080p.m3u8', 'index_360p.m3u8']
+    assert playlist.variants[0]['bandwidth'] == 5128000
+    assert playlist.variants[0]['resolution'] == '1920x1080'
+    assert 'CODECS="avc1.640028,mp4a.40.2"' in playlist.variants[0]['attributes']
+
+
+def test_media_playlist_segments_and_sequence():
+    playlist = parse_playlist(MEDIA)
+    assert not playlist.is_master
+    assert playlist.target_duration == 6
+    assert playlist.media_sequence == 41
+    assert playlist.ended
+    assert [(s.uri, s.sequence) for s in playlist.segments] == [
+        ('index_1080p_00041.ts', 41), ('index_1080p_00042.ts', 42), ('index_1080p_00043.ts', 43)
+    ]
+    assert playlist.duration == 18.0
+
+
+def test_program_date_time_carries_forward_until_restated():
+    first, second, third = parse_playlist(MEDIA).segments
+    assert first.program_date_time == START
+    assert second.program_date_time == START + 6.006
+    assert third.program_date_time == START + 60.5
+
+
+def test_discontinuity_marks_only_the_next_segment():
+    assert [s.discontinuity for s in parse_playlist(MEDIA).segments] == [False, False, True]
+
+
+def test_undated_live_playlist():
+    playlist = parse_playlist('#EXTM3U\n#EXT-X-TARGETDURATION:2\n\n#EXTINF:2,\na_1.ts\n#EXTINF:2,\na_2.ts\n')
+    assert not playlist.ended
+    assert playlist.media_sequence == 0
+    assert [s.program_date_time for s in playlist.segments] == [None, None]
+
+
+def test_unknown_tags_are_ignored():
+    playlist = parse_playlist('#EXTM3U\n#EXT-X-INDEPENDENT-SEGMENTS\n#EXT-X-FUTURE-TAG:1\n#EXTINF:6,\na_1.ts\n')
+    assert [s.uri for s in playlist.segments] == ['a_1.ts']
+
+
+def test_program_date_time_offsets_and_naive_stamps():
+    assert parse_program_date_time('2026-01-01T01:00:00+01:00') == START
+    assert parse_program_date_time('2026-01-01T00:00:00') == START
+
+
+def test_parse_attributes_keeps_quoted_commas():
+    assert parse_attributes('BANDWIDTH=100,CODECS="a,b",RESOLUTION=1x1') == {
+        'BANDWIDTH': '100', 'CODECS': 'a,b', 'RESOLUTION': '1x1'
+    }
+
+
+def test_resolve_uri_relative_to_the_playlist():
+    assert resolve_uri('recordings/s1/index.m3u8', 'index_1080p.m3u8') == 'recordings/s1/index_1080p.m3u8'
+    assert resolve_uri('recordings/s1/clips/c1/a.m3u8', '../../a_1.ts') == 'recordings/s1/a_1.ts'
+    assert resolve_uri('recordings/s1/index.m3u8', 'https://cdn/x.ts') == 'https://cdn/x.ts'
@@ -0,0 +1,188 @@
+"""Lease acquire/release conditions and the single-flight wait."""
+import time
+
+import pytest
+from botocore.stub import ANY
+
+from shelcaster_common import lease
+from shelcaster_common.lease import acquire_lease, release_lease, single_flight, stage_release
+from shelcaster_common.session import session_key
+from shelcaster_common.writes import WriteBatch
+
+KEY = session_key('s1')
+
+
+def expect_acquire(stubber, condition, error=None):
+    params = {
+        'TableName': 'test',
+        'Key': KEY,
+        'UpdateExpression': 'SET #lease = :lease',
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': {'#lease': 'provisionLease'},
+        'ExpressionAttributeValues': ANY
+    }
+    if error:
+        stubber.add_client_error('update_item', service_error_code=error, expected_params=params)
+    else:
+        stubber.add_response('update_item', {}, params)
+
+
+def test_acquire_requires_the_item_and_a_free_or_expired_lease(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_acquire(stubber, 'attribute_exists(pk) AND (attribute_not_exists(#lease) OR #lease.expiresAt < :now)')
+    assert acquire_lease(client, KEY, 'owner-1', ttl=90, table_name='test') is True
+
+
+def test_acquire_writes_owner_and_expiry(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    captured = {}
+    stubber.add_response('update_item', {})
+    client.meta.events.register('provide-client-params.dynamodb.UpdateItem', lambda params, **_: captured.update(params))
+    before = int(time.time())
+    acquire_lease(client, KEY, 'owner-1', ttl=90, table_name='test')
+
+    lease = captured['ExpressionAttributeValues'][':lease']['M']
+    assert lease['owner'] == {'S': 'owner-1'}
+    assert before + 90 <= int(lease['expiresAt']['N']) <= int(time.time()) + 90
+    assert int(captured['ExpressionAttributeValues'][':now']['N']) >= before
+
+
+def test_acquire_refused_once_the_work_is_done(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_acquire(
+        stubber,
+        'attribute_not_exists(mediaLive.channelId) AND (attribute_not_exists(#lease) OR #lease.expiresAt < :now)',
+        error='ConditionalCheckFailedException'
+    )
+    assert acquire_lease(client, KEY, 'owner-1', unless_exists='mediaLive.channelId', must_exist=False,
+                         table_name='test') is False
+
+
+def test_acquire_lets_other_errors_through(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    expect_acquire(
+        stubber, 'attribute_exists(pk) AND (attribute_not_exists(#lease) OR #lease.expiresAt < :now)',
+        error='ProvisionedThroughputExceededException'
+    )
+    with pytest.raises(client.exceptions.ProvisionedThroughputExceededException):
+        acquire_lease(client, KEY, 'owner-1', table_name='test')
+
+
+def test_release_is_conditioned_on_ownership(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    stubber.add_response('update_item', {}, {
+        'TableName': 'test',
+        'Key': KEY,
+        'UpdateExpression': 'REMOVE #lease',
+        'ConditionExpression': '#lease.#owner = :owner',
+        'ExpressionAttributeNames': {'#lease': 'provisionLease', '#owner': 'owner'},
+        'ExpressionAttributeValues': {':owner': {'S': 'owner-1'}}
+    })
+    release_lease(client, KEY, 'owner-1', table_name='test')
+
+
+def test_release_of_a_lease_taken_over_is_a_no_op(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+    release_lease(client, KEY, 'owner-1', table_name='test')
+
+
+def test_stage_release_rides_on_the_result_write(dynamodb):
+    writes = WriteBatch(dynamodb, table_name='test')
+    writes.set(KEY, 'mediaLive.channelId', {'S': 'ch-1'})
+    stage_release(writes, KEY, 'owner-1')
+    writes.flush()
+
+    (operation, params), = dynamodb.requests
+    assert operation == 'update_item'
+    assert params['UpdateExpression'] == 'SET #n0.#n1 = :v0 REMOVE #n2'
+    assert params['ExpressionAttributeNames']['#n2'] == 'provisionLease'
+    assert params['ConditionExpression'] == '(#lease.#leaseOwner = :leaseOwner)'
+    assert params['ExpressionAttributeValues'][':leaseOwner'] == {'S': 'owner-1'}
+
+
+@pytest.fixture
+def slept(monkeypatch):
+    intervals = []
+    monkeypatch.setattr(lease.time, 'sleep', intervals.append)
+    return intervals
+
+
+def held_item(expires_at, done=False):
+    item = {
+        'pk': {'S': 'session#s1'},
+        'sk': {'S': 'info'},
+        'provisionLease': {'M': {'owner': {'S': 'owner-2'}, 'expiresAt': {'N': str(expires_at)}}}
+    }
+    if done:
+        item['mediaLive'] = {'M': {'channelId': {'S': 'ch-1'}}}
+    return item
+
+
+def is_done(item):
+    return 'mediaLive' in item
+
+
+def test_single_flight_returns_the_holders_result(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+    stubber.add_response('get_item', {'Item': held_item(int(time.time()) + 60, done=True)},
+                         {'TableName': 'test', 'Key': KEY, 'ConsistentRead': True})
+    item, acquired = single_flight(client, KEY, 'owner-1', is_done, time.monotonic() + 5, table_name='test')
+    assert acquired is False
+    assert item['mediaLive']['M']['channelId'] == {'S': 'ch-1'}
+
+
+def test_single_flight_takes_over_an_expired_lease(stubbed_dynamodb, slept):
+    client, stubber = stubbed_dynamodb
+    stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+    stubber.add_response('get_item', {'Item': held_item(int(time.time()) - 1)})
+    stubber.add_response('update_item', {})
+    assert single_flight(client, KEY, 'owner-1', is_done, time.monotonic() + 5, table_name='test') == (None, True)
+    assert len(slept) == 1
+
+
+def test_single_flight_backs_off_between_takeover_attempts(stubbed_dynamodb, slept):
+    client, stubber = stubbed_dynamodb
+    for _ in range(3):
+        stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+        stubber.add_response('get_item', {'Item': held_item(int(time.time()) - 1)})
+    stubber.add_response('update_item', {})
+    assert single_flight(client, KEY, 'owner-1', is_done, time.monotonic() + 5, table_name='test') == (None, True)
+    assert len(slept) == 3
+    assert all(interval > 0 for interval in slept)
+
+
+def test_single_flight_waits_out_the_current_second(stubbed_dynamodb, slept, monkeypatch):
+    # Expiring this second is not expired yet for acquire_lease's integer :now
+    monkeypatch.setattr(lease.time, 'time', lambda: 1_767_225_600.9)
+    client, stubber = stubbed_dynamodb
+    stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+    stubber.add_response('get_item', {'Item': held_item(1_767_225_600)})
+    with pytest.raises(TimeoutError, match='owner-2'):
+        single_flight(client, KEY, 'owner-1', is_done, time.monotonic() - 1, table_name='test')
+
+
+def test_single_flight_does_not_retake_an_expired_lease_past_the_deadline(stubbed_dynamodb, slept):
+    client, stubber = stubbed_dynamodb
+    stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+    stubber.add_response('get_item', {'Item': held_item(int(time.time()) - 1)})
+    with pytest.raises(TimeoutError):
+        single_flight(client, KEY, 'owner-1', is_done, time.monotonic() - 1, table_name='test')
+    assert slept == []
+
+
+def test_single_flight_gives_up_at_the_deadline(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+    stubber.add_response('get_item', {'Item': held_item(int(time.time()) + 60)})
+    with pytest.raises(TimeoutError):
+        single_flight(client, KEY, 'owner-1', is_done, time.monotonic() - 1, table_name='test')
+
+
+def test_single_flight_fails_if_the_item_disappears(stubbed_dynamodb):
+    client, stubber = stubbed_dynamodb
+    stubber.add_client_error('update_item', service_error_code='ConditionalCheckFailedException')
+    stubber.add_response('get_item', {})
+    with pytest.raises(LookupError):
+        single_flight(client, KEY, 'owner-1', is_done, time.monotonic() + 5, table_name='test')
@@ -0,0 +1,128 @@
+"""Start-up histograms, lead times, the show schedule index and the prewarm scheduler."""
+import time
+
+import pytest
+
+from conftest import LambdaContext, load_handler
+from shelcaster_common.clients import get_client
+from shelcaster_common.prewarm import (
+    BUCKET_SECONDS,
+    DEFAULT_LEAD_SECONDS,
+    HOLD_SECONDS,
+    LEAD_MARGIN_SECONDS,
+    MAX_LEAD_SECONDS,
+    MIN_SAMPLES,
+    StartupStats,
+    air_day,
+    bucket_name,
+    format_time,
+    load_startup_stats,
+    mark_running,
+    prewarm_attribute,
+    prewarm_expired,
+    record_startup,
+    startup_key,
+    upcoming_shows,
+)
+from shelcaster_common.session import decode_value, session_key
+
+NOW = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+
+
+@pytest.mark.parametrize('seconds, expected', [
+    (0, 'b0000'),
+    (89.9, 'b0085'),
+    (-3, 'b0000'),
+    (5000, 'b0900'),
+])
+def test_bucket_name(seconds, expected):
+    assert bucket_name(seconds) == expected
+
+
+def test_lead_time_is_the_default_until_enough_samples():
+    assert StartupStats('hd-1080p', {60: MIN_SAMPLES - 1}).lead_time() == DEFAULT_LEAD_SECONDS
+    assert StartupStats('hd-1080p').percentile(0.9) is None
+
+
+def test_lead_time_is_a_high_percentile_plus_margin():
+    stats = StartupStats('hd-1080p', {60: 8, 90: 1, 120: 1})
+    assert stats.percentile(0.5) == 60 + BUCKET_SECONDS
+    assert stats.percentile(0.9) == 90 + BUCKET_SECONDS
+    assert stats.lead_time() == 90 + BUCKET_SECONDS + LEAD_MARGIN_SECONDS
+    assert StartupStats('hd-1080p', {900: 10}).lead_time() == MAX_LEAD_SECONDS
+
+
+def test_stats_read_only_bucket_attributes():
+    stats = StartupStats.from_item('hd-1080p', {
+        'b0060': {'N': '2'}, 'b0065': {'N': '1'}, 'samples': {'N': '3'}, 'bogus': {'S': 'x'}
+    })
+    assert stats.buckets == {60: 2, 65: 1}
+    assert stats.samples == 3
+
+
+def test_recorded_samples_accumulate(fake_aws):
+    dynamodb = get_client('dynamodb')
+    record_startup(dynamodb, 'hd-1080p', 62.5)
+    record_startup(dynamodb, 'hd-1080p', 64)
+    item = fake_aws.items[tuple(value['S'] for value in startup_key('hd-1080p').values())]
+    assert (item['samples'], item['b0060']) == ({'N': '2'}, {'N': '2'})
+    stats = load_startup_stats(dynamodb, ['hd-1080p', 'abr-720p'])
+    assert (stats['hd-1080p'].samples, stats['abr-720p'].samples) == (2, 0)
+
+
+def test_times_match_javascript_iso_strings():
+    assert format_time(NOW + 1.5) == '2026-01-01T00:00:01.500Z'
+    assert air_day(NOW - 1) == '2025-12-31'
+
+
+def test_upcoming_shows_span_air_days(fake_aws):
+    for show_id, air_time, status in (('late', NOW - 60, 'scheduled'), ('early', NOW + 60, 'scheduled'),
+                                      ('done', NOW + 30, 'completed'), ('far', NOW + 7200, 'scheduled')):
+        fake_aws.put_item({
+            'pk': {'S': f'show#{show_id}'}, 'sk': {'S': 'info'}, 'status': {'S': status},
+            'airTime': {'S': format_time(air_time)}, 'airDay': {'S': air_day(air_time)},
+            **({'currentSessionId': {'S': 's1'}} if show_id == 'early' else {})
+        })
+    shows = upcoming_shows(get_client('dynamodb'), NOW - 120, NOW + 120)
+    assert shows == [
+        {'showId': 'late', 'airTime': NOW - 60, 'sessionId': None},
+        {'showId': 'early', 'airTime': NOW + 60, 'sessionId': 's1'}
+    ]
+
+
+def test_prewarm_expires_after_the_hold():
+    attribute = decode_value(prewarm_attribute('show-1', NOW, 120, '2025-12-31T23:58:00'))
+    assert attribute['leadSeconds'] == 120
+    assert not prewarm_expired(attribute, NOW + HOLD_SECONDS)
+    assert prewarm_expired(attribute, NOW + HOLD_SECONDS + 1)
+
+
+def test_running_is_stamped_once(fake_aws):
+    dynamodb = get_client('dynamodb')
+    fake_aws.put_item({**session_key('s1'), 'mediaLive': {'M': {
+        'prewarm': prewarm_attribute('show-1', NOW, 120, '2025-12-31T23:58:00')
+    }}})
+    fake_aws.put_item({**session_key('s2'), 'mediaLive': {'M': {}}})
+    assert mark_running(dynamodb, 's1', '2025-12-31T23:59:30')
+    assert not mark_running(dynamodb, 's1', '2026-01-01T00:00:00')
+    # Without a prewarm there is nothing to stamp
+    assert not mark_running(dynamodb, 's2', '2026-01-01T00:00:00')
+    stamped = fake_aws.items[('session#s1', 'info')]['mediaLive']['M']['prewarm']['M']['runningAt']
+    assert stamped == {'S': '2025-12-31T23:59:30'}
+
+
+def test_scheduler_leaves_a_dry_pool_to_the_refill(fake_aws):
+    soon = time.time() + 600
+    for show_id in ('show-1', 'show-2'):
+        fake_aws.put_item({
+            'pk': {'S': f'show#{show_id}'}, 'sk': {'S': 'info'}, 'status': {'S': 'scheduled'},
+            'airTime': {'S': format_time(soon)}, 'airDay': {'S': air_day(soon)}
+        })
+    result = load_handler('shelcaster-prewarm-channels-py').lambda_handler({}, LambdaContext())
+
+    assert {show_id: outcome['result'] for show_id, outcome in result['actions'].items()} == {
+        'show-1': 'pool_empty', 'show-2': 'pool_empty'
+    }
+    # No channel is created inline; one asynchronous top-up covers both shows
+    assert not any(call.startswith('medialive.') for call in fake_aws.calls)
+    assert fake_aws.calls['lambda.Invoke'] == 1
@@ -0,0 +1,110 @@
+"""Encoder profile spec hashing, validation and selection."""
+import copy
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from shelcaster_common import profiles
+from shelcaster_common.profiles import (
+    PROFILE_TAG,
+    SPEC_HASH_TAG,
+    get_profile,
+    profile_names,
+    resolve_profile,
+    select_profile,
+    spec_hash,
+    validate_encoder_settings,
+)
+
+LAYER = os.path.dirname(os.path.dirname(profiles.__file__))
+
+
+def reversed_keys(value):
+    """The same JSON value with every object's keys in reverse order"""
+    if isinstance(value, dict):
+        return {key: reversed_keys(value[key]) for key in reversed(list(value))}
+    if isinstance(value, list):
+        return [reversed_keys(item) for item in value]
+    return value
+
+
+def test_spec_hash_ignores_key_order():
+    profile = get_profile('hd-1080p')
+    assert spec_hash(
+        reversed_keys(profile.input_specification), reversed_keys(profile.encoder_settings), profile.channel_class
+    ) == profile.spec_hash
+
+
+def test_spec_hash_changes_with_the_spec():
+    profile = get_profile('hd-1080p')
+    settings = copy.deepcopy(profile.encoder_settings)
+    settings['VideoDescriptions'][0]['Width'] += 2
+    assert spec_hash(profile.input_specification, settings, profile.channel_class) != profile.spec_hash
+    assert spec_hash(profile.input_specification, profile.encoder_settings, 'STANDARD') != profile.spec_hash
+
+
+def test_rebuilt_profiles_hash_the_same(monkeypatch):
+    hashes = {name: get_profile(name).spec_hash for name in profile_names()}
+    monkeypatch.setattr(profiles, '_PROFILES', {})
+    assert {name: get_profile(name).spec_hash for name in profile_names()} == hashes
+
+
+def test_spec_hash_is_stable_across_processes():
+    # The hash is stored on channels and compared by later containers
+    script = (
+        'import json; from shelcaster_common.profiles import get_profile, profile_names; '
+        'print(json.dumps({name: get_profile(name).spec_hash for name in profile_names()}))'
+    )
+    expected = {name: get_profile(name).spec_hash for name in profile_names()}
+    for seed in ('1', '2'):
+        env = dict(os.environ, PYTHONPATH=LAYER, PYTHONHASHSEED=seed)
+        output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+        assert json.loads(output.stdout) == expected
+
+
+def test_every_profile_has_its_own_hash():
+    hashes = [get_profile(name).spec_hash for name in profile_names()]
+    assert len(set(hashes)) == len(hashes)
+
+
+def test_profile_tags():
+    profile = get_profile('abr-720p')
+    assert profile.tags() == {PROFILE_TAG: 'abr-720p', SPEC_HASH_TAG: profile.spec_hash}
+
+
+def test_unknown_profile():
+    with pytest.raises(KeyError):
+        get_profile('no-such-profile')
+
+
+def test_validation_rejects_dangling_references():
+    settings = copy.deepcopy(get_profile('hd-1080p').encoder_settings)
+    settings['OutputGroups'][0]['Outputs'][0]['VideoDescriptionName'] = 'missing'
+    with pytest.raises(ValueError, match='unknown video description'):
+        validate_encoder_settings(settings)
+
+
+@pytest.mark.parametrize('source, expected', [
+    (None, 'hd-1080p'),
+    ({'width': 1920}, 'hd-1080p'),
+    ({'height': 1080, 'bitrate': 8_000_000}, 'abr-1080p'),
+    ({'height': 720}, 'abr-720p'),
+    ({'height': 1080, 'bitrate': 3_500_000}, 'abr-720p'),
+    ({'height': 1080, 'bitrate': 2_500_000}, 'abr-480p'),
+    ({'height': 240}, 'abr-360p'),
+])
+def test_select_profile(source, expected):
+    assert select_profile(source, default='hd-1080p') == expected
+
+
+def test_resolve_profile_latency_mode():
+    assert resolve_profile(source={'height': 720}, latency_mode='low') == 'abr-720p-ll'
+    assert resolve_profile(current='abr-480p-ll') == 'abr-480p-ll'
+    assert resolve_profile(current='abr-480p-ll', latency_mode='standard') == 'abr-480p'
+    with pytest.raises(ValueError):
+        resolve_profile(latency_mode='fast')
+    with pytest.raises(ValueError):
+        resolve_profile(requested='no-such-profile')
@@ -0,0 +1,78 @@
+"""Deadlines, backoff, channel state waits and status tokens."""
+import time
+
+import pytest
+
+from conftest import LambdaContext
+from shelcaster_common import readiness
+from shelcaster_common.clients import get_client
+from shelcaster_common.readiness import (
+    DEADLINE_MARGIN,
+    backoff_intervals,
+    decode_status_token,
+    deadline_from_context,
+    encode_status_token,
+    wait_for_channel_state,
+)
+
+
+def test_deadline_keeps_a_margin_of_the_remaining_time():
+    remaining = deadline_from_context(LambdaContext(remaining_ms=10000)) - time.monotonic()
+    assert remaining == pytest.approx(10 - DEADLINE_MARGIN, abs=0.1)
+    assert deadline_from_context(LambdaContext(remaining_ms=10000), cap=1) - time.monotonic() <= 1
+    assert deadline_from_context(LambdaContext(remaining_ms=0)) <= time.monotonic()
+    assert deadline_from_context(None, cap=3) - time.monotonic() == pytest.approx(3, abs=0.1)
+
+
+def test_backoff_stays_between_initial_and_maximum():
+    intervals = backoff_intervals(initial=0.5, maximum=4)
+    drawn = [next(intervals) for _ in range(200)]
+    assert all(0.5 <= interval <= 4 for interval in drawn)
+    assert max(drawn) > 2
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(readiness.time, 'sleep', slept.append)
+    return slept
+
+
+def test_wait_returns_once_the_channel_is_ready(aws, no_sleep):
+    medialive = aws('medialive')
+    for state in ('STARTING', 'STARTING', 'RUNNING'):
+        medialive.add_response('describe_channel', {'State': state}, {'ChannelId': 'ch-1'})
+    state, reached = wait_for_channel_state(
+        get_client('medialive'), 'ch-1', ('RUNNING',), deadline=time.monotonic() + 30, initial=0.1, maximum=0.2
+    )
+    assert (state, reached) == ('RUNNING', True)
+    assert len(no_sleep) == 2
+
+
+def test_wait_stops_on_a_failed_start(aws, no_sleep):
+    aws('medialive').add_response('describe_channel', {'State': 'CREATE_FAILED'})
+    assert wait_for_channel_state(
+        get_client('medialive'), 'ch-1', ('RUNNING',), deadline=time.monotonic() + 30, fail_states=('CREATE_FAILED',)
+    ) == ('CREATE_FAILED', False)
+    assert no_sleep == []
+
+
+def test_wait_gives_up_at_the_deadline(aws, no_sleep):
+    aws('medialive').add_response('describe_channel', {'State': 'STARTING'})
+    assert wait_for_channel_state(
+        get_client('medialive'), 'ch-1', ('RUNNING',), deadline=time.monotonic() - 1
+    ) == ('STARTING', False)
+
+
+def test_status_token_round_trip():
+    token = encode_status_token('s1', 'ch-1')
+    assert '=' not in token
+    decoded = decode_status_token(token)
+    assert (decoded['sessionId'], decoded['channelId']) == ('s1', 'ch-1')
+    assert decoded['issuedAt'] == pytest.approx(time.time(), abs=5)
+
+
+@pytest.mark.parametrize('token', ['', 'not-a-token', encode_status_token('s1', 'ch-1')[:-4]])
+def test_malformed_status_tokens(token):
+    with pytest.raises(ValueError, match='Invalid status token'):
+        decode_status_token(token)
@@ -0,0 +1,31 @@
+"""start-recording against stubbed AWS clients."""
+import json
+
+from conftest import LambdaContext, load_handler
+from shelcaster_common.session import invalidate_session
+
+
+def recording_item(session_id):
+    return {
+        'pk': {'S': f'session#{session_id}'},
+        'sk': {'S': 'info'},
+        'sessionId': {'S': session_id},
+        'mediaLive': {'M': {'channelId': {'S': f'ch-{session_id}'}}},
+        'recording': {'M': {
+            'isRecording': {'BOOL': True},
+            'actionName': {'S': f'recording-start-{session_id}-0'}
+        }}
+    }
+
+
+def test_start_recording_returns_early_without_reading_the_timeline(aws):
+    aws('dynamodb').add_response('get_item', {'Item': recording_item('s1')})
+    # Any S3 read would hit the empty stubber
+    aws('s3')
+    invalidate_session('s1')
+    event = {'pathParameters': {'sessionId': 's1'}, 'body': json.dumps({'startAt': '2026-01-01T00:10:00Z'})}
+    response = load_handler('shelcaster-start-recording-py').lambda_handler(event, LambdaContext())
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {
+        'message': 'Recording already started', 'actionName': 'recording-start-s1-0'
+    }
@@ -0,0 +1,240 @@
+"""Error classification, the circuit breaker, the token bucket and guarded retries."""
+import time
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from shelcaster_common import resilience
+from shelcaster_common.resilience import (
+    BudgetExhausted,
+    CircuitBreaker,
+    CircuitOpenError,
+    ServiceGuard,
+    TokenBucket,
+    classify,
+)
+
+
+def client_error(code, status=400):
+    return ClientError({'Error': {'Code': code, 'Message': 'test'}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'Test')
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(resilience.time, 'sleep', slept.append)
+    return slept
+
+
+class Flaky:
+    """Raises the given errors in turn, then returns ``result``"""
+
+    def __init__(self, *errors, result='ok'):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+@pytest.mark.parametrize('error, kind', [
+    (client_error('TooManyRequestsException'), resilience.THROTTLE),
+    (client_error('ThrottlingException'), resilience.THROTTLE),
+    (client_error('InternalServerErrorException', 500), resilience.TRANSIENT),
+    (client_error('SomethingNew', 503), resilience.TRANSIENT),
+    (EndpointConnectionError(endpoint_url='https://medialive'), resilience.TRANSIENT),
+    (client_error('ConflictException', 409), resilience.CONFLICT),
+    (client_error('NotFoundException', 404), resilience.NOT_FOUND),
+    (client_error('BadRequestException'), resilience.CLIENT),
+    (ValueError('not AWS'), None),
+    (CircuitOpenError('medialive', 'circuit open', 1.0), resilience.THROTTLE),
+])
+def test_classify_by_error_code(error, kind):
+    assert classify(error) == kind
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, reset_after=60)
+    assert [breaker.on_failure() for _ in range(3)] == [False, False, True]
+    assert breaker.state == 'open'
+    assert breaker.allow() > 0
+
+
+def test_breaker_success_resets_the_count():
+    breaker = CircuitBreaker(failures=2, reset_after=60)
+    breaker.on_failure()
+    breaker.on_success()
+    assert breaker.on_failure() is False
+    assert breaker.allow() is None
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failures=1, reset_after=0)
+    breaker.on_failure()
+    assert breaker.allow() is None
+    assert breaker.state == 'half-open'
+    assert breaker.allow() is not None
+    breaker.on_success()
+    assert breaker.state == 'closed'
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failures=1, reset_after=0)
+    breaker.on_failure()
+    breaker.allow()
+    assert breaker.on_failure() is True
+    assert breaker.state == 'open'
+
+
+def test_breaker_abandoned_probe_frees_the_slot():
+    breaker = CircuitBreaker(failures=1, reset_after=0)
+    breaker.on_failure()
+    assert breaker.allow() is None
+    breaker.abandon()
+    assert breaker.allow() is None
+
+
+def test_bucket_spends_its_burst_then_respects_the_deadline():
+    bucket = TokenBucket(rate=0.001, burst=2)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire(deadline=time.monotonic()) is None
+
+
+def test_bucket_waits_for_a_token(monkeypatch):
+    bucket = TokenBucket(rate=10, burst=1)
+    slept = []
+
+    def sleep(seconds):
+        # Let the time pass for the bucket
+        slept.append(seconds)
+        bucket._updated -= seconds
+
+    monkeypatch.setattr(resilience.time, 'sleep', sleep)
+    bucket.acquire()
+    bucket._updated -= 0.05  # half a token has accrued
+    assert bucket.acquire() == pytest.approx(0.05, abs=0.01)
+    assert len(slept) == 1
+
+
+def test_bucket_halves_on_throttle_and_creeps_back():
+    bucket = TokenBucket(rate=10, burst=5, min_rate=1)
+    bucket.on_throttle()
+    assert bucket.rate == 5
+    assert bucket.tokens <= 0
+    for _ in range(4):
+        bucket.on_throttle()
+    assert bucket.rate == 1
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(1.5)
+    for _ in range(100):
+        bucket.on_success()
+    assert bucket.rate == 10
+
+
+def test_guard_retries_transient_errors_with_backoff(no_sleep):
+    fn = Flaky(client_error('InternalServerErrorException', 500), client_error('ServiceUnavailable', 503))
+    guard = ServiceGuard('medialive', rate=1000, burst=1000)
+    assert guard.call(fn) == 'ok'
+    assert fn.calls == 3
+    assert len(no_sleep) == 2
+    assert guard.breaker.consecutive == 0
+
+
+def test_guard_does_not_retry_client_errors():
+    fn = Flaky(client_error('BadRequestException'))
+    guard = ServiceGuard('medialive', rate=1000, burst=1000)
+    with pytest.raises(ClientError):
+        guard.call(fn)
+    assert fn.calls == 1
+    assert guard.breaker.consecutive == 0
+
+
+def test_guard_leaves_the_breaker_alone_on_local_errors():
+    guard = ServiceGuard('medialive', rate=1000, burst=1000, failures=3)
+    with pytest.raises(ClientError):
+        guard.call(Flaky(client_error('ThrottlingException'), client_error('ThrottlingException')), max_attempts=2)
+    fn = Flaky(ValueError('bad response shape'))
+    with pytest.raises(ValueError):
+        guard.call(fn)
+    assert fn.calls == 1
+    # Not a service response, so the failure count is not reset
+    assert guard.breaker.consecutive == 2
+
+
+def test_local_error_during_a_probe_frees_the_slot():
+    guard = ServiceGuard('medialive', rate=1000, burst=1000, failures=1, reset_after=0)
+    with pytest.raises(ClientError):
+        guard.call(Flaky(client_error('InternalServerErrorException', 500)), max_attempts=1)
+    with pytest.raises(ValueError):
+        guard.call(Flaky(ValueError('bad response shape')))
+    assert guard.breaker.state == 'half-open'
+    assert guard.call(Flaky()) == 'ok'
+    assert guard.breaker.state == 'closed'
+
+
+def test_guard_retries_non_idempotent_calls_only_on_throttling():
+    guard = ServiceGuard('medialive', rate=1000, burst=1000)
+    throttled = Flaky(client_error('TooManyRequestsException'))
+    assert guard.call(throttled, idempotent=False) == 'ok'
+    assert throttled.calls == 2
+
+    failed = Flaky(client_error('InternalServerErrorException', 500))
+    with pytest.raises(ClientError):
+        guard.call(failed, idempotent=False)
+    assert failed.calls == 1
+
+
+def test_guard_stops_at_max_attempts():
+    errors = [client_error('ThrottlingException') for _ in range(10)]
+    fn = Flaky(*errors)
+    guard = ServiceGuard('ivs', rate=1000, burst=1000, failures=100)
+    with pytest.raises(ClientError):
+        guard.call(fn, max_attempts=3)
+    assert fn.calls == 3
+
+
+def test_guard_does_not_sleep_past_the_deadline(no_sleep):
+    fn = Flaky(client_error('ThrottlingException'))
+    guard = ServiceGuard('ivs', rate=1000, burst=1000)
+    with pytest.raises(ClientError):
+        guard.call(fn, deadline=time.monotonic())
+    assert fn.calls == 1
+    assert no_sleep == []
+
+
+def test_open_circuit_fails_fast_without_calling():
+    guard = ServiceGuard('medialive', rate=1000, burst=1000, failures=2, reset_after=60)
+    with pytest.raises(ClientError):
+        guard.call(Flaky(*[client_error('ThrottlingException') for _ in range(5)]), max_attempts=2)
+    fn = Flaky()
+    with pytest.raises(CircuitOpenError) as raised:
+        guard.call(fn)
+    assert fn.calls == 0
+    assert raised.value.retry_after > 0
+
+
+def test_exhausted_budget_fails_without_calling():
+    guard = ServiceGuard('medialive', rate=0.001, burst=1)
+    assert guard.call(Flaky()) == 'ok'
+    fn = Flaky()
+    with pytest.raises(BudgetExhausted):
+        guard.call(fn, deadline=time.monotonic())
+    assert fn.calls == 0
+    # Refused before reaching the service, so not a failure
+    assert guard.breaker.consecutive == 0
+
+
+def test_guard_is_shared_per_service(monkeypatch):
+    monkeypatch.setenv('CALL_BUDGET_TESTSVC', '3/7')
+    resilience.reset_guards()
+    try:
+        guard = resilience.guard('testsvc')
+        assert resilience.guard('testsvc') is guard
+        assert (guard.bucket.rate, guard.bucket.burst) == (3.0, 7)
+    finally:
+        resilience.reset_guards()
@@ -0,0 +1,47 @@
+"""Marker start alignment and schedule time formats."""
+import pytest
+
+from shelcaster_common.profiles import LOW_LATENCY_SEGMENT_SECONDS
+from shelcaster_common.schedule import MIN_LEAD_SECONDS, aligned_start, fixed_time, hls_segment_length, parse_time
+
+NOW = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+
+
+def test_aligned_start_without_anchor_uses_epoch_multiples():
+    assert aligned_start(NOW + 61, 6, now=NOW) == NOW + 66
+    assert aligned_start(NOW + 60, 6, now=NOW) == NOW + 60
+
+
+def test_aligned_start_follows_the_anchor_timeline():
+    anchor = NOW - 100.25  # a boundary seen in the playlist
+    aligned = aligned_start(NOW + 61, 6, now=NOW, anchor=anchor)
+    assert aligned == pytest.approx(NOW + 61.75)
+    assert (aligned - anchor) % 6 == pytest.approx(0)
+
+
+def test_aligned_start_on_an_anchor_boundary_stays_put():
+    anchor = NOW + 0.5
+    assert aligned_start(anchor + 60, 6, now=NOW, anchor=anchor) == pytest.approx(anchor + 60)
+
+
+def test_aligned_start_tolerates_float_noise():
+    anchor = NOW + 0.1
+    # 0.1 + 0.2 style error must not push the start a whole segment later
+    assert aligned_start(anchor + 60.0000001, 6, now=NOW, anchor=anchor) == pytest.approx(anchor + 60)
+
+
+def test_aligned_start_inside_the_lead_time():
+    with pytest.raises(ValueError):
+        aligned_start(NOW + MIN_LEAD_SECONDS - 6, 6, now=NOW)
+
+
+def test_hls_segment_length():
+    assert hls_segment_length('hd-1080p') == 6
+    assert hls_segment_length('hd-1080p-ll') == LOW_LATENCY_SEGMENT_SECONDS
+
+
+def test_fixed_time_round_trips_with_parse_time():
+    assert fixed_time(NOW + 1.5) == '2026-01-01T00:00:01.500Z'
+    assert parse_time(fixed_time(NOW + 1.5)) == NOW + 1.5
+    assert parse_time('2026-01-01T00:00:00') == NOW
+    assert parse_time(NOW) == NOW
@@ -0,0 +1,197 @@
+"""SegmentIndex seeks, serialization and incremental updates from S3."""
+from datetime import datetime, timezone
+
+import pytest
+
+from shelcaster_common.hls import parse_playlist
+from shelcaster_common.segment_index import (
+    SegmentIndex,
+    extend_index,
+    index_key,
+    load_index,
+    save_index,
+    segment_format,
+    span_objects,
+    timeline_anchor,
+    update_index,
+)
+
+BUCKET = 'test-bucket'
+PLAYLIST = 'recordings/s1/index_1080p.m3u8'
+T0 = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+
+
+def stamp(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def make_index():
+    """Five 6s segments from T0, with a 10s gap before the fourth"""
+    index = SegmentIndex(PLAYLIST, segment_format('index_1080p_00001.ts'), 6)
+    for sequence, start in ((1, T0), (2, T0 + 6), (3, T0 + 12), (4, T0 + 28), (5, T0 + 34)):
+        index.append(sequence, start, 6.0, 1000 + sequence)
+    return index
+
+
+def media_playlist(first, last, dated=True, ended=False):
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:6', f'#EXT-X-MEDIA-SEQUENCE:{first}']
+    if dated:
+        lines.append(f'#EXT-X-PROGRAM-DATE-TIME:{stamp(T0 + (first - 1) * 6)}')
+    for sequence in range(first, last + 1):
+        lines += ['#EXTINF:6.000,', f'index_1080p_{sequence:05d}.ts']
+    if ended:
+        lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def seed_segments(s3, first, last):
+    for sequence in range(first, last + 1):
+        s3.put(BUCKET, f'recordings/s1/index_1080p_{sequence:05d}.ts', b'x' * 100, modified=T0 + sequence * 6)
+
+
+def test_bounds_and_keys():
+    index = make_index()
+    assert len(index) == 5
+    assert (index.start, index.end, index.last_sequence) == (T0, T0 + 40, 5)
+    assert index.bytes == sum(1000 + n for n in range(1, 6))
+    assert index.key(0) == 'recordings/s1/index_1080p_00001.ts'
+    assert index.entry(3) == {
+        'key': 'recordings/s1/index_1080p_00004.ts', 'sequence': 4, 'start': T0 + 28, 'duration': 6.0, 'size': 1004
+    }
+
+
+def test_empty_index():
+    index = SegmentIndex(PLAYLIST)
+    assert (index.start, index.end, index.last_sequence) == (None, None, None)
+    assert index.locate(T0) is None
+    assert index.span(T0, T0 + 60) is None
+
+
+@pytest.mark.parametrize('when, expected', [
+    (T0, 0),
+    (T0 + 5.999, 0),
+    (T0 + 6, 1),
+    (T0 - 30, 0),      # before the first segment snaps forward
+    (T0 + 20, 3),      # inside the gap snaps forward
+    (T0 + 39.9, 4),
+    (T0 + 40, None),   # past the end
+])
+def test_locate(when, expected):
+    assert make_index().locate(when) == expected
+
+
+@pytest.mark.parametrize('started_at, stopped_at, expected', [
+    (T0 + 3, T0 + 13, (0, 2)),
+    (T0 + 6, T0 + 12, (1, 1)),     # the stop boundary excludes the next segment
+    (T0 + 6, T0 + 6.5, (1, 1)),
+    (T0 - 10, T0 + 100, (0, 4)),
+    (T0 + 18, T0 + 28, None),      # only the gap
+    (T0 + 40, T0 + 50, None),
+])
+def test_span(started_at, stopped_at, expected):
+    assert make_index().span(started_at, stopped_at) == expected
+
+
+def test_span_objects_are_finalize_summaries():
+    assert span_objects(make_index(), T0 + 6, T0 + 13) == [
+        {'Key': 'recordings/s1/index_1080p_00002.ts', 'Size': 1002},
+        {'Key': 'recordings/s1/index_1080p_00003.ts', 'Size': 1003}
+    ]
+    assert span_objects(make_index(), T0 + 40, T0 + 50) == []
+
+
+def test_append_keeps_sequences_and_starts_ordered():
+    index = make_index()
+    with pytest.raises(ValueError):
+        index.append(5, T0 + 40, 6.0, 1)
+    index.append(6, T0 + 30, 6.0, 1)
+    assert index.columns['start'][-1] == T0 + 34
+
+
+def test_json_round_trip():
+    index = make_index()
+    index.ended = True
+    restored = SegmentIndex.from_json(index.to_json(), etag='"abc"')
+    assert restored.etag == '"abc"'
+    assert restored.ended
+    assert restored.segment_format == index.segment_format
+    assert [restored.entry(i) for i in range(len(restored))] == [index.entry(i) for i in range(len(index))]
+
+
+def test_from_json_rejects_other_versions_and_torn_columns():
+    document = make_index().to_json()
+    with pytest.raises(ValueError):
+        SegmentIndex.from_json(document.replace('"version":1', '"version":99'))
+    with pytest.raises(ValueError):
+        SegmentIndex.from_json(document.replace('"count":5', '"count":4'))
+
+
+def test_segment_format_escapes_and_pads():
+    assert segment_format('index_1080p_00042.ts').format(7) == 'index_1080p_00007.ts'
+    assert segment_format('odd{name}_9.ts').format(12) == 'odd{name}_12.ts'
+    with pytest.raises(ValueError):
+        segment_format('no-number.ts')
+
+
+def test_extend_index_dates_segments_from_the_playlist(s3):
+    seed_segments(s3, 1, 6)
+    objects = {obj['Key']: obj for obj in s3.paginate(BUCKET, 'recordings/s1/index_1080p_')[0]['Contents']}
+    index = SegmentIndex(PLAYLIST)
+    # Segments 1-2 slid out of the live window; 6 is not in the playlist yet
+    added = extend_index(index, parse_playlist(media_playlist(3, 5)), objects)
+
+    assert added == 5
+    assert list(index.columns['sequence']) == [1, 2, 3, 4, 5]
+    # The first undated segment starts at LastModified minus its duration
+    assert index.columns['start'][0] == T0
+    assert list(index.columns['start'])[2:] == [T0 + 12, T0 + 18, T0 + 24]
+    assert index.target_duration == 6
+
+
+def test_update_index_is_incremental(s3):
+    seed_segments(s3, 1, 3)
+    s3.put(BUCKET, PLAYLIST, media_playlist(1, 3))
+    index, added = update_index(s3, BUCKET, PLAYLIST)
+    assert (added, len(index)) == (3, 3)
+    assert load_index(s3, BUCKET, PLAYLIST).to_json() == index.to_json()
+
+    etag = s3.objects[(BUCKET, index_key(PLAYLIST))][1]
+    index, added = update_index(s3, BUCKET, PLAYLIST)
+    assert added == 0
+    assert s3.objects[(BUCKET, index_key(PLAYLIST))][1] == etag
+
+    seed_segments(s3, 4, 5)
+    s3.put(BUCKET, PLAYLIST, media_playlist(2, 5, ended=True))
+    index, added = update_index(s3, BUCKET, PLAYLIST)
+    assert added == 2
+    assert index.ended
+    assert index.end == T0 + 30
+
+
+def test_update_index_skips_master_playlists(s3):
+    s3.put(BUCKET, 'recordings/s1/index.m3u8', '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1\nindex_1080p.m3u8\n')
+    assert update_index(s3, BUCKET, 'recordings/s1/index.m3u8') == (None, 0)
+
+
+def test_save_index_refuses_to_overwrite_a_newer_copy(s3):
+    first = make_index()
+    assert save_index(s3, BUCKET, first)
+    stale = SegmentIndex.from_json(first.to_json(), etag='"stale"')
+    assert not save_index(s3, BUCKET, stale)
+    fresh = SegmentIndex(PLAYLIST)
+    assert not save_index(s3, BUCKET, fresh)
+
+
+def test_timeline_anchor_is_the_end_of_the_newest_dated_segment(s3):
+    s3.put(BUCKET, 'recordings/s1/index.m3u8', (
+        '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=5000000\nindex_1080p.m3u8\n'
+        '#EXT-X-STREAM-INF:BANDWIDTH=1000000\nindex_360p.m3u8\n'
+    ))
+    s3.put(BUCKET, PLAYLIST, media_playlist(3, 5))
+    assert timeline_anchor(s3, BUCKET, 'recordings/s1/') == T0 + 30
+
+
+def test_timeline_anchor_without_dated_output(s3):
+    assert timeline_anchor(s3, BUCKET, 'recordings/s1/') is None
+    s3.put(BUCKET, 'recordings/s1/index.m3u8', media_playlist(1, 2, dated=False))
+    assert timeline_anchor(s3, BUCKET, 'recordings/s1/') is None
@@ -0,0 +1,108 @@
+"""Session decoding, key layout routing and the container cache."""
+import os
+import subprocess
+import sys
+
+from shelcaster_common import session as session_module
+from shelcaster_common.session import (
+    Session,
+    SessionCache,
+    SessionWrites,
+    decode_value,
+    session_key,
+    session_path,
+)
+from shelcaster_common.writes import WriteBatch
+
+
+def test_decode_value_handles_nested_types():
+    value = {'M': {
+        'name': {'S': 'show'},
+        'count': {'N': '3'},
+        'level': {'N': '0.5'},
+        'live': {'BOOL': True},
+        'overlay': {'NULL': True},
+        'callers': {'L': [{'S': 'a'}, {'N': '-2'}]}
+    }}
+    assert decode_value(value) == {
+        'name': 'show', 'count': 3, 'level': 0.5, 'live': True, 'overlay': None, 'callers': ['a', -2]
+    }
+
+
+def test_get_walks_only_the_requested_path():
+    session = Session('s1', {
+        'mediaLive': {'M': {'channelId': {'S': 'ch-1'}}},
+        'streaming': {'M': {'isLive': {'BOOL': True}}}
+    })
+    assert session.get('mediaLive', 'channelId') == 'ch-1'
+    assert session.get('mediaLive', 'missing') is None
+    assert session.get('streaming', 'isLive', 'deeper') is None
+    assert session.media_live_channel_id == 'ch-1'
+    assert session.is_live is True
+
+
+def test_from_items_merges_split_concerns_and_takes_newest_version():
+    session = Session.from_items('s1', [
+        {'pk': {'S': 'session#s1'}, 'sk': {'S': 'info'}, 'status': {'S': 'ACTIVE'}, 'updatedAt': {'S': '2026-01-01T00:00:00'}},
+        {'pk': {'S': 'session#s1'}, 'sk': {'S': 'info#recording'}, 'isRecording': {'BOOL': True}, 'updatedAt': {'S': '2026-01-02T00:00:00'}}
+    ])
+    assert session.get('status') == 'ACTIVE'
+    assert session.is_recording is True
+    assert session.version == '2026-01-02T00:00:00'
+
+
+def test_session_path_routes_concerns_in_split_layout():
+    assert session_path('s1', 'mediaLive.channelId', layout='item') == (session_key('s1'), 'mediaLive.channelId')
+    assert session_path('s1', 'mediaLive.channelId', layout='split') == (session_key('s1', 'info#mediaLive'), 'channelId')
+    assert session_path('s1', 'recording', layout='split') == (session_key('s1', 'info#recording'), None)
+    assert session_path('s1', 'status', layout='split') == (session_key('s1'), 'status')
+
+
+def test_session_writes_touch_every_item_written(dynamodb):
+    writes = WriteBatch(dynamodb, table_name='test')
+    session_writes = SessionWrites(writes, 's1', layout='split')
+    session_writes.set('streaming.isLive', {'BOOL': True})
+    session_writes.set('recording', {'M': {'isRecording': {'BOOL': False}}})
+    session_writes.touch({'S': 'now'})
+    writes.flush()
+
+    (operation, params), = dynamodb.requests
+    assert operation == 'transact_write_items'
+    updates = {item['Update']['Key']['sk']['S']: item['Update'] for item in params['TransactItems']}
+    assert set(updates) == {'info#streaming', 'info#recording'}
+    for update in updates.values():
+        assert 'updatedAt' in update['ExpressionAttributeNames'].values()
+
+
+def test_cache_never_rolls_back_to_an_older_version():
+    cache = SessionCache(ttl=60)
+    newer = Session('s1', {'updatedAt': {'S': '2026-01-02T00:00:00'}})
+    older = Session('s1', {'updatedAt': {'S': '2026-01-01T00:00:00'}})
+    cache.put(newer)
+    assert cache.put(older) is newer
+    assert cache.get('s1') is newer
+
+
+def test_cache_misses_when_the_view_lacks_requested_parts():
+    cache = SessionCache(ttl=60)
+    cache.put(Session('s1', {}, parts=('streaming',)))
+    assert cache.get('s1', parts=('streaming',)) is not None
+    assert cache.get('s1', parts=('streaming', 'recording')) is None
+    assert cache.get('s1') is None
+
+
+def test_cache_expires_entries_after_ttl():
+    cache = SessionCache(ttl=5)
+    cache.put(Session('s1', {}, fetched_at=0.0))
+    assert cache.get('s1') is None
+
+
+def test_split_layout_refuses_to_load():
+    # The JS readers (end-session) only look at the info item
+    layer = os.path.dirname(os.path.dirname(session_module.__file__))
+    env = dict(os.environ, PYTHONPATH=layer, SESSION_LAYOUT='split')
+    result = subprocess.run(
+        [sys.executable, '-c', 'import shelcaster_common.session'], env=env, capture_output=True, text=True
+    )
+    assert result.returncode != 0
+    assert 'SESSION_LAYOUT=split is not supported' in result.stderr
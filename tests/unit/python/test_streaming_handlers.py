@@ -0,0 +1,230 @@
+"""start-streaming, stop-streaming, bulk-stop and streaming-status against stubbed or fake AWS clients."""
+import json
+import time
+
+import pytest
+
+from conftest import LambdaContext, load_handler
+from shelcaster_common.channel_pool import pool_key
+from shelcaster_common.lease import DEFAULT_LEASE
+from shelcaster_common.profiles import get_profile
+from shelcaster_common.session import invalidate_session
+
+CHANNEL_ARN = 'arn:aws:ivs:us-east-1:000000000000:channel/test'
+
+
+def session_item(session_id, ivs=True):
+    profile = get_profile()
+    item = {
+        'pk': {'S': f'session#{session_id}'},
+        'sk': {'S': 'info'},
+        'sessionId': {'S': session_id},
+        'streaming': {'M': {'isLive': {'BOOL': True}}},
+        'mediaLive': {'M': {
+            'channelId': {'S': f'ch-{session_id}'},
+            'profile': {'S': profile.name},
+            'specHash': {'S': profile.spec_hash}
+        }},
+        'mediaLiveChannelId': {'S': f'ch-{session_id}'},
+        'ivs': {'M': {
+            'programIngestEndpoint': {'S': 'rtmps://test.global-contribute.live-video.net:443/app/'},
+            'programChannelArn': {'S': CHANNEL_ARN},
+            'programPlaybackUrl': {'S': 'https://test.playback.live-video.net/test.m3u8'}
+        }}
+    }
+    if not ivs:
+        del item['ivs']
+    return item
+
+
+def invoke(function_dir, session_id=None, query=None, body=None):
+    invalidate_session(session_id)
+    event = {'pathParameters': {'sessionId': session_id}, 'queryStringParameters': query}
+    if body is not None:
+        event['body'] = json.dumps(body)
+    response = load_handler(function_dir).lambda_handler(event, LambdaContext())
+    return response['statusCode'], json.loads(response['body'])
+
+
+def status(session_id, if_none_match=None):
+    event = {'pathParameters': {'sessionId': session_id}, 'headers': {'if-none-match': if_none_match}}
+    return load_handler('shelcaster-streaming-status-py').lambda_handler(event, LambdaContext())
+
+
+@pytest.fixture
+def session(aws):
+    aws('dynamodb').add_response('get_item', {'Item': session_item('s1')})
+    return 's1'
+
+
+def test_stop_streaming_ends_the_ivs_broadcast(aws, session):
+    aws('medialive').add_response('stop_channel', {}, {'ChannelId': 'ch-s1'})
+    aws('ivs').add_response('stop_stream', {}, {'channelArn': CHANNEL_ARN})
+    aws('dynamodb').add_response('update_item', {})
+    status, body = invoke('shelcaster-stop-streaming-py', session)
+    assert status == 200
+    assert 'warnings' not in body
+
+
+def test_stop_streaming_treats_an_idle_ivs_channel_as_stopped(aws, session):
+    aws('medialive').add_client_error('stop_channel', 'ConflictException', http_status_code=409)
+    aws('ivs').add_client_error('stop_stream', 'ChannelNotBroadcasting', http_status_code=404)
+    aws('dynamodb').add_response('update_item', {})
+    status, body = invoke('shelcaster-stop-streaming-py', session)
+    assert status == 200
+    assert 'warnings' not in body
+
+
+def test_stop_streaming_reports_other_ivs_errors_as_warnings(aws, session):
+    aws('medialive').add_response('stop_channel', {})
+    aws('ivs').add_client_error('stop_stream', 'AccessDeniedException', http_status_code=403)
+    aws('dynamodb').add_response('update_item', {})
+    status, body = invoke('shelcaster-stop-streaming-py', session)
+    assert status == 200
+    assert list(body['warnings']) == ['ivs']
+
+
+def test_start_streaming_makes_no_ivs_call(aws, session):
+    # IVS goes live on ingest; any IVS call would hit the empty stubber
+    aws('ivs')
+    aws('medialive').add_response('start_channel', {'State': 'STARTING'}, {'ChannelId': 'ch-s1'})
+    aws('dynamodb').add_response('update_item', {})
+    status, body = invoke('shelcaster-start-streaming-py', session)
+    assert status == 200
+    assert body['playbackUrl'] == 'https://test.playback.live-video.net/test.m3u8'
+    assert 'warnings' not in body
+
+
+def test_start_streaming_rejects_an_unknown_mode(aws):
+    status, body = invoke('shelcaster-start-streaming-py', 's1', query={'mode': 'eventually'})
+    assert status == 400
+    assert body['error'] == 'Invalid mode: eventually'
+
+
+def test_start_streaming_unknown_session(aws):
+    aws('dynamodb').add_response('get_item', {})
+    status, _ = invoke('shelcaster-start-streaming-py', 's1')
+    assert status == 404
+
+
+def cold_session(fake_aws, session_id='s1'):
+    """A session with its IVS ingest but no MediaLive channel yet"""
+    item = session_item(session_id)
+    del item['mediaLive'], item['mediaLiveChannelId']
+    fake_aws.put_item(item)
+    return session_id
+
+
+def test_cold_start_takes_a_pooled_channel(fake_aws):
+    profile = get_profile()
+    fake_aws.put_item({
+        **pool_key('ch-pool', profile.name),
+        'status': {'S': 'idle'},
+        'channelId': {'S': 'ch-pool'},
+        'inputId': {'S': 'in-pool'},
+        'rtmpUrl': {'S': 'rtmp://198.51.100.10:1935/host/pool'},
+        'specHash': {'S': profile.spec_hash},
+        'createdAt': {'S': '2026-01-01T00:00:00'}
+    })
+    fake_aws.channel_states['ch-pool'] = 'IDLE'
+    status, _ = invoke('shelcaster-start-streaming-py', cold_session(fake_aws))
+
+    assert status == 200
+    item = fake_aws.items[('session#s1', 'info')]
+    assert item['mediaLive']['M']['channelId'] == item['mediaLiveChannelId'] == {'S': 'ch-pool'}
+    assert item['streaming']['M']['isLive'] == {'BOOL': True}
+    # The session write took the pool entry and let go of the provisioning lease
+    assert tuple(key['S'] for key in pool_key('ch-pool', profile.name).values()) not in fake_aws.items
+    assert DEFAULT_LEASE not in item
+    assert fake_aws.calls['medialive.CreateChannel'] == 0
+    assert fake_aws.calls['lambda.Invoke'] == 1
+
+
+def test_cold_start_on_an_empty_pool_creates_a_channel(fake_aws):
+    status, _ = invoke('shelcaster-start-streaming-py', cold_session(fake_aws))
+
+    assert status == 200
+    channel_id = fake_aws.items[('session#s1', 'info')]['mediaLive']['M']['channelId']['S']
+    assert channel_id in fake_aws.channel_states
+    assert fake_aws.calls['medialive.CreateChannel'] == fake_aws.calls['medialive.StartChannel'] == 1
+    # The default profile's pool is topped up after an inline create
+    assert fake_aws.calls['lambda.Invoke'] == 1
+
+
+def test_stop_streaming_needs_a_known_session(aws):
+    status, _ = invoke('shelcaster-stop-streaming-py', None)
+    assert status == 400
+    aws('dynamodb').add_response('get_item', {})
+    status, _ = invoke('shelcaster-stop-streaming-py', 's1')
+    assert status == 404
+
+
+@pytest.mark.parametrize('body, error', [
+    ({}, 'Provide sessionIds or filter'),
+    ({'sessionIds': [f's{n}' for n in range(201)]}, 'At most 200 sessions per request'),
+])
+def test_bulk_stop_rejects_bad_requests(aws, body, error):
+    status, response = invoke('shelcaster-bulk-stop-streaming-py', body=body)
+    assert (status, response['error']) == (400, error)
+
+
+def test_bulk_stop_counts_only_sessions_left_stopped(aws):
+    aws('dynamodb').add_response('batch_get_item', {'Responses': {'shelcaster-app': [
+        session_item('s1', ivs=False), session_item('s2', ivs=False)
+    ]}})
+    aws('medialive').add_response('stop_channel', {})
+    aws('medialive').add_response('stop_channel', {})
+    # The batch write is cancelled, and the item-by-item retry fails for s2
+    aws('dynamodb').add_client_error('transact_write_items', 'TransactionCanceledException')
+    aws('dynamodb').add_response('update_item', {})
+    aws('dynamodb').add_client_error('update_item', 'ConditionalCheckFailedException')
+    status, body = invoke('shelcaster-bulk-stop-streaming-py', body={'sessionIds': ['s1', 's2', 's3']})
+    assert status == 200
+    assert {session_id: result['status'] for session_id, result in body['results'].items()} == {
+        's1': 'stopped', 's2': 'error', 's3': 'not_found'
+    }
+    assert body['count'] == 1
+
+
+@pytest.fixture
+def status_handler(aws):
+    module = load_handler('shelcaster-streaming-status-py')
+    module._status_cache.clear()
+    module._channel_states.clear()
+    return module
+
+
+@pytest.mark.parametrize('tag, expected', [
+    ('{etag}', 304),
+    ('W/{etag}', 304),
+    ('"stale", {etag}', 304),
+    ('"stale"', 200),
+])
+def test_streaming_status_revalidates_with_if_none_match(aws, status_handler, tag, expected):
+    aws('dynamodb').add_response('get_item', {'Item': session_item('s1')})
+    first = status('s1')
+    assert first['statusCode'] == 200
+    # The second poll is answered from the container's status cache
+    second = status('s1', tag.format(etag=first['headers']['ETag']))
+    assert second['statusCode'] == expected
+    assert second['headers']['ETag'] == first['headers']['ETag']
+    if expected == 304:
+        assert second['body'] == ''
+        assert 'Content-Type' not in second['headers']
+    else:
+        assert second['body'] == first['body']
+
+
+def test_channel_state_cache_is_bounded(aws, status_handler, monkeypatch):
+    monkeypatch.setattr(status_handler, 'CHANNEL_STATE_MAX_ENTRIES', 2)
+    for channel_id in ('ch-1', 'ch-2', 'ch-3'):
+        aws('medialive').add_response('describe_channel', {'State': 'RUNNING'}, {'ChannelId': channel_id})
+        assert status_handler.get_channel_state(channel_id) == 'RUNNING'
+    assert list(status_handler._channel_states) == ['ch-2', 'ch-3']
+
+
+def test_channel_state_cache_drops_expired_entries(aws, status_handler):
+    status_handler._channel_states['ch-1'] = ('STARTING', time.monotonic() - status_handler.CHANNEL_STATE_TTL)
+    aws('medialive').add_response('describe_channel', {'State': 'RUNNING'})
+    assert status_handler.get_channel_state('ch-2') == 'RUNNING'
+    assert list(status_handler._channel_states) == ['ch-2']
@@ -0,0 +1,82 @@
+"""Span recording, guard retry reporting and EMF output."""
+import json
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from shelcaster_common import resilience, tracing
+from shelcaster_common.resilience import ServiceGuard
+
+
+@pytest.fixture(autouse=True)
+def clean_recorder(monkeypatch):
+    monkeypatch.setattr(resilience.time, 'sleep', lambda seconds: None)
+    tracing.recorder.drain()
+    yield
+    tracing.recorder.drain()
+
+
+def client_error(code, status=400):
+    return ClientError({'Error': {'Code': code, 'Message': 'test'}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'Test')
+
+
+def test_record_aggregates_per_operation():
+    tracing.recorder.record('ivs', 'GetStream', 5.0)
+    tracing.recorder.record('ivs', 'GetStream', 7.0, retries=2, error_code='ThrottlingException')
+    span = tracing.recorder.drain()[('ivs', 'GetStream')]
+    assert span['latencies'] == [5.0, 7.0]
+    assert (span['attempts'], span['retries'], span['errors']) == (4, 2, 1)
+    assert span['error_codes'] == {'ThrottlingException'}
+
+
+def test_guard_reports_attempts_and_retries():
+    errors = [client_error('ThrottlingException'), client_error('InternalServerErrorException', 500)]
+
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert ServiceGuard('medialive', rate=1000, burst=1000).call(fn) == 'ok'
+    span = tracing.recorder.drain()[('medialive', 'GuardedCall')]
+    assert (span['attempts'], span['retries'], span['errors']) == (3, 2, 0)
+
+
+def test_guard_reports_its_final_error():
+    def fn():
+        raise client_error('BadRequestException')
+
+    with pytest.raises(ClientError):
+        ServiceGuard('ivs', rate=1000, burst=1000).call(fn)
+    span = tracing.recorder.drain()[('ivs', 'GuardedCall')]
+    assert (span['attempts'], span['retries']) == (1, 0)
+    assert span['error_codes'] == {'BadRequestException'}
+
+
+def test_operations_of_a_guard_retry_count_as_retries():
+    session = boto3.session.Session(aws_access_key_id='x', aws_secret_access_key='x', region_name='us-east-1')
+    tracing.instrument_session(session)
+    ivs = session.client('ivs')
+    stubber = Stubber(ivs)
+    stubber.add_client_error('stop_stream', 'ThrottlingException', http_status_code=429)
+    stubber.add_response('stop_stream', {})
+    with stubber:
+        ServiceGuard('ivs', rate=1000, burst=1000).call(lambda: ivs.stop_stream(channelArn='arn:aws:ivs:us-east-1:1:channel/a'))
+    spans = tracing.recorder.drain()
+    assert (spans[('ivs', 'StopStream')]['attempts'], spans[('ivs', 'StopStream')]['retries']) == (3, 1)
+    assert spans[('ivs', 'GuardedCall')]['retries'] == 1
+
+
+def test_emit_metrics_prints_one_emf_line_per_operation(capsys):
+    tracing.recorder.record('ivs', 'GetStream', 5.0, retries=1)
+    tracing.recorder.record('dynamodb', 'GetItem', 2.0, error_code='ResourceNotFoundException')
+    tracing.emit_metrics('fn', tracing.recorder.drain())
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(line['Service'], line['Operation']) for line in lines] == [('dynamodb', 'GetItem'), ('ivs', 'GetStream')]
+    assert {m['Name'] for m in lines[0]['_aws']['CloudWatchMetrics'][0]['Metrics']} == {
+        'Latency', 'Attempts', 'Retries', 'Errors'
+    }
+    assert (lines[1]['Attempts'], lines[1]['Retries']) == (2, 1)
+    assert lines[0]['ErrorCodes'] == ['ResourceNotFoundException']
@@ -0,0 +1,114 @@
+"""WriteBatch expression generation and request shape."""
+import pytest
+
+from shelcaster_common.session import session_key
+from shelcaster_common.writes import MAX_TRANSACT_ITEMS, WriteBatch
+
+
+def test_single_item_is_one_update_with_shared_name_placeholders(dynamodb):
+    key = session_key('s1')
+    writes = WriteBatch(dynamodb, table_name='test')
+    writes.set(key, 'recording.isRecording', {'BOOL': True})
+    writes.set(key, 'recording.startedAt', {'S': 'now'})
+    writes.remove(key, 'recording.stopAt')
+    assert writes.flush() == 1
+
+    (operation, params), = dynamodb.requests
+    assert operation == 'update_item'
+    assert params['TableName'] == 'test'
+    assert params['Key'] == key
+    assert params['UpdateExpression'] == 'SET #n0.#n1 = :v0, #n0.#n2 = :v1 REMOVE #n0.#n3'
+    assert params['ExpressionAttributeNames'] == {
+        '#n0': 'recording', '#n1': 'isRecording', '#n2': 'startedAt', '#n3': 'stopAt'
+    }
+    assert params['ExpressionAttributeValues'] == {':v0': {'BOOL': True}, ':v1': {'S': 'now'}}
+    assert 'ConditionExpression' not in params
+
+
+def test_later_set_of_the_same_path_wins(dynamodb):
+    key = session_key('s1')
+    writes = WriteBatch(dynamodb)
+    writes.set(key, 'status', {'S': 'ACTIVE'})
+    writes.set(key, 'status', {'S': 'ENDED'})
+    writes.flush()
+
+    (_, params), = dynamodb.requests
+    assert params['UpdateExpression'] == 'SET #n0 = :v0'
+    assert params['ExpressionAttributeValues'] == {':v0': {'S': 'ENDED'}}
+
+
+def test_conditions_are_joined_and_their_placeholders_merged(dynamodb):
+    key = session_key('s1')
+    writes = WriteBatch(dynamodb)
+    writes.set(key, 'streaming.isLive', {'BOOL': False})
+    writes.condition(key, '#live0.#live1 = :isLive', values={':isLive': {'BOOL': True}},
+                     names={'#live0': 'streaming', '#live1': 'isLive'})
+    writes.condition(key, 'attribute_exists(pk)')
+    writes.flush()
+
+    (_, params), = dynamodb.requests
+    assert params['ConditionExpression'] == '(#live0.#live1 = :isLive) AND (attribute_exists(pk))'
+    assert params['ExpressionAttributeNames'] == {
+        '#n0': 'streaming', '#n1': 'isLive', '#live0': 'streaming', '#live1': 'isLive'
+    }
+    assert params['ExpressionAttributeValues'] == {':v0': {'BOOL': False}, ':isLive': {'BOOL': True}}
+
+
+def test_several_items_become_one_transaction(dynamodb):
+    session = session_key('s1')
+    channel = {'pk': {'S': 'channel#ch-1'}, 'sk': {'S': 'info'}}
+    pooled = {'pk': {'S': 'pool#ch-2'}, 'sk': {'S': 'info'}}
+    writes = WriteBatch(dynamodb, table_name='test')
+    writes.set(session, 'mediaLive.channelId', {'S': 'ch-1'})
+    writes.condition(channel, '#owner = :sid', values={':sid': {'S': 's1'}}, names={'#owner': 'claimedBy'})
+    writes.delete(pooled)
+    assert len(writes) == 3
+    assert writes.flush() == 3
+
+    (operation, params), = dynamodb.requests
+    assert operation == 'transact_write_items'
+    update, check, delete = params['TransactItems']
+    assert update['Update']['Key'] == session
+    assert update['Update']['UpdateExpression'] == 'SET #n0.#n1 = :v0'
+    assert check == {'ConditionCheck': {
+        'TableName': 'test',
+        'Key': channel,
+        'ConditionExpression': '(#owner = :sid)',
+        'ExpressionAttributeNames': {'#owner': 'claimedBy'},
+        'ExpressionAttributeValues': {':sid': {'S': 's1'}}
+    }}
+    assert delete == {'Delete': {'TableName': 'test', 'Key': pooled}}
+
+
+def test_single_delete_uses_delete_item(dynamodb):
+    key = session_key('s1', 'info#recording')
+    writes = WriteBatch(dynamodb)
+    writes.delete(key)
+    writes.flush()
+
+    assert dynamodb.requests == [('delete_item', {'TableName': writes.table_name, 'Key': key})]
+
+
+def test_condition_alone_sends_nothing(dynamodb):
+    writes = WriteBatch(dynamodb)
+    writes.condition(session_key('s1'), 'attribute_exists(pk)')
+    assert writes.flush() == 0
+    assert dynamodb.requests == []
+
+
+def test_flush_clears_the_batch(dynamodb):
+    writes = WriteBatch(dynamodb)
+    writes.set(session_key('s1'), 'status', {'S': 'ACTIVE'})
+    writes.flush()
+    assert not writes
+    assert writes.flush() == 0
+    assert len(dynamodb.requests) == 1
+
+
+def test_too_many_items_for_one_transaction(dynamodb):
+    writes = WriteBatch(dynamodb)
+    for n in range(MAX_TRANSACT_ITEMS + 1):
+        writes.set(session_key(f's{n}'), 'status', {'S': 'ENDED'})
+    with pytest.raises(ValueError):
+        writes.flush()
+    assert dynamodb.requests == []